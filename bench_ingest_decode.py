@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-reading CPU cost of decoding a CattleSensorData payload.
+
+Before: Starlette json.loads -> nested model validation -> model_dump() twice
+        -> requests re-encodes the dict for the storage write.
+After:  decode_sensor_reading() validates the raw bytes once, the encoded
+        JSON and dict views are each built once.
+
+Usage: python bench_ingest_decode.py [iterations]
+"""
+
+import sys
+sys.path.append('.')
+
+import json
+import timeit
+
+from models import CattleSensorData
+from ingest_codec import decode_sensor_reading
+
+RAW_READING = json.dumps({
+    "cattle_id": "cattle1",
+    "timestamp": "2025-07-28T12:34:56.000Z",
+    "latitude": -15.3875,
+    "longitude": 28.3228,
+    "gps_fix": True,
+    "speed_kmh": 1.8,
+    "heading": 137.5,
+    "is_moving": True,
+    "acceleration": {"x": 0.12, "y": -0.08, "z": 9.79},
+    "behavior": {"current": "grazing", "previous": "walking", "duration_seconds": 320, "confidence": 0.87},
+    "activity": {"total_active_time_seconds": 14400, "total_rest_time_seconds": 28800,
+                 "daily_steps": 1250, "daily_distance_km": 2.3}
+}).encode()
+
+
+def before():
+    data = CattleSensorData.model_validate(json.loads(RAW_READING))
+    live_payload = json.dumps(data.model_dump()).encode()  # set_realtime_data(..., json=...)
+    behavior_payload = data.model_dump()                    # analyze_behavior_and_generate_alerts
+    return live_payload, behavior_payload
+
+
+def after():
+    reading = decode_sensor_reading(RAW_READING)
+    return reading.as_json(), reading.as_dict()
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    before_time = min(timeit.repeat(before, number=iterations, repeat=5)) / iterations
+    after_time = min(timeit.repeat(after, number=iterations, repeat=5)) / iterations
+    print(f"📡 {iterations} readings per run")
+    print(f"⏱️ Before (json.loads + validate + 2x model_dump + json.dumps): {before_time * 1e6:6.1f} µs/reading")
+    print(f"⚡ After  (decode_sensor_reading + shared encodings):          {after_time * 1e6:6.1f} µs/reading")
+    print(f"🚀 Speed-up: {before_time / after_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Benchmark: default FastAPI JSON path vs FastJSONResponse on a 2,000-animal
+/cattle/live-data payload, plus gzip size on the wire.
+
+Usage: python bench_json_response.py [herd_size]
+"""
+
+import sys
+sys.path.append('.')
+
+import gzip
+import random
+import timeit
+from datetime import datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from fast_json import FastJSONResponse, orjson
+
+
+def build_herd_payload(herd_size: int) -> dict:
+    random.seed(42)
+    now = datetime(2025, 7, 28, 12, 0, 0)
+    data = {}
+    for i in range(herd_size):
+        cattle_id = f"cattle{i}"
+        data[cattle_id] = {
+            "cattle_id": cattle_id,
+            "timestamp": (now - timedelta(seconds=random.randint(0, 900))).isoformat(),
+            "latitude": -15.4 + random.random() * 0.05,
+            "longitude": 28.25 + random.random() * 0.05,
+            "gps_fix": True,
+            "speed_kmh": round(random.random() * 6, 2),
+            "heading": round(random.random() * 360, 1),
+            "is_moving": random.random() > 0.5,
+            "acceleration": {"x": random.gauss(0, 0.3), "y": random.gauss(0, 0.3), "z": 9.8 + random.gauss(0, 0.2)},
+            "behavior": {"current": random.choice(["grazing", "resting", "walking"]), "previous": "resting",
+                         "duration_seconds": random.randint(0, 3600), "confidence": round(random.random(), 2)},
+            "activity": {"total_active_time_seconds": random.randint(0, 40000), "total_rest_time_seconds": random.randint(0, 40000),
+                         "daily_steps": random.randint(0, 8000), "daily_distance_km": round(random.random() * 6, 2)}
+        }
+    return {"success": True, "data": data}
+
+
+def default_path(payload: dict) -> bytes:
+    # What FastAPI does for a plain dict return value
+    return JSONResponse(jsonable_encoder(payload)).body
+
+
+def fast_path(payload: dict) -> bytes:
+    return FastJSONResponse(payload).body
+
+
+def main():
+    herd_size = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    payload = build_herd_payload(herd_size)
+    runs = 20
+
+    print(f"🐄 Herd size: {herd_size} animals (orjson {'available' if orjson else 'NOT installed'})")
+    default_time = min(timeit.repeat(lambda: default_path(payload), number=1, repeat=runs))
+    fast_time = min(timeit.repeat(lambda: fast_path(payload), number=1, repeat=runs))
+    body = fast_path(payload)
+    compressed = gzip.compress(body, compresslevel=9)
+
+    print(f"⏱️ jsonable_encoder + json:   {default_time * 1000:8.2f} ms")
+    print(f"⚡ FastJSONResponse:          {fast_time * 1000:8.2f} ms  ({default_time / fast_time:.1f}x faster)")
+    print(f"📦 Body size: {len(body) / 1024:.1f} KiB raw, {len(compressed) / 1024:.1f} KiB gzip "
+          f"({len(compressed) / len(body):.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,379 @@
+"""
+Geofence breach episodes.
+
+A breach used to produce one alert per reading for as long as the animal
+stayed outside. Now every evaluation is folded into episodes: one per animal
+and fence, from the first reading outside (or inside, for exclusion zones)
+to the first reading back. An episode records its start and end, the
+maximum distance from the boundary and the path length walked while in
+breach. Only the start of an episode raises an alert.
+
+Episodes are stored compactly under geofence_episodes/{cattle_id}/{episode_id},
+with episode ids that sort by start time, so one animal's history is a small
+key-ordered query. Open episodes are written when they start, at most every
+EPISODE_FLUSH_SECONDS while they last, and when they end. Daily time-in-breach
+per animal and per fence is aggregated from the episodes on request.
+
+Two indexes are written in the same multi-path update, so no read has to
+download the whole episode tree:
+- geofence_episodes_open/{cattle_id}/{episode_id} holds the open episodes
+  only. It is loaded back on first use, so after a restart an ongoing breach
+  continues its episode instead of opening a second one, and an animal found
+  back inside closes it.
+- geofence_episodes_daily/{day}_{cattle_id}_{episode_id} holds each closed
+  episode once per UTC day it spans, so herd-wide queries read a key range
+  of days (at most EPISODE_QUERY_MAX_DAYS) plus the open episodes.
+
+All times are naive UTC.
+"""
+
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from fence_geometry import ZONE_EXCLUSION, ZONE_INCLUSION
+from live_state_cache import distance_m
+from temp_firebase_service import temp_firebase_service as firebase_service
+
+EPISODE_ROOT = "geofence_episodes"
+OPEN_EPISODE_ROOT = "geofence_episodes_open"
+DAILY_EPISODE_ROOT = "geofence_episodes_daily"
+EPISODE_FLUSH_SECONDS = float(os.getenv("GEOFENCE_EPISODE_FLUSH_SECONDS", "60"))
+EPISODE_QUERY_MAX_DAYS = int(os.getenv("GEOFENCE_EPISODE_QUERY_MAX_DAYS", "31"))
+
+
+def utc_now() -> datetime:
+    """The current time as a naive UTC datetime"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def parse_time(value: Optional[str]) -> Optional[datetime]:
+    """
+    Naive UTC datetime for an ISO date or timestamp (None if missing or
+    unparseable). Timestamps without an offset are taken as UTC.
+    """
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return parsed.astimezone(timezone.utc).replace(tzinfo=None) if parsed.tzinfo else parsed
+
+
+def episode_key(start: datetime, fence_id: str) -> str:
+    """Episode id that sorts by start time"""
+    return f"{start.strftime('%Y%m%dT%H%M%S%f')}_{fence_id}"
+
+
+class Episode:
+    __slots__ = ("id", "cattle_id", "fence_id", "fence_name", "zone_type", "start", "last_seen", "end",
+                 "max_distance_km", "path_length_m", "last_position", "observations", "flushed_at")
+
+    def __init__(self, cattle_id: str, fence_id: str, fence_name: str, zone_type: str,
+                 start: datetime, position: Optional[Tuple[float, float]]):
+        self.id = episode_key(start, fence_id)
+        self.cattle_id = cattle_id
+        self.fence_id = fence_id
+        self.fence_name = fence_name
+        self.zone_type = zone_type
+        self.start = start
+        self.last_seen = start
+        self.end: Optional[datetime] = None
+        self.max_distance_km = 0.0
+        self.path_length_m = 0.0
+        self.last_position = position
+        self.observations = 0
+        self.flushed_at: Optional[datetime] = None
+
+    @classmethod
+    def from_document(cls, cattle_id: str, episode_id: str, document: Dict[str, Any]) -> Optional["Episode"]:
+        """An open episode read back from storage (None if it is not usable)"""
+        start = parse_time(document.get("start"))
+        if start is None or not document.get("fence_id"):
+            return None
+        episode = cls(cattle_id, document["fence_id"], document.get("fence_name", document["fence_id"]),
+                      document.get("zone_type", ZONE_INCLUSION), start, None)
+        episode.id = episode_id
+        episode.last_seen = parse_time(document.get("last_seen")) or start
+        episode.max_distance_km = document.get("max_distance_km", 0.0)
+        episode.path_length_m = document.get("path_length_m", 0.0)
+        episode.observations = document.get("observations", 0)
+        episode.flushed_at = episode.last_seen
+        return episode
+
+    def observe(self, at: datetime, position: Tuple[float, float], distance_km: float):
+        if self.observations and self.last_position is not None:
+            self.path_length_m += distance_m(self.last_position[0], self.last_position[1], position[0], position[1])
+        self.last_position = position
+        self.last_seen = max(self.last_seen, at)
+        self.max_distance_km = max(self.max_distance_km, distance_km)
+        self.observations += 1
+
+    def as_document(self) -> Dict[str, Any]:
+        return {
+            "cattle_id": self.cattle_id,
+            "fence_id": self.fence_id,
+            "fence_name": self.fence_name,
+            "zone_type": self.zone_type,
+            "start": self.start.isoformat(),
+            "end": self.end.isoformat() if self.end else None,
+            "last_seen": self.last_seen.isoformat(),
+            "max_distance_km": round(self.max_distance_km, 3),
+            "path_length_m": round(self.path_length_m, 1),
+            "observations": self.observations
+        }
+
+
+def episode_days(start: datetime, end: datetime) -> List[str]:
+    """The UTC days (ISO dates) an episode spans"""
+    days = []
+    day = start.date()
+    while day <= end.date():
+        days.append(day.isoformat())
+        day += timedelta(days=1)
+    return days
+
+
+def episode_bounds(episode: dict, now: datetime) -> Tuple[Optional[datetime], datetime]:
+    """(start, end) of a stored episode; open episodes last until now"""
+    start = parse_time(episode.get("start"))
+    end = parse_time(episode.get("end")) or now
+    return start, end
+
+
+def daily_time_outside(episodes: List[dict], start: datetime, end: datetime,
+                       now: Optional[datetime] = None) -> Dict[str, Dict[str, Any]]:
+    """Seconds in breach per day, per animal and per fence, within [start, end)"""
+    now = now or utc_now()
+    days: Dict[str, Dict[str, Any]] = {}
+    for episode in episodes:
+        episode_start, episode_end = episode_bounds(episode, now)
+        if episode_start is None:
+            continue
+        cursor = max(episode_start, start)
+        stop = min(episode_end, end)
+        while cursor < stop:
+            day_end = datetime.combine(cursor.date() + timedelta(days=1), datetime.min.time())
+            seconds = (min(stop, day_end) - cursor).total_seconds()
+            day = days.setdefault(cursor.date().isoformat(), {"cattle": {}, "fences": {}, "episodes": 0})
+            day["cattle"][episode["cattle_id"]] = day["cattle"].get(episode["cattle_id"], 0.0) + seconds
+            day["fences"][episode["fence_id"]] = day["fences"].get(episode["fence_id"], 0.0) + seconds
+            if cursor == max(episode_start, start):
+                day["episodes"] += 1
+            cursor = day_end
+    for day in days.values():
+        day["cattle"] = {key: round(value) for key, value in day["cattle"].items()}
+        day["fences"] = {key: round(value) for key, value in day["fences"].items()}
+    return dict(sorted(days.items()))
+
+
+class BreachEpisodeTracker:
+    def __init__(self, flush_seconds: float = EPISODE_FLUSH_SECONDS):
+        self.flush_seconds = flush_seconds
+        self._open: Dict[str, Dict[str, Episode]] = {}  # cattle id -> fence id -> episode
+        self._lock = threading.Lock()
+        self._loaded = False
+        self.counters = {"opened": 0, "closed": 0, "restored": 0, "writes": 0, "write_failures": 0}
+
+    def _load_open(self):
+        """Take over the episodes left open in storage (by a previous run of the server)"""
+        result = firebase_service.get_realtime_data(OPEN_EPISODE_ROOT)
+        if not result.get("success"):
+            print(f"⚠️ Failed to load open breach episodes: {result.get('error')}")
+            return
+        restored = []
+        for cattle_id, animal_episodes in (result.get("data") or {}).items():
+            if not isinstance(animal_episodes, dict):
+                continue
+            for episode_id, document in animal_episodes.items():
+                if isinstance(document, dict) and document.get("end") is None:
+                    episode = Episode.from_document(cattle_id, episode_id, document)
+                    if episode is not None:
+                        restored.append(episode)
+        with self._lock:
+            if self._loaded:
+                return
+            for episode in restored:
+                # An episode opened since (in this process) wins
+                self._open.setdefault(episode.cattle_id, {}).setdefault(episode.fence_id, episode)
+            self._loaded = True
+            self.counters["restored"] += len(restored)
+        if restored:
+            print(f"♻️ Restored {len(restored)} open breach episodes from storage")
+
+    def _write(self, episode: Episode):
+        document = episode.as_document()
+        path = f"{episode.cattle_id}/{episode.id}"
+        updates = {f"{EPISODE_ROOT}/{path}": document,
+                   f"{OPEN_EPISODE_ROOT}/{path}": document if episode.end is None else None}
+        if episode.end is not None:
+            for day in episode_days(episode.start, episode.end):
+                updates[f"{DAILY_EPISODE_ROOT}/{day}_{episode.cattle_id}_{episode.id}"] = {"episode_id": episode.id, **document}
+        # One multi-path update at the database root
+        result = firebase_service.update_realtime_data("", updates)
+        if result.get("success"):
+            self.counters["writes"] += 1
+        else:
+            self.counters["write_failures"] += 1
+            print(f"⚠️ Failed to store breach episode {episode.id}: {result.get('error')}")
+
+    def observe(self, cattle_id: str, latitude: float, longitude: float, breaches: List[dict],
+                at: Optional[datetime] = None) -> Dict[str, str]:
+        """
+        Fold one evaluation into the animal's episodes. breaches are the
+        breached fences of the evaluation (outside_geofences). Returns
+        {fence id: episode id} for the episodes that started now.
+        """
+        if not self._loaded:
+            self._load_open()
+        at = at or utc_now()
+        position = (latitude, longitude)
+        opened: Dict[str, str] = {}
+        to_write: List[Episode] = []
+        with self._lock:
+            episodes = self._open.setdefault(cattle_id, {})
+            breached: Set[str] = set()
+            for fence in breaches:
+                fence_id = fence.get("id")
+                if fence_id is None or fence_id in breached:
+                    continue
+                breached.add(fence_id)
+                episode = episodes.get(fence_id)
+                if episode is None:
+                    episode = Episode(cattle_id, fence_id, fence.get("name", fence_id),
+                                      fence.get("zone_type", ZONE_INCLUSION), at, position)
+                    episodes[fence_id] = episode
+                    opened[fence_id] = episode.id
+                    self.counters["opened"] += 1
+                episode.observe(at, position, fence.get("distance_to_boundary_km", 0.0))
+                if episode.flushed_at is None or (at - episode.flushed_at).total_seconds() >= self.flush_seconds:
+                    episode.flushed_at = at
+                    to_write.append(episode)
+
+            for fence_id in [fence_id for fence_id in episodes if fence_id not in breached]:
+                episode = episodes.pop(fence_id)
+                episode.end = max(at, episode.last_seen)
+                self.counters["closed"] += 1
+                to_write.append(episode)
+            if not episodes:
+                self._open.pop(cattle_id, None)
+
+        for episode in to_write:
+            self._write(episode)
+            if episode.end is not None:
+                minutes = (episode.end - episode.start).total_seconds() / 60
+                print(f"🏁 Breach episode ended: {cattle_id} back from '{episode.fence_name}' after {minutes:.1f} min")
+        return opened
+
+    def open_fence_ids(self, cattle_id: str) -> Set[str]:
+        """Fences the animal has an open episode for"""
+        if not self._loaded:
+            self._load_open()
+        with self._lock:
+            return set(self._open.get(cattle_id, {}))
+
+    def open_episodes(self, cattle_id: Optional[str] = None) -> List[dict]:
+        with self._lock:
+            animals = [cattle_id] if cattle_id is not None else list(self._open)
+            return [{"id": episode.id, **episode.as_document()}
+                    for animal in animals for episode in self._open.get(animal, {}).values()]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            open_count = sum(len(episodes) for episodes in self._open.values())
+        return {**self.counters, "open": open_count}
+
+
+def episode_alert(episode: dict) -> Dict[str, Any]:
+    """A stored episode in the shape of a geofence alert, for the alert endpoints"""
+    exclusion = episode.get("zone_type") == ZONE_EXCLUSION
+    distance_km = episode.get("max_distance_km", 0.0)
+    return {
+        "id": episode.get("id"),
+        "episode_id": episode.get("id"),
+        "cattleId": episode.get("cattle_id"),
+        "type": "geofence_exclusion_breach" if exclusion else "geofence_breach",
+        "severity": "high" if exclusion or distance_km > 1.0 else "medium",
+        "message": f"🚨 Cattle {episode.get('cattle_id')} was "
+                   f"{'inside exclusion zone' if exclusion else 'outside geofence'} '{episode.get('fence_name')}'",
+        "timestamp": episode.get("start"),
+        "end": episode.get("end"),
+        "ongoing": episode.get("end") is None,
+        "path_length_m": episode.get("path_length_m", 0.0),
+        "geofence": {
+            "id": episode.get("fence_id"),
+            "name": episode.get("fence_name"),
+            "distance_km": distance_km
+        }
+    }
+
+
+def query_episodes(start: Optional[datetime] = None, end: Optional[datetime] = None,
+                   cattle_id: Optional[str] = None, fence_id: Optional[str] = None,
+                   limit: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Stored episodes overlapping [start, end), newest first. With cattle_id
+    only that animal's episodes are read, ordered by key and limited on the
+    server when possible. Herd-wide queries need a window of at most
+    EPISODE_QUERY_MAX_DAYS and read the daily index and the open episodes.
+    """
+    if cattle_id is not None:
+        end_key = episode_key(end, "") if end is not None else None
+        result = firebase_service.query_collection(
+            f"{EPISODE_ROOT}/{cattle_id}", order_by="$key", end_at=end_key,
+            limit_to_last=limit if start is None and fence_id is None else None
+        )
+        if not result.get("success"):
+            return result
+        episodes = [{**episode, "cattle_id": cattle_id} for episode in result.get("data", [])]
+    else:
+        if start is None or end is None:
+            return {"success": False, "error": "Herd-wide episode queries need both 'from' and 'to'"}
+        if end - start > timedelta(days=EPISODE_QUERY_MAX_DAYS):
+            return {"success": False, "error": f"Herd-wide episode queries span at most {EPISODE_QUERY_MAX_DAYS} days"}
+        result = firebase_service.query_collection(
+            DAILY_EPISODE_ROOT, order_by="$key",
+            start_at=start.date().isoformat(), end_at=f"{end.date().isoformat()}\uf8ff"
+        )
+        if not result.get("success"):
+            return result
+        # A closed episode is listed once per day it spans
+        by_id = {(entry.get("cattle_id"), entry.get("episode_id")): entry for entry in result.get("data", [])}
+        episodes = [{**{key: value for key, value in entry.items() if key != "episode_id"}, "id": episode_id}
+                    for (_, episode_id), entry in by_id.items()]
+
+        result = firebase_service.get_realtime_data(OPEN_EPISODE_ROOT)
+        if not result.get("success"):
+            return result
+        for animal, animal_episodes in (result.get("data") or {}).items():
+            if isinstance(animal_episodes, dict):
+                episodes.extend({"id": key, **value, "cattle_id": animal} for key, value in animal_episodes.items()
+                                if isinstance(value, dict) and (animal, key) not in by_id)
+
+    now = utc_now()
+    matches = []
+    for episode in episodes:
+        if fence_id is not None and episode.get("fence_id") != fence_id:
+            continue
+        episode_start, episode_end = episode_bounds(episode, now)
+        if episode_start is None:
+            continue
+        if start is not None and episode_end < start:
+            continue
+        if end is not None and episode_start >= end:
+            continue
+        matches.append(episode)
+    matches.sort(key=lambda episode: episode.get("start", ""), reverse=True)
+    return {"success": True, "data": matches[:limit] if limit else matches}
+
+
+def count_episodes(cattle_id: str) -> Optional[int]:
+    """Number of stored episodes of an animal, from a shallow (ids only) read"""
+    result = firebase_service.query_collection(f"{EPISODE_ROOT}/{cattle_id}", shallow=True)
+    return len(result.get("data", [])) if result.get("success") else None
+
+
+# Global instance
+breach_episodes = BreachEpisodeTracker()
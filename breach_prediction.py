@@ -0,0 +1,190 @@
+"""
+Predictive breach detection from heading and speed.
+
+For an animal inside its fences the geofence check only says "inside now".
+This stage casts a ray from the animal's position along its heading, as far
+as it would walk at its current speed within PREDICTION_HORIZON_SECONDS, and
+intersects it with the fence boundaries (in each fence's local metric
+projection):
+
+- inclusion fences the animal is inside: crossing the boundary means leaving,
+- exclusion zones nearby that it is not in: crossing means entering.
+
+The earliest crossing gives the time to boundary. Below
+APPROACH_WARNING_SECONDS an ingested reading raises an "approaching_boundary"
+warning (at most once per animal and fence every
+APPROACH_ALERT_COOLDOWN_SECONDS), and the time to boundary also shortens the
+device's next reporting interval. Herd monitoring only reports predictions.
+
+Animals are grouped by fence and each fence is intersected with all of its
+rays in one vectorized Shapely call, so a herd-wide evaluation costs one
+call per fence rather than one per animal.
+"""
+
+import math
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import shapely
+
+from fence_geometry import ZONE_EXCLUSION
+from geofence_registry import FenceEntry, GeofenceRegistry, geofence_registry
+
+PREDICTION_HORIZON_SECONDS = float(os.getenv("GEOFENCE_PREDICTION_HORIZON_SECONDS", "300"))
+APPROACH_WARNING_SECONDS = float(os.getenv("GEOFENCE_APPROACH_WARNING_SECONDS", "120"))
+APPROACH_MIN_SPEED_KMH = float(os.getenv("GEOFENCE_APPROACH_MIN_SPEED_KMH", "0.5"))
+APPROACH_ALERT_COOLDOWN_SECONDS = float(os.getenv("GEOFENCE_APPROACH_ALERT_COOLDOWN_SECONDS", "600"))
+
+
+def seconds_to_boundary(entry: FenceEntry, longitudes, latitudes, headings, speeds_ms,
+                        horizon_seconds: float = PREDICTION_HORIZON_SECONDS) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (seconds, meters) until each ray first crosses the fence boundary,
+    inf where it does not cross within the horizon. Headings are degrees
+    clockwise from north.
+    """
+    x, y = entry.projection.to_local_arrays(longitudes, latitudes)
+    speeds_ms = np.asarray(speeds_ms, dtype=float)
+    reach = speeds_ms * horizon_seconds
+    heading = np.radians(np.asarray(headings, dtype=float))
+    end_x, end_y = x + np.sin(heading) * reach, y + np.cos(heading) * reach
+    rays = shapely.linestrings(np.stack([np.stack([x, y], axis=-1), np.stack([end_x, end_y], axis=-1)], axis=1))
+    crossings = shapely.intersection(rays, entry.metric_boundary)
+    # The nearest point of the crossings along the ray is the first one; empty crossings give NaN
+    meters = shapely.distance(shapely.points(x, y), crossings)
+    meters = np.where(np.isnan(meters), np.inf, meters)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        seconds = np.where((speeds_ms > 0) & np.isfinite(meters), meters / speeds_ms, np.inf)
+    return seconds, meters
+
+
+class BreachPredictor:
+    def __init__(self, horizon_seconds: float = PREDICTION_HORIZON_SECONDS,
+                 warning_seconds: float = APPROACH_WARNING_SECONDS,
+                 min_speed_kmh: float = APPROACH_MIN_SPEED_KMH,
+                 alert_cooldown_seconds: float = APPROACH_ALERT_COOLDOWN_SECONDS,
+                 registry: GeofenceRegistry = geofence_registry):
+        self.registry = registry
+        self.horizon_seconds = horizon_seconds
+        self.warning_seconds = warning_seconds
+        self.min_speed_kmh = min_speed_kmh
+        self.alert_cooldown_seconds = alert_cooldown_seconds
+        self._last_alert: Dict[Tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+        self.counters = {"predictions": 0, "fence_batches": 0, "approaching": 0, "warnings": 0, "suppressed": 0}
+
+    def _watched_fences(self, animal: dict, reach_m: float) -> List[FenceEntry]:
+        """Inclusion fences the animal is inside, and exclusion zones within reach that it is not in"""
+        result = animal.get("geofence_result") or {}
+        watched = []
+        for fence in result.get("inside_geofences", []):
+            entry = self.registry.get(fence.get("id"))
+            if entry is not None and entry.zone_type != ZONE_EXCLUSION:
+                watched.append(entry)
+        breached = {fence.get("id") for fence in result.get("outside_geofences", [])}
+        for fence_id in self.registry.exclusion_ids():
+            entry = self.registry.get(fence_id)
+            if entry is not None and fence_id not in breached and \
+                    entry.bbox_distance_m(animal["longitude"], animal["latitude"]) <= reach_m:
+                watched.append(entry)
+        return watched
+
+    def predict(self, animals: List[dict]) -> Dict[str, Optional[dict]]:
+        """
+        Earliest predicted boundary crossing per animal (None if none within
+        the horizon). Each animal is a dict with cattle_id, latitude,
+        longitude, heading, speed_kmh and its geofence_result.
+        """
+        predictions: Dict[str, Optional[dict]] = {}
+        batches: Dict[str, Tuple[FenceEntry, List[int]]] = {}
+        for index, animal in enumerate(animals):
+            predictions[animal["cattle_id"]] = None
+            speed_kmh = animal.get("speed_kmh") or 0.0
+            result = animal.get("geofence_result") or {}
+            if speed_kmh < self.min_speed_kmh or animal.get("heading") is None or not result.get("success"):
+                continue
+            for entry in self._watched_fences(animal, speed_kmh / 3.6 * self.horizon_seconds):
+                batches.setdefault(entry.id, (entry, []))[1].append(index)
+
+        best: Dict[str, Tuple[float, float, FenceEntry]] = {}
+        for entry, indices in batches.values():
+            selected = [animals[index] for index in indices]
+            seconds, meters = seconds_to_boundary(
+                entry,
+                [animal["longitude"] for animal in selected],
+                [animal["latitude"] for animal in selected],
+                [animal["heading"] for animal in selected],
+                [animal["speed_kmh"] / 3.6 for animal in selected],
+                self.horizon_seconds
+            )
+            for animal, animal_seconds, animal_meters in zip(selected, seconds, meters):
+                cattle_id = animal["cattle_id"]
+                if math.isfinite(animal_seconds) and (cattle_id not in best or animal_seconds < best[cattle_id][0]):
+                    best[cattle_id] = (float(animal_seconds), float(animal_meters), entry)
+
+        for cattle_id, (seconds, meters, entry) in best.items():
+            predictions[cattle_id] = {
+                "geofence_id": entry.id,
+                "name": entry.name,
+                "zone_type": entry.zone_type,
+                "seconds_to_boundary": round(seconds, 1),
+                "distance_m": round(meters, 1),
+                "approaching": seconds <= self.warning_seconds
+            }
+
+        with self._lock:
+            self.counters["predictions"] += len(animals)
+            self.counters["fence_batches"] += len(batches)
+            self.counters["approaching"] += sum(1 for prediction in predictions.values()
+                                                if prediction and prediction["approaching"])
+        return predictions
+
+    def warning_alert(self, cattle_id: str, prediction: Optional[dict], latitude: float, longitude: float,
+                      now: Optional[float] = None) -> Optional[dict]:
+        """approaching_boundary alert for a prediction, unless one was raised recently for the same fence"""
+        if not prediction or not prediction["approaching"]:
+            return None
+        now = now if now is not None else time.monotonic()
+        key = (cattle_id, prediction["geofence_id"])
+        with self._lock:
+            last = self._last_alert.get(key)
+            if last is not None and now - last < self.alert_cooldown_seconds:
+                self.counters["suppressed"] += 1
+                return None
+            if len(self._last_alert) > 10000:
+                self._last_alert = {other: at for other, at in self._last_alert.items()
+                                    if now - at < self.alert_cooldown_seconds}
+            self._last_alert[key] = now
+            self.counters["warnings"] += 1
+
+        entering = prediction["zone_type"] == ZONE_EXCLUSION
+        action = "enter exclusion zone" if entering else "leave geofence"
+        return {
+            "cattleId": cattle_id,
+            "type": "approaching_boundary",
+            "severity": "medium",
+            "message": f"⚠️ Cattle {cattle_id} may {action} '{prediction['name']}' "
+                       f"in about {prediction['seconds_to_boundary']:.0f} s",
+            "timestamp": datetime.now().isoformat(),
+            "location": {
+                "latitude": latitude,
+                "longitude": longitude
+            },
+            "geofence": {
+                "id": prediction["geofence_id"],
+                "name": prediction["name"],
+                "seconds_to_boundary": prediction["seconds_to_boundary"],
+                "distance_m": prediction["distance_m"]
+            }
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, "horizon_seconds": self.horizon_seconds, "warning_seconds": self.warning_seconds}
+
+
+# Global instance
+breach_predictor = BreachPredictor()
@@ -0,0 +1,67 @@
+"""
+Shared test helpers: square fences, registries built from them, and a
+harness that runs check_cattle_geofence_status against given fences and
+assignments with storage faked out.
+"""
+
+import sys
+sys.path.append('.')
+
+import pytest
+
+from geofence_assignments import GeofenceAssignmentIndex
+from geofence_registry import GeofenceRegistry
+
+
+def square(fence_id, x, y, size, **extra):
+    """Fence document of a size x size degree square with its south-west corner at (x, y)"""
+    return {"id": fence_id, "name": fence_id,
+            "coordinates": [[x, y], [x + size, y], [x + size, y + size], [x, y + size], [x, y]], **extra}
+
+
+def registry_with(*fences):
+    registry = GeofenceRegistry()
+    registry.sync(list(fences))
+    return registry
+
+
+@pytest.fixture
+def check_geofences(monkeypatch):
+    """
+    check(fences, cattle_id, latitude, longitude, ...) -> (result, saved alerts).
+    Each call uses fresh fences, assignments and breach episodes.
+    """
+    import breach_episodes
+    import routers.geofence as geofence_router
+
+    def check(fences, cattle_id, latitude, longitude, assignments=(), unassigned_mode="all_fences",
+              far_fence_mode="bbox", record=True):
+        index = GeofenceAssignmentIndex(unassigned_mode=unassigned_mode)
+        index.sync(list(assignments))
+        saved = []
+
+        class FakeFirebase:
+            def create_document(self, collection, doc_id, data):
+                saved.append(data)
+                return {"success": True}
+
+            def set_realtime_data(self, path, data):
+                return {"success": True}
+
+            def update_realtime_data(self, path, data):
+                return {"success": True}
+
+            def get_realtime_data(self, path):
+                return {"success": True, "data": {}}
+
+        monkeypatch.setattr(geofence_router, "geofence_registry", registry_with(*fences))
+        monkeypatch.setattr(geofence_router, "geofence_assignments", index)
+        monkeypatch.setattr(geofence_router, "firebase_service", FakeFirebase())
+        monkeypatch.setattr(breach_episodes, "firebase_service", FakeFirebase())
+        monkeypatch.setattr(geofence_router, "breach_episodes", breach_episodes.BreachEpisodeTracker())
+        monkeypatch.setattr(geofence_router.dashboard_summary, "record_alert", lambda *args: None)
+        monkeypatch.setattr(geofence_router, "FAR_FENCE_MODE", far_fence_mode)
+        result = geofence_router.check_cattle_geofence_status(cattle_id, latitude, longitude, record=record)
+        return result, saved
+
+    return check
@@ -0,0 +1,280 @@
+"""
+Materialized dashboard summary kept in memory.
+
+The cattle, staff and alert write paths feed changes in as they happen, so
+GET /dashboard/summary never has to download the full collections. A periodic
+reconciliation against the database corrects any drift (writes made by other
+processes, missed updates, restarts). Changes recorded while a
+reconciliation is downloading the collections are kept in a journal and
+replayed on top of the rebuilt summary, so they are not lost.
+"""
+
+import heapq
+import json
+import os
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from http_cache import make_etag
+from temp_firebase_service import temp_firebase_service as firebase_service
+
+RECENT_ALERTS_LIMIT = 5
+RECONCILE_INTERVAL_SECONDS = int(os.getenv("DASHBOARD_RECONCILE_SECONDS", "300"))
+
+
+class DashboardSummary:
+    def __init__(self, recent_limit: int = RECENT_ALERTS_LIMIT):
+        self.recent_limit = recent_limit
+        # Keep a few spare entries so deleting a recent alert rarely forces a reload
+        self._recent_capacity = recent_limit * 4
+        self._lock = threading.RLock()
+        self._reconcile_lock = threading.Lock()  # one reconciliation at a time
+        self._journal: Optional[List[Tuple[str, tuple]]] = None  # changes recorded during a reconciliation
+        self._reset_state()
+        self.last_reconciled_at: Optional[float] = None
+        self.last_drift: Dict[str, int] = {}
+
+    def _reset_state(self):
+        self._cattle: Dict[str, Tuple[str, str]] = {}  # id -> (status, location)
+        self._cattle_by_status: Counter = Counter()
+        self._cattle_by_location: Counter = Counter()
+        self._staff: Dict[str, str] = {}  # id -> status
+        self._staff_online = 0
+        self._alert_timestamps: Dict[str, str] = {}  # id -> timestamp
+        self._recent: List[Tuple[str, str, dict]] = []  # min-heap of (timestamp, id, alert)
+        self._needs_reconcile = False
+        self._version = 0
+        self._snapshot: Optional[Tuple[dict, str]] = None
+
+    def _touch(self):
+        self._version += 1
+        self._snapshot = None
+
+    def _log(self, method: str, *args):
+        """Journal a change while a reconciliation is in flight (lock held)"""
+        if self._journal is not None:
+            self._journal.append((method, tuple(dict(arg) if isinstance(arg, dict) else arg for arg in args)))
+
+    # =====================
+    # CATTLE
+    # =====================
+
+    def record_cattle(self, cattle_id: str, fields: dict):
+        """Apply a create/update of a cattle document"""
+        with self._lock:
+            self._log("record_cattle", cattle_id, fields)
+            old = self._cattle.get(cattle_id)
+            status = fields.get("status", old[0] if old else "unknown")
+            location = fields.get("location", old[1] if old else "unknown")
+            if old == (status, location):
+                return
+            if old:
+                self._decrement(self._cattle_by_status, old[0])
+                self._decrement(self._cattle_by_location, old[1])
+            self._cattle[cattle_id] = (status, location)
+            self._cattle_by_status[status] += 1
+            self._cattle_by_location[location] += 1
+            self._touch()
+
+    def remove_cattle(self, cattle_id: str):
+        with self._lock:
+            self._log("remove_cattle", cattle_id)
+            old = self._cattle.pop(cattle_id, None)
+            if old:
+                self._decrement(self._cattle_by_status, old[0])
+                self._decrement(self._cattle_by_location, old[1])
+                self._touch()
+
+    # =====================
+    # STAFF
+    # =====================
+
+    def record_staff(self, staff_id: str, fields: dict):
+        """Apply a create/update of a staff document"""
+        with self._lock:
+            self._log("record_staff", staff_id, fields)
+            old = self._staff.get(staff_id)
+            status = fields.get("status", old)
+            if staff_id in self._staff and old == status:
+                return
+            self._staff_online += (status == "Online") - (old == "Online")
+            self._staff[staff_id] = status
+            self._touch()
+
+    def remove_staff(self, staff_id: str):
+        with self._lock:
+            self._log("remove_staff", staff_id)
+            if staff_id in self._staff:
+                self._staff_online -= self._staff.pop(staff_id) == "Online"
+                self._touch()
+
+    # =====================
+    # ALERTS
+    # =====================
+
+    def record_alert(self, alert_id: str, alert: dict):
+        """Apply the creation of an alert"""
+        with self._lock:
+            self._log("record_alert", alert_id, alert)
+            if alert_id in self._alert_timestamps:
+                self._update_alert(alert_id, alert)
+                return
+            timestamp = alert.get("timestamp", "")
+            self._alert_timestamps[alert_id] = timestamp
+            self._push_recent(timestamp, alert_id, {"id": alert_id, **alert})
+            self._touch()
+
+    def update_alert(self, alert_id: str, fields: dict):
+        """Apply a partial update of an alert"""
+        with self._lock:
+            self._log("update_alert", alert_id, fields)
+            self._update_alert(alert_id, fields)
+
+    def _update_alert(self, alert_id: str, fields: dict):
+        if alert_id not in self._alert_timestamps:
+            # Unknown alert (created elsewhere): let the next reconciliation pick it up
+            self._needs_reconcile = True
+            return
+        timestamp = fields.get("timestamp", self._alert_timestamps[alert_id])
+        self._alert_timestamps[alert_id] = timestamp
+        entry = self._pop_recent(alert_id)
+        if entry is not None:
+            self._push_recent(timestamp, alert_id, {**entry, **fields})
+        elif self._recent and timestamp > self._recent[0][0]:
+            # Became recent but we only hold the partial update
+            self._needs_reconcile = True
+        self._touch()
+
+    def remove_alert(self, alert_id: str):
+        with self._lock:
+            self._log("remove_alert", alert_id)
+            if self._alert_timestamps.pop(alert_id, None) is None:
+                return
+            if self._pop_recent(alert_id) is not None:
+                if len(self._recent) < min(self.recent_limit, len(self._alert_timestamps)):
+                    self._needs_reconcile = True
+            self._touch()
+
+    def _push_recent(self, timestamp: str, alert_id: str, alert: dict):
+        item = (timestamp, alert_id, alert)
+        if len(self._recent) < self._recent_capacity:
+            heapq.heappush(self._recent, item)
+        elif timestamp > self._recent[0][0]:
+            heapq.heapreplace(self._recent, item)
+
+    def _pop_recent(self, alert_id: str) -> Optional[dict]:
+        for index, (_, entry_id, alert) in enumerate(self._recent):
+            if entry_id == alert_id:
+                self._recent.pop(index)
+                heapq.heapify(self._recent)
+                return alert
+        return None
+
+    @staticmethod
+    def _decrement(counter: Counter, key: str):
+        counter[key] -= 1
+        if counter[key] <= 0:
+            del counter[key]
+
+    # =====================
+    # READ SIDE
+    # =====================
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.last_reconciled_at is not None
+
+    @property
+    def needs_reconcile(self) -> bool:
+        return self._needs_reconcile
+
+    def snapshot(self) -> Tuple[dict, str]:
+        """Return the summary payload and its ETag, rebuilt only after changes"""
+        with self._lock:
+            if self._snapshot is None:
+                total_staff = len(self._staff)
+                staff_online = self._staff_online
+                recent = [alert for _, _, alert in heapq.nlargest(self.recent_limit, self._recent)]
+                data = {
+                    "cattle": {
+                        "total": len(self._cattle),
+                        "by_status": dict(self._cattle_by_status),
+                        "by_location": dict(self._cattle_by_location)
+                    },
+                    "staff": {
+                        "total": total_staff,
+                        "online": staff_online,
+                        "offline": total_staff - staff_online
+                    },
+                    "alerts": {
+                        "total": len(self._alert_timestamps),
+                        "recent": recent
+                    }
+                }
+                etag = make_etag("dashboard", json.dumps(data, sort_keys=True, default=str))
+                self._snapshot = (data, etag)
+            return self._snapshot
+
+    # =====================
+    # RECONCILIATION
+    # =====================
+
+    def reconcile(self) -> Dict[str, Any]:
+        """Rebuild the summary from the database and report how far it had drifted"""
+        with self._reconcile_lock:
+            with self._lock:
+                self._journal = []
+            try:
+                cattle_result = firebase_service.get_collection("cattle")
+                staff_result = firebase_service.get_collection("staff")
+                alerts_result = firebase_service.get_collection("alerts")
+
+                if not all([cattle_result["success"], staff_result["success"], alerts_result["success"]]):
+                    return {"success": False, "error": "Failed to fetch dashboard data"}
+
+                with self._lock:
+                    journal, self._journal = self._journal, None
+                    previous, _ = self.snapshot() if self.is_loaded else ({}, None)
+                    self._reset_state()
+                    for cattle in cattle_result["data"]:
+                        self.record_cattle(cattle.get("id"), cattle)
+                    for staff in staff_result["data"]:
+                        self.record_staff(staff.get("id"), staff)
+                    for alert in alerts_result["data"]:
+                        alert_id = alert.get("id")
+                        timestamp = alert.get("timestamp", "")
+                        self._alert_timestamps[alert_id] = timestamp
+                        self._push_recent(timestamp, alert_id, alert)
+                    # Changes recorded during the download may be missing from it
+                    for method, args in journal:
+                        getattr(self, method)(*args)
+                    self._touch()
+                    current, _ = self.snapshot()
+
+                    drift = {}
+                    if previous:
+                        for section in ("cattle", "staff", "alerts"):
+                            delta = current[section]["total"] - previous[section]["total"]
+                            if delta:
+                                drift[section] = delta
+                    self.last_drift = drift
+                    self.last_reconciled_at = time.time()
+            finally:
+                with self._lock:
+                    self._journal = None
+
+        if drift:
+            print(f"🔄 Dashboard summary reconciled, corrected drift: {drift}")
+        return {"success": True, "drift": drift}
+
+    def ensure_fresh(self) -> Dict[str, Any]:
+        """Reconcile on first use or when an incremental update could not be applied"""
+        if not self.is_loaded or self._needs_reconcile:
+            return self.reconcile()
+        return {"success": True}
+
+
+# Global dashboard summary instance
+dashboard_summary = DashboardSummary()
@@ -37,7 +37,10 @@ const long gmtOffset_sec = 10800;  // 3 hours for East Africa Time (UTC+3)
 const int daylightOffset_sec = 0;
 
 // Data transmission control
-const unsigned long SEND_INTERVAL = 15000;  // 15 seconds
+const unsigned long SEND_INTERVAL = 15000;  // 15 seconds (default until the backend says otherwise)
+const unsigned long MIN_SEND_INTERVAL = 15000;
+const unsigned long MAX_SEND_INTERVAL = 600000;  // 10 minutes
+unsigned long sendInterval = SEND_INTERVAL;
 unsigned long lastSendTime = 0;
 bool mpuInitialized = false;
 String deviceId;
@@ -90,7 +93,7 @@ void loop() {
   }
 
   // Send data at intervals
-  if (millis() - lastSendTime >= SEND_INTERVAL) {
+  if (millis() - lastSendTime >= sendInterval) {
     if (WiFi.status() == WL_CONNECTED) {
       sendSensorDataToBackend();
     } else {
@@ -258,6 +261,7 @@ void ICACHE_FLASH_ATTR sendSensorDataToBackend() {
         String response = http.getString();
         Serial.print(F("Backend response: "));
         Serial.println(response);
+        applyReportingInterval(response);
       }
     } else {
       Serial.printf("HTTP failed, error: %s\n", http.errorToString(httpCode).c_str());
@@ -268,6 +272,21 @@ void ICACHE_FLASH_ATTR sendSensorDataToBackend() {
   }
 }
 
+// Use the next reporting interval computed by the backend, if present
+void applyReportingInterval(const String& response) {
+  StaticJsonDocument<64> filter;
+  filter["next_report_interval_seconds"] = true;
+  StaticJsonDocument<64> reply;
+  if (deserializeJson(reply, response, DeserializationOption::Filter(filter))) {
+    return;
+  }
+  unsigned long seconds = reply["next_report_interval_seconds"] | 0UL;
+  if (seconds > 0) {
+    sendInterval = constrain(seconds * 1000UL, MIN_SEND_INTERVAL, MAX_SEND_INTERVAL);
+    Serial.printf("Next report in %lu s\n", sendInterval / 1000UL);
+  }
+}
+
 // Helper function to get ISO timestamp
 String getCurrentISOTimestamp() {
   time_t now;
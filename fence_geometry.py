@@ -0,0 +1,169 @@
+"""
+Geometry and zone semantics of geofence documents.
+
+A geofence document describes:
+- its shape: "coordinates" is the outer ring ([[lng, lat], ...]), with
+  optional "holes" (inner rings) and optional "parts" (more polygons, each
+  {"coordinates": [...], "holes": [...]}) for fences made of several areas,
+- its zone_type: "inclusion" (animals belong inside, the default) or
+  "exclusion" (animals must stay out: dams, crops, ...),
+- an optional parent_id: fences form a hierarchy (farm > paddock > water
+  point) and a child is only evaluated when the animal is inside its parent.
+
+Documents without the new fields are plain inclusion polygons, as before.
+
+When a fence is stored, its rings are closed and checked, and a cleaned
+"evaluation_geometry" (GeoJSON) is stored alongside the original: invalid
+(self-intersecting) shapes are repaired with make_valid, rings are oriented
+(exterior counter-clockwise), and the shape is simplified within
+GEOFENCE_SIMPLIFY_TOLERANCE_M meters so traced boundaries with thousands of
+vertices stay cheap to check. Older documents without it are cleaned the
+same way when they are loaded, so checks never see an invalid polygon.
+"""
+
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import shapely
+from shapely.geometry import MultiPolygon, Polygon, shape
+from shapely.geometry.base import BaseGeometry
+from shapely.geometry.polygon import orient
+
+from local_projection import LocalProjection
+
+ZONE_INCLUSION = "inclusion"
+ZONE_EXCLUSION = "exclusion"
+ZONE_TYPES = (ZONE_INCLUSION, ZONE_EXCLUSION)
+
+MAX_HIERARCHY_DEPTH = 8
+
+SIMPLIFY_TOLERANCE_M = float(os.getenv("GEOFENCE_SIMPLIFY_TOLERANCE_M", "1"))
+EVALUATION_GEOMETRY_FIELD = "evaluation_geometry"
+
+Ring = List[List[float]]
+
+
+def zone_type(document: dict) -> str:
+    value = document.get("zone_type") or ZONE_INCLUSION
+    return value if value in ZONE_TYPES else ZONE_INCLUSION
+
+
+def parent_id(document: dict) -> Optional[str]:
+    value = document.get("parent_id")
+    return str(value) if value else None
+
+
+def fence_rings(document: dict) -> List[Tuple[Ring, List[Ring]]]:
+    """(outer ring, holes) for every polygon of a fence"""
+    rings = [(document.get("coordinates") or [], document.get("holes") or [])]
+    for part in document.get("parts") or []:
+        if isinstance(part, dict):
+            rings.append((part.get("coordinates") or [], part.get("holes") or []))
+    return rings
+
+
+def fence_geometry(document: dict) -> BaseGeometry:
+    """Polygon or MultiPolygon for a geofence document (ValueError if it has no usable ring)"""
+    polygons = []
+    for outer, holes in fence_rings(document):
+        if len(outer) < 3:
+            raise ValueError("insufficient coordinates")
+        polygons.append(Polygon(outer, [hole for hole in holes if len(hole) >= 3]))
+    return polygons[0] if len(polygons) == 1 else MultiPolygon(polygons)
+
+
+# =====================
+# VALIDATION AND REPAIR
+# =====================
+
+def close_ring(ring: Ring) -> Ring:
+    """A ring as closed [lng, lat] pairs without repeated points (ValueError if unusable)"""
+    points = []
+    for point in ring:
+        if not isinstance(point, (list, tuple)) or len(point) < 2:
+            raise ValueError("coordinates must be [lng, lat] pairs")
+        lng, lat = float(point[0]), float(point[1])
+        if not (-180 <= lng <= 180 and -90 <= lat <= 90):
+            raise ValueError(f"coordinate out of range: [{lng}, {lat}]")
+        if not points or points[-1] != [lng, lat]:
+            points.append([lng, lat])
+    if len(points) > 1 and points[0] == points[-1]:
+        points.pop()
+    if len(points) < 3:
+        raise ValueError("a ring needs at least 3 distinct points")
+    return points + [points[0]]
+
+
+def polygonal(geometry: BaseGeometry) -> BaseGeometry:
+    """The polygon parts of a geometry (make_valid can return collections with lines and points)"""
+    polygons = []
+    for part in shapely.get_parts(geometry):
+        if isinstance(part, MultiPolygon):
+            polygons.extend(shapely.get_parts(part))
+        elif isinstance(part, Polygon):
+            polygons.append(part)
+    polygons = [polygon for polygon in polygons if not polygon.is_empty]
+    if not polygons:
+        raise ValueError("fence has no area")
+    return polygons[0] if len(polygons) == 1 else MultiPolygon(polygons)
+
+
+def clean_geometry(geometry: BaseGeometry, tolerance_m: float = SIMPLIFY_TOLERANCE_M) -> Tuple[BaseGeometry, Dict[str, Any]]:
+    """Repaired, simplified and oriented copy of a fence geometry, with a report of what changed"""
+    report = {"valid": bool(geometry.is_valid), "vertices": int(shapely.get_num_coordinates(geometry))}
+    if not geometry.is_valid:
+        report["invalid_reason"] = shapely.is_valid_reason(geometry)
+        geometry = polygonal(shapely.make_valid(geometry))
+    if tolerance_m > 0:
+        # Simplify in meters, not degrees, so the tolerance means the same everywhere
+        projection = LocalProjection.around(geometry)
+        simplified = projection.unproject(projection.project(geometry).simplify(tolerance_m, preserve_topology=True))
+        if simplified.is_valid and not simplified.is_empty:
+            geometry = polygonal(simplified)
+    if isinstance(geometry, MultiPolygon):
+        geometry = MultiPolygon([orient(polygon, 1.0) for polygon in geometry.geoms])
+    else:
+        geometry = orient(geometry, 1.0)
+    if geometry.area == 0:
+        raise ValueError("fence has no area")
+    report["evaluation_vertices"] = int(shapely.get_num_coordinates(geometry))
+    report["tolerance_m"] = tolerance_m
+    return geometry, report
+
+
+def prepare_fence(document: dict, tolerance_m: float = SIMPLIFY_TOLERANCE_M) -> Tuple[dict, Dict[str, Any]]:
+    """
+    Copy of a geofence document ready to store: rings closed and checked,
+    plus the cleaned evaluation geometry. Raises ValueError for fences that
+    cannot be used.
+    """
+    prepared = dict(document)
+    prepared["coordinates"] = close_ring(document.get("coordinates") or [])
+    if document.get("holes"):
+        prepared["holes"] = [close_ring(hole) for hole in document["holes"]]
+    if document.get("parts"):
+        prepared["parts"] = []
+        for part in document["parts"]:
+            cleaned = {"coordinates": close_ring(part.get("coordinates") or [])}
+            if part.get("holes"):
+                cleaned["holes"] = [close_ring(hole) for hole in part["holes"]]
+            prepared["parts"].append(cleaned)
+    prepared.pop(EVALUATION_GEOMETRY_FIELD, None)
+
+    geometry, report = clean_geometry(fence_geometry(prepared), tolerance_m)
+    prepared[EVALUATION_GEOMETRY_FIELD] = json.loads(shapely.to_geojson(geometry))
+    return prepared, report
+
+
+def evaluation_geometry(document: dict) -> BaseGeometry:
+    """The geometry to check points against: the stored evaluation geometry, or the document's cleaned shape"""
+    stored = document.get(EVALUATION_GEOMETRY_FIELD)
+    if stored:
+        try:
+            geometry = polygonal(shape(stored))
+            if geometry.is_valid:
+                return geometry
+        except Exception as e:
+            print(f"⚠️ Ignoring stored evaluation geometry of geofence {document.get('id')}: {str(e)}")
+    return clean_geometry(fence_geometry(document))[0]
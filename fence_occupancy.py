@@ -0,0 +1,177 @@
+"""
+Per-fence occupancy ("how many head are in each paddock right now").
+
+Counts are maintained incrementally: for every evaluated reading the
+fences containing the animal's position are looked up in the registry grid
+and compared with the fences it was in before, and only the enter/exit
+transitions change the counts. Reading the occupancy is then a dictionary
+lookup per fence instead of a full per-animal evaluation.
+
+Occupancy covers every fence containing the animal, whatever its
+assignment, and stocking density (head per hectare) uses the fence area
+computed once at registration in the fence's local metric projection.
+
+Counts can drift (positions held after a restart, fences edited or
+deleted), so they are periodically reconciled against a full recount:
+every fence is tested against all latest positions in the herd state
+with one vectorized contains_xy call per fence. A recount also runs on
+the next read after the fences changed. Transitions recorded while a
+recount runs are replayed on top of it, so none are lost.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+import shapely
+
+from geofence_registry import GeofenceRegistry, geofence_registry
+from herd_state import herd_state
+
+OCCUPANCY_RECONCILE_SECONDS = float(os.getenv("GEOFENCE_OCCUPANCY_RECONCILE_SECONDS", "300"))
+
+SQUARE_METERS_PER_HECTARE = 10000.0
+
+
+class FenceOccupancy:
+    def __init__(self, registry: GeofenceRegistry = geofence_registry):
+        self.registry = registry
+        self._fences: Dict[str, FrozenSet[str]] = {}  # cattle id -> fences it is in
+        self._counts: Dict[str, int] = {}  # fence id -> head
+        self._lock = threading.Lock()
+        self._reconcile_lock = threading.Lock()  # one recount at a time
+        self._changed: Optional[Dict[str, FrozenSet[str]]] = None  # fences set while a recount runs
+        self._reconciled_version: Optional[int] = None  # registry version of the last recount
+        self.reconciled_at: Optional[float] = None
+        self.counters = {"updates": 0, "enters": 0, "exits": 0, "reconciliations": 0, "drift_corrected": 0}
+
+    def _move(self, cattle_id: str, fence_ids: FrozenSet[str]) -> Tuple[FrozenSet[str], FrozenSet[str]]:
+        """Set an animal's fences, adjusting the counts by the difference (lock held)"""
+        previous = self._fences.get(cattle_id, frozenset())
+        entered, exited = fence_ids - previous, previous - fence_ids
+        for fence_id in entered:
+            self._counts[fence_id] = self._counts.get(fence_id, 0) + 1
+        for fence_id in exited:
+            remaining = self._counts.get(fence_id, 0) - 1
+            if remaining > 0:
+                self._counts[fence_id] = remaining
+            else:
+                self._counts.pop(fence_id, None)
+        if fence_ids:
+            self._fences[cattle_id] = fence_ids
+        else:
+            self._fences.pop(cattle_id, None)
+        if self._changed is not None:
+            self._changed[cattle_id] = fence_ids
+        return entered, exited
+
+    def update(self, cattle_id: str, latitude: float, longitude: float) -> Tuple[FrozenSet[str], FrozenSet[str]]:
+        """Record an animal's new position. Returns the (entered, exited) fence ids."""
+        fence_ids = frozenset(entry.id for entry in self.registry.containing(longitude, latitude))
+        with self._lock:
+            entered, exited = self._move(cattle_id, fence_ids)
+            self.counters["updates"] += 1
+            self.counters["enters"] += len(entered)
+            self.counters["exits"] += len(exited)
+        return entered, exited
+
+    def remove(self, cattle_id: str):
+        with self._lock:
+            self._move(cattle_id, frozenset())
+
+    # =====================
+    # RECONCILIATION
+    # =====================
+
+    def recount(self, cattle_ids: List[str], latitudes, longitudes) -> Dict[str, FrozenSet[str]]:
+        """Fences of every animal from scratch, one vectorized test per fence"""
+        members: Dict[str, set] = {}
+        if cattle_ids:
+            for entry in self.registry.entries():
+                inside = shapely.contains_xy(entry.polygon, longitudes, latitudes)
+                for index in inside.nonzero()[0]:
+                    members.setdefault(cattle_ids[index], set()).add(entry.id)
+        return {cattle_id: frozenset(fence_ids) for cattle_id, fence_ids in members.items()}
+
+    def herd_positions(self) -> Tuple[List[str], Any, Any]:
+        """Latest herd positions from the columnar herd state"""
+        herd_state.ensure_fresh()
+        return herd_state.positions()
+
+    def reconcile(self, positions: Optional[Tuple[List[str], Any, Any]] = None) -> Dict[str, Any]:
+        """Replace the counts with a full recount; reports how far the incremental counts had drifted"""
+        with self._reconcile_lock:
+            version = self.registry.version
+            with self._lock:
+                self._changed = {}
+            try:
+                cattle_ids, latitudes, longitudes = positions if positions is not None else self.herd_positions()
+                started = time.perf_counter()
+                fences = self.recount(cattle_ids, latitudes, longitudes)
+                counts: Dict[str, int] = {}
+                for fence_ids in fences.values():
+                    for fence_id in fence_ids:
+                        counts[fence_id] = counts.get(fence_id, 0) + 1
+                with self._lock:
+                    changed, self._changed = self._changed, None
+                    previous = self._counts
+                    self._fences, self._counts = fences, counts
+                    # Positions that arrived during the recount are newer than its snapshot
+                    for cattle_id, fence_ids in changed.items():
+                        self._move(cattle_id, fence_ids)
+                    drift = {fence_id: self._counts.get(fence_id, 0) - previous.get(fence_id, 0)
+                             for fence_id in set(self._counts) | set(previous)
+                             if self._counts.get(fence_id, 0) != previous.get(fence_id, 0)}
+                    self._reconciled_version = version
+                    self.reconciled_at = time.time()
+                    self.counters["reconciliations"] += 1
+                    self.counters["drift_corrected"] += sum(abs(delta) for delta in drift.values())
+            finally:
+                with self._lock:
+                    self._changed = None
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if drift:
+            print(f"🔢 Occupancy reconciled ({len(cattle_ids)} animals, {elapsed_ms:.1f} ms), corrected: {drift}")
+        return {"animals": len(cattle_ids), "drift": drift, "elapsed_ms": round(elapsed_ms, 2)}
+
+    def ensure_current(self):
+        """Recount if the fences changed since the last recount"""
+        if self._reconciled_version != self.registry.version:
+            self.reconcile()
+
+    # =====================
+    # READS
+    # =====================
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Head count and stocking density of every fence"""
+        with self._lock:
+            counts = dict(self._counts)
+        fences = []
+        for entry in self.registry.entries():
+            head = counts.get(entry.id, 0)
+            area_ha = entry.area_m2 / SQUARE_METERS_PER_HECTARE
+            fences.append({
+                "id": entry.id,
+                "name": entry.name,
+                "zone_type": entry.zone_type,
+                "parent_id": entry.parent_id,
+                "head": head,
+                "area_ha": round(area_ha, 2),
+                "head_per_ha": round(head / area_ha, 3) if area_ha > 0 else None
+            })
+        return fences
+
+    def fences_of(self, cattle_id: str) -> FrozenSet[str]:
+        with self._lock:
+            return self._fences.get(cattle_id, frozenset())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            tracked = len(self._fences)
+        return {**self.counters, "animals_in_fences": tracked, "reconciled_at": self.reconciled_at}
+
+
+# Global instance
+fence_occupancy = FenceOccupancy()
@@ -0,0 +1,54 @@
+"""
+What-if evaluation of a candidate fence against the current herd.
+
+Before a fence is saved, the UI previews which animals would be inside or
+outside it. All latest positions are classified in one vectorized pass: one
+contains_xy call on the prepared geometry for inside/outside, and one
+distance call in the fence's local metric projection for the distance to
+the boundary, so thousands of animals take a few milliseconds.
+"""
+
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+import shapely
+from shapely.geometry.base import BaseGeometry
+
+from fence_geometry import ZONE_EXCLUSION, ZONE_INCLUSION
+from local_projection import LocalProjection
+
+
+def preview_fence(geometry: BaseGeometry, cattle_ids: List[str], latitudes, longitudes,
+                  zone_type: str = ZONE_INCLUSION, include_cattle: bool = True) -> Dict[str, Any]:
+    """Counts (and per-animal results) of the herd against a candidate fence geometry"""
+    started = time.perf_counter()
+    latitudes = np.asarray(latitudes, dtype=float)
+    longitudes = np.asarray(longitudes, dtype=float)
+    shapely.prepare(geometry)
+    inside = shapely.contains_xy(geometry, longitudes, latitudes)
+
+    projection = LocalProjection.around(geometry)
+    boundary = projection.project(geometry).boundary
+    shapely.prepare(boundary)
+    x, y = projection.to_local_arrays(longitudes, latitudes)
+    distances = shapely.distance(shapely.points(x, y), boundary) if len(x) else np.zeros(0)
+
+    breached = inside if zone_type == ZONE_EXCLUSION else ~inside
+    result = {
+        "counts": {
+            "total": int(len(cattle_ids)),
+            "inside": int(inside.sum()),
+            "outside": int(len(cattle_ids) - inside.sum()),
+            "in_breach": int(breached.sum())
+        },
+        "zone_type": zone_type
+    }
+    if include_cattle:
+        rounded = np.round(distances, 1).tolist()
+        result["cattle"] = [
+            {"cattle_id": cattle_id, "is_inside": is_inside, "in_breach": in_breach, "distance_to_boundary_m": distance}
+            for cattle_id, is_inside, in_breach, distance in zip(cattle_ids, inside.tolist(), breached.tolist(), rounded)
+        ]
+    result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return result
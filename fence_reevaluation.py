@@ -0,0 +1,308 @@
+"""
+Retroactive re-evaluation of stored position history against a fence version.
+
+When a paddock boundary is edited, a re-evaluation job replays the stored
+positions of a time range (see position_history.py) against the new shape:
+which positions would have been in breach, the breach episodes they form,
+time in breach per animal and per day, and, when an existing fence is being
+edited, how many positions the edit reclassifies compared with the current
+version.
+
+Jobs run in a background thread so API workers are never blocked: the
+thread loads each animal's track and hands it to a process pool, where the
+whole track is classified with one vectorized Shapely call per geometry.
+Progress can be polled or streamed while the job runs.
+
+The pool's processes are started with forkserver (spawn where that is not
+available), never by forking the multi-threaded server process, whose
+copied locks could leave a child deadlocked.
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import shapely
+
+from breach_episodes import daily_time_outside
+from fence_geometry import ZONE_EXCLUSION, ZONE_INCLUSION
+from local_projection import LocalProjection
+from position_history import history_animals, load_track, position_history
+
+REEVALUATION_WORKERS = int(os.getenv("GEOFENCE_REEVALUATION_WORKERS", str(min(4, os.cpu_count() or 1))))
+REEVALUATION_MAX_GAP_SECONDS = float(os.getenv("GEOFENCE_REEVALUATION_MAX_GAP_SECONDS", "3600"))
+REEVALUATION_MAX_JOBS = int(os.getenv("GEOFENCE_REEVALUATION_MAX_JOBS", "20"))
+REEVALUATION_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+JOB_DONE = (JOB_COMPLETED, JOB_FAILED, JOB_CANCELLED)
+
+
+def utc_iso(epoch_seconds: float) -> str:
+    return datetime.fromtimestamp(epoch_seconds, timezone.utc).replace(tzinfo=None).isoformat()
+
+
+# =====================
+# WORKER (runs in the process pool)
+# =====================
+
+def breach_flags(geometry, zone_type: str, longitudes: np.ndarray, latitudes: np.ndarray) -> np.ndarray:
+    inside = shapely.contains_xy(geometry, longitudes, latitudes)
+    return inside if zone_type == ZONE_EXCLUSION else ~inside
+
+
+def track_episodes(times: np.ndarray, breached: np.ndarray, distances_m: np.ndarray,
+                   max_gap_seconds: float) -> List[Dict[str, Any]]:
+    """
+    Breach episodes of a classified track. An episode runs from its first
+    breached position to the first position back, and is cut at its last
+    breached position where the track has a gap longer than max_gap_seconds.
+    """
+    episodes = []
+    start = None
+    for index in range(len(times)):
+        gap = index > 0 and times[index] - times[index - 1] > max_gap_seconds
+        if start is not None and (gap or not breached[index]):
+            end = times[index] if not gap else times[index - 1]
+            episodes.append({"start": float(times[start]), "end": float(end),
+                             "max_distance_m": float(distances_m[start:index].max())})
+            start = None
+        if start is None and breached[index]:
+            start = index
+    if start is not None:
+        episodes.append({"start": float(times[start]), "end": float(times[-1]),
+                         "max_distance_m": float(distances_m[start:].max())})
+    return episodes
+
+
+def evaluate_track(geometry_json: str, zone_type: str, times: List[float], latitudes: List[float],
+                   longitudes: List[float], baseline_json: Optional[str] = None,
+                   max_gap_seconds: float = REEVALUATION_MAX_GAP_SECONDS) -> Dict[str, Any]:
+    """Classification, episodes and time in breach of one animal's track (optionally compared with a baseline fence)"""
+    geometry = shapely.from_geojson(geometry_json)
+    times = np.asarray(times, dtype=float)
+    latitudes = np.asarray(latitudes, dtype=float)
+    longitudes = np.asarray(longitudes, dtype=float)
+    breached = breach_flags(geometry, zone_type, longitudes, latitudes)
+
+    distances = np.zeros(len(times))
+    if breached.any():
+        projection = LocalProjection.around(geometry)
+        x, y = projection.to_local_arrays(longitudes[breached], latitudes[breached])
+        distances[breached] = shapely.distance(shapely.points(x, y), projection.project(geometry).boundary)
+
+    episodes = track_episodes(times, breached, distances, max_gap_seconds)
+    result = {
+        "positions": int(len(times)),
+        "positions_in_breach": int(breached.sum()),
+        "seconds_in_breach": round(sum(episode["end"] - episode["start"] for episode in episodes)),
+        "episodes": episodes
+    }
+    if baseline_json is not None:
+        baseline = breach_flags(shapely.from_geojson(baseline_json), zone_type, longitudes, latitudes)
+        result["newly_in_breach"] = int((breached & ~baseline).sum())
+        result["no_longer_in_breach"] = int((baseline & ~breached).sum())
+    return result
+
+
+# =====================
+# JOBS
+# =====================
+
+class ReevaluationJob:
+    def __init__(self, geometry_json: str, zone_type: str, start: float, end: float,
+                 cattle_ids: Optional[List[str]], fence_id: Optional[str], fence_name: str,
+                 baseline_json: Optional[str]):
+        self.id = uuid.uuid4().hex[:12]
+        self.geometry_json = geometry_json
+        self.zone_type = zone_type if zone_type in (ZONE_INCLUSION, ZONE_EXCLUSION) else ZONE_INCLUSION
+        self.start = start
+        self.end = end
+        self.cattle_ids = cattle_ids
+        self.fence_id = fence_id
+        self.fence_name = fence_name
+        self.baseline_json = baseline_json
+        self.status = JOB_QUEUED
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.animals_total = 0
+        self.animals_done = 0
+        self.positions = 0
+        self.cancel_requested = False
+        self.animals: Dict[str, Dict[str, Any]] = {}
+
+    def progress(self) -> Dict[str, Any]:
+        finished = self.finished_at or time.time()
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "animals_total": self.animals_total,
+            "animals_done": self.animals_done,
+            "positions": self.positions,
+            "elapsed_seconds": round(finished - self.started_at, 2) if self.started_at else 0.0,
+            **({"error": self.error} if self.error else {})
+        }
+
+    def summary(self) -> Dict[str, Any]:
+        """Totals, per-animal statistics, episodes and daily time in breach"""
+        episodes = [
+            {"cattle_id": cattle_id, "fence_id": self.fence_id or "candidate", "start": utc_iso(episode["start"]),
+             "end": utc_iso(episode["end"]), "max_distance_m": round(episode["max_distance_m"], 1)}
+            for cattle_id, animal in self.animals.items() for episode in animal["episodes"]
+        ]
+        totals = {
+            "animals": len(self.animals),
+            "positions": sum(animal["positions"] for animal in self.animals.values()),
+            "positions_in_breach": sum(animal["positions_in_breach"] for animal in self.animals.values()),
+            "episodes": len(episodes),
+            "seconds_in_breach": sum(animal["seconds_in_breach"] for animal in self.animals.values())
+        }
+        if self.baseline_json is not None:
+            totals["newly_in_breach"] = sum(animal["newly_in_breach"] for animal in self.animals.values())
+            totals["no_longer_in_breach"] = sum(animal["no_longer_in_breach"] for animal in self.animals.values())
+        start = datetime.fromisoformat(utc_iso(self.start))
+        end = datetime.fromisoformat(utc_iso(self.end))
+        return {
+            "fence": {"id": self.fence_id, "name": self.fence_name, "zone_type": self.zone_type},
+            "from": start.isoformat(),
+            "to": end.isoformat(),
+            "totals": totals,
+            "cattle": {cattle_id: {key: value for key, value in animal.items() if key != "episodes"}
+                       for cattle_id, animal in self.animals.items()},
+            "episodes": sorted(episodes, key=lambda episode: episode["start"]),
+            "daily": daily_time_outside(episodes, start, end, now=end)
+        }
+
+
+class FenceReevaluations:
+    def __init__(self, workers: int = REEVALUATION_WORKERS, max_jobs: int = REEVALUATION_MAX_JOBS):
+        self.workers = max(1, workers)
+        self.max_jobs = max_jobs
+        self._jobs: Dict[str, ReevaluationJob] = {}
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.counters = {"jobs_started": 0, "jobs_completed": 0, "jobs_failed": 0, "jobs_cancelled": 0,
+                         "animals_evaluated": 0, "positions_evaluated": 0}
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context(REEVALUATION_START_METHOD))
+            return self._pool
+
+    def shutdown(self):
+        """Cancel running jobs and stop the worker processes (on server shutdown)"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+            for job in self._jobs.values():
+                if job.status not in JOB_DONE:
+                    job.cancel_requested = True
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    def start(self, geometry_json: str, zone_type: str, start: float, end: float,
+              cattle_ids: Optional[List[str]] = None, fence_id: Optional[str] = None,
+              fence_name: str = "candidate", baseline_json: Optional[str] = None) -> ReevaluationJob:
+        job = ReevaluationJob(geometry_json, zone_type, start, end, cattle_ids, fence_id, fence_name, baseline_json)
+        with self._lock:
+            finished = sorted((other for other in self._jobs.values() if other.status in JOB_DONE),
+                              key=lambda other: other.created_at)
+            for other in finished[:max(0, len(self._jobs) - self.max_jobs + 1)]:
+                del self._jobs[other.id]
+            self._jobs[job.id] = job
+            self.counters["jobs_started"] += 1
+        threading.Thread(target=self._run, args=(job,), name=f"reevaluation-{job.id}", daemon=True).start()
+        return job
+
+    def _run(self, job: ReevaluationJob):
+        job.status = JOB_RUNNING
+        job.started_at = time.time()
+        print(f"🔁 Re-evaluation {job.id} started for fence '{job.fence_name}'")
+        try:
+            cattle_ids = job.cattle_ids
+            if cattle_ids is None:
+                result = history_animals()
+                if not result.get("success"):
+                    raise RuntimeError(f"Failed to list position history: {result.get('error')}")
+                cattle_ids = sorted(result.get("data", []))
+            job.animals_total = len(cattle_ids)
+
+            # Tracks are loaded here (I/O) while earlier ones are evaluated in the pool
+            executor = self._executor()
+            running = {}
+            for cattle_id in cattle_ids:
+                if job.cancel_requested:
+                    break
+                times, latitudes, longitudes = load_track(cattle_id, job.start, job.end, position_history)
+                if not times:
+                    job.animals_done += 1
+                    continue
+                future = executor.submit(evaluate_track, job.geometry_json, job.zone_type, times,
+                                         latitudes, longitudes, job.baseline_json)
+                running[future] = cattle_id
+                while len(running) >= self.workers * 2:
+                    self._collect(job, running, wait(running, return_when=FIRST_COMPLETED).done)
+            while running:
+                self._collect(job, running, wait(running, return_when=FIRST_COMPLETED).done)
+
+            job.status = JOB_CANCELLED if job.cancel_requested else JOB_COMPLETED
+        except Exception as e:
+            if job.cancel_requested:
+                # The pool was shut down under the job
+                job.status = JOB_CANCELLED
+            else:
+                job.status = JOB_FAILED
+                job.error = str(e)
+                print(f"❌ Re-evaluation {job.id} failed: {str(e)}")
+        job.finished_at = time.time()
+        with self._lock:
+            self.counters[f"jobs_{job.status}"] += 1
+            self.counters["animals_evaluated"] += len(job.animals)
+            self.counters["positions_evaluated"] += job.positions
+        print(f"🏁 Re-evaluation {job.id} {job.status}: {job.animals_done}/{job.animals_total} animals, "
+              f"{job.positions} positions in {job.finished_at - job.started_at:.1f}s")
+
+    def _collect(self, job: ReevaluationJob, running: dict, done):
+        for future in done:
+            cattle_id = running.pop(future)
+            result = future.result()
+            job.animals[cattle_id] = result
+            job.positions += result["positions"]
+            job.animals_done += 1
+
+    def get(self, job_id: str) -> Optional[ReevaluationJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self) -> List[ReevaluationJob]:
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda job: job.created_at, reverse=True)
+
+    def cancel(self, job_id: str) -> bool:
+        job = self.get(job_id)
+        if job is None:
+            return False
+        job.cancel_requested = True
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            running = sum(1 for job in self._jobs.values() if job.status == JOB_RUNNING)
+        return {**self.counters, "running": running, "workers": self.workers}
+
+
+# Global instance
+fence_reevaluations = FenceReevaluations()
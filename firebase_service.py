@@ -2,11 +2,23 @@ import firebase_admin
 from firebase_admin import credentials, db
 import os
 import json
+import threading
+from collections import OrderedDict
 from dotenv import load_dotenv
+from typing import Any, Optional, Tuple
+from request_coalescing import SingleFlight
+import storage_query
 
 # Load environment variables
 load_dotenv()
 
+# Rarely-changing collections kept in a local cache and revalidated with
+# their ETag, so an unchanged payload is not downloaded again. The cache
+# keeps a serialized copy and every read parses a fresh one, since callers
+# modify the documents they get back.
+REVALIDATED_COLLECTIONS = {"geofences", "staff", "users"}
+REVALIDATION_CACHE_SIZE = 256
+
 class FirebaseService:
     def __init__(self):
         # Initialize Firebase Admin SDK
@@ -55,6 +67,39 @@ class FirebaseService:
             print("✅ Firebase Realtime Database client initialized successfully")
         except Exception as e:
             raise ValueError(f"Failed to initialize Firebase Realtime Database: {e}")
+        
+        # Concurrent identical reads share one database request
+        self.single_flight = SingleFlight()
+        self._etag_cache: "OrderedDict[str, Tuple[str, str]]" = OrderedDict()  # path -> (etag, JSON)
+        self._etag_cache_lock = threading.Lock()
+        self.revalidation_stats = {"requests": 0, "not_modified": 0}
+    
+    def _get_with_etag(self, path: str) -> Tuple[Any, Optional[str]]:
+        """
+        Read a path and return (data, etag). Reads under REVALIDATED_COLLECTIONS
+        reuse the cached payload when the server reports it unchanged.
+        """
+        ref = self.realtime_db.child(path)
+        if path.split("/", 1)[0] not in REVALIDATED_COLLECTIONS:
+            return ref.get(etag=True)
+        
+        self.revalidation_stats["requests"] += 1
+        with self._etag_cache_lock:
+            cached = self._etag_cache.get(path)
+        if cached:
+            changed, data, etag = ref.get_if_changed(cached[0])
+            if not changed:
+                self.revalidation_stats["not_modified"] += 1
+                return json.loads(cached[1]), cached[0]
+        else:
+            data, etag = ref.get(etag=True)
+        
+        with self._etag_cache_lock:
+            self._etag_cache[path] = (etag, json.dumps(data))
+            self._etag_cache.move_to_end(path)
+            while len(self._etag_cache) > REVALIDATION_CACHE_SIZE:
+                self._etag_cache.popitem(last=False)
+        return data, etag
     
     # Realtime Database methods for collections (simulating Firestore behavior)
     def create_document(self, collection_name: str, document_id: str, data: dict):
@@ -68,9 +113,9 @@ class FirebaseService:
     def get_document(self, collection_name: str, document_id: str):
         """Get a document from Realtime Database"""
         try:
-            data = self.realtime_db.child(collection_name).child(document_id).get()
+            data, etag = self._get_with_etag(f"{collection_name}/{document_id}")
             if data:
-                return {"success": True, "data": data}
+                return {"success": True, "data": data, "etag": etag}
             else:
                 return {"success": False, "message": "Document not found"}
         except Exception as e:
@@ -94,8 +139,15 @@ class FirebaseService:
     
     def get_collection(self, collection_name: str):
         """Get all documents from a collection in Realtime Database"""
+        return self.single_flight.do(f"collection:{collection_name}", lambda: self._fetch_collection(collection_name))
+    
+    async def aget_collection(self, collection_name: str):
+        """Async variant of get_collection that does not block the event loop"""
+        return await self.single_flight.do_async(f"collection:{collection_name}", lambda: self._fetch_collection(collection_name))
+    
+    def _fetch_collection(self, collection_name: str):
         try:
-            data = self.realtime_db.child(collection_name).get()
+            data, etag = self._get_with_etag(collection_name)
             if data:
                 # Convert to list format similar to Firestore
                 documents = []
@@ -108,9 +160,56 @@ class FirebaseService:
                     else:
                         # Handle case where doc_data is not a dict
                         documents.append({"id": doc_id, "data": doc_data})
-                return {"success": True, "data": documents}
+                return {"success": True, "data": documents, "etag": etag}
             else:
-                return {"success": True, "data": []}
+                return {"success": True, "data": [], "etag": etag}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+    
+    def query_collection(self, collection_name: str, order_by: Optional[str] = None, equal_to: Any = None,
+                         start_at: Any = None, end_at: Any = None, limit_to_first: Optional[int] = None,
+                         limit_to_last: Optional[int] = None, shallow: bool = False):
+        """
+        Query a collection with server-side filtering.
+        order_by is a child name, "$key" or "$value". With shallow=True only
+        the document IDs are returned.
+        """
+        error = storage_query.validate_query(order_by, equal_to, start_at, end_at, limit_to_first, limit_to_last, shallow)
+        if error:
+            return {"success": False, "error": error}
+        params = storage_query.to_rest_params(order_by, equal_to, start_at, end_at, limit_to_first, limit_to_last, shallow)
+        key = storage_query.cache_key(collection_name, params)
+        return self.single_flight.do(key, lambda: self._fetch_query(
+            collection_name, order_by, equal_to, start_at, end_at, limit_to_first, limit_to_last, shallow))
+    
+    def _fetch_query(self, collection_name, order_by, equal_to, start_at, end_at, limit_to_first, limit_to_last, shallow):
+        try:
+            ref = self.realtime_db.child(collection_name)
+            if shallow:
+                data = ref.get(shallow=True)
+                return {"success": True, "data": list(data.keys()) if isinstance(data, dict) else []}
+            
+            if order_by == storage_query.ORDER_BY_KEY:
+                query = ref.order_by_key()
+            elif order_by == storage_query.ORDER_BY_VALUE:
+                query = ref.order_by_value()
+            elif order_by:
+                query = ref.order_by_child(order_by)
+            else:
+                return self._fetch_collection(collection_name)
+            
+            if equal_to is not None:
+                query = query.equal_to(equal_to)
+            if start_at is not None:
+                query = query.start_at(start_at)
+            if end_at is not None:
+                query = query.end_at(end_at)
+            if limit_to_first is not None:
+                query = query.limit_to_first(limit_to_first)
+            if limit_to_last is not None:
+                query = query.limit_to_last(limit_to_last)
+            
+            return {"success": True, "data": storage_query.to_documents(query.get(), order_by)}
         except Exception as e:
             return {"success": False, "error": str(e)}
     
@@ -123,11 +222,27 @@ class FirebaseService:
         except Exception as e:
             return {"success": False, "error": str(e)}
     
+    def set_realtime_raw(self, path: str, body: bytes):
+        """Set data from an already JSON-encoded body"""
+        try:
+            # The Admin SDK only accepts Python values
+            self.realtime_db.child(path).set(json.loads(body))
+            return {"success": True, "message": f"Data set at {path}"}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+    
     def get_realtime_data(self, path: str):
         """Get data from Realtime Database"""
+        return self.single_flight.do(f"path:{path}", lambda: self._fetch_realtime_data(path))
+    
+    async def aget_realtime_data(self, path: str):
+        """Async variant of get_realtime_data that does not block the event loop"""
+        return await self.single_flight.do_async(f"path:{path}", lambda: self._fetch_realtime_data(path))
+    
+    def _fetch_realtime_data(self, path: str):
         try:
-            data = self.realtime_db.child(path).get()
-            return {"success": True, "data": data}
+            data, etag = self._get_with_etag(path)
+            return {"success": True, "data": data, "etag": etag}
         except Exception as e:
             return {"success": False, "error": str(e)}
     
@@ -0,0 +1,182 @@
+"""
+Cattle -> geofence assignments.
+
+Without an assignment every animal is checked against every fence, so a cow
+correctly inside paddock A is reported (and alerted) as outside paddock B.
+An assignment names the fences an animal belongs to and how to read them:
+
+- "any": the animal must be inside at least one of the fences (rotational
+         paddocks, a herd allowed in several camps). Being outside the
+         others is not a breach; outside all of them is one breach, against
+         the nearest fence.
+- "all": the animal must be inside every fence (e.g. a paddock and the farm
+         boundary). Each fence it is outside of is a breach.
+
+Assignments are stored in the "geofence_assignments" collection, either for
+one animal (target_type "cattle") or for a herd group (target_type "group",
+with the member cattle_ids). An animal's own assignment wins over its
+group's. Animals without any assignment fall back to GEOFENCE_UNASSIGNED_MODE:
+"all_fences" checks them against every fence (the old behavior), "any" uses
+"any" semantics over every fence.
+
+The assignments are kept in memory and re-synced every
+GEOFENCE_ASSIGNMENT_REFRESH_SECONDS, like the geofence registry.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Dict, FrozenSet, List, Optional
+
+from temp_firebase_service import temp_firebase_service as firebase_service
+
+ASSIGNMENT_COLLECTION = "geofence_assignments"
+ASSIGNMENT_REFRESH_SECONDS = float(os.getenv("GEOFENCE_ASSIGNMENT_REFRESH_SECONDS", "30"))
+
+MODE_ANY = "any"
+MODE_ALL = "all"
+ASSIGNMENT_MODES = (MODE_ANY, MODE_ALL)
+
+TARGET_CATTLE = "cattle"
+TARGET_GROUP = "group"
+TARGET_TYPES = (TARGET_CATTLE, TARGET_GROUP)
+
+UNASSIGNED_MODE = os.getenv("GEOFENCE_UNASSIGNED_MODE", "all_fences")
+if UNASSIGNED_MODE not in ("all_fences", MODE_ANY):
+    print(f"⚠️ Unknown GEOFENCE_UNASSIGNED_MODE '{UNASSIGNED_MODE}', using 'all_fences'")
+    UNASSIGNED_MODE = "all_fences"
+
+
+class Assignment:
+    __slots__ = ("source", "target_id", "geofence_ids", "mode")
+
+    def __init__(self, source: str, target_id: Optional[str], geofence_ids: Optional[FrozenSet[str]], mode: str):
+        self.source = source  # "cattle", "group" or "unassigned"
+        self.target_id = target_id
+        self.geofence_ids = geofence_ids  # None: every fence
+        self.mode = mode
+
+    def as_dict(self) -> dict:
+        return {
+            "source": self.source,
+            "target_id": self.target_id,
+            "mode": self.mode,
+            "geofence_ids": sorted(self.geofence_ids) if self.geofence_ids is not None else None
+        }
+
+
+def assignment_id(target_type: str, target_id: str) -> str:
+    return f"{target_type}_{target_id}"
+
+
+def parse_assignment(document: dict) -> Optional[Assignment]:
+    """Assignment for a stored document (None if it is malformed)"""
+    target_type = document.get("target_type")
+    target_id = document.get("target_id")
+    mode = document.get("mode", MODE_ANY)
+    geofence_ids = document.get("geofence_ids")
+    if target_type not in TARGET_TYPES or not target_id or mode not in ASSIGNMENT_MODES:
+        return None
+    if not isinstance(geofence_ids, list) or not geofence_ids:
+        return None
+    return Assignment(target_type, str(target_id), frozenset(str(fence_id) for fence_id in geofence_ids), mode)
+
+
+class GeofenceAssignmentIndex:
+    def __init__(self, refresh_seconds: float = ASSIGNMENT_REFRESH_SECONDS, unassigned_mode: str = UNASSIGNED_MODE):
+        self.refresh_seconds = refresh_seconds
+        self.unassigned = Assignment("unassigned", None, None, MODE_ANY if unassigned_mode == MODE_ANY else MODE_ALL)
+        self._documents: Dict[str, dict] = {}
+        self._by_cattle: Dict[str, Assignment] = {}
+        self._by_group: Dict[str, Assignment] = {}
+        self._group_of: Dict[str, str] = {}  # cattle id -> group id
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._synced_at = 0.0
+        self.version = 0
+        self.counters = {"lookups": 0, "assigned": 0, "unassigned": 0}
+
+    def _rebuild_locked(self):
+        by_cattle, by_group, group_of = {}, {}, {}
+        for document in self._documents.values():
+            assignment = parse_assignment(document)
+            if assignment is None:
+                print(f"⚠️ Skipping invalid geofence assignment {document.get('id')}")
+                continue
+            if assignment.source == TARGET_CATTLE:
+                by_cattle[assignment.target_id] = assignment
+            else:
+                by_group[assignment.target_id] = assignment
+                for cattle_id in document.get("cattle_ids") or []:
+                    group_of[str(cattle_id)] = assignment.target_id
+        self._by_cattle, self._by_group, self._group_of = by_cattle, by_group, group_of
+        self.version += 1
+
+    # =====================
+    # UPDATES
+    # =====================
+
+    def sync(self, documents: List[dict]):
+        with self._lock:
+            self._documents = {document.get("id"): document for document in documents if isinstance(document, dict)}
+            self._rebuild_locked()
+            self._loaded = True
+            self._synced_at = time.monotonic()
+
+    def upsert(self, document: dict):
+        with self._lock:
+            self._documents[document.get("id")] = document
+            self._rebuild_locked()
+
+    def remove(self, document_id: str) -> bool:
+        with self._lock:
+            if self._documents.pop(document_id, None) is None:
+                return False
+            self._rebuild_locked()
+            return True
+
+    def ensure_fresh(self) -> bool:
+        """Sync with the database if never loaded or older than refresh_seconds"""
+        if self._loaded and time.monotonic() - self._synced_at < self.refresh_seconds:
+            return True
+        result = firebase_service.get_collection(ASSIGNMENT_COLLECTION)
+        if result.get("success"):
+            self.sync(result.get("data", []))
+            return True
+        print(f"❌ Failed to fetch geofence assignments: {result.get('error')}")
+        # Keep the assignments we have (or none) and try again after the refresh interval
+        self._synced_at = time.monotonic()
+        return self._loaded
+
+    # =====================
+    # LOOKUPS
+    # =====================
+
+    def for_cattle(self, cattle_id: str) -> Assignment:
+        """The assignment that applies to an animal (its own, its group's, or the unassigned default)"""
+        self.ensure_fresh()
+        with self._lock:
+            self.counters["lookups"] += 1
+            assignment = self._by_cattle.get(cattle_id)
+            if assignment is None:
+                group_id = self._group_of.get(cattle_id)
+                assignment = self._by_group.get(group_id) if group_id is not None else None
+            self.counters["assigned" if assignment is not None else "unassigned"] += 1
+            return assignment if assignment is not None else self.unassigned
+
+    def documents(self) -> List[dict]:
+        with self._lock:
+            return sorted(self._documents.values(), key=lambda document: str(document.get("id")))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "cattle_assignments": len(self._by_cattle),
+            "group_assignments": len(self._by_group),
+            "grouped_cattle": len(self._group_of),
+            "unassigned_mode": "any" if self.unassigned.mode == MODE_ANY else "all_fences"
+        }
+
+
+# Global instance
+geofence_assignments = GeofenceAssignmentIndex()
@@ -0,0 +1,181 @@
+"""
+Compact, versioned geofence bundle for on-device checking.
+
+Collars download the active fences once and keep them until the server
+publishes a new version. To fit an ESP8266 the fences are simplified and
+their coordinates quantized to integers relative to a shared origin:
+
+    {
+      "version": 3,                       # increases whenever the content changes
+      "hash": "9f2c...",                  # content hash of origin and fences
+      "scale": 100000,                    # integer units per degree (~1.1 m)
+      "origin": [2825000, -1540000],      # [lng, lat] * scale
+      "fences": [
+        {"id": "geofence_ab12cd34", "n": "North paddock",
+         "b": [minx, miny, maxx, maxy],   # bounding box, relative to origin
+         "p": [x0, y0, x1, y1, ...],      # ring without the closing point
+         "h": [[x0, y0, ...], ...],       # holes (only present if the fence has any)
+         "x": 1}                          # exclusion zone (only present for exclusions)
+      ]
+    }
+
+A point is inside a fence when it lies inside the ring "p" and in none of
+its holes "h" (the bounding box "b" is a cheap pre-check). A fence made of
+several polygons appears once per polygon, with the same id. Animals must
+stay inside inclusion fences and out of exclusion zones. The version is
+stored under config/geofence_bundle so every instance hands out the same
+numbers.
+
+Fences are simplified with a tolerance in meters, in the fence's local
+metric projection (see local_projection.py), so the error is the same at
+any latitude and in both directions.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from shapely.geometry import Polygon
+
+from fence_geometry import ZONE_EXCLUSION, evaluation_geometry, zone_type
+from local_projection import LocalProjection
+from temp_firebase_service import temp_firebase_service as firebase_service
+
+BUNDLE_META_PATH = "config/geofence_bundle"
+BUNDLE_SCALE = 100000  # integer units per degree, ~1.1 m at the equator
+BUNDLE_TOLERANCE_M = float(os.getenv("GEOFENCE_BUNDLE_TOLERANCE_M", "2"))
+BUNDLE_REFRESH_SECONDS = float(os.getenv("GEOFENCE_BUNDLE_REFRESH_SECONDS", "30"))
+BUNDLE_VERSION_HEADER = "X-Geofence-Bundle-Version"
+
+
+def encode_fences(geofences: List[dict], scale: int = BUNDLE_SCALE,
+                  tolerance_m: float = BUNDLE_TOLERANCE_M) -> Dict[str, Any]:
+    """Simplify and quantize geofence documents into the bundle's fence list"""
+    def quantize(coords):
+        ring = [(round(x * scale), round(y * scale)) for x, y in coords[:-1]]
+        # Quantizing can merge neighbouring points
+        return [point for index, point in enumerate(ring) if index == 0 or point != ring[index - 1]]
+
+    rings = []
+    for geofence in geofences:
+        try:
+            geometry = evaluation_geometry(geofence)
+        except Exception:
+            continue
+        exclusion = zone_type(geofence) == ZONE_EXCLUSION
+        polygons = list(geometry.geoms) if geometry.geom_type == "MultiPolygon" else [geometry]
+        projection = LocalProjection.around(geometry)
+        for polygon in polygons:
+            try:
+                if tolerance_m > 0:
+                    simplified = projection.unproject(
+                        projection.project(polygon).simplify(tolerance_m, preserve_topology=True))
+                    if isinstance(simplified, Polygon) and not simplified.is_empty:
+                        polygon = simplified
+                ring = quantize(polygon.exterior.coords)
+                holes = [hole for hole in (quantize(interior.coords) for interior in polygon.interiors) if len(hole) >= 3]
+            except Exception as e:
+                print(f"⚠️ Skipping geofence {geofence.get('id')} in bundle: {str(e)}")
+                continue
+            if len(ring) >= 3:
+                rings.append((geofence.get("id"), geofence.get("name", ""), ring, holes, exclusion))
+
+    if not rings:
+        return {"origin": [0, 0], "fences": []}
+
+    origin_x = min(x for _, _, ring, _, _ in rings for x, _ in ring)
+    origin_y = min(y for _, _, ring, _, _ in rings for _, y in ring)
+
+    def relative(ring):
+        return [value for x, y in ring for value in (x - origin_x, y - origin_y)]
+
+    fences = []
+    for fence_id, name, ring, holes, exclusion in sorted(rings, key=lambda item: str(item[0])):
+        xs = [x - origin_x for x, _ in ring]
+        ys = [y - origin_y for _, y in ring]
+        fence = {
+            "id": fence_id,
+            "n": name,
+            "b": [min(xs), min(ys), max(xs), max(ys)],
+            "p": relative(ring)
+        }
+        if holes:
+            fence["h"] = [relative(hole) for hole in holes]
+        if exclusion:
+            fence["x"] = 1
+        fences.append(fence)
+    return {"origin": [origin_x, origin_y], "fences": fences}
+
+
+def content_hash(encoded: Dict[str, Any]) -> str:
+    canonical = json.dumps(encoded, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+class GeofenceBundle:
+    def __init__(self, refresh_seconds: float = BUNDLE_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._bundle: Optional[Dict[str, Any]] = None
+        self._built_at = 0.0
+        self._stale = True
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        """Rebuild on the next request (call after a fence is created, changed or deleted)"""
+        self._stale = True
+
+    def _needs_rebuild(self) -> bool:
+        return self._stale or time.monotonic() - self._built_at >= self.refresh_seconds
+
+    def current(self) -> Optional[Dict[str, Any]]:
+        """The current bundle, rebuilt at most every refresh_seconds"""
+        if self._needs_rebuild():
+            with self._lock:
+                if self._needs_rebuild():
+                    self._stale = False
+                    self._built_at = time.monotonic()
+                    self._rebuild()
+        return self._bundle
+
+    def version(self) -> Optional[int]:
+        """Version of the current bundle (None if it could not be built)"""
+        bundle = self.current()
+        return bundle["version"] if bundle else None
+
+    def _rebuild(self):
+        result = firebase_service.get_collection("geofences")
+        if not result.get("success"):
+            print(f"⚠️ Could not rebuild geofence bundle: {result.get('error')}")
+            # Keep serving the previous bundle, try again after the refresh interval
+            return
+
+        encoded = encode_fences(result.get("data", []))
+        bundle_hash = content_hash(encoded)
+        if self._bundle is not None and self._bundle["hash"] == bundle_hash:
+            return
+
+        version = self._next_version(bundle_hash)
+        self._bundle = {"version": version, "hash": bundle_hash, "scale": BUNDLE_SCALE, **encoded}
+        print(f"📦 Geofence bundle v{version}: {len(encoded['fences'])} fences, "
+              f"{len(json.dumps(self._bundle, separators=(',', ':')))} bytes")
+
+    def _next_version(self, bundle_hash: str) -> int:
+        meta_result = firebase_service.get_realtime_data(BUNDLE_META_PATH)
+        meta = meta_result.get("data") if meta_result.get("success") else None
+        stored_version = meta.get("version", 0) if isinstance(meta, dict) else 0
+        local_version = self._bundle["version"] if self._bundle else 0
+        if isinstance(meta, dict) and meta.get("hash") == bundle_hash:
+            return stored_version
+
+        version = max(stored_version, local_version) + 1
+        write = firebase_service.set_realtime_data(BUNDLE_META_PATH, {"version": version, "hash": bundle_hash})
+        if not write.get("success"):
+            print(f"⚠️ Could not store geofence bundle version: {write.get('error')}")
+        return version
+
+
+# Global instance
+geofence_bundle = GeofenceBundle()
@@ -0,0 +1,179 @@
+"""
+Bulk geofence import from GeoJSON and KML files.
+
+Both parsers return plain geofence fields (name, coordinates, holes, parts,
+zone_type, parent_id), one dict per fence, which are then stored through the
+same validation and repair as POST /geofence/geofences.
+
+- GeoJSON: a FeatureCollection, a Feature, or a bare Polygon/MultiPolygon.
+  name, zone_type and parent_id are read from the feature properties.
+- KML: every Placemark with a Polygon (or several, in a MultiGeometry).
+  zone_type and parent_id are read from ExtendedData when present.
+
+Features without a polygon (points, lines) are reported as skipped.
+"""
+
+import json
+import os
+import xml.etree.ElementTree as ElementTree
+from typing import Any, Dict, List, Optional, Tuple
+
+IMPORT_MAX_BYTES = int(os.getenv("GEOFENCE_IMPORT_MAX_BYTES", str(5 * 1024 * 1024)))
+
+FORMAT_GEOJSON = "geojson"
+FORMAT_KML = "kml"
+IMPORT_FORMATS = (FORMAT_GEOJSON, FORMAT_KML)
+
+FENCE_PROPERTIES = ("zone_type", "parent_id")
+
+
+def detect_format(content_type: Optional[str], body: bytes) -> str:
+    """Import format from the Content-Type, or from the first character of the file"""
+    content_type = (content_type or "").lower()
+    if "kml" in content_type:
+        return FORMAT_KML
+    if "json" in content_type:
+        return FORMAT_GEOJSON
+    return FORMAT_KML if body.lstrip()[:1] == b"<" else FORMAT_GEOJSON
+
+
+def _rings_to_fence(polygons: List[List[List[List[float]]]]) -> Dict[str, Any]:
+    """Fence shape fields from a list of polygons, each [outer ring, *holes]"""
+    def ring(points):
+        return [[float(point[0]), float(point[1])] for point in points]
+
+    first, rest = polygons[0], polygons[1:]
+    fence = {"coordinates": ring(first[0])}
+    if len(first) > 1:
+        fence["holes"] = [ring(hole) for hole in first[1:]]
+    if rest:
+        fence["parts"] = []
+        for polygon in rest:
+            part = {"coordinates": ring(polygon[0])}
+            if len(polygon) > 1:
+                part["holes"] = [ring(hole) for hole in polygon[1:]]
+            fence["parts"].append(part)
+    return fence
+
+
+# =====================
+# GEOJSON
+# =====================
+
+def parse_geojson(body: bytes) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """(fences, skipped features) from a GeoJSON document"""
+    try:
+        document = json.loads(body)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid GeoJSON: {str(e)}")
+    if not isinstance(document, dict):
+        raise ValueError("Invalid GeoJSON: expected an object")
+
+    if document.get("type") == "FeatureCollection":
+        features = document.get("features") or []
+    elif document.get("type") == "Feature":
+        features = [document]
+    else:
+        features = [{"type": "Feature", "properties": {}, "geometry": document}]
+
+    fences, skipped = [], []
+    for index, feature in enumerate(features):
+        properties = (feature or {}).get("properties") or {}
+        name = properties.get("name") or properties.get("Name") or f"Imported fence {index + 1}"
+        geometry = (feature or {}).get("geometry") or {}
+        geometry_type = geometry.get("type")
+        coordinates = geometry.get("coordinates")
+        if geometry_type == "Polygon" and coordinates:
+            polygons = [coordinates]
+        elif geometry_type == "MultiPolygon" and coordinates:
+            polygons = coordinates
+        else:
+            skipped.append({"index": index, "name": name, "reason": f"no polygon ({geometry_type})"})
+            continue
+        try:
+            fence = {"name": str(name), **_rings_to_fence(polygons)}
+        except (TypeError, IndexError, ValueError) as e:
+            skipped.append({"index": index, "name": name, "reason": f"malformed coordinates: {str(e)}"})
+            continue
+        for key in FENCE_PROPERTIES:
+            if properties.get(key):
+                fence[key] = properties[key]
+        fences.append(fence)
+    return fences, skipped
+
+
+# =====================
+# KML
+# =====================
+
+def _local(tag: str) -> str:
+    """Tag name without its XML namespace"""
+    return tag.rsplit("}", 1)[-1]
+
+
+def _children(element, name: str):
+    return [child for child in element if _local(child.tag) == name]
+
+
+def _descendants(element, name: str):
+    return [child for child in element.iter() if _local(child.tag) == name]
+
+
+def _kml_ring(boundary) -> List[List[float]]:
+    coordinates = _descendants(boundary, "coordinates")
+    if not coordinates or not coordinates[0].text:
+        return []
+    ring = []
+    for triple in coordinates[0].text.split():
+        values = triple.split(",")
+        ring.append([float(values[0]), float(values[1])])
+    return ring
+
+
+def _kml_extended_data(placemark) -> Dict[str, str]:
+    values = {}
+    for data in _descendants(placemark, "Data"):
+        value = _children(data, "value")
+        if data.get("name") and value and value[0].text:
+            values[data.get("name")] = value[0].text.strip()
+    for data in _descendants(placemark, "SimpleData"):
+        if data.get("name") and data.text:
+            values[data.get("name")] = data.text.strip()
+    return values
+
+
+def parse_kml(body: bytes) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """(fences, skipped placemarks) from a KML document"""
+    try:
+        root = ElementTree.fromstring(body)
+    except ElementTree.ParseError as e:
+        raise ValueError(f"Invalid KML: {str(e)}")
+
+    fences, skipped = [], []
+    for index, placemark in enumerate(_descendants(root, "Placemark")):
+        names = _children(placemark, "name")
+        name = names[0].text.strip() if names and names[0].text else f"Imported fence {index + 1}"
+        polygons = []
+        for polygon in _descendants(placemark, "Polygon"):
+            outer = [_kml_ring(boundary) for boundary in _children(polygon, "outerBoundaryIs")]
+            inner = [_kml_ring(boundary) for boundary in _children(polygon, "innerBoundaryIs")]
+            if outer and outer[0]:
+                polygons.append([outer[0]] + [ring for ring in inner if ring])
+        if not polygons:
+            skipped.append({"index": index, "name": name, "reason": "no polygon"})
+            continue
+        fence = {"name": name, **_rings_to_fence(polygons)}
+        extended = _kml_extended_data(placemark)
+        for key in FENCE_PROPERTIES:
+            if extended.get(key):
+                fence[key] = extended[key]
+        fences.append(fence)
+    return fences, skipped
+
+
+def parse_import(body: bytes, import_format: str) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    if len(body) > IMPORT_MAX_BYTES:
+        raise ValueError(f"File too large ({len(body)} bytes, limit {IMPORT_MAX_BYTES})")
+    if import_format == FORMAT_KML:
+        return parse_kml(body)
+    return parse_geojson(body)
@@ -0,0 +1,143 @@
+"""
+Precomputed raster grids for fast inside/outside lookups on large fences.
+
+A fence with many vertices gets a grid over its bounding box, in the
+fence's local metric projection (see local_projection.py), at
+GEOFENCE_RASTER_CELL_M resolution. Every cell is classified once, when the
+fence is registered:
+- boundary: the fence boundary crosses the cell, points there need the exact test
+- inside / outside: the whole cell is on one side of the boundary
+
+and non-boundary cells also store the distance from their center to the
+boundary. A point in an inside or outside cell is then classified with an
+array lookup, and its boundary distance is approximated by the cell's
+(within half a cell diagonal). Points in boundary cells, or outside the
+grid, fall back to the exact Shapely test.
+
+Set GEOFENCE_RASTER_CELL_M=0 to disable rasters.
+"""
+
+import math
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import shapely
+from shapely.geometry.base import BaseGeometry
+
+RASTER_CELL_M = float(os.getenv("GEOFENCE_RASTER_CELL_M", "20"))
+RASTER_MIN_VERTICES = int(os.getenv("GEOFENCE_RASTER_MIN_VERTICES", "32"))
+RASTER_MAX_CELLS = int(os.getenv("GEOFENCE_RASTER_MAX_CELLS", "65536"))
+
+OUTSIDE = 0
+INSIDE = 1
+BOUNDARY = 2
+
+raster_stats: Dict[str, float] = {
+    "rasters_built": 0,
+    "build_seconds_total": 0.0,
+    "build_seconds_max": 0.0,
+    "cells_built": 0,
+    "lookups": 0,
+    "hits": 0,
+    "fallbacks": 0
+}
+
+
+class FenceRaster:
+    __slots__ = ("origin_x", "origin_y", "cell", "nx", "ny", "states", "distances", "build_seconds")
+
+    def __init__(self, origin_x: float, origin_y: float, cell: float,
+                 states: np.ndarray, distances: np.ndarray, build_seconds: float):
+        self.origin_x = origin_x
+        self.origin_y = origin_y
+        self.cell = cell
+        self.ny, self.nx = states.shape
+        self.states = states
+        self.distances = distances
+        self.build_seconds = build_seconds
+
+    def lookup(self, x: float, y: float) -> Optional[Tuple[bool, float]]:
+        """
+        (is_inside, approximate boundary distance in meters) for a point in
+        local meters, or None when the exact test is needed.
+        """
+        raster_stats["lookups"] += 1
+        i = math.floor((x - self.origin_x) / self.cell)
+        j = math.floor((y - self.origin_y) / self.cell)
+        if not (0 <= i < self.nx and 0 <= j < self.ny):
+            raster_stats["fallbacks"] += 1
+            return None
+        state = self.states[j, i]
+        if state == BOUNDARY:
+            raster_stats["fallbacks"] += 1
+            return None
+        raster_stats["hits"] += 1
+        return state == INSIDE, float(self.distances[j, i])
+
+    def counts(self) -> Dict[str, int]:
+        return {
+            "inside": int(np.count_nonzero(self.states == INSIDE)),
+            "outside": int(np.count_nonzero(self.states == OUTSIDE)),
+            "boundary": int(np.count_nonzero(self.states == BOUNDARY))
+        }
+
+
+def wants_raster(polygon: BaseGeometry, min_vertices: int = RASTER_MIN_VERTICES, cell_m: float = RASTER_CELL_M) -> bool:
+    """Rasters pay off for fences with many vertices (exact tests are cheap on small ones)"""
+    return cell_m > 0 and shapely.get_num_coordinates(polygon) >= min_vertices
+
+
+def build_raster(polygon: BaseGeometry, cell_m: float = RASTER_CELL_M,
+                 max_cells: int = RASTER_MAX_CELLS) -> Optional[FenceRaster]:
+    """
+    Classify a grid over the bounding box of a polygon given in local meters
+    (None for an empty polygon)
+    """
+    if polygon.is_empty:
+        return None
+    started = time.perf_counter()
+    minx, miny, maxx, maxy = polygon.bounds
+    cell = cell_m
+    nx = max(1, math.ceil((maxx - minx) / cell))
+    ny = max(1, math.ceil((maxy - miny) / cell))
+    if nx * ny > max_cells:
+        # Coarsen the grid to stay within the cell budget
+        cell *= math.sqrt(nx * ny / max_cells)
+        nx = max(1, math.ceil((maxx - minx) / cell))
+        ny = max(1, math.ceil((maxy - miny) / cell))
+
+    x0, y0 = np.meshgrid(minx + np.arange(nx) * cell, miny + np.arange(ny) * cell)
+    cells = shapely.box(x0, y0, x0 + cell, y0 + cell)
+    boundary = polygon.boundary
+    shapely.prepare(boundary)
+    on_boundary = shapely.intersects(boundary, cells)
+
+    center_x, center_y = x0 + cell / 2, y0 + cell / 2
+    inside = shapely.contains_xy(polygon, center_x, center_y)
+    states = np.where(on_boundary, BOUNDARY, np.where(inside, INSIDE, OUTSIDE)).astype(np.uint8)
+
+    distances = np.zeros(states.shape, dtype=np.float32)
+    resolved = ~on_boundary
+    if resolved.any():
+        distances[resolved] = shapely.distance(boundary, shapely.points(center_x[resolved], center_y[resolved]))
+
+    build_seconds = time.perf_counter() - started
+    raster_stats["rasters_built"] += 1
+    raster_stats["build_seconds_total"] += build_seconds
+    raster_stats["build_seconds_max"] = max(raster_stats["build_seconds_max"], build_seconds)
+    raster_stats["cells_built"] += int(states.size)
+    return FenceRaster(minx, miny, cell, states, distances, build_seconds)
+
+
+def stats() -> Dict[str, float]:
+    lookups = raster_stats["lookups"]
+    return {
+        **raster_stats,
+        "build_seconds_total": round(raster_stats["build_seconds_total"], 4),
+        "build_seconds_max": round(raster_stats["build_seconds_max"], 4),
+        "hit_ratio": round(raster_stats["hits"] / lookups, 4) if lookups else None,
+        "cell_m": RASTER_CELL_M,
+        "min_vertices": RASTER_MIN_VERTICES
+    }
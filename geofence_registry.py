@@ -0,0 +1,383 @@
+"""
+In-memory geofence registry with a grid spatial index.
+
+Fence polygons are built (and prepared for fast containment tests) once,
+not on every reading, and indexed in a uniform grid of GRID_CELL_DEG cells
+by bounding box. A point is then tested exactly only against the fences whose
+bounding box lies within the "near" radius; fences further away cannot
+contain the point and are reported according to FAR_FENCE_MODE:
+
+- "exact":  compute the exact boundary distance for every fence (old behavior)
+- "bbox":   report far fences as outside, with the bounding-box distance as
+            an approximate (lower bound) distance
+- "skip":   leave far fences out of the result
+
+Listing the far fences means walking every fence, so query() only does it
+when asked (include_far=True); the ingest path does not.
+
+Every fence is also projected once into its own local metric system
+(local_projection.py), so boundary distances are real meters rather than
+degrees times a constant. Fences with many vertices also get a precomputed
+raster (geofence_raster.py) so most points near them are classified with an
+array lookup. Exclusion zones and the parent/child hierarchy (fence_geometry.py)
+are tracked here so evaluation can prune children of fences the point is not in.
+
+Fences are inserted and removed incrementally when they are created or
+deleted through the API. The registry also re-syncs with the database every
+GEOFENCE_REGISTRY_REFRESH_SECONDS (only changed fences are re-indexed), so
+changes made by other instances are picked up.
+"""
+
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from typing import Any, Collection, Dict, List, Optional, Set, Tuple
+
+import shapely
+from shapely.geometry.base import BaseGeometry
+
+import geofence_raster
+from fence_geometry import (
+    EVALUATION_GEOMETRY_FIELD, MAX_HIERARCHY_DEPTH, ZONE_EXCLUSION, evaluation_geometry, parent_id, zone_type
+)
+from geofence_raster import FenceRaster, build_raster, wants_raster
+from local_projection import LocalProjection
+from temp_firebase_service import temp_firebase_service as firebase_service
+
+GRID_CELL_DEG = float(os.getenv("GEOFENCE_GRID_CELL_DEG", "0.01"))  # ~1.1 km
+MAX_CELLS_PER_FENCE = int(os.getenv("GEOFENCE_MAX_CELLS_PER_FENCE", "4096"))
+REGISTRY_REFRESH_SECONDS = float(os.getenv("GEOFENCE_REGISTRY_REFRESH_SECONDS", "30"))
+FAR_FENCE_DISTANCE_KM = float(os.getenv("GEOFENCE_FAR_DISTANCE_KM", "2"))
+FAR_FENCE_MODE = os.getenv("GEOFENCE_FAR_FENCE_MODE", "bbox")
+FAR_FENCE_MODES = ("exact", "bbox", "skip")
+if FAR_FENCE_MODE not in FAR_FENCE_MODES:
+    print(f"⚠️ Unknown GEOFENCE_FAR_FENCE_MODE '{FAR_FENCE_MODE}', using 'bbox'")
+    FAR_FENCE_MODE = "bbox"
+
+KM_PER_DEGREE = 111.32  # per degree of latitude, only used to size search radii
+
+
+class FenceEntry:
+    __slots__ = ("id", "name", "document", "zone_type", "parent_id", "polygon", "bounds", "cells", "fingerprint",
+                 "projection", "metric_boundary", "metric_bounds", "area_m2", "raster")
+
+    def __init__(self, document: dict, polygon: BaseGeometry, fingerprint: str):
+        self.id = document.get("id", "unknown")
+        self.name = document.get("name", self.id)
+        self.zone_type = zone_type(document)
+        self.parent_id = parent_id(document)
+        self.document = document
+        self.polygon = polygon
+        self.bounds = polygon.bounds  # (minx, miny, maxx, maxy) = (min lng, min lat, max lng, max lat)
+        self.cells: Optional[List[Tuple[int, int]]] = None  # None: too large for the grid
+        self.fingerprint = fingerprint
+        self.projection = LocalProjection.around(polygon)
+        metric_polygon = self.projection.project(polygon)
+        self.metric_boundary = metric_polygon.boundary
+        shapely.prepare(self.metric_boundary)
+        self.metric_bounds = metric_polygon.bounds
+        self.area_m2 = float(metric_polygon.area)
+        self.raster: Optional[FenceRaster] = None
+        if wants_raster(metric_polygon):
+            try:
+                self.raster = build_raster(metric_polygon)
+            except Exception as e:
+                print(f"⚠️ Could not build raster for geofence {self.name}, using exact tests: {str(e)}")
+
+    def bbox_distance(self, x: float, y: float) -> float:
+        """Distance in degrees from a point to this fence's bounding box (0 inside it)"""
+        minx, miny, maxx, maxy = self.bounds
+        dx = max(minx - x, 0.0, x - maxx)
+        dy = max(miny - y, 0.0, y - maxy)
+        return math.hypot(dx, dy)
+
+    def boundary_distance_m(self, longitude: float, latitude: float) -> float:
+        """Exact distance in meters from a point to this fence's boundary"""
+        x, y = self.projection.to_local(longitude, latitude)
+        return float(shapely.distance(self.metric_boundary, shapely.points(x, y)))
+
+    def bbox_distance_m(self, longitude: float, latitude: float) -> float:
+        """Distance in meters from a point to this fence's bounding box (0 inside it)"""
+        x, y = self.projection.to_local(longitude, latitude)
+        minx, miny, maxx, maxy = self.metric_bounds
+        return math.hypot(max(minx - x, 0.0, x - maxx), max(miny - y, 0.0, y - maxy))
+
+
+def fence_fingerprint(document: dict) -> str:
+    canonical = json.dumps([document.get("name"), document.get("coordinates"), document.get("holes"),
+                            document.get("parts"), zone_type(document), parent_id(document),
+                            document.get(EVALUATION_GEOMETRY_FIELD)], separators=(",", ":"))
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+
+def build_entry(document: dict) -> Optional[FenceEntry]:
+    """Polygon (or MultiPolygon) for a geofence document, prepared for repeated tests (None if invalid)"""
+    try:
+        polygon = evaluation_geometry(document)
+    except ValueError as e:
+        print(f"⚠️ Skipping invalid geofence {document.get('name', document.get('id'))}: {str(e)}")
+        return None
+    try:
+        shapely.prepare(polygon)
+    except Exception as e:
+        print(f"❌ Error processing geofence {document.get('name', document.get('id'))}: {str(e)}")
+        return None
+    try:
+        entry = FenceEntry(document, polygon, fence_fingerprint(document))
+    except Exception as e:
+        print(f"❌ Error projecting geofence {document.get('name', document.get('id'))}: {str(e)}")
+        return None
+    if entry.raster is not None:
+        print(f"🧮 Raster for geofence {entry.name}: {entry.raster.nx}x{entry.raster.ny} cells "
+              f"in {entry.raster.build_seconds * 1000:.1f} ms")
+    return entry
+
+
+class GeofenceRegistry:
+    def __init__(self, cell_size_deg: float = GRID_CELL_DEG, refresh_seconds: float = REGISTRY_REFRESH_SECONDS,
+                 max_cells_per_fence: int = MAX_CELLS_PER_FENCE):
+        self.cell_size = cell_size_deg
+        self.refresh_seconds = refresh_seconds
+        self.max_cells_per_fence = max_cells_per_fence
+        self._entries: Dict[str, FenceEntry] = {}
+        self._grid: Dict[Tuple[int, int], Set[str]] = {}
+        self._large: Set[str] = set()  # fences spanning too many cells, always candidates
+        self._exclusions: Set[str] = set()
+        self._invalid: Dict[str, str] = {}  # id -> fingerprint of documents that could not be built
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._synced_at = 0.0
+        self.version = 0  # increases on every change
+        self.stats_counters = {"queries": 0, "exact_tests": 0, "far_fences": 0, "syncs": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _cell(self, x: float, y: float) -> Tuple[int, int]:
+        return (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+
+    # =====================
+    # INCREMENTAL UPDATES
+    # =====================
+
+    def upsert(self, document: dict) -> bool:
+        """Insert or replace one fence. Returns False if the fence is invalid."""
+        entry = build_entry(document)
+        with self._lock:
+            self._remove_locked(document.get("id", "unknown"))
+            if entry is None:
+                return False
+            minx, miny, maxx, maxy = entry.bounds
+            (x0, y0), (x1, y1) = self._cell(minx, miny), self._cell(maxx, maxy)
+            if (x1 - x0 + 1) * (y1 - y0 + 1) > self.max_cells_per_fence:
+                self._large.add(entry.id)
+            else:
+                entry.cells = [(cx, cy) for cx in range(x0, x1 + 1) for cy in range(y0, y1 + 1)]
+                for cell in entry.cells:
+                    self._grid.setdefault(cell, set()).add(entry.id)
+            if entry.zone_type == ZONE_EXCLUSION:
+                self._exclusions.add(entry.id)
+            self._entries[entry.id] = entry
+            self.version += 1
+            return True
+
+    def remove(self, geofence_id: str) -> bool:
+        with self._lock:
+            return self._remove_locked(geofence_id)
+
+    def _remove_locked(self, geofence_id: str) -> bool:
+        entry = self._entries.pop(geofence_id, None)
+        if entry is None:
+            return False
+        self._exclusions.discard(geofence_id)
+        if entry.cells is None:
+            self._large.discard(geofence_id)
+        else:
+            for cell in entry.cells:
+                members = self._grid.get(cell)
+                if members is not None:
+                    members.discard(geofence_id)
+                    if not members:
+                        del self._grid[cell]
+        self.version += 1
+        return True
+
+    # =====================
+    # SYNC WITH THE DATABASE
+    # =====================
+
+    def sync(self, documents: List[dict]) -> Dict[str, int]:
+        """Bring the registry in line with the given documents, re-indexing only what changed"""
+        changes = {"added": 0, "updated": 0, "removed": 0}
+        with self._lock:
+            seen = set()
+            for document in documents:
+                if not isinstance(document, dict):
+                    continue
+                geofence_id = document.get("id", "unknown")
+                seen.add(geofence_id)
+                current = self._entries.get(geofence_id)
+                fingerprint = fence_fingerprint(document)
+                if current is not None and current.fingerprint == fingerprint:
+                    continue
+                if self._invalid.get(geofence_id) == fingerprint:
+                    continue
+                if self.upsert(document):
+                    self._invalid.pop(geofence_id, None)
+                    changes["updated" if current is not None else "added"] += 1
+                else:
+                    self._invalid[geofence_id] = fingerprint
+            self._invalid = {fence_id: fingerprint for fence_id, fingerprint in self._invalid.items() if fence_id in seen}
+            for geofence_id in [fence_id for fence_id in self._entries if fence_id not in seen]:
+                self._remove_locked(geofence_id)
+                changes["removed"] += 1
+            self._loaded = True
+            self._synced_at = time.monotonic()
+            self.stats_counters["syncs"] += 1
+        if any(changes.values()):
+            print(f"🗺️ Geofence registry synced: {changes} ({len(self._entries)} fences)")
+        return changes
+
+    def ensure_fresh(self) -> bool:
+        """
+        Sync with the database if never loaded or older than refresh_seconds.
+        Returns False only if no fences could ever be loaded.
+        """
+        if self._loaded and time.monotonic() - self._synced_at < self.refresh_seconds:
+            return True
+        result = firebase_service.get_collection("geofences")
+        if result.get("success"):
+            self.sync(result.get("data", []))
+            return True
+        print(f"❌ Failed to fetch geofences: {result.get('error')}")
+        if self._loaded:
+            # Keep using the fences we have and try again after the refresh interval
+            self._synced_at = time.monotonic()
+        return self._loaded
+
+    def mark_stale(self):
+        """Force a sync with the database on the next lookup"""
+        self._synced_at = 0.0
+
+    # =====================
+    # LOOKUPS
+    # =====================
+
+    def entries(self) -> List[FenceEntry]:
+        with self._lock:
+            return sorted(self._entries.values(), key=lambda entry: str(entry.id))
+
+    def get(self, geofence_id: str) -> Optional[FenceEntry]:
+        return self._entries.get(geofence_id)
+
+    def exclusion_ids(self) -> frozenset:
+        return frozenset(self._exclusions)
+
+    def ancestors(self, entry: FenceEntry) -> List[FenceEntry]:
+        """Parent fences of an entry, outermost first (missing parents and cycles end the chain)"""
+        chain = []
+        seen = {entry.id}
+        current = entry
+        while current.parent_id is not None and len(chain) < MAX_HIERARCHY_DEPTH:
+            parent = self._entries.get(current.parent_id)
+            if parent is None or parent.id in seen:
+                break
+            chain.append(parent)
+            seen.add(parent.id)
+            current = parent
+        chain.reverse()
+        return chain
+
+    def containing(self, longitude: float, latitude: float) -> List[FenceEntry]:
+        """Fences (of any zone type) that contain a point, sorted by id"""
+        near, _ = self.query(longitude, latitude, 0.0)
+        inside = []
+        for entry in near:
+            hit = entry.raster.lookup(*entry.projection.to_local(longitude, latitude)) if entry.raster is not None else None
+            if hit is not None:
+                if hit[0]:
+                    inside.append(entry)
+            elif shapely.contains_xy(entry.polygon, longitude, latitude):
+                inside.append(entry)
+        return inside
+
+    def count(self, only: Optional[Collection[str]] = None) -> int:
+        """Number of fences, or of the given ids that exist"""
+        if only is None:
+            return len(self._entries)
+        return sum(1 for fence_id in only if fence_id in self._entries)
+
+    def query(self, longitude: float, latitude: float, radius_deg: float,
+              include_far: bool = False, only: Optional[Collection[str]] = None) -> Tuple[List[FenceEntry], List[FenceEntry]]:
+        """
+        Split the fences into (near, far) for a point: near fences have a
+        bounding box within radius_deg of the point and need an exact test,
+        far fences cannot contain the point (only listed with include_far,
+        which walks all the fences).
+        With only, just those fences are considered (unknown ids are ignored).
+        Both lists are sorted by id.
+        """
+        with self._lock:
+            self.stats_counters["queries"] += 1
+            if only is not None:
+                # A handful of assigned fences: no need for the grid
+                candidates = [self._entries[fence_id] for fence_id in only if fence_id in self._entries]
+                near = [entry for entry in candidates if entry.bbox_distance(longitude, latitude) <= radius_deg]
+                far = [entry for entry in candidates if entry not in near] if include_far else []
+                self.stats_counters["exact_tests"] += len(near)
+                self.stats_counters["far_fences"] += len(candidates) - len(near)
+                near.sort(key=lambda entry: str(entry.id))
+                far.sort(key=lambda entry: str(entry.id))
+                return near, far
+
+            (x0, y0) = self._cell(longitude - radius_deg, latitude - radius_deg)
+            (x1, y1) = self._cell(longitude + radius_deg, latitude + radius_deg)
+            candidate_ids = set(self._large)
+            if (x1 - x0 + 1) * (y1 - y0 + 1) > len(self._grid):
+                # The search area covers more cells than are occupied, walk the occupied ones
+                for (cx, cy), members in self._grid.items():
+                    if x0 <= cx <= x1 and y0 <= cy <= y1:
+                        candidate_ids.update(members)
+            else:
+                for cx in range(x0, x1 + 1):
+                    for cy in range(y0, y1 + 1):
+                        members = self._grid.get((cx, cy))
+                        if members:
+                            candidate_ids.update(members)
+
+            near = []
+            for geofence_id in candidate_ids:
+                entry = self._entries[geofence_id]
+                if entry.bbox_distance(longitude, latitude) <= radius_deg:
+                    near.append(entry)
+            far = []
+            if include_far:
+                near_ids = {entry.id for entry in near}
+                far = [entry for fence_id, entry in self._entries.items() if fence_id not in near_ids]
+            self.stats_counters["exact_tests"] += len(near)
+            self.stats_counters["far_fences"] += len(self._entries) - len(near)
+
+        near.sort(key=lambda entry: str(entry.id))
+        far.sort(key=lambda entry: str(entry.id))
+        return near, far
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats_counters,
+            "fences": len(self._entries),
+            "grid_cells": len(self._grid),
+            "large_fences": len(self._large),
+            "exclusion_zones": len(self._exclusions),
+            "child_fences": sum(1 for entry in self._entries.values() if entry.parent_id is not None),
+            "rasters": sum(1 for entry in self._entries.values() if entry.raster is not None),
+            "raster": geofence_raster.stats(),
+            "far_fence_mode": FAR_FENCE_MODE,
+            "far_distance_km": FAR_FENCE_DISTANCE_KM
+        }
+
+
+# Global instance
+geofence_registry = GeofenceRegistry()
@@ -0,0 +1,280 @@
+"""
+Columnar in-memory state of the whole herd.
+
+Herd-wide endpoints used to download cattle_live_data and build a list of
+dicts on every request. The herd state keeps the latest reading of every
+animal in NumPy columns instead:
+
+- cattle ids are interned to dense row indices,
+- latitude, longitude and last_seen (epoch seconds) are float64,
+- speed, heading and acceleration x/y/z are float32,
+- is_moving is a bool, and the behavior label a uint8 code into a small
+  label table,
+
+about 45 bytes per animal. Rows are updated in place on ingest, and herd
+scans (counts, filters, the locations list) are vectorized over the columns.
+
+Readings ingested by other processes are merged in from cattle_live_data
+when the state is first used and every HERD_STATE_RESYNC_SECONDS after
+that; a row is only replaced by a stored reading that is not older.
+
+Positions are also indexed in a uniform grid (position_grid), moved on
+every row update, so radius and bounding-box queries only look at the
+animals in nearby cells.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ingest_dedup import timestamp_order
+from live_state_cache import EARTH_RADIUS_M
+from position_grid import PositionGrid
+from temp_firebase_service import temp_firebase_service as firebase_service
+
+HERD_STATE_RESYNC_SECONDS = float(os.getenv("HERD_STATE_RESYNC_SECONDS", "300"))
+HERD_STATE_ACTIVE_SECONDS = float(os.getenv("HERD_STATE_ACTIVE_SECONDS", "900"))
+INITIAL_CAPACITY = 1024
+
+UNKNOWN_BEHAVIOR = "unknown"
+
+FLOAT64_COLUMNS = ("latitude", "longitude", "last_seen")
+FLOAT32_COLUMNS = ("speed_kmh", "heading", "accel_x", "accel_y", "accel_z")
+
+
+def iso_timestamp(epoch_seconds: float) -> Optional[str]:
+    if np.isnan(epoch_seconds):
+        return None
+    return datetime.fromtimestamp(epoch_seconds, timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+class HerdState:
+    def __init__(self, capacity: int = INITIAL_CAPACITY, resync_seconds: float = HERD_STATE_RESYNC_SECONDS):
+        self.resync_seconds = resync_seconds
+        self._index: Dict[str, int] = {}
+        self._ids: List[str] = []
+        self._behaviors: List[str] = [UNKNOWN_BEHAVIOR]
+        self._behavior_codes: Dict[str, int] = {UNKNOWN_BEHAVIOR: 0}
+        self._columns: Dict[str, np.ndarray] = {}
+        self._allocate(capacity)
+        self._grid = PositionGrid()
+        self._lock = threading.RLock()
+        self._synced_at: Optional[float] = None
+        self.version = 0  # increases on every change
+        self.counters = {"updates": 0, "resyncs": 0, "rows_merged": 0}
+
+    def _allocate(self, capacity: int):
+        """Create or grow the columns to capacity rows (new rows are empty: NaN positions)"""
+        old = self._columns
+        size = len(self._ids)
+        columns = {name: np.full(capacity, np.nan, dtype=np.float64) for name in FLOAT64_COLUMNS}
+        columns.update({name: np.zeros(capacity, dtype=np.float32) for name in FLOAT32_COLUMNS})
+        columns["is_moving"] = np.zeros(capacity, dtype=bool)
+        columns["behavior"] = np.zeros(capacity, dtype=np.uint8)
+        for name, column in old.items():
+            columns[name][:size] = column[:size]
+        self._columns = columns
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _row(self, cattle_id: str) -> int:
+        row = self._index.get(cattle_id)
+        if row is None:
+            row = len(self._ids)
+            if row == len(self._columns["latitude"]):
+                self._allocate(row * 2)
+            self._index[cattle_id] = row
+            self._ids.append(cattle_id)
+        return row
+
+    def _behavior_code(self, label: Optional[str]) -> int:
+        label = label or UNKNOWN_BEHAVIOR
+        code = self._behavior_codes.get(label)
+        if code is None:
+            if len(self._behaviors) >= 255:
+                return 0
+            code = self._behavior_codes[label] = len(self._behaviors)
+            self._behaviors.append(label)
+        return code
+
+    # =====================
+    # UPDATES
+    # =====================
+
+    def _set(self, cattle_id: str, reading: Dict[str, Any], at: float):
+        row = self._row(cattle_id)
+        columns = self._columns
+        if reading.get("latitude") is not None and reading.get("longitude") is not None:
+            # A reading without a position keeps the last known one
+            columns["latitude"][row] = reading["latitude"]
+            columns["longitude"][row] = reading["longitude"]
+        columns["last_seen"][row] = at
+        columns["speed_kmh"][row] = reading.get("speed_kmh") or 0.0
+        columns["heading"][row] = reading.get("heading") or 0.0
+        acceleration = reading.get("acceleration") or {}
+        columns["accel_x"][row] = acceleration.get("x") or 0.0
+        columns["accel_y"][row] = acceleration.get("y") or 0.0
+        columns["accel_z"][row] = acceleration.get("z") or 0.0
+        columns["is_moving"][row] = bool(reading.get("is_moving", False))
+        columns["behavior"][row] = self._behavior_code((reading.get("behavior") or {}).get("current"))
+        self._grid.move(row, columns["latitude"][row], columns["longitude"][row])
+        self.version += 1
+
+    def update(self, cattle_id: str, reading: Dict[str, Any]):
+        """Store an animal's latest reading (a cattle_live_data dict) in place"""
+        at = timestamp_order(reading.get("timestamp") or "")
+        with self._lock:
+            self._set(cattle_id, reading, at if at is not None else time.time())
+            self.counters["updates"] += 1
+
+    def merge(self, live_data: Dict[str, Any]) -> int:
+        """Merge stored live data ({cattle_id: reading}), keeping rows that are newer in memory"""
+        merged = 0
+        with self._lock:
+            for cattle_id, reading in live_data.items():
+                if not isinstance(reading, dict):
+                    continue
+                at = timestamp_order(reading.get("timestamp") or "")
+                row = self._index.get(cattle_id)
+                # Equal timestamps are the reading already in memory (with its filtered position)
+                if row is not None and (at is None or self._columns["last_seen"][row] >= at):
+                    continue
+                self._set(cattle_id, reading, at if at is not None else np.nan)
+                merged += 1
+            self.counters["rows_merged"] += merged
+        return merged
+
+    def ensure_fresh(self) -> bool:
+        """Merge in cattle_live_data if never loaded or older than resync_seconds. False only if never loaded."""
+        if self._synced_at is not None and time.monotonic() - self._synced_at < self.resync_seconds:
+            return True
+        result = firebase_service.get_realtime_data("cattle_live_data")
+        if result.get("success"):
+            merged = self.merge(result.get("data") or {})
+            self.counters["resyncs"] += 1
+            if merged:
+                print(f"🐄 Herd state merged {merged} rows from storage ({len(self)} animals)")
+        else:
+            print(f"⚠️ Failed to load cattle_live_data for the herd state: {result.get('error')}")
+            if self._synced_at is None:
+                return False
+        self._synced_at = time.monotonic()
+        return True
+
+    # =====================
+    # READS
+    # =====================
+
+    def columns(self, *names: str) -> Dict[str, np.ndarray]:
+        """Copies of the filled part of some columns (all of them by default), plus "cattle_id" and "behavior_label" lookups"""
+        with self._lock:
+            size = len(self._ids)
+            view = {name: self._columns[name][:size].copy() for name in (names or self._columns)}
+            view["cattle_id"] = np.array(self._ids, dtype=object)
+            view["behavior_label"] = np.array(self._behaviors, dtype=object)
+        return view
+
+    def positions(self) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        """(cattle ids, latitudes, longitudes) of every animal with a position, for vectorized herd scans"""
+        view = self.columns("latitude", "longitude")
+        rows = (~(np.isnan(view["latitude"]) | np.isnan(view["longitude"]))).nonzero()[0]
+        return view["cattle_id"][rows].tolist(), view["latitude"][rows], view["longitude"][rows]
+
+    def _location_dicts(self, view: Dict[str, np.ndarray], rows: np.ndarray,
+                        distances: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """Location dicts of some rows of a columns() view, with distance_m when distances are given"""
+        behaviors = view["behavior_label"][view["behavior"][rows]].tolist()
+        locations = [
+            {"cattle_id": cattle_id, "latitude": latitude, "longitude": longitude,
+             "timestamp": iso_timestamp(last_seen), "behavior": behavior, "is_moving": is_moving}
+            for cattle_id, latitude, longitude, last_seen, behavior, is_moving in zip(
+                view["cattle_id"][rows].tolist(), view["latitude"][rows].tolist(), view["longitude"][rows].tolist(),
+                view["last_seen"][rows], behaviors, view["is_moving"][rows].tolist())
+        ]
+        if distances is not None:
+            for location, distance in zip(locations, distances.tolist()):
+                location["distance_m"] = round(distance, 1)
+        return locations
+
+    def locations(self) -> List[Dict[str, Any]]:
+        """Latest location of every animal with a position, as plain dicts"""
+        view = self.columns("latitude", "longitude", "last_seen", "behavior", "is_moving")
+        has_position = ~(np.isnan(view["latitude"]) | np.isnan(view["longitude"]))
+        return self._location_dicts(view, has_position.nonzero()[0])
+
+    def _candidates(self, min_latitude: float, max_latitude: float, longitude_ranges: List[Tuple[float, float]]):
+        """Grid candidates for latitude and longitude ranges, with the columns needed to filter and describe them"""
+        names = ("latitude", "longitude", "last_seen", "behavior", "is_moving")
+        with self._lock:
+            rows = np.concatenate([self._grid.rows_in(west, min_latitude, east, max_latitude)
+                                   for west, east in longitude_ranges])
+            view = {name: self._columns[name][rows] for name in names}
+            view["cattle_id"] = np.array([self._ids[row] for row in rows.tolist()], dtype=object)
+            view["behavior_label"] = np.array(self._behaviors, dtype=object)
+        return view
+
+    def in_bbox(self, min_latitude: float, min_longitude: float, max_latitude: float, max_longitude: float,
+                limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Latest locations inside a bounding box (edges included), ordered by cattle id"""
+        view = self._candidates(min_latitude, max_latitude, [(min_longitude, max_longitude)])
+        latitudes, longitudes = view["latitude"], view["longitude"]
+        inside = ((latitudes >= min_latitude) & (latitudes <= max_latitude)
+                  & (longitudes >= min_longitude) & (longitudes <= max_longitude))
+        rows = inside.nonzero()[0]
+        rows = rows[np.argsort(view["cattle_id"][rows], kind="stable")][:limit]
+        return self._location_dicts(view, rows)
+
+    def nearby(self, latitude: float, longitude: float, radius_m: float,
+               limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Latest locations within radius_m of a point, nearest first"""
+        # Bounding box of the circle on the sphere (all longitudes if it reaches a pole),
+        # split in two where it crosses the antimeridian
+        angle = radius_m / EARTH_RADIUS_M
+        half_height = np.degrees(angle)
+        ratio = np.sin(angle) / max(np.cos(np.radians(latitude)), 1e-12)
+        half_width = np.degrees(np.arcsin(ratio)) if ratio < 1 else 180.0
+        west, east = longitude - half_width, longitude + half_width
+        if half_width >= 180.0:
+            longitude_ranges = [(-180.0, 180.0)]
+        elif west < -180.0:
+            longitude_ranges = [(west + 360.0, 180.0), (-180.0, east)]
+        elif east > 180.0:
+            longitude_ranges = [(west, 180.0), (-180.0, east - 360.0)]
+        else:
+            longitude_ranges = [(west, east)]
+        view = self._candidates(latitude - half_height, latitude + half_height, longitude_ranges)
+        lat1, lon1 = np.radians(latitude), np.radians(longitude)
+        lat2, lon2 = np.radians(view["latitude"]), np.radians(view["longitude"])
+        a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+        distances = 2 * EARTH_RADIUS_M * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+        rows = (distances <= radius_m).nonzero()[0]
+        rows = rows[np.argsort(distances[rows], kind="stable")][:limit]
+        return self._location_dicts(view, rows, distances[rows])
+
+    def summary(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """Herd counts: tracked, moving, reporting recently, by behavior"""
+        now = now if now is not None else time.time()
+        view = self.columns("last_seen", "behavior", "is_moving")
+        counts = np.bincount(view["behavior"], minlength=len(view["behavior_label"]))
+        return {
+            "tracked": int(len(view["cattle_id"])),
+            "moving": int(view["is_moving"].sum()),
+            "active": int((view["last_seen"] >= now - HERD_STATE_ACTIVE_SECONDS).sum()),
+            "by_behavior": {label: int(count) for label, count in zip(view["behavior_label"].tolist(), counts) if count}
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            capacity = len(self._columns["latitude"])
+            nbytes = sum(column.nbytes for column in self._columns.values())
+        return {**self.counters, "animals": len(self), "capacity": capacity,
+                "bytes_per_animal": round(nbytes / capacity, 1), "behavior_labels": len(self._behaviors), "grid": self._grid.stats()}
+
+
+# Global instance
+herd_state = HerdState()
@@ -0,0 +1,45 @@
+"""
+HTTP caching helpers shared by the read endpoints.
+Builds strong ETags and answers If-None-Match with 304 Not Modified.
+"""
+
+import hashlib
+from typing import Optional
+from fastapi import Request, Response
+
+
+def make_etag(*parts) -> str:
+    """Build a quoted strong ETag from any number of string-able parts"""
+    digest = hashlib.sha1("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+    return f'"{digest[:20]}"'
+
+
+def etag_matches(request: Request, etag: Optional[str]) -> bool:
+    """Check the request's If-None-Match header against an ETag"""
+    if not etag:
+        return False
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in header.split(",")]
+    # Weak comparison, as recommended for If-None-Match
+    return any(tag.removeprefix("W/") == etag.removeprefix("W/") for tag in candidates)
+
+
+def storage_etag(result: dict, *parts) -> Optional[str]:
+    """
+    Build an HTTP ETag from the storage ETag carried in a service result,
+    removing it from the result so it does not leak into the response body.
+    Returns None when the storage layer did not provide one.
+    """
+    storage_tag = result.pop("etag", None)
+    if not storage_tag:
+        return None
+    return make_etag("storage", storage_tag, *parts)
+
+
+def not_modified(etag: str) -> Response:
+    """Empty 304 response carrying the current ETag"""
+    return Response(status_code=304, headers={"ETag": etag})
@@ -0,0 +1,218 @@
+"""
+Fast decode path for IoT sensor readings.
+
+The raw request body is validated straight into CattleSensorData once
+(pydantic-core parses the bytes directly, no intermediate dict). The encoded
+JSON and the plain dict views are each produced at most once and shared by
+every consumer, so the storage write sends pre-encoded bytes instead of
+re-serializing the payload.
+
+Collars may also send a compact encoding, chosen by Content-Type:
+- application/json                          verbose JSON (the original format)
+- application/vnd.liwena.sensor+json        short-key JSON (see SHORT_KEYS)
+- application/msgpack, application/cbor     binary, with short or verbose keys
+All of them decode into the same CattleSensorData.
+"""
+
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional wire format
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:  # pragma: no cover - optional wire format
+    cbor2 = None
+
+from models import CattleSensorData
+
+
+class DecodedReading:
+    __slots__ = ("model", "_dict", "_json")
+
+    def __init__(self, model: CattleSensorData):
+        self.model = model
+        self._dict: Optional[Dict[str, Any]] = None
+        self._json: Optional[bytes] = None
+
+    @property
+    def cattle_id(self) -> str:
+        return self.model.cattle_id
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Plain dict view, built once"""
+        if self._dict is None:
+            self._dict = self.model.model_dump()
+        return self._dict
+
+    def as_json(self) -> bytes:
+        """Canonical JSON encoding, built once and reused for storage writes"""
+        if self._json is None:
+            self._json = self.model.__pydantic_serializer__.to_json(self.model)
+        return self._json
+
+    def replace(self, **fields) -> "DecodedReading":
+        """Copy of this reading with some fields changed (cached encodings are rebuilt lazily)"""
+        return DecodedReading(self.model.model_copy(update=fields))
+
+
+def decode_sensor_reading(raw: bytes) -> DecodedReading:
+    """
+    Validate a raw JSON request body into a DecodedReading.
+    Raises ValidationError for invalid payloads. Any other failure of the fast
+    path falls back to the stdlib json + model_validate route.
+    """
+    try:
+        return DecodedReading(CattleSensorData.model_validate_json(raw))
+    except ValidationError:
+        raise
+    except Exception as e:
+        print(f"⚠️ Fast decode failed ({type(e).__name__}: {e}), using fallback parser")
+        return DecodedReading(CattleSensorData.model_validate(json.loads(raw)))
+
+
+# =====================
+# COMPACT WIRE FORMATS
+# =====================
+
+SENSOR_SCHEMA_VERSION = 1
+SCHEMA_VERSION_HEADER = "X-Sensor-Schema-Version"
+
+SHORT_JSON_MEDIA_TYPE = "application/vnd.liwena.sensor+json"
+MSGPACK_MEDIA_TYPES = {"application/msgpack", "application/x-msgpack", "application/vnd.msgpack"}
+CBOR_MEDIA_TYPE = "application/cbor"
+
+# Short key -> (field name, nested short keys) for schema version 1
+SHORT_KEYS: Dict[str, Tuple[str, Optional[Dict[str, str]]]] = {
+    "i": ("cattle_id", None),
+    "t": ("timestamp", None),
+    "la": ("latitude", None),
+    "lo": ("longitude", None),
+    "f": ("gps_fix", None),
+    "s": ("speed_kmh", None),
+    "h": ("heading", None),
+    "m": ("is_moving", None),
+    "a": ("acceleration", {"x": "x", "y": "y", "z": "z"}),
+    "b": ("behavior", {"c": "current", "p": "previous", "d": "duration_seconds", "k": "confidence"}),
+    "ac": ("activity", {"at": "total_active_time_seconds", "rt": "total_rest_time_seconds",
+                        "st": "daily_steps", "dk": "daily_distance_km"}),
+}
+
+
+class UnsupportedEncodingError(Exception):
+    """The Content-Type or schema version of a sensor payload is not supported"""
+
+
+def expand_short_keys(item: Any) -> Any:
+    """
+    Expand a short-key reading into the verbose field names. Verbose keys are
+    passed through, acceleration may be an [x, y, z] array and the timestamp
+    may be epoch seconds.
+    """
+    if not isinstance(item, dict):
+        return item
+    expanded = {}
+    for key, value in item.items():
+        field, nested = SHORT_KEYS.get(key, (key, None))
+        if field == "acceleration" and isinstance(value, (list, tuple)) and len(value) == 3:
+            value = dict(zip(("x", "y", "z"), value))
+        elif nested and isinstance(value, dict):
+            value = {nested.get(k, k): v for k, v in value.items()}
+        elif field == "timestamp" and isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = datetime.fromtimestamp(value, tz=timezone.utc).isoformat().replace("+00:00", "Z")
+        expanded[field] = value
+    return expanded
+
+
+def parse_content_type(content_type: Optional[str]) -> Tuple[str, Dict[str, str]]:
+    """Split a Content-Type header into its media type and parameters"""
+    parts = [part.strip() for part in (content_type or "application/json").split(";")]
+    params = {}
+    for part in parts[1:]:
+        if "=" in part:
+            name, value = part.split("=", 1)
+            params[name.strip().lower()] = value.strip().strip('"')
+    return parts[0].lower() or "application/json", params
+
+
+def _load_payload(raw: bytes, media_type: str) -> Any:
+    if media_type == SHORT_JSON_MEDIA_TYPE:
+        return json.loads(raw)
+    if media_type in MSGPACK_MEDIA_TYPES:
+        if msgpack is None:
+            raise UnsupportedEncodingError("MessagePack support is not installed on this server")
+        return msgpack.unpackb(raw, raw=False)
+    if media_type == CBOR_MEDIA_TYPE:
+        if cbor2 is None:
+            raise UnsupportedEncodingError("CBOR support is not installed on this server")
+        return cbor2.loads(raw)
+    raise UnsupportedEncodingError(f"Unsupported sensor payload Content-Type: {media_type}")
+
+
+def _check_schema_version(params: Dict[str, str], schema_version: Optional[str]):
+    version = params.get("v") or params.get("version") or schema_version
+    if version is not None and str(version) != str(SENSOR_SCHEMA_VERSION):
+        raise UnsupportedEncodingError(
+            f"Unsupported sensor schema version {version} (server speaks {SENSOR_SCHEMA_VERSION})")
+
+
+def decode_sensor_payload(raw: bytes, content_type: Optional[str] = None,
+                          schema_version: Optional[str] = None) -> DecodedReading:
+    """Decode one reading in any supported encoding"""
+    media_type, params = parse_content_type(content_type)
+    _check_schema_version(params, schema_version)
+    if media_type in ("application/json", "text/plain", "*/*"):
+        return decode_sensor_reading(raw)
+    item = _load_payload(raw, media_type)
+    return DecodedReading(CattleSensorData.model_validate(expand_short_keys(item)))
+
+
+def decode_sensor_batch(raw: bytes, content_type: Optional[str] = None,
+                        schema_version: Optional[str] = None) -> List[Any]:
+    """
+    Decode a batch (a list of readings, or {"readings": [...]}) in any
+    supported encoding. Returns one DecodedReading or ValidationError per item,
+    so a single bad reading does not reject the whole upload.
+    """
+    media_type, params = parse_content_type(content_type)
+    _check_schema_version(params, schema_version)
+    if media_type in ("application/json", "text/plain", "*/*"):
+        payload = json.loads(raw)
+    else:
+        payload = _load_payload(raw, media_type)
+    if isinstance(payload, dict):
+        payload = payload.get("readings", payload.get("r"))
+    if not isinstance(payload, list):
+        raise ValueError("Batch body must be a list of readings or {\"readings\": [...]}")
+
+    decoded = []
+    for item in payload:
+        try:
+            decoded.append(DecodedReading(CattleSensorData.model_validate(expand_short_keys(item))))
+        except ValidationError as e:
+            decoded.append(e)
+    return decoded
+
+
+def inline_json_schema(model) -> Dict[str, Any]:
+    """JSON schema for a model with $defs references inlined (for openapi_extra)"""
+    schema = model.model_json_schema()
+    definitions = schema.pop("$defs", {})
+
+    def resolve(node):
+        if isinstance(node, dict):
+            ref = node.get("$ref")
+            if ref and ref.startswith("#/$defs/"):
+                return resolve(definitions[ref.split("/")[-1]])
+            return {key: resolve(value) for key, value in node.items()}
+        if isinstance(node, list):
+            return [resolve(item) for item in node]
+        return node
+
+    return resolve(schema)
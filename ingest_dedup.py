@@ -0,0 +1,138 @@
+"""
+Duplicate and replay suppression for sensor ingest.
+
+Collars retry on timeouts and re-send buffered readings, so the same reading
+(same cattle_id + timestamp) can arrive several times. Each animal keeps a
+bounded window of recently processed timestamps with their results; a repeat
+gets the original result back without touching storage, geofences or alerts.
+Timestamps are compared as instants, so a retry that spells the same time
+differently ("Z" or "+00:00", more or fewer fractional digits) is a repeat.
+
+Requests may also carry an Idempotency-Key header; the response for a key is
+kept for IDEMPOTENCY_TTL_SECONDS and replayed for retries of that request.
+
+A reading older than the newest one already processed for the animal is out
+of order: it must not overwrite the live state written by the newer reading.
+
+The windows are kept in memory per process.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+DEDUP_WINDOW_SIZE = int(os.getenv("INGEST_DEDUP_WINDOW", "32"))
+IDEMPOTENCY_CAPACITY = int(os.getenv("INGEST_IDEMPOTENCY_CAPACITY", "4096"))
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("INGEST_IDEMPOTENCY_TTL_SECONDS", "3600"))
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+
+
+def timestamp_order(timestamp: str) -> Optional[float]:
+    """Epoch seconds for an ISO 8601 reading timestamp (None if it cannot be parsed)"""
+    try:
+        parsed = datetime.fromisoformat(timestamp.strip().replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def dedup_key(timestamp: str):
+    """Window key of a reading timestamp: its instant, or the raw string if it cannot be parsed"""
+    order = timestamp_order(timestamp)
+    return order if order is not None else timestamp
+
+
+class IngestDeduplicator:
+    def __init__(self, window_size: int = DEDUP_WINDOW_SIZE, idempotency_capacity: int = IDEMPOTENCY_CAPACITY,
+                 idempotency_ttl: float = IDEMPOTENCY_TTL_SECONDS):
+        self.window_size = window_size
+        self.idempotency_capacity = idempotency_capacity
+        self.idempotency_ttl = idempotency_ttl
+        self._lock = threading.Lock()
+        self._seen: Dict[str, "OrderedDict[Any, dict]"] = {}  # cattle_id -> dedup_key(timestamp) -> result
+        self._latest: Dict[str, Tuple[float, str]] = {}  # cattle_id -> (order, timestamp)
+        self._keys: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()  # key -> (expires_at, response)
+        self.duplicates = 0
+        self.out_of_order = 0
+        self.replays = 0
+
+    # =====================
+    # PER-ANIMAL READING WINDOW
+    # =====================
+
+    def lookup(self, cattle_id: str, timestamp: str) -> Optional[dict]:
+        """Result of an already processed reading, or None"""
+        with self._lock:
+            result = self._seen.get(cattle_id, {}).get(dedup_key(timestamp))
+            if result is not None:
+                self.duplicates += 1
+            return result
+
+    def latest_timestamp(self, cattle_id: str, timestamp: str) -> Optional[str]:
+        """
+        The newest timestamp processed for the animal if this reading is older
+        than it (out of order), otherwise None.
+        """
+        order = timestamp_order(timestamp)
+        with self._lock:
+            latest = self._latest.get(cattle_id)
+            if order is None or latest is None or order >= latest[0]:
+                return None
+            self.out_of_order += 1
+            return latest[1]
+
+    def remember(self, cattle_id: str, timestamp: str, result: dict):
+        """Record a processed reading and its result"""
+        order = timestamp_order(timestamp)
+        key = order if order is not None else timestamp
+        with self._lock:
+            window = self._seen.setdefault(cattle_id, OrderedDict())
+            window[key] = result
+            window.move_to_end(key)
+            while len(window) > self.window_size:
+                window.popitem(last=False)
+            latest = self._latest.get(cattle_id)
+            if order is not None and (latest is None or order > latest[0]):
+                self._latest[cattle_id] = (order, timestamp)
+
+    # =====================
+    # IDEMPOTENCY KEYS
+    # =====================
+
+    def replay(self, key: str) -> Optional[Any]:
+        """Stored response for an Idempotency-Key, or None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._keys.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= now:
+                del self._keys[key]
+                return None
+            self.replays += 1
+            return entry[1]
+
+    def remember_key(self, key: str, response: Any):
+        with self._lock:
+            self._keys[key] = (time.monotonic() + self.idempotency_ttl, response)
+            self._keys.move_to_end(key)
+            while len(self._keys) > self.idempotency_capacity:
+                self._keys.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "duplicates": self.duplicates,
+            "out_of_order": self.out_of_order,
+            "idempotent_replays": self.replays,
+            "tracked_animals": len(self._seen),
+            "idempotency_keys": len(self._keys)
+        }
+
+
+# Global instance
+ingest_dedup = IngestDeduplicator()
@@ -0,0 +1,218 @@
+"""
+Last known state per animal, used for change detection on ingest.
+
+Most readings from a resting herd repeat the previous one apart from the
+timestamp and sensor noise. Comparing each reading with the cached last
+state lets the ingest path:
+- skip geofence evaluation while the animal stays within GPS noise of the
+  position it was last evaluated at (and was inside all its fences),
+- write only the fields that changed, as a patch,
+- drop heartbeat-only writes (nothing but timestamps and noise changed)
+  until HEARTBEAT_MIN_INTERVAL_SECONDS have passed since the last write.
+
+The cache is per process and starts empty; the first reading from each
+animal after a restart is written in full.
+"""
+
+import math
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+STATIONARY_THRESHOLD_M = float(os.getenv("INGEST_STATIONARY_THRESHOLD_M", "5"))
+HEARTBEAT_MIN_INTERVAL_SECONDS = float(os.getenv("INGEST_HEARTBEAT_MIN_INTERVAL_SECONDS", "300"))
+GEOFENCE_RESULT_MAX_AGE_SECONDS = float(os.getenv("INGEST_GEOFENCE_RESULT_MAX_AGE_SECONDS", "300"))
+
+EARTH_RADIUS_M = 6371008.8
+
+WRITE_FULL = "full"
+WRITE_PATCH = "patch"
+WRITE_SKIP = "skip"
+
+
+def distance_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle (haversine) distance in meters"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def changed_fields(previous: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Any]:
+    """Top-level fields of current that differ from previous"""
+    return {key: value for key, value in current.items() if previous.get(key) != value}
+
+
+class LiveState:
+    __slots__ = ("reading", "live", "live_written_at", "position", "cattle", "cattle_written_at",
+                 "evaluated_position", "geofence_result", "evaluated_at", "fence_generation")
+
+    def __init__(self):
+        self.reading: Optional[Dict[str, Any]] = None  # last processed reading
+        self.live: Optional[Dict[str, Any]] = None  # cattle_live_data as last written
+        self.live_written_at = 0.0
+        self.position: Optional[Tuple[float, float]] = None  # (lat, lon) when live data was last written
+        self.cattle: Optional[Dict[str, Any]] = None  # cattle document fields as last written
+        self.cattle_written_at = 0.0
+        self.evaluated_position: Optional[Tuple[float, float]] = None
+        self.geofence_result: Optional[dict] = None
+        self.evaluated_at = 0.0
+        self.fence_generation = -1
+
+
+class LiveStateCache:
+    def __init__(self, stationary_threshold_m: float = STATIONARY_THRESHOLD_M,
+                 heartbeat_interval: float = HEARTBEAT_MIN_INTERVAL_SECONDS,
+                 geofence_max_age: float = GEOFENCE_RESULT_MAX_AGE_SECONDS):
+        self.stationary_threshold_m = stationary_threshold_m
+        self.heartbeat_interval = heartbeat_interval
+        self.geofence_max_age = geofence_max_age
+        self._states: Dict[str, LiveState] = {}
+        self._lock = threading.Lock()
+        self._fence_generation = 0
+        self.stats_counters = {
+            "live_full": 0, "live_patch": 0, "live_skipped": 0,
+            "cattle_patch": 0, "cattle_skipped": 0,
+            "geofence_evaluated": 0, "geofence_cached": 0
+        }
+
+    def _state(self, cattle_id: str) -> LiveState:
+        with self._lock:
+            state = self._states.get(cattle_id)
+            if state is None:
+                state = self._states[cattle_id] = LiveState()
+            return state
+
+    def previous_reading(self, cattle_id: str) -> Optional[Dict[str, Any]]:
+        state = self._states.get(cattle_id)
+        return state.reading if state else None
+
+    def is_stationary(self, cattle_id: str, latitude: float, longitude: float, is_moving: bool) -> bool:
+        """
+        Not moving and within GPS noise of the last stored position (compared
+        with what was written, so slow drift still gets written eventually).
+        """
+        state = self._states.get(cattle_id)
+        if is_moving or state is None:
+            return False
+        reference = state.position
+        if reference is None and state.reading and state.reading.get("latitude") is not None:
+            reference = (state.reading["latitude"], state.reading["longitude"])
+        if reference is None:
+            return False
+        return distance_m(*reference, latitude, longitude) < self.stationary_threshold_m
+
+    # =====================
+    # WRITES
+    # =====================
+
+    def plan_write(self, previous: Optional[Dict[str, Any]], written_at: float, current: Dict[str, Any],
+                   significant: bool, now: Optional[float] = None) -> Tuple[str, Dict[str, Any]]:
+        """
+        Decide how to store current given the last written version.
+        Returns (WRITE_FULL | WRITE_PATCH | WRITE_SKIP, fields to write).
+        """
+        now = time.monotonic() if now is None else now
+        if previous is None:
+            return WRITE_FULL, current
+        changes = changed_fields(previous, current)
+        if not changes:
+            return WRITE_SKIP, {}
+        if not significant and now - written_at < self.heartbeat_interval:
+            return WRITE_SKIP, {}
+        return WRITE_PATCH, changes
+
+    def plan_live_write(self, cattle_id: str, live: Dict[str, Any], stationary: bool) -> Tuple[str, Dict[str, Any]]:
+        state = self._states.get(cattle_id)
+        previous = state.live if state else None
+        significant = not stationary or previous is None or any(
+            previous.get(key) != live.get(key) for key in ("gps_fix", "is_moving")
+        ) or (previous.get("behavior") or {}).get("current") != (live.get("behavior") or {}).get("current")
+        mode, fields = self.plan_write(previous, state.live_written_at if state else 0.0, live, significant)
+        self._count("live", mode)
+        return mode, fields
+
+    def plan_cattle_write(self, cattle_id: str, fields: Dict[str, Any], stationary: bool) -> Tuple[str, Dict[str, Any]]:
+        state = self._states.get(cattle_id)
+        previous = state.cattle if state else None
+        significant = not stationary or previous is None or previous.get("status") != fields.get("status")
+        mode, changes = self.plan_write(previous, state.cattle_written_at if state else 0.0, fields, significant)
+        # The cattle document is always patched, so a first write is a patch of every field
+        if mode == WRITE_FULL:
+            mode = WRITE_PATCH
+        self._count("cattle", mode)
+        return mode, changes
+
+    def _count(self, target: str, mode: str):
+        name = f"{target}_skipped" if mode == WRITE_SKIP else f"{target}_{mode}"
+        self.stats_counters[name] = self.stats_counters.get(name, 0) + 1
+
+    def record_reading(self, cattle_id: str, reading: Dict[str, Any]):
+        self._state(cattle_id).reading = reading
+
+    def record_live_write(self, cattle_id: str, live: Dict[str, Any],
+                          position: Optional[Tuple[float, float]] = None):
+        """position is the (filtered) position the write stands for, defaults to the live data's own"""
+        state = self._state(cattle_id)
+        state.live = live
+        state.live_written_at = time.monotonic()
+        state.position = position or (live["latitude"], live["longitude"])
+
+    def record_cattle_write(self, cattle_id: str, fields: Dict[str, Any]):
+        state = self._state(cattle_id)
+        state.cattle = {**(state.cattle or {}), **fields}
+        state.cattle_written_at = time.monotonic()
+
+    # =====================
+    # GEOFENCE RESULTS
+    # =====================
+
+    def cached_geofence_result(self, cattle_id: str, latitude: float, longitude: float,
+                               is_moving: bool) -> Optional[dict]:
+        """
+        Previous geofence result if the animal is stationary near the position
+        it was evaluated at, was inside all its fences, and no fence changed since.
+        """
+        state = self._states.get(cattle_id)
+        if is_moving or state is None or state.geofence_result is None or state.evaluated_position is None:
+            return None
+        if state.fence_generation != self._fence_generation:
+            return None
+        if time.monotonic() - state.evaluated_at >= self.geofence_max_age:
+            return None
+        if state.geofence_result.get("total_breaches", 0) > 0:
+            return None
+        if distance_m(*state.evaluated_position, latitude, longitude) >= self.stationary_threshold_m:
+            return None
+        self.stats_counters["geofence_cached"] += 1
+        return {**state.geofence_result, "alerts": [], "cached": True}
+
+    def held_geofence_result(self, cattle_id: str) -> Optional[dict]:
+        """Last geofence result, for readings without a usable position of their own"""
+        state = self._states.get(cattle_id)
+        if state is None or state.geofence_result is None:
+            return None
+        return {**state.geofence_result, "alerts": [], "cached": True}
+
+    def record_geofence_result(self, cattle_id: str, latitude: float, longitude: float, result: dict):
+        self.stats_counters["geofence_evaluated"] += 1
+        if not result.get("success"):
+            return
+        state = self._state(cattle_id)
+        state.evaluated_position = (latitude, longitude)
+        state.geofence_result = result
+        state.evaluated_at = time.monotonic()
+        state.fence_generation = self._fence_generation
+
+    def invalidate_geofence_results(self):
+        """Force re-evaluation for every animal (call after fences change)"""
+        self._fence_generation += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {**self.stats_counters, "tracked_animals": len(self._states)}
+
+
+# Global instance
+live_state_cache = LiveStateCache()
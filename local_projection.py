@@ -0,0 +1,60 @@
+"""
+Local metric projections for distance calculations.
+
+Fence polygons are stored in degrees, and a degree of longitude is only
+cos(latitude) times as long as a degree of latitude (~3.5% shorter at
+-15°), so distances measured in degrees and multiplied by a constant are
+wrong in one direction. Each fence is therefore projected once, at
+registration, into an equirectangular system centered on its centroid:
+
+    x = (lon - lon0) * cos(lat0) * METERS_PER_DEGREE
+    y = (lat - lat0) * METERS_PER_DEGREE
+
+Within a few tens of kilometers of the center the error is well below GPS
+noise. Points are transformed with the same formula (scalars or NumPy
+arrays), and distances are then plain planar distances in meters.
+"""
+
+import math
+from typing import Tuple
+
+import numpy as np
+import shapely
+from shapely.geometry.base import BaseGeometry
+
+METERS_PER_DEGREE = 111320.0
+
+
+class LocalProjection:
+    __slots__ = ("origin_lon", "origin_lat", "kx", "ky")
+
+    def __init__(self, origin_lon: float, origin_lat: float):
+        self.origin_lon = origin_lon
+        self.origin_lat = origin_lat
+        self.kx = math.cos(math.radians(origin_lat)) * METERS_PER_DEGREE
+        self.ky = METERS_PER_DEGREE
+
+    @classmethod
+    def around(cls, geometry: BaseGeometry) -> "LocalProjection":
+        """Projection centered on a geometry's centroid"""
+        center = geometry.centroid
+        return cls(center.x, center.y)
+
+    def to_local(self, longitude: float, latitude: float) -> Tuple[float, float]:
+        return (longitude - self.origin_lon) * self.kx, (latitude - self.origin_lat) * self.ky
+
+    def to_local_arrays(self, longitudes, latitudes) -> Tuple[np.ndarray, np.ndarray]:
+        return ((np.asarray(longitudes, dtype=float) - self.origin_lon) * self.kx,
+                (np.asarray(latitudes, dtype=float) - self.origin_lat) * self.ky)
+
+    def to_lonlat(self, x: float, y: float) -> Tuple[float, float]:
+        return self.origin_lon + x / self.kx, self.origin_lat + y / self.ky
+
+    def project(self, geometry: BaseGeometry) -> BaseGeometry:
+        """The geometry in local meters"""
+        return shapely.transform(geometry, lambda coords: np.column_stack(self.to_local_arrays(coords[:, 0], coords[:, 1])))
+
+    def unproject(self, geometry: BaseGeometry) -> BaseGeometry:
+        """A geometry in local meters back in degrees"""
+        return shapely.transform(geometry, lambda coords: np.column_stack(
+            (self.origin_lon + coords[:, 0] / self.kx, self.origin_lat + coords[:, 1] / self.ky)))
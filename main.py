@@ -1,8 +1,15 @@
+import asyncio
+import os
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 
 # Import routers
-from routers import auth, staff, alerts, geofence, cattle, dashboard
+from routers import auth, staff, alerts, geofence, cattle, dashboard, metrics
+from dashboard_summary import dashboard_summary, RECONCILE_INTERVAL_SECONDS
+from position_history import position_history
+from fence_occupancy import fence_occupancy, OCCUPANCY_RECONCILE_SECONDS
+from fence_reevaluation import fence_reevaluations
 
 # Single FastAPI app instance
 app = FastAPI(title="Cattle Monitor API", description="FastAPI backend for cattle monitoring system with Firebase integration")
@@ -16,6 +23,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Gzip responses above a size threshold
+COMPRESSION_MINIMUM_SIZE = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "1024"))
+app.add_middleware(GZipMiddleware, minimum_size=COMPRESSION_MINIMUM_SIZE)
+
 # Include routers
 app.include_router(auth.router)
 app.include_router(staff.router)
@@ -23,6 +34,41 @@ app.include_router(alerts.router)
 app.include_router(geofence.router, prefix="/geofence")
 app.include_router(cattle.router)
 app.include_router(dashboard.router)
+app.include_router(metrics.router)
+
+async def reconcile_dashboard_summary_periodically():
+    """Periodically recount the dashboard summary to correct drift"""
+    while True:
+        try:
+            await asyncio.to_thread(dashboard_summary.reconcile)
+        except Exception as e:
+            print(f"⚠️ Dashboard summary reconciliation failed: {str(e)}")
+        await asyncio.sleep(RECONCILE_INTERVAL_SECONDS)
+
+async def reconcile_fence_occupancy_periodically():
+    """Periodically recount per-fence occupancy to correct drift"""
+    while True:
+        await asyncio.sleep(OCCUPANCY_RECONCILE_SECONDS)
+        try:
+            await asyncio.to_thread(fence_occupancy.reconcile)
+        except Exception as e:
+            print(f"⚠️ Fence occupancy reconciliation failed: {str(e)}")
+
+@app.on_event("startup")
+async def start_background_tasks():
+    app.state.background_tasks = [
+        asyncio.create_task(reconcile_dashboard_summary_periodically()),
+        asyncio.create_task(reconcile_fence_occupancy_periodically()),
+        asyncio.create_task(asyncio.to_thread(staff.backfill_staff_search_keys))
+    ]
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    for task in getattr(app.state, "background_tasks", []):
+        task.cancel()
+    # Positions still buffered for the history would be lost otherwise
+    await asyncio.to_thread(position_history.flush)
+    await asyncio.to_thread(fence_reevaluations.shutdown)
 
 @app.get("/")
 def read_root():
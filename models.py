@@ -102,18 +102,79 @@ class CattleLiveData(CattleSensorData):
     """
     id: str
 
+class ReportingPolicy(BaseModel):
+    """
+    Policy used to compute the next reporting interval returned to collars.
+    Intervals are in seconds, fence distances in km.
+    """
+    min_interval_seconds: int = 15
+    max_interval_seconds: int = 300
+    default_interval_seconds: int = 60
+    behavior_intervals: Dict[str, int] = {
+        "resting": 300,
+        "lying": 300,
+        "ruminating": 240,
+        "grazing": 90,
+        "walking": 30,
+        "running": 15
+    }
+    moving_interval_seconds: int = 30
+    fast_speed_kmh: float = 6.0
+    fence_near_km: float = 0.1
+    fence_far_km: float = 1.0
+    high_load_readings_per_second: float = 50.0
+    load_backoff_factor: float = 2.0
+
+class ReportingPolicyUpdate(BaseModel):
+    min_interval_seconds: Optional[int] = None
+    max_interval_seconds: Optional[int] = None
+    default_interval_seconds: Optional[int] = None
+    behavior_intervals: Optional[Dict[str, int]] = None
+    moving_interval_seconds: Optional[int] = None
+    fast_speed_kmh: Optional[float] = None
+    fence_near_km: Optional[float] = None
+    fence_far_km: Optional[float] = None
+    high_load_readings_per_second: Optional[float] = None
+    load_backoff_factor: Optional[float] = None
+
 # =================================================
 
 # Geofence models
 from typing import List
+class GeofencePart(BaseModel):
+    coordinates: List[List[float]]  # [[lng, lat], ...] outer ring
+    holes: Optional[List[List[List[float]]]] = None
+
 class Geofence(BaseModel):
     id: str
     name: str
     coordinates: List[List[float]]  # [[lng, lat], ...] polygon
+    holes: Optional[List[List[List[float]]]] = None  # inner rings cut out of the polygon
+    parts: Optional[List[GeofencePart]] = None  # further polygons of a multi-part fence
+    zone_type: str = "inclusion"  # "inclusion": stay inside, "exclusion": stay out
+    parent_id: Optional[str] = None  # enclosing fence, e.g. the farm of a paddock
 
 class GeofenceCreate(BaseModel):
     name: str
     coordinates: List[List[float]]
+    holes: Optional[List[List[List[float]]]] = None
+    parts: Optional[List[GeofencePart]] = None
+    zone_type: str = "inclusion"
+    parent_id: Optional[str] = None
+
+# Which fences an animal (or a herd group) belongs to, see geofence_assignments.py
+class GeofenceAssignmentCreate(BaseModel):
+    geofence_ids: List[str]
+    mode: str = "any"  # "any": inside at least one fence, "all": inside every fence
+    cattle_ids: Optional[List[str]] = None  # group members (group assignments only)
+
+# Re-evaluation of stored position history against a fence version, see fence_reevaluation.py
+class FenceReevaluationCreate(BaseModel):
+    start_time: str  # ISO timestamps (UTC when no offset is given)
+    end_time: Optional[str] = None  # default: now
+    geofence: Optional[GeofenceCreate] = None  # the new or edited shape (default: the current version of geofence_id)
+    geofence_id: Optional[str] = None  # the fence being edited; its current version is the baseline
+    cattle_ids: Optional[List[str]] = None  # default: every animal with stored history
 
 # Cattle location update model
 class CattleLocationUpdate(BaseModel):
@@ -0,0 +1,213 @@
+"""
+GPS quality gating and per-animal position smoothing.
+
+Each animal gets a streaming constant-velocity Kalman filter, run in local
+meters around the animal's first fix (east and north are filtered
+independently, so the filter is a pair of two-state filters). For every
+reading:
+- no fix (gps_fix false, or an impossible coordinate such as 0,0) holds the
+  last filtered position,
+- a position that would need a physically impossible speed since the last
+  accepted one is rejected and the last position is held; after
+  RESET_AFTER_REJECTS consecutive rejections the filter restarts at the new
+  position (the animal really is somewhere else),
+- otherwise the measurement updates the filter and the smoothed position is
+  returned. While the collar's accelerometer says the animal is not moving,
+  the velocity is held at zero and the position only drifts slowly, so GPS
+  jitter of a resting animal is averaged out instead of followed.
+
+The filtered position is what geofence evaluation and behavior analysis
+see; the raw reading is still stored as received.
+"""
+
+import math
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from ingest_dedup import timestamp_order
+
+GPS_NOISE_M = float(os.getenv("GPS_NOISE_M", "5"))
+GPS_ACCEL_NOISE = float(os.getenv("GPS_ACCEL_NOISE", "0.5"))  # m/s^2, how quickly an animal changes speed
+MAX_SPEED_MS = float(os.getenv("GPS_MAX_SPEED_MS", "15"))  # ~54 km/h, faster than any cattle
+JUMP_ALLOWANCE_M = float(os.getenv("GPS_JUMP_ALLOWANCE_M", "30"))
+RESET_AFTER_REJECTS = int(os.getenv("GPS_RESET_AFTER_REJECTS", "3"))
+STILL_DRIFT_M = float(os.getenv("GPS_STILL_DRIFT_M", "1"))  # position drift allowed per reading while not moving
+
+METERS_PER_DEGREE = 111320.0
+
+QUALITY_FILTERED = "filtered"
+QUALITY_INITIAL = "initial"
+QUALITY_NO_FIX = "no_fix"
+QUALITY_REJECTED = "rejected_jump"
+QUALITY_RESET = "reset"
+
+
+class FilteredPosition:
+    __slots__ = ("latitude", "longitude", "speed_kmh", "quality")
+
+    def __init__(self, latitude: Optional[float], longitude: Optional[float], speed_kmh: float, quality: str):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.speed_kmh = speed_kmh
+        self.quality = quality
+
+    @property
+    def available(self) -> bool:
+        """A position is known (possibly held from an earlier fix)"""
+        return self.latitude is not None
+
+    @property
+    def measured(self) -> bool:
+        """The position comes from this reading's own fix"""
+        return self.quality in (QUALITY_FILTERED, QUALITY_INITIAL, QUALITY_RESET)
+
+    def as_dict(self) -> dict:
+        return {"latitude": self.latitude, "longitude": self.longitude,
+                "speed_kmh": round(self.speed_kmh, 2), "quality": self.quality}
+
+
+class _AxisFilter:
+    """Two-state (position, velocity) Kalman filter for one axis"""
+    __slots__ = ("p", "v", "p00", "p01", "p11")
+
+    def __init__(self, position: float, noise: float):
+        self.p = position
+        self.v = 0.0
+        self.p00 = noise * noise
+        self.p01 = 0.0
+        self.p11 = 1.0  # (m/s)^2, cattle at rest or walking
+
+    def predict(self, dt: float, accel_noise: float):
+        q = accel_noise * accel_noise
+        self.p += self.v * dt
+        self.p00 += 2 * dt * self.p01 + dt * dt * self.p11 + q * dt ** 4 / 4
+        self.p01 += dt * self.p11 + q * dt ** 3 / 2
+        self.p11 += q * dt * dt
+
+    def hold_still(self, drift: float):
+        """Zero-velocity step: the animal is not moving, only allow a small position drift"""
+        self.v = 0.0
+        self.p01 = 0.0
+        self.p11 = min(self.p11, 0.01)
+        self.p00 += drift * drift
+
+    def update(self, measurement: float, noise: float):
+        s = self.p00 + noise * noise
+        k0 = self.p00 / s
+        k1 = self.p01 / s
+        residual = measurement - self.p
+        self.p += k0 * residual
+        self.v += k1 * residual
+        self.p11 -= k1 * self.p01
+        self.p00 *= 1 - k0
+        self.p01 *= 1 - k0
+
+
+class _AnimalTrack:
+    __slots__ = ("origin_lat", "origin_lon", "cos_lat", "east", "north", "last_time", "rejects")
+
+    def __init__(self, latitude: float, longitude: float, at: float, noise: float):
+        self.origin_lat = latitude
+        self.origin_lon = longitude
+        self.cos_lat = math.cos(math.radians(latitude))
+        self.east = _AxisFilter(0.0, noise)
+        self.north = _AxisFilter(0.0, noise)
+        self.last_time = at
+        self.rejects = 0
+
+    def to_local(self, latitude: float, longitude: float):
+        return ((longitude - self.origin_lon) * self.cos_lat * METERS_PER_DEGREE,
+                (latitude - self.origin_lat) * METERS_PER_DEGREE)
+
+    def position(self) -> FilteredPosition:
+        latitude = self.origin_lat + self.north.p / METERS_PER_DEGREE
+        longitude = self.origin_lon + self.east.p / (self.cos_lat * METERS_PER_DEGREE)
+        return FilteredPosition(latitude, longitude, self.speed_ms() * 3.6, QUALITY_FILTERED)
+
+    def speed_ms(self) -> float:
+        return math.hypot(self.east.v, self.north.v)
+
+
+def valid_coordinate(latitude: float, longitude: float) -> bool:
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return False
+    # Many GPS modules report 0,0 before their first fix
+    return not (latitude == 0 and longitude == 0)
+
+
+class PositionFilter:
+    def __init__(self, noise_m: float = GPS_NOISE_M, accel_noise: float = GPS_ACCEL_NOISE,
+                 max_speed_ms: float = MAX_SPEED_MS, jump_allowance_m: float = JUMP_ALLOWANCE_M,
+                 reset_after_rejects: int = RESET_AFTER_REJECTS, still_drift_m: float = STILL_DRIFT_M):
+        self.noise_m = noise_m
+        self.accel_noise = accel_noise
+        self.max_speed_ms = max_speed_ms
+        self.jump_allowance_m = jump_allowance_m
+        self.reset_after_rejects = reset_after_rejects
+        self.still_drift_m = still_drift_m
+        self._tracks: Dict[str, _AnimalTrack] = {}
+        self._lock = threading.Lock()
+        self.counters = {QUALITY_FILTERED: 0, QUALITY_INITIAL: 0, QUALITY_NO_FIX: 0,
+                         QUALITY_REJECTED: 0, QUALITY_RESET: 0}
+
+    def update(self, cattle_id: str, latitude: float, longitude: float, gps_fix: bool,
+               timestamp: Optional[str] = None, is_moving: bool = True) -> FilteredPosition:
+        """Feed one reading and return the position to use for it"""
+        at = timestamp_order(timestamp) if timestamp else None
+        if at is None:
+            at = time.time()
+
+        with self._lock:
+            track = self._tracks.get(cattle_id)
+            position = self._update(cattle_id, track, latitude, longitude, gps_fix, at, is_moving)
+            self.counters[position.quality] += 1
+            return position
+
+    def _update(self, cattle_id, track, latitude, longitude, gps_fix, at, is_moving) -> FilteredPosition:
+        if not gps_fix or not valid_coordinate(latitude, longitude):
+            if track is None:
+                return FilteredPosition(None, None, 0.0, QUALITY_NO_FIX)
+            held = track.position()
+            held.quality = QUALITY_NO_FIX
+            return held
+
+        if track is None:
+            self._tracks[cattle_id] = _AnimalTrack(latitude, longitude, at, self.noise_m)
+            return FilteredPosition(latitude, longitude, 0.0, QUALITY_INITIAL)
+
+        dt = max(at - track.last_time, 0.0)
+        x, y = track.to_local(latitude, longitude)
+        jump = math.hypot(x - track.east.p, y - track.north.p)
+        if jump > self.max_speed_ms * dt + self.jump_allowance_m:
+            track.rejects += 1
+            if track.rejects < self.reset_after_rejects:
+                held = track.position()
+                held.quality = QUALITY_REJECTED
+                return held
+            self._tracks[cattle_id] = _AnimalTrack(latitude, longitude, at, self.noise_m)
+            return FilteredPosition(latitude, longitude, 0.0, QUALITY_RESET)
+
+        track.rejects = 0
+        if not is_moving:
+            track.east.hold_still(self.still_drift_m)
+            track.north.hold_still(self.still_drift_m)
+        elif dt > 0:
+            track.east.predict(dt, self.accel_noise)
+            track.north.predict(dt, self.accel_noise)
+        track.last_time = max(track.last_time, at)
+        track.east.update(x, self.noise_m)
+        track.north.update(y, self.noise_m)
+        return track.position()
+
+    def forget(self, cattle_id: str):
+        with self._lock:
+            self._tracks.pop(cattle_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {**self.counters, "tracked_animals": len(self._tracks)}
+
+
+# Global instance
+position_filter = PositionFilter()
@@ -0,0 +1,76 @@
+"""
+Uniform grid index over live herd positions.
+
+Each animal (a herd state row) sits in one cell of HERD_GRID_CELL_DEG
+degrees. Moving an animal only touches its old and new cell, so the index is
+kept current on every reading, and a bounding-box query only visits the
+cells it overlaps (or the occupied cells, when there are fewer of those).
+The rows found are candidates; callers filter them exactly.
+"""
+
+import math
+import os
+from typing import Dict, Set, Tuple
+
+import numpy as np
+
+HERD_GRID_CELL_DEG = float(os.getenv("HERD_GRID_CELL_DEG", "0.005"))  # ~550 m
+
+
+class PositionGrid:
+    def __init__(self, cell_size_deg: float = HERD_GRID_CELL_DEG):
+        self.cell_size = cell_size_deg
+        self._cells: Dict[Tuple[int, int], Set[int]] = {}
+        self._row_cells: Dict[int, Tuple[int, int]] = {}
+        self.moves = 0
+
+    def _cell(self, longitude: float, latitude: float) -> Tuple[int, int]:
+        return (math.floor(longitude / self.cell_size), math.floor(latitude / self.cell_size))
+
+    def move(self, row: int, latitude: float, longitude: float):
+        """Place a row at a position (NaN removes it from the index)"""
+        if math.isnan(latitude) or math.isnan(longitude):
+            self.remove(row)
+            return
+        cell = self._cell(longitude, latitude)
+        previous = self._row_cells.get(row)
+        if previous == cell:
+            return
+        if previous is not None:
+            self._discard(row, previous)
+        self._cells.setdefault(cell, set()).add(row)
+        self._row_cells[row] = cell
+        self.moves += 1
+
+    def remove(self, row: int):
+        previous = self._row_cells.pop(row, None)
+        if previous is not None:
+            self._discard(row, previous)
+
+    def _discard(self, row: int, cell: Tuple[int, int]):
+        members = self._cells.get(cell)
+        if members is not None:
+            members.discard(row)
+            if not members:
+                del self._cells[cell]
+
+    def rows_in(self, min_longitude: float, min_latitude: float, max_longitude: float, max_latitude: float) -> np.ndarray:
+        """Candidate rows in the cells overlapping a bounding box"""
+        (x0, y0), (x1, y1) = self._cell(min_longitude, min_latitude), self._cell(max_longitude, max_latitude)
+        rows = []
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > len(self._cells):
+            # The box covers more cells than are occupied, walk the occupied ones
+            for (cx, cy), members in self._cells.items():
+                if x0 <= cx <= x1 and y0 <= cy <= y1:
+                    rows.extend(members)
+        else:
+            for cx in range(x0, x1 + 1):
+                for cy in range(y0, y1 + 1):
+                    members = self._cells.get((cx, cy))
+                    if members:
+                        rows.extend(members)
+        return np.fromiter(rows, dtype=np.int64, count=len(rows))
+
+    def stats(self) -> Dict[str, float]:
+        return {"cells": len(self._cells), "indexed": len(self._row_cells), "moves": self.moves,
+                "cell_size_deg": self.cell_size}
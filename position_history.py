@@ -0,0 +1,132 @@
+"""
+Compact position history per animal.
+
+cattle_live_data only holds the latest reading, so past positions cannot be
+re-examined (for example against an edited fence, see fence_reevaluation.py).
+Measured positions are kept under position_history/{cattle_id} as
+
+    {"<epoch seconds>": [lat, lon], ...}
+
+Keys are ten-digit epoch seconds, so they sort by time and a time range is
+one key-range query. At most one position per HISTORY_MIN_INTERVAL_SECONDS
+is kept per animal, and positions are buffered in memory and written as one
+patch per animal every HISTORY_FLUSH_SECONDS, so history adds a write every
+few minutes rather than one per reading.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from ingest_dedup import timestamp_order
+from temp_firebase_service import temp_firebase_service as firebase_service
+
+HISTORY_ROOT = "position_history"
+HISTORY_MIN_INTERVAL_SECONDS = float(os.getenv("POSITION_HISTORY_MIN_INTERVAL_SECONDS", "60"))
+HISTORY_FLUSH_SECONDS = float(os.getenv("POSITION_HISTORY_FLUSH_SECONDS", "300"))
+HISTORY_ENABLED = os.getenv("POSITION_HISTORY_ENABLED", "true").lower() == "true"
+
+
+def history_key(epoch_seconds: float) -> str:
+    return f"{int(epoch_seconds):010d}"
+
+
+class PositionHistory:
+    def __init__(self, min_interval_seconds: float = HISTORY_MIN_INTERVAL_SECONDS,
+                 flush_seconds: float = HISTORY_FLUSH_SECONDS, enabled: bool = HISTORY_ENABLED):
+        self.min_interval_seconds = min_interval_seconds
+        self.flush_seconds = flush_seconds
+        self.enabled = enabled
+        self._pending: Dict[str, Dict[str, List[float]]] = {}  # cattle id -> key -> [lat, lon]
+        self._last_kept: Dict[str, float] = {}  # cattle id -> epoch seconds of the last kept position
+        self._flushed_at: Dict[str, float] = {}  # cattle id -> monotonic time of the last flush
+        self._lock = threading.Lock()
+        self.counters = {"recorded": 0, "thinned": 0, "flushes": 0, "flush_failures": 0}
+
+    def record(self, cattle_id: str, timestamp: str, latitude: float, longitude: float):
+        """Keep a measured position (thinned to one per min interval) and flush the animal's buffer when due"""
+        if not self.enabled:
+            return
+        at = timestamp_order(timestamp)
+        if at is None:
+            return
+        with self._lock:
+            last = self._last_kept.get(cattle_id)
+            if last is not None and abs(at - last) < self.min_interval_seconds:
+                self.counters["thinned"] += 1
+                return
+            self._last_kept[cattle_id] = at
+            self._pending.setdefault(cattle_id, {})[history_key(at)] = [round(latitude, 6), round(longitude, 6)]
+            self.counters["recorded"] += 1
+            now = time.monotonic()
+            flushed_at = self._flushed_at.setdefault(cattle_id, now)
+            due = now - flushed_at >= self.flush_seconds
+        if due:
+            self.flush(cattle_id)
+
+    def flush(self, cattle_id: Optional[str] = None):
+        """Write buffered positions (of one animal, or all) as one patch per animal"""
+        with self._lock:
+            animals = [cattle_id] if cattle_id is not None else list(self._pending)
+            batches = [(animal, self._pending.pop(animal)) for animal in animals if self._pending.get(animal)]
+            for animal, _ in batches:
+                self._flushed_at[animal] = time.monotonic()
+        for animal, positions in batches:
+            result = firebase_service.update_realtime_data(f"{HISTORY_ROOT}/{animal}", positions)
+            if result.get("success"):
+                self.counters["flushes"] += 1
+            else:
+                self.counters["flush_failures"] += 1
+                print(f"⚠️ Failed to store position history of {animal}: {result.get('error')}")
+                with self._lock:
+                    # Keep the positions for the next flush
+                    self._pending[animal] = {**positions, **self._pending.get(animal, {})}
+
+    def pending(self, cattle_id: str) -> Dict[str, List[float]]:
+        with self._lock:
+            return dict(self._pending.get(cattle_id, {}))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            buffered = sum(len(positions) for positions in self._pending.values())
+        return {**self.counters, "buffered": buffered, "enabled": self.enabled}
+
+
+def history_animals() -> Dict[str, Any]:
+    """IDs of the animals with stored history (shallow read)"""
+    return firebase_service.query_collection(HISTORY_ROOT, shallow=True)
+
+
+def load_track(cattle_id: str, start: Optional[float] = None, end: Optional[float] = None,
+               history: Optional[PositionHistory] = None) -> Tuple[List[float], List[float], List[float]]:
+    """
+    (epoch seconds, latitudes, longitudes) of an animal's stored positions in
+    [start, end], sorted by time, including positions not yet flushed.
+    """
+    result = firebase_service.query_collection(
+        f"{HISTORY_ROOT}/{cattle_id}", order_by="$key",
+        start_at=history_key(start) if start is not None else None,
+        end_at=history_key(end) if end is not None else None
+    )
+    if not result.get("success"):
+        raise RuntimeError(f"Failed to load position history of {cattle_id}: {result.get('error')}")
+    positions = {document["id"]: document.get("data") for document in result.get("data", [])}
+    if history is not None:
+        positions.update(history.pending(cattle_id))
+
+    times, latitudes, longitudes = [], [], []
+    for key in sorted(positions):
+        value = positions[key]
+        at = float(key)
+        if (start is not None and at < start) or (end is not None and at > end):
+            continue
+        if isinstance(value, list) and len(value) >= 2:
+            times.append(at)
+            latitudes.append(float(value[0]))
+            longitudes.append(float(value[1]))
+    return times, latitudes, longitudes
+
+
+# Global instance
+position_history = PositionHistory()
@@ -0,0 +1,188 @@
+"""
+Adaptive reporting interval for collars.
+
+Every ingest response tells the device when to report next. Animals that are
+outside a fence, close to a boundary or moving fast report at the minimum
+interval, and an animal heading for a boundary reports at least twice before
+it is predicted to cross it (see breach_prediction.py); calm animals far from
+any fence back off towards the maximum. When the server is under heavy ingest
+load the calm animals back off further, the safety-relevant cases never do.
+
+The policy is stored in the database under config/reporting_policy so every
+instance uses the same settings.
+"""
+
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from models import ReportingPolicy, ReportingPolicyUpdate
+from temp_firebase_service import temp_firebase_service as firebase_service
+
+REPORTING_POLICY_PATH = "config/reporting_policy"
+LOAD_WINDOW_SECONDS = 60
+POLICY_RELOAD_RETRY_SECONDS = 60
+
+
+class IngestRateMeter:
+    """Readings per second over a sliding window, kept in one-second buckets"""
+
+    def __init__(self, window_seconds: int = LOAD_WINDOW_SECONDS):
+        self.window_seconds = window_seconds
+        self._buckets = [0] * window_seconds
+        self._bucket_seconds = [0] * window_seconds
+        self._lock = threading.Lock()
+
+    def record(self, count: int = 1, now: Optional[float] = None):
+        second = int(now if now is not None else time.time())
+        slot = second % self.window_seconds
+        with self._lock:
+            if self._bucket_seconds[slot] != second:
+                self._bucket_seconds[slot] = second
+                self._buckets[slot] = 0
+            self._buckets[slot] += count
+
+    def rate(self, now: Optional[float] = None) -> float:
+        second = int(now if now is not None else time.time())
+        oldest = second - self.window_seconds
+        with self._lock:
+            total = sum(count for count, bucket_second in zip(self._buckets, self._bucket_seconds)
+                        if oldest < bucket_second <= second)
+        return total / self.window_seconds
+
+
+def nearest_fence(geofence_result: Optional[dict]) -> Tuple[Optional[float], bool]:
+    """Distance (km) to the nearest fence boundary and whether any fence is breached"""
+    if not geofence_result or not geofence_result.get("success"):
+        return None, False
+    fences = geofence_result.get("inside_geofences", []) + geofence_result.get("outside_geofences", [])
+    distances = [fence["distance_to_boundary_km"] for fence in fences if "distance_to_boundary_km" in fence]
+    breached = bool(geofence_result.get("outside_geofences"))
+    return (min(distances) if distances else None), breached
+
+
+def compute_next_interval(policy: ReportingPolicy, behavior: str, is_moving: bool, speed_kmh: float,
+                          fence_distance_km: Optional[float], breached: bool,
+                          load_rps: float = 0.0, seconds_to_boundary: Optional[float] = None) -> Tuple[int, str]:
+    """
+    Next reporting interval in seconds and the reason for it.
+    fence_distance_km is None when no fences are configured, seconds_to_boundary
+    when no boundary crossing is predicted.
+    """
+    if breached:
+        return policy.min_interval_seconds, "outside_geofence"
+    if speed_kmh >= policy.fast_speed_kmh:
+        return policy.min_interval_seconds, "fast_movement"
+    if fence_distance_km is not None and fence_distance_km <= policy.fence_near_km:
+        return policy.min_interval_seconds, "near_fence_boundary"
+
+    behavior_key = (behavior or "").lower()
+    interval = float(policy.behavior_intervals.get(behavior_key, policy.default_interval_seconds))
+    reasons = [f"behavior:{behavior_key or 'unknown'}"]
+
+    if is_moving and interval > policy.moving_interval_seconds:
+        interval = float(policy.moving_interval_seconds)
+        reasons.append("moving")
+
+    # Between the near and far distances, scale linearly down towards the minimum
+    if fence_distance_km is not None and fence_distance_km < policy.fence_far_km:
+        span = max(policy.fence_far_km - policy.fence_near_km, 1e-9)
+        fraction = (fence_distance_km - policy.fence_near_km) / span
+        interval = policy.min_interval_seconds + (interval - policy.min_interval_seconds) * fraction
+        reasons.append("fence_proximity")
+
+    if load_rps > policy.high_load_readings_per_second:
+        interval *= policy.load_backoff_factor
+        reasons.append("server_load")
+
+    # Never backed off under load: hear from the animal at least twice before it reaches the boundary
+    if seconds_to_boundary is not None and seconds_to_boundary / 2 < interval:
+        interval = seconds_to_boundary / 2
+        if "server_load" in reasons:
+            # The load backoff no longer applies
+            reasons.remove("server_load")
+        reasons.append("approaching_boundary")
+
+    interval = min(max(interval, policy.min_interval_seconds), policy.max_interval_seconds)
+    return int(round(interval)), ",".join(reasons)
+
+
+def validate_policy(policy: ReportingPolicy) -> Optional[str]:
+    """Return an error message if the policy is inconsistent"""
+    if policy.min_interval_seconds < 1:
+        return "min_interval_seconds must be at least 1"
+    if policy.max_interval_seconds < policy.min_interval_seconds:
+        return "max_interval_seconds must not be below min_interval_seconds"
+    if policy.fence_far_km < policy.fence_near_km:
+        return "fence_far_km must not be below fence_near_km"
+    if policy.load_backoff_factor < 1:
+        return "load_backoff_factor must be at least 1"
+    if any(seconds < 1 for seconds in policy.behavior_intervals.values()):
+        return "behavior_intervals must be at least 1 second"
+    return None
+
+
+class ReportingPolicyManager:
+    def __init__(self):
+        self.meter = IngestRateMeter()
+        self._policy = ReportingPolicy()
+        self._loaded = False
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+
+    def get_policy(self) -> ReportingPolicy:
+        """Current policy, loaded from the database on first use"""
+        if not self._loaded and time.time() >= self._retry_at:
+            with self._lock:
+                if not self._loaded and time.time() >= self._retry_at:
+                    self._load()
+        return self._policy
+
+    def _load(self):
+        result = firebase_service.get_realtime_data(REPORTING_POLICY_PATH)
+        stored = result.get("data") if result.get("success") else None
+        if isinstance(stored, dict):
+            try:
+                policy = ReportingPolicy(**stored)
+                if validate_policy(policy) is None:
+                    self._policy = policy
+                    print("📶 Loaded reporting policy from database")
+            except Exception as e:
+                print(f"⚠️ Stored reporting policy is invalid, using defaults: {str(e)}")
+        # Use the defaults if storage is unreachable and retry a little later
+        self._loaded = result.get("success", False)
+        if not self._loaded:
+            self._retry_at = time.time() + POLICY_RELOAD_RETRY_SECONDS
+
+    def update_policy(self, update: ReportingPolicyUpdate) -> Dict[str, Any]:
+        """Merge and persist a policy update"""
+        fields = update.model_dump(exclude_none=True)
+        policy = ReportingPolicy(**{**self.get_policy().model_dump(), **fields})
+        error = validate_policy(policy)
+        if error:
+            return {"success": False, "error": error}
+
+        result = firebase_service.set_realtime_data(REPORTING_POLICY_PATH, policy.model_dump())
+        if not result.get("success"):
+            return {"success": False, "error": result.get("error")}
+        with self._lock:
+            self._policy = policy
+            self._loaded = True
+        print(f"📶 Reporting policy updated: {', '.join(fields) or 'no changes'}")
+        return {"success": True, "data": policy}
+
+    def next_interval(self, behavior: str, is_moving: bool, speed_kmh: float,
+                      geofence_result: Optional[dict] = None,
+                      seconds_to_boundary: Optional[float] = None) -> Tuple[int, str]:
+        """Record one ingested reading and compute the device's next reporting interval"""
+        self.meter.record()
+        distance_km, breached = nearest_fence(geofence_result)
+        return compute_next_interval(self.get_policy(), behavior, is_moving, speed_kmh,
+                                     distance_km, breached, self.meter.rate(), seconds_to_boundary)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"ingest_readings_per_second": round(self.meter.rate(), 3)}
+
+
+# Global instance
+reporting_policy = ReportingPolicyManager()
@@ -0,0 +1,150 @@
+"""
+Request coalescing helpers.
+
+SingleFlight lets concurrent identical storage reads share one in-flight
+request. Every caller gets its own deep copy of the result, since callers
+modify the documents they read. micro_cache adds a very short-lived response cache in
+front of hot polling endpoints, so a burst of dashboards polling the same URL
+costs one computation.
+"""
+
+import asyncio
+import copy
+import functools
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Tuple
+
+
+class _Call:
+    __slots__ = ("event", "result", "error", "waiters")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """
+        Run fn once for all concurrent callers using the same key. Callers
+        that shared a result each get a deep copy; the result is only handed
+        out uncopied when nobody else waited for it.
+        """
+        with self._lock:
+            self.calls += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self.executions += 1
+            else:
+                call.waiters += 1
+                self.coalesced += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                waiters = call.waiters
+            call.event.set()
+        # The waiters copy call.result, so it must stay untouched
+        return copy.deepcopy(call.result) if waiters else call.result
+
+    async def do_async(self, key: str, fn: Callable[[], Any]) -> Any:
+        """Same as do(), but runs the blocking call off the event loop"""
+        return await asyncio.to_thread(self.do, key, fn)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._calls)
+        }
+
+
+# =====================
+# MICRO-TTL RESPONSE CACHE
+# =====================
+
+MICRO_CACHE_TTL_SECONDS = float(os.getenv("MICRO_CACHE_TTL_SECONDS", "1.0"))
+
+micro_cache_stats: Dict[str, Dict[str, int]] = {}
+
+
+def micro_cache(ttl_seconds: float):
+    """
+    Cache an async endpoint's result for ttl_seconds, keyed by its arguments.
+    Concurrent calls with the same key while a result is being computed await
+    that computation instead of starting their own.
+
+    Cache payloads, not Response objects: every caller gets the same cached
+    object, and middleware (compression) rewrites a response's headers in place.
+    """
+    def decorator(func):
+        cache: Dict[Tuple, Tuple[float, Any]] = {}
+        in_flight: Dict[Tuple, asyncio.Future] = {}
+        stats = micro_cache_stats.setdefault(func.__name__, {"hits": 0, "misses": 0, "coalesced": 0})
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = tuple(sorted((k, v) for k, v in kwargs.items() if isinstance(v, (str, int, float, bool, type(None)))))
+            now = time.monotonic()
+            cached = cache.get(key)
+            if cached and cached[0] > now:
+                stats["hits"] += 1
+                return cached[1]
+
+            pending = in_flight.get(key)
+            if pending is not None:
+                stats["coalesced"] += 1
+                return await asyncio.shield(pending)
+
+            stats["misses"] += 1
+            future = asyncio.get_running_loop().create_future()
+            in_flight[key] = future
+            try:
+                result = await func(*args, **kwargs)
+                expires_at = time.monotonic() + ttl_seconds
+                if len(cache) >= 256:
+                    for stale_key in [k for k, (exp, _) in cache.items() if exp <= now]:
+                        del cache[stale_key]
+                cache[key] = (expires_at, result)
+                future.set_result(result)
+                return result
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as e:
+                future.set_exception(e)
+                # Nobody may be waiting; mark the exception as retrieved
+                future.exception()
+                raise
+            finally:
+                del in_flight[key]
+
+        wrapper.cache_clear = cache.clear
+        return wrapper
+    return decorator
@@ -1,6 +1,8 @@
 from fastapi import APIRouter, HTTPException
 from temp_firebase_service import temp_firebase_service as firebase_service
 from models import AlertCreate, AlertUpdate, AlertResponse
+from dashboard_summary import dashboard_summary
+from fast_json import FastJSONResponse
 import uuid
 
 router = APIRouter(prefix="/alerts", tags=["alerts"])
@@ -15,15 +17,17 @@ async def create_alert(alert_data: AlertCreate):
     result = firebase_service.create_document("alerts", alert_id, alert_dict)
     if not result["success"]:
         raise HTTPException(status_code=400, detail=result.get("error", "Failed to create alert"))
+    dashboard_summary.record_alert(alert_id, alert_dict)
     return result
 
-@router.get("", response_model=AlertResponse)
+@router.get("", response_model=AlertResponse, response_class=FastJSONResponse)
 async def get_all_alerts():
     """Get all alerts"""
     result = firebase_service.get_collection("alerts")
     if not result["success"]:
         raise HTTPException(status_code=400, detail=result.get("error", "Failed to get alerts"))
-    return result
+    result.pop("etag", None)
+    return FastJSONResponse(result)
 
 @router.get("/{alert_id}", response_model=AlertResponse)
 async def get_alert(alert_id: str):
@@ -46,6 +50,7 @@ async def update_alert(alert_id: str, alert_data: AlertUpdate):
     result = firebase_service.update_document("alerts", alert_id, update_data)
     if not result["success"]:
         raise HTTPException(status_code=400, detail=result.get("error", "Failed to update alert"))
+    dashboard_summary.update_alert(alert_id, update_data)
     return result
 
 @router.delete("/{alert_id}", response_model=AlertResponse)
@@ -54,26 +59,37 @@ async def delete_alert(alert_id: str):
     result = firebase_service.delete_document("alerts", alert_id)
     if not result["success"]:
         raise HTTPException(status_code=400, detail=result.get("error", "Failed to delete alert"))
+    dashboard_summary.remove_alert(alert_id)
     return result
 
-@router.get("/cattle/{cattle_id}", response_model=AlertResponse)
+@router.get("/cattle/{cattle_id}", response_model=AlertResponse, response_class=FastJSONResponse)
 async def get_alerts_for_cattle(cattle_id: str):
     """Get all alerts for a specific cattle"""
+    result = firebase_service.query_collection("alerts", order_by="cattleId", equal_to=cattle_id)
+    if result["success"]:
+        return FastJSONResponse({"success": True, "data": result["data"]})
+    
+    # Index not deployed yet or query unsupported: fall back to a full scan
     result = firebase_service.get_collection("alerts")
     if not result["success"]:
         raise HTTPException(status_code=400, detail=result.get("error", "Failed to get alerts"))
     
     # Filter by cattle ID
     filtered_alerts = [alert for alert in result["data"] if alert.get("cattleId") == cattle_id]
-    return {"success": True, "data": filtered_alerts}
+    return FastJSONResponse({"success": True, "data": filtered_alerts})
 
-@router.get("/type/{alert_type}", response_model=AlertResponse)
+@router.get("/type/{alert_type}", response_model=AlertResponse, response_class=FastJSONResponse)
 async def get_alerts_by_type(alert_type: str):
     """Get alerts by type (Health, Location, etc.)"""
+    result = firebase_service.query_collection("alerts", order_by="type", equal_to=alert_type)
+    if result["success"]:
+        return FastJSONResponse({"success": True, "data": result["data"]})
+    
+    # Index not deployed yet or query unsupported: fall back to a full scan
     result = firebase_service.get_collection("alerts")
     if not result["success"]:
         raise HTTPException(status_code=400, detail=result.get("error", "Failed to get alerts"))
     
     # Filter by type
     filtered_alerts = [alert for alert in result["data"] if alert.get("type") == alert_type]
-    return {"success": True, "data": filtered_alerts}
+    return FastJSONResponse({"success": True, "data": filtered_alerts})
@@ -137,6 +137,7 @@ async def list_users(current_user: dict = Depends(get_current_user)):
         result = firebase_service.get_collection("users")
         if not result["success"]:
             raise HTTPException(status_code=500, detail="Failed to fetch users")
+        result.pop("etag", None)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,11 +1,15 @@
 from datetime import datetime
+from typing import Optional
 from temp_firebase_service import temp_firebase_service as firebase_service
+from dashboard_summary import dashboard_summary
 import uuid
 
-def analyze_behavior_and_generate_alerts(cattle_id: str, new_data: dict):
+def analyze_behavior_and_generate_alerts(cattle_id: str, new_data: dict, prev_data: Optional[dict] = None):
     """
     Analyze new sensor data for a cattle, compare with previous data,
     and generate alerts for suspicious events (e.g., sudden speed change, abnormal motion).
+    prev_data is the previous reading when the caller already has it; otherwise
+    it is fetched from the live data.
     Returns a list of generated alerts (if any).
     """
     alerts = []
@@ -14,8 +18,9 @@ def analyze_behavior_and_generate_alerts(cattle_id: str, new_data: dict):
         print(f"🔍 Starting behavior analysis for cattle: {cattle_id}")
 
         # 1. Fetch previous live data for this cattle
-        prev_result = firebase_service.get_realtime_data(f"cattle_live_data/{cattle_id}")
-        prev_data = prev_result.get("data") if prev_result.get("success") else None
+        if prev_data is None:
+            prev_result = firebase_service.get_realtime_data(f"cattle_live_data/{cattle_id}")
+            prev_data = prev_result.get("data") if prev_result.get("success") else None
         
         if prev_data:
             print(f"📊 Found previous data for comparison")
@@ -81,6 +86,7 @@ def analyze_behavior_and_generate_alerts(cattle_id: str, new_data: dict):
                 alert_id = f"alert_{cattle_id}_{uuid.uuid4().hex[:8]}"
                 result = firebase_service.create_document("alerts", alert_id, alert)
                 if result.get("success"):
+                    dashboard_summary.record_alert(alert_id, alert)
                     print(f"✅ Alert saved: {alert['type']}")
                 else:
                     print(f"❌ Failed to save alert: {result.get('error')}")
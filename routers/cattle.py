@@ -1,11 +1,31 @@
-from fastapi import APIRouter, HTTPException, Body
+from fastapi import APIRouter, HTTPException, Body, Request, Response
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
 from temp_firebase_service import temp_firebase_service as firebase_service
-from models import CattleSensorData
+from models import CattleSensorData, ReportingPolicyUpdate
 from shapely.geometry import Point, Polygon
 from datetime import datetime
+import asyncio
 import uuid
 import math
 from routers.behaviorAnalysis import analyze_behavior_and_generate_alerts
+from dashboard_summary import dashboard_summary
+from request_coalescing import micro_cache, MICRO_CACHE_TTL_SECONDS
+from http_cache import etag_matches, not_modified, storage_etag
+from fast_json import FastJSONResponse
+from reporting_policy import reporting_policy
+from geofence_bundle import geofence_bundle, BUNDLE_VERSION_HEADER
+from ingest_dedup import ingest_dedup, IDEMPOTENCY_KEY_HEADER
+from live_state_cache import live_state_cache, WRITE_FULL, WRITE_SKIP
+from position_filter import position_filter
+from position_history import position_history
+from herd_state import herd_state
+from fence_occupancy import fence_occupancy
+from breach_episodes import parse_time
+from ingest_codec import (
+    DecodedReading, decode_sensor_payload, decode_sensor_batch, inline_json_schema, UnsupportedEncodingError,
+    SENSOR_SCHEMA_VERSION, SCHEMA_VERSION_HEADER, SHORT_JSON_MEDIA_TYPE, SHORT_KEYS
+)
 
 router = APIRouter(prefix="/cattle", tags=["cattle"])
 
@@ -13,13 +33,204 @@ router = APIRouter(prefix="/cattle", tags=["cattle"])
 # NEW ENDPOINT FOR ESP32 SENSOR DATA (No Auth Required)
 # =================================================
 
-@router.post("/live-data", status_code=200)
-async def update_cattle_live_data(data: CattleSensorData):
+SENSOR_DATA_SCHEMA = inline_json_schema(CattleSensorData)
+SENSOR_DATA_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {"schema": SENSOR_DATA_SCHEMA},
+            SHORT_JSON_MEDIA_TYPE: {"schema": {"type": "object", "description": "Short-key reading, see GET /cattle/live-data/schema"}},
+            "application/msgpack": {"schema": {"type": "string", "format": "binary"}},
+            "application/cbor": {"schema": {"type": "string", "format": "binary"}}
+        }
+    }
+}
+
+def validation_error_details(error: ValidationError, *loc_prefix):
+    """Same error shape FastAPI produces for a body model"""
+    return [{**detail, "loc": (*loc_prefix, *detail["loc"])} for detail in error.errors()]
+
+def geofence_bundle_status(request: Request, response: Response) -> dict:
+    """
+    Current fence bundle version for the ingest response. Devices send the
+    version they hold in X-Geofence-Bundle-Version; geofence_bundle_update
+    tells them to fetch GET /geofence/bundle.
+    """
+    try:
+        version = geofence_bundle.version()
+    except Exception as e:
+        print(f"⚠️ Geofence bundle unavailable: {str(e)}")
+        return {}
+    if version is None:
+        return {}
+    response.headers[BUNDLE_VERSION_HEADER] = str(version)
+    device_version = request.headers.get(BUNDLE_VERSION_HEADER)
+    return {
+        "geofence_bundle_version": version,
+        "geofence_bundle_update": device_version is not None and device_version.strip() != str(version)
+    }
+
+@router.post("/live-data", status_code=200, openapi_extra=SENSOR_DATA_REQUEST_BODY)
+async def update_cattle_live_data(request: Request, response: Response):
     """
     Receives and processes live sensor data from ESP32/ESP8266 devices for cattle.
     This is the primary endpoint for hardware integration.
     Note: Authentication removed for ESP32/ESP8266 compatibility.
+    The body is a CattleSensorData payload, as verbose JSON or in one of the
+    compact encodings selected by Content-Type (see GET /cattle/live-data/schema).
+    A retried request with the same Idempotency-Key header gets the original result.
+    """
+    response.headers[SCHEMA_VERSION_HEADER] = str(SENSOR_SCHEMA_VERSION)
+    idempotency_key = request.headers.get(IDEMPOTENCY_KEY_HEADER)
+    if idempotency_key:
+        replayed = ingest_dedup.replay(f"live-data:{idempotency_key}")
+        if replayed is not None:
+            print(f"♻️ Replaying result for Idempotency-Key {idempotency_key}")
+            response.headers["Idempotent-Replayed"] = "true"
+            return {**replayed, **geofence_bundle_status(request, response)}
+    
+    try:
+        reading = decode_sensor_payload(
+            await request.body(),
+            request.headers.get("content-type"),
+            request.headers.get(SCHEMA_VERSION_HEADER)
+        )
+    except UnsupportedEncodingError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except ValidationError as e:
+        raise RequestValidationError(validation_error_details(e, "body"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid body: {str(e)}")
+    
+    result = process_sensor_reading(reading)
+    if idempotency_key:
+        ingest_dedup.remember_key(f"live-data:{idempotency_key}", result)
+    return {**result, **geofence_bundle_status(request, response)}
+
+@router.post("/live-data/batch", status_code=200)
+async def update_cattle_live_data_batch(request: Request, response: Response):
+    """
+    Ingest several buffered readings in one request (a list, or {"readings": [...]}),
+    in any encoding accepted by POST /cattle/live-data. Invalid readings are
+    reported individually and do not reject the rest of the batch.
+    Readings already processed (e.g. a retried upload) are not processed again.
+    """
+    response.headers[SCHEMA_VERSION_HEADER] = str(SENSOR_SCHEMA_VERSION)
+    idempotency_key = request.headers.get(IDEMPOTENCY_KEY_HEADER)
+    if idempotency_key:
+        replayed = ingest_dedup.replay(f"live-data-batch:{idempotency_key}")
+        if replayed is not None:
+            print(f"♻️ Replaying batch result for Idempotency-Key {idempotency_key}")
+            response.headers["Idempotent-Replayed"] = "true"
+            return {**replayed, **geofence_bundle_status(request, response)}
+    
+    try:
+        decoded = decode_sensor_batch(
+            await request.body(),
+            request.headers.get("content-type"),
+            request.headers.get(SCHEMA_VERSION_HEADER)
+        )
+    except UnsupportedEncodingError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid body: {str(e)}")
+    
+    results = []
+    for index, reading in enumerate(decoded):
+        if isinstance(reading, ValidationError):
+            results.append({"success": False, "index": index, "errors": validation_error_details(reading, "body", index)})
+            continue
+        try:
+            results.append({"index": index, **process_sensor_reading(reading)})
+        except HTTPException as e:
+            results.append({"success": False, "index": index, "cattle_id": reading.cattle_id, "error": e.detail})
+    
+    accepted = sum(1 for result in results if result.get("success"))
+    print(f"📦 Batch ingest: {accepted}/{len(results)} readings processed")
+    result = {
+        "success": accepted == len(results),
+        "accepted": accepted,
+        "rejected": len(results) - accepted,
+        "results": results
+    }
+    if idempotency_key:
+        ingest_dedup.remember_key(f"live-data-batch:{idempotency_key}", result)
+    return {**result, **geofence_bundle_status(request, response)}
+
+@router.get("/reporting-policy")
+async def get_reporting_policy():
+    """Policy used to compute next_report_interval_seconds in ingest responses"""
+    try:
+        policy = reporting_policy.get_policy()
+        return {"success": True, "data": policy, **reporting_policy.stats()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching reporting policy: {str(e)}")
+
+@router.put("/reporting-policy")
+async def update_reporting_policy(update: ReportingPolicyUpdate):
+    """Change the reporting policy. Omitted fields keep their current value."""
+    try:
+        result = reporting_policy.update_policy(update)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error updating reporting policy: {str(e)}")
+    if not result["success"]:
+        raise HTTPException(status_code=400, detail=result["error"])
+    return {"success": True, "message": "Reporting policy updated", "data": result["data"]}
+
+@router.get("/live-data/schema")
+async def get_sensor_wire_schema(response: Response):
+    """Published wire formats and the short-key map devices can use"""
+    response.headers[SCHEMA_VERSION_HEADER] = str(SENSOR_SCHEMA_VERSION)
+    return {
+        "success": True,
+        "schema_version": SENSOR_SCHEMA_VERSION,
+        "content_types": {
+            "application/json": "verbose JSON (CattleSensorData)",
+            SHORT_JSON_MEDIA_TYPE: "short-key JSON",
+            "application/msgpack": "MessagePack with short or verbose keys",
+            "application/cbor": "CBOR with short or verbose keys"
+        },
+        "short_keys": {
+            short: {"field": field, **({"fields": nested} if nested else {})}
+            for short, (field, nested) in SHORT_KEYS.items()
+        },
+        "notes": [
+            "acceleration may be sent as an [x, y, z] array",
+            "timestamp may be sent as epoch seconds",
+            f"send {SCHEMA_VERSION_HEADER}: {SENSOR_SCHEMA_VERSION} (or a ;v={SENSOR_SCHEMA_VERSION} Content-Type parameter)"
+        ]
+    }
+
+def process_sensor_reading(reading: DecodedReading):
+    """
+    Process a decoded reading once. A repeat of an already processed reading
+    returns the original result, and a reading older than the animal's newest
+    one is acknowledged without overwriting its live state.
     """
+    data = reading.model
+    previous = ingest_dedup.lookup(data.cattle_id, data.timestamp)
+    if previous is not None:
+        print(f"♻️ Duplicate reading from {data.cattle_id} at {data.timestamp}, returning original result")
+        return {**previous, "duplicate": True}
+    
+    latest_timestamp = ingest_dedup.latest_timestamp(data.cattle_id, data.timestamp)
+    if latest_timestamp is not None:
+        print(f"⏪ Out-of-order reading from {data.cattle_id} ({data.timestamp} < {latest_timestamp}), live state kept")
+        result = {
+            "success": True,
+            "message": f"Reading for {data.cattle_id} is older than the current live state ({latest_timestamp}); live state not overwritten.",
+            "cattle_id": data.cattle_id,
+            "out_of_order": True,
+            "latest_timestamp": latest_timestamp
+        }
+    else:
+        result = store_and_evaluate_reading(reading)
+    ingest_dedup.remember(data.cattle_id, data.timestamp, result)
+    return result
+
+def store_and_evaluate_reading(reading: DecodedReading):
+    """Store a decoded reading, update the cattle summary and run geofence/behavior checks"""
+    data = reading.model
     try:
         cattle_id = data.cattle_id
         
@@ -28,66 +239,144 @@ async def update_cattle_live_data(data: CattleSensorData):
         print(f"🐄 Behavior: {data.behavior.current}")
         print(f"🚶 Moving: {data.is_moving}")
         
-        # 1. Store the complete raw sensor data in 'cattle_live_data' collection
-        print(f"💾 Storing live data for {cattle_id}")
-        live_data_path = f"cattle_live_data/{cattle_id}"
-        result_live = firebase_service.set_realtime_data(live_data_path, data.model_dump())
+        live = reading.as_dict()
+        previous_reading = live_state_cache.previous_reading(cattle_id)
         
-        if not result_live["success"]:
-            print(f"❌ Failed to store live data: {result_live.get('error')}")
-            raise HTTPException(status_code=500, detail=f"Failed to store live sensor data: {result_live.get('error')}")
+        # Gate and smooth the GPS position; the checks below use the filtered one
+        position = position_filter.update(
+            cattle_id, data.latitude, data.longitude, data.gps_fix, data.timestamp, data.is_moving)
+        analyzed = dict(live)
+        if position.available:
+            analyzed["latitude"], analyzed["longitude"] = position.latitude, position.longitude
+        if not position.measured:
+            # Speed from a bad fix is as unreliable as its position
+            analyzed["speed_kmh"] = position.speed_kmh
+            print(f"🛰️ Position for {cattle_id} not used ({position.quality}), "
+                  f"{'holding last known position' if position.available else 'no position known yet'}")
+        stationary = position.available and live_state_cache.is_stationary(
+            cattle_id, position.latitude, position.longitude, data.is_moving)
+        
+        # 1. Store the sensor data in 'cattle_live_data' (in full the first time,
+        #    then only changed fields; heartbeat-only readings are throttled)
+        live_data_path = f"cattle_live_data/{cattle_id}"
+        live_mode, live_changes = live_state_cache.plan_live_write(cattle_id, live, stationary)
+        if live_mode == WRITE_SKIP:
+            print(f"⏭️ Heartbeat-only reading for {cattle_id}, live data write skipped")
         else:
-            print(f"✅ Live data stored successfully")
+            print(f"💾 Storing live data for {cattle_id} ({live_mode}, {len(live_changes)} fields)")
+            if live_mode == WRITE_FULL:
+                result_live = firebase_service.set_realtime_raw(live_data_path, reading.as_json())
+            else:
+                result_live = firebase_service.update_realtime_data(live_data_path, live_changes)
+            
+            if not result_live["success"]:
+                print(f"❌ Failed to store live data: {result_live.get('error')}")
+                raise HTTPException(status_code=500, detail=f"Failed to store live sensor data: {result_live.get('error')}")
+            else:
+                live_state_cache.record_live_write(
+                    cattle_id, live, (position.latitude, position.longitude) if position.available else None)
+                print(f"✅ Live data stored successfully")
+
+        # The columnar herd state is always current, even when the storage write was skipped.
+        # It holds the filtered position, or keeps the last known one when there is none.
+        herd_reading = dict(analyzed)
+        if not position.available:
+            herd_reading.pop("latitude", None)
+            herd_reading.pop("longitude", None)
+        herd_state.update(cattle_id, herd_reading)
 
         # 2. Update the main 'cattle' document with the latest summary
-        print(f"📝 Updating cattle document for {cattle_id}")
         update_data = {
             "last_seen": data.timestamp,
-            "location": f"{data.latitude},{data.longitude}",
             "status": data.behavior.current,
-            "position": {"x": data.longitude, "y": data.latitude},
             "lastMovement": data.timestamp if data.is_moving else "Stationary"
         }
-        result_update = firebase_service.update_document("cattle", cattle_id, update_data)
-        
-        if not result_update["success"]:
-            print(f"⚠️ Warning: Failed to update main cattle document for {cattle_id}: {result_update.get('error')}")
+        if position.available:
+            update_data["location"] = f"{position.latitude},{position.longitude}"
+            update_data["position"] = {"x": position.longitude, "y": position.latitude}
+        cattle_mode, cattle_changes = live_state_cache.plan_cattle_write(cattle_id, update_data, stationary)
+        if cattle_mode == WRITE_SKIP:
+            print(f"⏭️ Cattle document for {cattle_id} unchanged, update skipped")
         else:
-            print(f"✅ Cattle document updated successfully")
+            print(f"📝 Updating cattle document for {cattle_id} ({len(cattle_changes)} fields)")
+            result_update = firebase_service.update_document("cattle", cattle_id, cattle_changes)
+            
+            if not result_update["success"]:
+                print(f"⚠️ Warning: Failed to update main cattle document for {cattle_id}: {result_update.get('error')}")
+            else:
+                live_state_cache.record_cattle_write(cattle_id, cattle_changes)
+                dashboard_summary.record_cattle(cattle_id, update_data)
+                print(f"✅ Cattle document updated successfully")
+
+        # Keep measured positions for later re-evaluation, see position_history.py
+        if position.measured:
+            position_history.record(cattle_id, data.timestamp, position.latitude, position.longitude)
 
         # 3. 🔥 ENHANCED GEOFENCING LOGIC 🔥
-        print(f"🗺️ Checking geofences for cattle {cattle_id}...")
-        
         # Use the enhanced geofence checking logic from geofence router
         from routers.geofence import check_cattle_geofence_status
         
-        try:
-            geofence_result = check_cattle_geofence_status(cattle_id, data.latitude, data.longitude)
-            
-            if geofence_result.get("success"):
-                geofence_alerts = geofence_result.get("alerts", [])
-                breach_count = geofence_result.get("total_breaches", 0)
+        geofence_alerts = []
+        if not position.measured:
+            # Never evaluate (and alert on) a position this reading did not measure
+            geofence_result = live_state_cache.held_geofence_result(cattle_id)
+            geofence_mode = "held"
+        else:
+            geofence_result = live_state_cache.cached_geofence_result(
+                cattle_id, position.latitude, position.longitude, data.is_moving)
+            geofence_mode = "cached" if geofence_result is not None else "evaluated"
+        if geofence_result is not None or geofence_mode == "held":
+            print(f"♻️ Reusing the geofence status of {cattle_id} ({geofence_mode})")
+        else:
+            print(f"🗺️ Checking geofences for cattle {cattle_id}...")
+            try:
+                geofence_result = check_cattle_geofence_status(cattle_id, position.latitude, position.longitude,
+                                                               record=True, at=parse_time(data.timestamp))
                 
-                if breach_count > 0:
-                    print(f"🚨 GEOFENCE BREACHES DETECTED: {breach_count} breaches for cattle {cattle_id}")
+                if geofence_result.get("success"):
+                    live_state_cache.record_geofence_result(cattle_id, position.latitude, position.longitude, geofence_result)
+                    # Enter/exit transitions keep the per-fence head counts current
+                    entered, exited = fence_occupancy.update(cattle_id, position.latitude, position.longitude)
+                    if entered or exited:
+                        print(f"🔢 Cattle {cattle_id} entered {sorted(entered)}, left {sorted(exited)}")
+                    geofence_alerts = geofence_result.get("alerts", [])
+                    breach_count = geofence_result.get("total_breaches", 0)
+                    
+                    if breach_count > 0:
+                        print(f"🚨 GEOFENCE BREACHES DETECTED: {breach_count} breaches for cattle {cattle_id}")
+                    else:
+                        print(f"✅ Cattle {cattle_id} is within all geofences")
                 else:
-                    print(f"✅ Cattle {cattle_id} is within all geofences")
-            else:
-                print(f"⚠️ Geofence check failed: {geofence_result.get('error')}")
-                geofence_alerts = []
-                
-        except Exception as e:
-            print(f"❌ Error in enhanced geofence processing: {str(e)}")
-            geofence_alerts = []
+                    print(f"⚠️ Geofence check failed: {geofence_result.get('error')}")
+                    
+            except Exception as e:
+                print(f"❌ Error in enhanced geofence processing: {str(e)}")
 
+        # Predict a boundary crossing from heading and speed (animals inside their fences)
+        boundary_prediction, approach_warnings = None, []
+        if position.available and geofence_result is not None:
+            from routers.geofence import predict_boundary_crossings
+            predictions, warnings = predict_boundary_crossings([{
+                "cattle_id": cattle_id,
+                "latitude": position.latitude,
+                "longitude": position.longitude,
+                "heading": data.heading,
+                "speed_kmh": analyzed["speed_kmh"],
+                "geofence_result": geofence_result
+            }], record=True)
+            boundary_prediction = predictions.get(cattle_id)
+            approach_warnings = warnings.get(cattle_id, [])
+        
         # Prepare response with geofence status
         response_message = f"Live data for {cattle_id} processed successfully."
         if geofence_alerts:
             response_message += f" Generated {len(geofence_alerts)} geofence alerts."
+        if approach_warnings:
+            response_message += f" Approaching boundary of '{boundary_prediction['name']}'."
 
         # --- Behavior-based alert analysis ---
         try:
-            alerts = analyze_behavior_and_generate_alerts(cattle_id, data.model_dump())
+            alerts = analyze_behavior_and_generate_alerts(cattle_id, analyzed, previous_reading)
             print(f"🔍 Generated {len(alerts)} behavior alerts")
         except Exception as e:
             print(f"⚠️ Warning: Behavior analysis failed: {str(e)}")
@@ -97,15 +386,29 @@ async def update_cattle_live_data(data: CattleSensorData):
         if alerts:
             response_message += f" Generated {len(alerts)} behavior alerts."
 
+        # --- Tell the device when to report next ---
+        next_interval, interval_reason = reporting_policy.next_interval(
+            data.behavior.current, data.is_moving, analyzed["speed_kmh"], geofence_result,
+            boundary_prediction["seconds_to_boundary"] if boundary_prediction else None
+        )
+        print(f"📶 Next report from {cattle_id} in {next_interval}s ({interval_reason})")
+
+        live_state_cache.record_reading(cattle_id, analyzed)
         print(f"✅ Successfully processed data for {cattle_id}")
         return {
             "success": True, 
             "message": response_message,
             "cattle_id": cattle_id,
             "location": {"latitude": data.latitude, "longitude": data.longitude},
+            "filtered_position": position.as_dict(),
             "behavior": data.behavior.current,
             "geofence_alerts": geofence_alerts,
-            "behavior_alerts": alerts
+            "boundary_prediction": boundary_prediction,
+            "approach_warnings": approach_warnings,
+            "behavior_alerts": alerts,
+            "next_report_interval_seconds": next_interval,
+            "report_interval_reason": interval_reason,
+            "writes": {"live_data": live_mode, "cattle": cattle_mode, "geofence": geofence_mode}
         }
         
     except HTTPException:
@@ -125,18 +428,28 @@ async def get_cattle_live_data(cattle_id: str):
         result = firebase_service.get_realtime_data(f"cattle_live_data/{cattle_id}")
         if not result["success"]:
             raise HTTPException(status_code=404, detail=f"No live data found for cattle {cattle_id}")
+        result.pop("etag", None)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get live data: {str(e)}")
 
-@router.get("/live-data")
-async def get_all_cattle_live_data():
+@micro_cache(MICRO_CACHE_TTL_SECONDS)
+async def load_all_cattle_live_data():
+    """Read the whole cattle_live_data node, shared by concurrent pollers"""
+    result = await firebase_service.aget_realtime_data("cattle_live_data")
+    etag = storage_etag(result) if result["success"] else None
+    return result, etag
+
+@router.get("/live-data", response_class=FastJSONResponse)
+async def get_all_cattle_live_data(request: Request):
     """Get live data for all cattle"""
     try:
-        result = firebase_service.get_realtime_data("cattle_live_data")
+        result, etag = await load_all_cattle_live_data()
         if not result["success"]:
             raise HTTPException(status_code=404, detail="No live data found")
-        return result
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        return FastJSONResponse(result, headers={"ETag": etag} if etag else None)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get live data: {str(e)}")
 
@@ -206,29 +519,61 @@ async def get_cattle_geofence_breach_status(cattle_id: str):
             "error": f"Error checking geofence status: {str(e)}"
         }
 
-@router.get("/locations")
+@micro_cache(MICRO_CACHE_TTL_SECONDS)
+async def load_all_cattle_locations():
+    """Latest location of every animal (from the in-memory herd state), shared by concurrent pollers"""
+    if not await asyncio.to_thread(herd_state.ensure_fresh):
+        return {"success": True, "data": []}
+    return {"success": True, "data": herd_state.locations()}
+
+@router.get("/locations", response_class=FastJSONResponse)
 async def get_all_cattle_locations():
     """Get all cattle locations in format expected by frontend"""
     try:
-        result = firebase_service.get_realtime_data("cattle_live_data")
-        if not result["success"]:
-            return {"success": True, "data": []}
-        
-        cattle_data = result.get("data", {})
-        locations = []
-        
-        for cattle_id, data in cattle_data.items():
-            if isinstance(data, dict) and "latitude" in data and "longitude" in data:
-                locations.append({
-                    "cattle_id": cattle_id,
-                    "latitude": data["latitude"],
-                    "longitude": data["longitude"],
-                    "timestamp": data.get("timestamp"),
-                    "behavior": data.get("behavior", {}).get("current", "unknown"),
-                    "is_moving": data.get("is_moving", False)
-                })
-        
-        return {"success": True, "data": locations}
+        # The cache holds the payload; every caller gets its own response object
+        return FastJSONResponse(await load_all_cattle_locations())
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get cattle locations: {str(e)}")
+
+def check_coordinate(name: str, value: float, bound: float):
+    if not -bound <= value <= bound:
+        raise HTTPException(status_code=400, detail=f"'{name}' must be between {-bound:g} and {bound:g}")
+
+@router.get("/nearby", response_class=FastJSONResponse)
+async def get_cattle_nearby(lat: float, lon: float, radius_m: float = 200.0, limit: int = 1000):
+    """Latest locations of the cattle within radius_m meters of a point, nearest first (with distance_m)"""
+    check_coordinate("lat", lat, 90)
+    check_coordinate("lon", lon, 180)
+    if radius_m <= 0 or limit < 1:
+        raise HTTPException(status_code=400, detail="'radius_m' and 'limit' must be positive")
+    try:
+        if not await asyncio.to_thread(herd_state.ensure_fresh):
+            return {"success": True, "data": [], "count": 0}
+        cattle = herd_state.nearby(lat, lon, radius_m, limit=limit)
+        return FastJSONResponse({"success": True, "data": cattle, "count": len(cattle)})
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get nearby cattle: {str(e)}")
+
+@router.get("/in-bbox", response_class=FastJSONResponse)
+async def get_cattle_in_bbox(min_lat: float, min_lon: float, max_lat: float, max_lon: float, limit: int = 5000):
+    """
+    Latest locations of the cattle inside a map viewport (bounding box, edges included).
+    Viewports crossing the antimeridian are not supported: min_lon must not exceed max_lon.
+    """
+    for name, value, bound in (("min_lat", min_lat, 90), ("max_lat", max_lat, 90),
+                               ("min_lon", min_lon, 180), ("max_lon", max_lon, 180)):
+        check_coordinate(name, value, bound)
+    if min_lat > max_lat or min_lon > max_lon:
+        raise HTTPException(status_code=400, detail="Bounding box minimums must not exceed its maximums")
+    if limit < 1:
+        raise HTTPException(status_code=400, detail="'limit' must be positive")
+    try:
+        if not await asyncio.to_thread(herd_state.ensure_fresh):
+            return {"success": True, "data": [], "count": 0}
+        cattle = herd_state.in_bbox(min_lat, min_lon, max_lat, max_lon, limit=limit)
+        return FastJSONResponse({"success": True, "data": cattle, "count": len(cattle)})
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get cattle in bounding box: {str(e)}")
@@ -1,60 +1,40 @@
-from fastapi import APIRouter, HTTPException
-from temp_firebase_service import temp_firebase_service as firebase_service
+import asyncio
+from fastapi import APIRouter, HTTPException, Request
+from dashboard_summary import dashboard_summary
+from herd_state import herd_state
+from http_cache import etag_matches, make_etag, not_modified
+from fast_json import FastJSONResponse
 
 router = APIRouter(prefix="/dashboard", tags=["dashboard"])
 
-@router.get("/summary")
-async def get_dashboard_summary():
-    """Get summary data for dashboard"""
+@router.get("/summary", response_class=FastJSONResponse)
+async def get_dashboard_summary(request: Request):
+    """Get summary data for dashboard (served from the in-memory materialized summary)"""
     try:
-        # Get cattle data
-        cattle_result = firebase_service.get_collection("cattle")
-        staff_result = firebase_service.get_collection("staff")
-        alerts_result = firebase_service.get_collection("alerts")
-        
-        if not all([cattle_result["success"], staff_result["success"], alerts_result["success"]]):
+        refresh = await asyncio.to_thread(dashboard_summary.ensure_fresh)
+        if not refresh["success"]:
             raise HTTPException(status_code=500, detail="Failed to fetch dashboard data")
         
-        cattle_data = cattle_result["data"]
-        staff_data = staff_result["data"]
-        alerts_data = alerts_result["data"]
-        
-        # Calculate statistics
-        total_cattle = len(cattle_data)
-        cattle_by_status = {}
-        cattle_by_location = {}
-        
-        for cattle in cattle_data:
-            status = cattle.get("status", "unknown")
-            location = cattle.get("location", "unknown")
-            cattle_by_status[status] = cattle_by_status.get(status, 0) + 1
-            cattle_by_location[location] = cattle_by_location.get(location, 0) + 1
+        data, etag = dashboard_summary.snapshot()
+        # Live herd counts come from the columnar herd state, scanned per request
+        if await asyncio.to_thread(herd_state.ensure_fresh):
+            herd = herd_state.summary()
+            data = {**data, "herd": herd}
+            etag = make_etag(etag, sorted(herd["by_behavior"].items()), herd["tracked"], herd["moving"], herd["active"])
+        if etag_matches(request, etag):
+            return not_modified(etag)
         
-        total_staff = len(staff_data)
-        staff_online = len([s for s in staff_data if s.get("status") == "Online"])
-        staff_offline = total_staff - staff_online
-        
-        total_alerts = len(alerts_data)
-        recent_alerts = sorted(alerts_data, key=lambda x: x.get("timestamp", ""), reverse=True)[:5]
-        
-        return {
+        return FastJSONResponse({
             "success": True,
-            "data": {
-                "cattle": {
-                    "total": total_cattle,
-                    "by_status": cattle_by_status,
-                    "by_location": cattle_by_location
-                },
-                "staff": {
-                    "total": total_staff,
-                    "online": staff_online,
-                    "offline": staff_offline
-                },
-                "alerts": {
-                    "total": total_alerts,
-                    "recent": recent_alerts
-                }
-            }
-        }
+            "data": data
+        }, headers={"ETag": etag})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate dashboard summary: {str(e)}")
+
+@router.post("/summary/reconcile")
+async def reconcile_dashboard_summary():
+    """Force a full recount of the dashboard summary from the database"""
+    result = await asyncio.to_thread(dashboard_summary.reconcile)
+    if not result["success"]:
+        raise HTTPException(status_code=500, detail=result.get("error", "Failed to reconcile dashboard summary"))
+    return result
@@ -1,34 +1,187 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from temp_firebase_service import temp_firebase_service as firebase_service
-from models import Geofence, GeofenceCreate, CattleLocationUpdate, CattleSensorData
-from shapely.geometry import Point, Polygon
-from datetime import datetime
+from dashboard_summary import dashboard_summary
+from request_coalescing import micro_cache, MICRO_CACHE_TTL_SECONDS
+from http_cache import etag_matches, make_etag, not_modified, storage_etag
+from fast_json import FastJSONResponse, dumps
+from geofence_bundle import geofence_bundle
+from live_state_cache import live_state_cache
+from geofence_registry import geofence_registry, FAR_FENCE_DISTANCE_KM, FAR_FENCE_MODE, KM_PER_DEGREE
+from fence_geometry import ZONE_EXCLUSION, ZONE_INCLUSION, ZONE_TYPES, evaluation_geometry, prepare_fence
+from fence_preview import preview_fence
+from fence_occupancy import fence_occupancy
+from herd_state import herd_state, iso_timestamp
+from geofence_import import IMPORT_FORMATS, detect_format, parse_import
+from breach_prediction import breach_predictor
+from fence_reevaluation import fence_reevaluations, JOB_DONE
+from ingest_dedup import timestamp_order
+from breach_episodes import (EPISODE_QUERY_MAX_DAYS, breach_episodes, count_episodes, daily_time_outside, episode_alert,
+                             parse_time, query_episodes, utc_now)
+from geofence_assignments import (
+    geofence_assignments, assignment_id, ASSIGNMENT_COLLECTION, ASSIGNMENT_MODES, MODE_ALL, TARGET_GROUP, TARGET_TYPES
+)
+from models import (
+    Geofence, GeofenceCreate, GeofenceAssignmentCreate, FenceReevaluationCreate, CattleLocationUpdate, CattleSensorData
+)
+from shapely.geometry import Point
+from datetime import datetime, timedelta
+from typing import Optional
+import asyncio
+import json
+import os
+import shapely
+import time
 import uuid
 import math
 
 router = APIRouter(tags=["geofence"])
 
-# Create a geofence
-@router.post("/geofences")
-async def create_geofence(geofence: GeofenceCreate):
+REEVALUATION_PROGRESS_INTERVAL_SECONDS = float(os.getenv("GEOFENCE_REEVALUATION_PROGRESS_INTERVAL_SECONDS", "1"))
+
+def validate_geofence(fields: dict):
+    """Validated and repaired geofence document with its geometry report (ValueError if unusable)"""
+    if fields.get("zone_type", ZONE_INCLUSION) not in ZONE_TYPES:
+        raise ValueError(f"zone_type must be one of {list(ZONE_TYPES)}")
+    if fields.get("parent_id") is not None:
+        geofence_registry.ensure_fresh()
+        if geofence_registry.get(fields["parent_id"]) is None:
+            raise ValueError(f"Parent geofence {fields['parent_id']} not found")
+    return prepare_fence(fields)
+
+def store_geofence(fields: dict):
+    """
+    Validate, repair and store one geofence (see fence_geometry.py).
+    Returns (stored document, geometry report); raises ValueError for fences
+    that cannot be used and RuntimeError if storing fails.
+    """
+    data, report = validate_geofence(fields)
     geofence_id = f"geofence_{uuid.uuid4().hex[:8]}"
-    data = geofence.model_dump()
     data["id"] = geofence_id
     result = firebase_service.create_document("geofences", geofence_id, data)
     if not result["success"]:
-        raise HTTPException(status_code=400, detail=result.get("error", "Failed to create geofence"))
+        raise RuntimeError(result.get("error", "Failed to create geofence"))
+    
+    geofence_registry.upsert(data)
+    geofence_bundle.invalidate()
+    live_state_cache.invalidate_geofence_results()
+    print(f"🗺️ New geofence created: {data['name']} with {len(data['coordinates'])} points "
+          f"({report['evaluation_vertices']} after cleaning)")
+    return data, report
+
+# Create a geofence
+@router.post("/geofences")
+async def create_geofence(geofence: GeofenceCreate):
+    try:
+        data, report = store_geofence(geofence.model_dump(exclude_none=True))
+    except (ValueError, RuntimeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "success": True,
+        "message": f"Document {data['id']} created successfully",
+        "data": {"id": data["id"], "geometry": report}
+    }
+
+# Bulk import from GeoJSON or KML
+@router.post("/import")
+async def import_geofences(request: Request, format: Optional[str] = None, dry_run: bool = False):
+    """
+    Import every polygon in a GeoJSON or KML file sent as the request body
+    (format is taken from the Content-Type unless given). Each fence goes
+    through the same validation and repair as a single create; fences that
+    fail are reported without stopping the import. With dry_run nothing is
+    stored.
+    """
+    body = await request.body()
+    import_format = format or detect_format(request.headers.get("content-type"), body)
+    if import_format not in IMPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {list(IMPORT_FORMATS)}")
+    try:
+        fences, skipped = parse_import(body, import_format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    print(f"🗺️ New geofence created: {data['name']} with {len(data['coordinates'])} points")
-    return result
+    created, failed = [], []
+    for index, fields in enumerate(fences):
+        try:
+            if dry_run:
+                _, report = validate_geofence(fields)
+                created.append({"name": fields["name"], "geometry": report})
+            else:
+                data, report = store_geofence(fields)
+                created.append({"id": data["id"], "name": data["name"], "geometry": report})
+        except (ValueError, RuntimeError) as e:
+            failed.append({"index": index, "name": fields.get("name"), "error": str(e)})
+    
+    print(f"📥 Geofence import ({import_format}{', dry run' if dry_run else ''}): "
+          f"{len(created)} created, {len(failed)} failed, {len(skipped)} skipped")
+    return {
+        "success": not failed,
+        "data": {"created": created, "failed": failed, "skipped": skipped, "dry_run": dry_run}
+    }
+
+# What-if evaluation of a fence before it is saved
+@router.post("/preview", response_class=FastJSONResponse)
+async def preview_geofence(geofence: GeofenceCreate, include_cattle: bool = True):
+    """
+    Which animals would be inside or outside a candidate fence, and how far
+    from its boundary, evaluated against the latest position of every animal
+    in one vectorized pass (see fence_preview.py). Nothing is stored.
+    """
+    try:
+        data, report = validate_geofence(geofence.model_dump(exclude_none=True))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # Latest positions from the columnar herd state (see herd_state.py)
+    await asyncio.to_thread(herd_state.ensure_fresh)
+    cattle_ids, latitudes, longitudes = herd_state.positions()
+    
+    result = preview_fence(evaluation_geometry(data), cattle_ids, latitudes, longitudes,
+                           data.get("zone_type", ZONE_INCLUSION), include_cattle)
+    print(f"👁️ Fence preview '{data['name']}': {result['counts']['inside']}/{result['counts']['total']} inside "
+          f"in {result['elapsed_ms']} ms")
+    return FastJSONResponse({
+        "success": True,
+        "data": {**result, "geometry": report}
+    })
 
 # Get all geofences
-@router.get("/geofences")
-async def get_geofences():
+@router.get("/geofences", response_class=FastJSONResponse)
+async def get_geofences(request: Request):
     result = firebase_service.get_collection("geofences")
     if not result["success"]:
         raise HTTPException(status_code=400, detail=result.get("error", "Failed to get geofences"))
     
-    return result
+    etag = storage_etag(result)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    return FastJSONResponse(result, headers={"ETag": etag} if etag else None)
+
+# Compact fence bundle for on-device checking
+@router.get("/bundle", response_class=FastJSONResponse)
+async def get_geofence_bundle(request: Request, since_version: Optional[int] = None):
+    """
+    Active fences, simplified and quantized for collars (format in geofence_bundle.py).
+    Pass the version the device already has as since_version to get a short
+    "unchanged" answer when it is still current.
+    """
+    try:
+        bundle = geofence_bundle.current()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to build geofence bundle: {str(e)}")
+    if bundle is None:
+        raise HTTPException(status_code=503, detail="Geofence bundle is not available yet")
+    
+    etag = make_etag("geofence-bundle", bundle["hash"])
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    if since_version == bundle["version"]:
+        return FastJSONResponse(
+            {"success": True, "changed": False, "version": bundle["version"], "hash": bundle["hash"]},
+            headers={"ETag": etag}
+        )
+    return FastJSONResponse({"success": True, "changed": True, "data": bundle}, headers={"ETag": etag})
 
 # =====================
 # CATTLE LOCATION UPDATE & GEOFENCE CHECK
@@ -141,19 +294,23 @@ async def monitor_cattle_geofence_realtime(cattle_id: str):
             "alerts": []
         }
 
-@router.get("/monitor/all")
+@router.get("/monitor/all", response_class=FastJSONResponse)
 async def monitor_all_cattle_geofences():
     """
     Monitor all cattle for geofence breaches in real-time.
     Returns summary of all cattle with breach status.
     """
+    # The cache holds the payload; every caller gets its own response object
+    return FastJSONResponse(await load_herd_geofence_monitor())
+
+@micro_cache(MICRO_CACHE_TTL_SECONDS)
+async def load_herd_geofence_monitor():
+    """Breach status of the whole herd, shared by concurrent pollers"""
     try:
         print(f"🔍 Monitoring all cattle for geofence breaches")
         
-        # Get all cattle live data
-        live_data_result = firebase_service.get_realtime_data("cattle_live_data")
-        
-        if not live_data_result.get("success"):
+        # Latest readings from the columnar herd state (see herd_state.py)
+        if not await asyncio.to_thread(herd_state.ensure_fresh):
             return {
                 "success": True,
                 "message": "No cattle data found",
@@ -162,18 +319,17 @@ async def monitor_all_cattle_geofences():
                 "cattle_status": []
             }
         
-        all_cattle_data = live_data_result.get("data", {})
+        herd = herd_state.columns("latitude", "longitude", "last_seen", "speed_kmh", "heading", "behavior", "is_moving")
+        behaviors = herd["behavior_label"][herd["behavior"]].tolist()
         cattle_status = []
         breach_count = 0
+        moving_animals = []
         
-        for cattle_id, cattle_data in all_cattle_data.items():
-            if not isinstance(cattle_data, dict):
-                continue
-                
-            latitude = cattle_data.get("latitude")
-            longitude = cattle_data.get("longitude")
+        for row, cattle_id in enumerate(herd["cattle_id"].tolist()):
+            latitude = float(herd["latitude"][row])
+            longitude = float(herd["longitude"][row])
             
-            if latitude is None or longitude is None:
+            if math.isnan(latitude) or math.isnan(longitude):
                 cattle_status.append({
                     "cattle_id": cattle_id,
                     "has_breach": False,
@@ -188,6 +344,14 @@ async def monitor_all_cattle_geofences():
             has_breach = len(geofence_result.get("outside_geofences", [])) > 0
             if has_breach:
                 breach_count += 1
+            moving_animals.append({
+                "cattle_id": cattle_id,
+                "latitude": latitude,
+                "longitude": longitude,
+                "heading": float(herd["heading"][row]),
+                "speed_kmh": float(herd["speed_kmh"][row]),
+                "geofence_result": geofence_result
+            })
             
             cattle_status.append({
                 "cattle_id": cattle_id,
@@ -196,10 +360,10 @@ async def monitor_all_cattle_geofences():
                 "current_location": {
                     "latitude": latitude,
                     "longitude": longitude,
-                    "timestamp": cattle_data.get("timestamp")
+                    "timestamp": iso_timestamp(herd["last_seen"][row])
                 },
-                "behavior": cattle_data.get("behavior", {}).get("current", "unknown"),
-                "is_moving": cattle_data.get("is_moving", False),
+                "behavior": behaviors[row],
+                "is_moving": bool(herd["is_moving"][row]),
                 "geofence_details": {
                     "outside": geofence_result.get("outside_geofences", []),
                     "inside": geofence_result.get("inside_geofences", [])
@@ -207,12 +371,25 @@ async def monitor_all_cattle_geofences():
                 "alerts": geofence_result.get("alerts", [])
             })
         
-        print(f"📊 Monitoring complete: {len(cattle_status)} cattle, {breach_count} with breaches")
+        # Predict boundary crossings for the whole herd at once (warnings are raised on ingest)
+        predictions, _ = predict_boundary_crossings(moving_animals)
+        approaching_count = 0
+        for status in cattle_status:
+            if "error" in status:
+                continue
+            prediction = predictions.get(status["cattle_id"])
+            status["boundary_prediction"] = prediction
+            if prediction and prediction["approaching"]:
+                approaching_count += 1
+        
+        print(f"📊 Monitoring complete: {len(cattle_status)} cattle, {breach_count} with breaches, "
+              f"{approaching_count} approaching a boundary")
         
         return {
             "success": True,
             "total_cattle": len(cattle_status),
             "cattle_with_breaches": breach_count,
+            "cattle_approaching_boundary": approaching_count,
             "timestamp": datetime.now().isoformat(),
             "cattle_status": cattle_status
         }
@@ -225,10 +402,59 @@ async def monitor_all_cattle_geofences():
 # ADVANCED GEOFENCE CHECK LOGIC
 # =====================
 
-def check_cattle_geofence_status(cattle_id: str, latitude: float, longitude: float):
+def save_geofence_alerts(cattle_id: str, alerts: list):
+    """Store geofence alerts and add them to the dashboard summary"""
+    for alert in alerts:
+        try:
+            alert_id = f"alert_{cattle_id}_{uuid.uuid4().hex[:8]}"
+            result = firebase_service.create_document("alerts", alert_id, alert)
+            if result.get("success"):
+                dashboard_summary.record_alert(alert_id, alert)
+                print(f"🚨 Geofence alert saved: {alert['message']}")
+            else:
+                print(f"❌ Failed to save alert: {result.get('error')}")
+        except Exception as e:
+            print(f"❌ Error saving alert: {str(e)}")
+
+def predict_boundary_crossings(animals: list, record: bool = False):
+    """
+    Predicted boundary crossings for a batch of animals (see breach_prediction.py).
+    Only record=True (the ingest path) raises and saves approaching_boundary warnings.
+    Returns ({cattle_id: prediction or None}, {cattle_id: [warning alerts]}).
+    """
+    try:
+        predictions = breach_predictor.predict(animals)
+    except Exception as e:
+        print(f"⚠️ Breach prediction failed: {str(e)}")
+        return {animal["cattle_id"]: None for animal in animals}, {}
+    
+    warnings = {}
+    if not record:
+        return predictions, warnings
+    for animal in animals:
+        cattle_id = animal["cattle_id"]
+        alert = breach_predictor.warning_alert(cattle_id, predictions.get(cattle_id),
+                                               animal["latitude"], animal["longitude"])
+        if alert is not None:
+            print(f"⚠️ {alert['message']}")
+            save_geofence_alerts(cattle_id, [alert])
+            warnings[cattle_id] = [alert]
+    return predictions, warnings
+
+def check_cattle_geofence_status(cattle_id: str, latitude: float, longitude: float,
+                                 record: bool = False, at: Optional[datetime] = None):
     """
     Check if a cattle is inside or outside all geofences.
     Returns detailed geofence status and generates alerts if needed.
+    
+    Inclusion fences are breached when the animal is outside them, exclusion
+    zones when it is inside them; both kinds of breach are listed in
+    outside_geofences. Child fences are only tested when the animal is inside
+    their parent.
+    
+    Only record=True (the ingest path, with the reading time as at) folds the
+    result into breach episodes and saves the alerts of newly started ones.
+    Other checks (status, monitoring, what-if coordinates) are read-only.
     """
     try:
         print(f"🔍 Checking geofence status for cattle {cattle_id} at ({latitude:.6f}, {longitude:.6f})")
@@ -236,18 +462,26 @@ def check_cattle_geofence_status(cattle_id: str, latitude: float, longitude: flo
         # Create point from cattle location
         cattle_point = Point(longitude, latitude)
         
-        # Get all geofences
-        geofences_result = firebase_service.get_collection("geofences")
-        if not geofences_result.get("success"):
-            print(f"❌ Failed to fetch geofences: {geofences_result.get('error')}")
+        # Fences come from the in-memory registry (synced with the database periodically)
+        if not geofence_registry.ensure_fresh():
             return {
                 "success": False,
                 "error": "Failed to fetch geofences",
                 "alerts": []
             }
         
-        geofences = geofences_result.get("data", [])
-        if not geofences:
+        # Only the animal's assigned fences are evaluated, see geofence_assignments.py
+        assignment = geofence_assignments.for_cattle(cattle_id)
+        if assignment.geofence_ids is not None and not geofence_registry.count(assignment.geofence_ids):
+            print(f"⚠️ None of the geofences assigned to cattle {cattle_id} exist, checking all geofences")
+            assignment = geofence_assignments.unassigned
+        only = assignment.geofence_ids
+        if only is not None:
+            # Exclusion zones (dams, crops) apply to every animal
+            only = only | geofence_registry.exclusion_ids()
+        
+        total_geofences = geofence_registry.count(only)
+        if not total_geofences:
             print(f"📭 No geofences found")
             return {
                 "success": True,
@@ -257,71 +491,179 @@ def check_cattle_geofence_status(cattle_id: str, latitude: float, longitude: flo
                 "alerts": []
             }
         
-        print(f"📊 Found {len(geofences)} geofences to check")
+        # Only fences near the point need an exact test, see geofence_registry.py
+        # Listing every far fence costs a walk over all fences, so the ingest path only takes
+        # the assigned ones and those with a breach in progress (more below if "any" needs them)
+        list_far = FAR_FENCE_MODE == "bbox" and (not record or only is not None)
+        if FAR_FENCE_MODE == "exact":
+            near_fences, far_fences = [entry for entry in geofence_registry.entries() if only is None or entry.id in only], []
+        else:
+            # Degrees of longitude are shorter than degrees of latitude, size the radius for both
+            radius_deg = FAR_FENCE_DISTANCE_KM / (KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01))
+            near_fences, far_fences = geofence_registry.query(
+                longitude, latitude, radius_deg, include_far=list_far, only=only
+            )
+            if FAR_FENCE_MODE == "bbox" and not list_far:
+                near_ids = {entry.id for entry in near_fences}
+                far_fences = sorted((entry for entry in map(geofence_registry.get, breach_episodes.open_fence_ids(cattle_id))
+                                     if entry is not None and entry.id not in near_ids), key=lambda entry: str(entry.id))
+        print(f"📊 Checking {len(near_fences)} nearby of {total_geofences} geofences")
         
         inside_geofences = []
+        outside_candidates = []
         outside_geofences = []
         alerts = []
-        
-        for geofence_data in geofences:
-            if not isinstance(geofence_data, dict):
-                continue
-                
-            geofence_id = geofence_data.get("id", "unknown")
-            geofence_name = geofence_data.get("name", geofence_id)
-            coordinates = geofence_data.get("coordinates", [])
+        far_ids = {entry.id for entry in far_fences}
+        evaluated = {}
+        pruned = 0
+        
+        def evaluate(entry):
+            """(is_inside, distance to boundary in meters, approximate), at most once per fence"""
+            if entry.id not in evaluated:
+                if entry.id in far_ids:
+                    # Far fences cannot contain the point; the bounding box gives a lower bound on the distance
+                    evaluated[entry.id] = (False, entry.bbox_distance_m(longitude, latitude), True)
+                else:
+                    # Large fences answer most points from their raster, see geofence_raster.py
+                    raster_hit = None
+                    if entry.raster is not None:
+                        raster_hit = entry.raster.lookup(*entry.projection.to_local(longitude, latitude))
+                    if raster_hit is not None:
+                        evaluated[entry.id] = (raster_hit[0], raster_hit[1], True)
+                    else:
+                        # Check if cattle is inside the geofence, and how far from its boundary
+                        # (in the fence's local metric projection)
+                        evaluated[entry.id] = (entry.polygon.contains(cattle_point),
+                                               entry.boundary_distance_m(longitude, latitude), False)
+            return evaluated[entry.id]
+        
+        def blocking_ancestor(entry):
+            """The outermost parent fence the point is not in (children are only tested inside their parent)"""
+            for ancestor in geofence_registry.ancestors(entry):
+                if not evaluate(ancestor)[0]:
+                    return ancestor
+            return None
+        
+        def record_outside(entry, distance_km, approximate):
+            outside_candidates.append((entry, distance_km, approximate))
+        
+        def record_breach(entry, distance_km, approximate):
+            geofence_info = {
+                "id": entry.id,
+                "name": entry.name,
+                "is_inside": False,
+                "distance_to_boundary_km": round(distance_km, 3)
+            }
+            if approximate:
+                geofence_info["distance_approximate"] = True
+            outside_geofences.append(geofence_info)
+            print(f"❌ Cattle {cattle_id} is OUTSIDE geofence '{entry.name}' by {distance_km:.3f} km")
             
-            if not coordinates or len(coordinates) < 3:
-                print(f"⚠️ Skipping invalid geofence {geofence_name}: insufficient coordinates")
-                continue
+            # Generate breach alert
+            alerts.append({
+                "cattleId": cattle_id,
+                "type": "geofence_breach",
+                "severity": "high" if distance_km > 1.0 else "medium",
+                "message": f"🚨 Cattle {cattle_id} is outside geofence '{entry.name}' by {distance_km:.3f} km",
+                "timestamp": datetime.now().isoformat(),
+                "location": {
+                    "latitude": latitude,
+                    "longitude": longitude
+                },
+                "geofence": {
+                    "id": entry.id,
+                    "name": entry.name,
+                    "distance_km": round(distance_km, 3)
+                }
+            })
+        
+        def record_exclusion_breach(entry, distance_km, approximate):
+            # Breached exclusion zones are listed with the other breaches, marked by zone_type
+            geofence_info = {
+                "id": entry.id,
+                "name": entry.name,
+                "is_inside": True,
+                "zone_type": ZONE_EXCLUSION,
+                "distance_to_boundary_km": round(distance_km, 3)
+            }
+            if approximate:
+                geofence_info["distance_approximate"] = True
+            outside_geofences.append(geofence_info)
+            print(f"❌ Cattle {cattle_id} is INSIDE exclusion zone '{entry.name}' by {distance_km:.3f} km")
             
-            try:
-                # Create polygon from coordinates
-                geofence_poly = Polygon(coordinates)
-                
-                # Check if cattle is inside the geofence
-                is_inside = geofence_poly.contains(cattle_point)
-                
-                # Calculate distance to geofence boundary
-                distance_to_boundary = cattle_point.distance(geofence_poly.boundary)
-                distance_km = distance_to_boundary * 111.32  # Rough conversion to km
-                
-                geofence_info = {
-                    "id": geofence_id,
-                    "name": geofence_name,
-                    "is_inside": is_inside,
-                    "distance_to_boundary_km": round(distance_km, 3)
+            alerts.append({
+                "cattleId": cattle_id,
+                "type": "geofence_exclusion_breach",
+                "severity": "high",
+                "message": f"🚨 Cattle {cattle_id} is inside exclusion zone '{entry.name}'",
+                "timestamp": datetime.now().isoformat(),
+                "location": {
+                    "latitude": latitude,
+                    "longitude": longitude
+                },
+                "geofence": {
+                    "id": entry.id,
+                    "name": entry.name,
+                    "distance_km": round(distance_km, 3)
                 }
-                
-                if is_inside:
+            })
+        
+        candidate_ids = {entry.id for entry in near_fences} | far_ids
+        
+        def classify(entry):
+            nonlocal pruned
+            try:
+                blocker = blocking_ancestor(entry)
+                if blocker is not None:
+                    # Outside the parent, so outside this fence too without testing it
+                    pruned += 1
+                    if entry.zone_type != ZONE_EXCLUSION and blocker.id not in candidate_ids:
+                        record_outside(entry, evaluate(blocker)[1] / 1000, approximate=True)
+                    return
+            
+                is_inside, distance_m, approximate = evaluate(entry)
+                distance_km = distance_m / 1000
+            
+                if entry.zone_type == ZONE_EXCLUSION:
+                    if is_inside:
+                        record_exclusion_breach(entry, distance_km, approximate)
+                elif is_inside:
+                    geofence_info = {
+                        "id": entry.id,
+                        "name": entry.name,
+                        "is_inside": True,
+                        "distance_to_boundary_km": round(distance_km, 3)
+                    }
+                    if approximate:
+                        geofence_info["distance_approximate"] = True
                     inside_geofences.append(geofence_info)
-                    print(f"✅ Cattle {cattle_id} is INSIDE geofence '{geofence_name}'")
+                    print(f"✅ Cattle {cattle_id} is INSIDE geofence '{entry.name}'")
                 else:
-                    outside_geofences.append(geofence_info)
-                    print(f"❌ Cattle {cattle_id} is OUTSIDE geofence '{geofence_name}' by {distance_km:.3f} km")
-                    
-                    # Generate breach alert
-                    alert = {
-                        "cattleId": cattle_id,
-                        "type": "geofence_breach",
-                        "severity": "high" if distance_km > 1.0 else "medium",
-                        "message": f"🚨 Cattle {cattle_id} is outside geofence '{geofence_name}' by {distance_km:.3f} km",
-                        "timestamp": datetime.now().isoformat(),
-                        "location": {
-                            "latitude": latitude,
-                            "longitude": longitude
-                        },
-                        "geofence": {
-                            "id": geofence_id,
-                            "name": geofence_name,
-                            "distance_km": round(distance_km, 3)
-                        }
-                    }
-                    alerts.append(alert)
-                    
+                    record_outside(entry, distance_km, approximate)
+                
             except Exception as e:
-                print(f"❌ Error processing geofence {geofence_name}: {str(e)}")
-                continue
+                print(f"❌ Error processing geofence {entry.name}: {str(e)}")
+        
+        for entry in near_fences + far_fences:
+            classify(entry)
+        
+        if FAR_FENCE_MODE == "bbox" and not list_far and assignment.mode != MODE_ALL and \
+                not inside_geofences and not outside_candidates:
+            # Nowhere near any fence: "any" needs the nearest one, so list the far fences after all
+            skipped = [entry for entry in geofence_registry.query(longitude, latitude, radius_deg, include_far=True,
+                                                                  only=only)[1] if entry.id not in far_ids]
+            far_ids.update(entry.id for entry in skipped)
+            candidate_ids.update(far_ids)
+            for entry in skipped:
+                classify(entry)
+        
+        # "all": every fence the animal is outside of is a breach.
+        # "any": inside one of the fences is enough, otherwise one breach against the nearest.
+        if assignment.mode == MODE_ALL:
+            for candidate in outside_candidates:
+                record_breach(*candidate)
+        elif not inside_geofences and outside_candidates:
+            record_breach(*min(outside_candidates, key=lambda candidate: candidate[1]))
         
         # Determine overall status
         if inside_geofences and not outside_geofences:
@@ -333,17 +675,15 @@ def check_cattle_geofence_status(cattle_id: str, latitude: float, longitude: flo
         else:
             overall_status = "unknown"
         
-        # Save alerts to database
-        for alert in alerts:
-            try:
-                alert_id = f"alert_{cattle_id}_{uuid.uuid4().hex[:8]}"
-                result = firebase_service.create_document("alerts", alert_id, alert)
-                if result.get("success"):
-                    print(f"🚨 Geofence breach alert saved: {alert['message']}")
-                else:
-                    print(f"❌ Failed to save alert: {result.get('error')}")
-            except Exception as e:
-                print(f"❌ Error saving alert: {str(e)}")
+        if record:
+            # Breaches are folded into episodes (see breach_episodes.py); only a new episode raises an alert
+            opened = breach_episodes.observe(cattle_id, latitude, longitude, outside_geofences, at=at)
+            alerts = [alert for alert in alerts if alert["geofence"]["id"] in opened]
+            for alert in alerts:
+                alert["episode_id"] = opened[alert["geofence"]["id"]]
+            
+            # Save alerts to database
+            save_geofence_alerts(cattle_id, alerts)
         
         return {
             "success": True,
@@ -351,8 +691,10 @@ def check_cattle_geofence_status(cattle_id: str, latitude: float, longitude: flo
             "inside_geofences": inside_geofences,
             "outside_geofences": outside_geofences,
             "alerts": alerts,
-            "total_geofences": len(geofences),
-            "total_breaches": len(outside_geofences)
+            "total_geofences": total_geofences,
+            "total_breaches": len(outside_geofences),
+            "pruned_geofences": pruned,
+            "assignment": assignment.as_dict()
         }
         
     except Exception as e:
@@ -414,14 +756,19 @@ async def get_cattle_geofence_status(cattle_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get geofence status: {str(e)}")
 
-@router.get("/status/all")
+@router.get("/status/all", response_class=FastJSONResponse)
 async def get_all_cattle_geofence_status():
     """
     Get geofence status for all cattle based on their latest locations.
     """
+    return FastJSONResponse(await load_herd_geofence_status())
+
+@micro_cache(MICRO_CACHE_TTL_SECONDS)
+async def load_herd_geofence_status():
+    """Geofence status of every animal, shared by concurrent pollers"""
     try:
         # Get all cattle live data
-        live_data_result = firebase_service.get_realtime_data("cattle_live_data")
+        live_data_result = await firebase_service.aget_realtime_data("cattle_live_data")
         
         if not live_data_result.get("success"):
             return {
@@ -480,7 +827,7 @@ async def get_all_cattle_geofence_status():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get all cattle geofence status: {str(e)}")
 
-@router.get("/alerts/recent")
+@router.get("/alerts/recent", response_class=FastJSONResponse)
 async def get_recent_geofence_alerts(limit: int = 50):
     """
     Get recent geofence breach alerts for frontend display.
@@ -516,66 +863,130 @@ async def get_recent_geofence_alerts(limit: int = 50):
         
         print(f"📋 Retrieved {len(limited_alerts)} recent geofence alerts")
         
-        return {
+        return FastJSONResponse({
             "success": True,
             "total_alerts": len(geofence_alerts),
             "returned_alerts": len(limited_alerts),
             "alerts": limited_alerts
-        }
+        })
         
     except Exception as e:
         print(f"❌ Error getting recent alerts: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to get alerts: {str(e)}")
 
-@router.get("/alerts/cattle/{cattle_id}")
+@router.get("/alerts/cattle/{cattle_id}", response_class=FastJSONResponse)
 async def get_cattle_geofence_alerts(cattle_id: str, limit: int = 20):
     """
     Get geofence breach alerts for a specific cattle.
+    Each breach episode (see breach_episodes.py) is one alert, read from the
+    animal's own key-ordered episode list instead of scanning all alerts.
     """
     try:
-        # Get all alerts from database
-        alerts_result = firebase_service.get_collection("alerts")
+        episodes_result = query_episodes(cattle_id=cattle_id, limit=limit)
         
-        if not alerts_result.get("success"):
+        if not episodes_result.get("success"):
             return {
                 "success": True,
                 "message": f"No alerts found for cattle {cattle_id}",
                 "alerts": []
             }
         
-        all_alerts = alerts_result.get("data", [])
-        
-        # Filter for this cattle's geofence breach alerts
-        cattle_alerts = [
-            alert for alert in all_alerts 
-            if isinstance(alert, dict) and 
-            alert.get("type") == "geofence_breach" and
-            alert.get("cattleId") == cattle_id
-        ]
-        
-        # Sort by timestamp (newest first)
-        cattle_alerts.sort(
-            key=lambda x: x.get("timestamp", ""), 
-            reverse=True
-        )
-        
-        # Limit results
-        limited_alerts = cattle_alerts[:limit]
+        limited_alerts = [episode_alert(episode) for episode in episodes_result.get("data", [])]
+        total_alerts = count_episodes(cattle_id)
         
         print(f"📋 Retrieved {len(limited_alerts)} alerts for cattle {cattle_id}")
         
-        return {
+        return FastJSONResponse({
             "success": True,
             "cattle_id": cattle_id,
-            "total_alerts": len(cattle_alerts),
+            "total_alerts": total_alerts if total_alerts is not None else len(limited_alerts),
             "returned_alerts": len(limited_alerts),
             "alerts": limited_alerts
-        }
+        })
         
     except Exception as e:
         print(f"❌ Error getting cattle alerts: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to get cattle alerts: {str(e)}")
 
+# =====================
+# BREACH EPISODES
+# =====================
+
+def episode_window(start: Optional[str], end: Optional[str], default_days: Optional[int] = None, max_days: Optional[int] = None):
+    """(start, end) UTC datetimes from query parameters (HTTP 400 if unparseable or longer than max_days)"""
+    window = []
+    for name, value in (("from", start), ("to", end)):
+        parsed = parse_time(value)
+        if value and parsed is None:
+            raise HTTPException(status_code=400, detail=f"Invalid '{name}' timestamp: {value}")
+        window.append(parsed)
+    if default_days is not None:
+        window[1] = window[1] or utc_now()
+        window[0] = window[0] or window[1] - timedelta(days=default_days)
+    if window[0] and window[1] and window[0] >= window[1]:
+        raise HTTPException(status_code=400, detail="'from' must be before 'to'")
+    if max_days is not None and window[1] - window[0] > timedelta(days=max_days):
+        raise HTTPException(status_code=400, detail=f"The window spans at most {max_days} days")
+    return window[0], window[1]
+
+@router.get("/episodes", response_class=FastJSONResponse)
+async def get_breach_episodes(start: Optional[str] = Query(None, alias="from"), end: Optional[str] = Query(None, alias="to"),
+                              cattle_id: Optional[str] = None, fence_id: Optional[str] = None, limit: int = 500):
+    """
+    Breach episodes overlapping a time window, newest first.
+    Open episodes have end = null. Without cattle_id the window defaults to
+    the last 7 days and spans at most EPISODE_QUERY_MAX_DAYS.
+    """
+    if cattle_id is None:
+        window_start, window_end = episode_window(start, end, default_days=7, max_days=EPISODE_QUERY_MAX_DAYS)
+    else:
+        window_start, window_end = episode_window(start, end)
+    try:
+        result = query_episodes(window_start, window_end, cattle_id=cattle_id, fence_id=fence_id, limit=limit)
+        if not result.get("success"):
+            raise HTTPException(status_code=500, detail=f"Failed to get episodes: {result.get('error')}")
+        episodes = result.get("data", [])
+        return FastJSONResponse({
+            "success": True,
+            "data": {
+                "episodes": episodes,
+                "count": len(episodes),
+                "open": sum(1 for episode in episodes if episode.get("end") is None)
+            }
+        })
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"❌ Error getting breach episodes: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to get episodes: {str(e)}")
+
+@router.get("/episodes/daily", response_class=FastJSONResponse)
+async def get_daily_time_outside(start: Optional[str] = Query(None, alias="from"), end: Optional[str] = Query(None, alias="to"),
+                                 cattle_id: Optional[str] = None, fence_id: Optional[str] = None):
+    """
+    Seconds in breach per UTC day, per animal and per fence (default: the last
+    7 days). Episodes spanning midnight are split between the days.
+    """
+    window_start, window_end = episode_window(start, end, default_days=7,
+                                              max_days=None if cattle_id else EPISODE_QUERY_MAX_DAYS)
+    try:
+        result = query_episodes(window_start, window_end, cattle_id=cattle_id, fence_id=fence_id)
+        if not result.get("success"):
+            raise HTTPException(status_code=500, detail=f"Failed to get episodes: {result.get('error')}")
+        return FastJSONResponse({
+            "success": True,
+            "data": {
+                "from": window_start.isoformat(),
+                "to": window_end.isoformat(),
+                "days": daily_time_outside(result.get("data", []), window_start, window_end)
+            }
+        })
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"❌ Error aggregating breach episodes: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to aggregate episodes: {str(e)}")
+
 @router.delete("/geofences/{geofence_id}")
 async def delete_geofence(geofence_id: str):
     """Delete a geofence"""
@@ -584,6 +995,9 @@ async def delete_geofence(geofence_id: str):
         if not result["success"]:
             raise HTTPException(status_code=400, detail=result.get("error", "Failed to delete geofence"))
         
+        geofence_registry.remove(geofence_id)
+        geofence_bundle.invalidate()
+        live_state_cache.invalidate_geofence_results()
         print(f"🗑️ Geofence {geofence_id} deleted")
         return result
         
@@ -592,6 +1006,206 @@ async def delete_geofence(geofence_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to delete geofence: {str(e)}")
 
+# =====================
+# OCCUPANCY
+# =====================
+
+@router.get("/occupancy", response_class=FastJSONResponse)
+async def get_fence_occupancy(reconcile: bool = False):
+    """
+    Head count and stocking density (head per hectare) of every fence,
+    maintained incrementally on ingest (see fence_occupancy.py). With
+    reconcile=true the counts are recounted from the latest herd positions first.
+    """
+    try:
+        geofence_registry.ensure_fresh()
+        reconciliation = None
+        if reconcile:
+            reconciliation = await asyncio.to_thread(fence_occupancy.reconcile)
+        else:
+            await asyncio.to_thread(fence_occupancy.ensure_current)
+        fences = fence_occupancy.snapshot()
+        data = {
+            "fences": fences,
+            "total_head_in_fences": fence_occupancy.stats()["animals_in_fences"],
+            "reconciled_at": datetime.fromtimestamp(fence_occupancy.reconciled_at).isoformat()
+                             if fence_occupancy.reconciled_at else None
+        }
+        if reconciliation is not None:
+            data["reconciliation"] = reconciliation
+        return FastJSONResponse({"success": True, "data": data})
+    except Exception as e:
+        print(f"❌ Error getting fence occupancy: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to get occupancy: {str(e)}")
+
+# =====================
+# GEOFENCE ASSIGNMENTS
+# =====================
+
+@router.get("/assignments", response_class=FastJSONResponse)
+async def get_geofence_assignments():
+    """All cattle and herd group geofence assignments"""
+    geofence_assignments.ensure_fresh()
+    return FastJSONResponse({
+        "success": True,
+        "data": geofence_assignments.documents(),
+        "stats": geofence_assignments.stats()
+    })
+
+@router.put("/assignments/{target_type}/{target_id}")
+async def set_geofence_assignment(target_type: str, target_id: str, assignment: GeofenceAssignmentCreate):
+    """
+    Assign fences to one animal (target_type "cattle") or a herd group
+    (target_type "group", with its member cattle_ids). Replaces any previous
+    assignment for the same target.
+    """
+    if target_type not in TARGET_TYPES:
+        raise HTTPException(status_code=400, detail=f"target_type must be one of {list(TARGET_TYPES)}")
+    if assignment.mode not in ASSIGNMENT_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {list(ASSIGNMENT_MODES)}")
+    if not assignment.geofence_ids:
+        raise HTTPException(status_code=400, detail="At least one geofence is required")
+    geofence_registry.ensure_fresh()
+    unknown = [fence_id for fence_id in assignment.geofence_ids if geofence_registry.get(fence_id) is None]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown geofences: {unknown}")
+    if target_type != TARGET_GROUP and assignment.cattle_ids:
+        raise HTTPException(status_code=400, detail="cattle_ids can only be set on group assignments")
+    
+    try:
+        document_id = assignment_id(target_type, target_id)
+        data = {
+            "id": document_id,
+            "target_type": target_type,
+            "target_id": target_id,
+            "geofence_ids": assignment.geofence_ids,
+            "mode": assignment.mode,
+            "updated_at": datetime.now().isoformat()
+        }
+        if target_type == TARGET_GROUP:
+            data["cattle_ids"] = assignment.cattle_ids or []
+        result = firebase_service.create_document(ASSIGNMENT_COLLECTION, document_id, data)
+        if not result["success"]:
+            raise HTTPException(status_code=400, detail=result.get("error", "Failed to save geofence assignment"))
+        
+        geofence_assignments.upsert(data)
+        live_state_cache.invalidate_geofence_results()
+        print(f"📌 Geofences {assignment.geofence_ids} ({assignment.mode}) assigned to {target_type} {target_id}")
+        return {"success": True, "data": data}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to save geofence assignment: {str(e)}")
+
+@router.delete("/assignments/{target_type}/{target_id}")
+async def delete_geofence_assignment(target_type: str, target_id: str):
+    """Remove an assignment; the target falls back to its group's or the default"""
+    if target_type not in TARGET_TYPES:
+        raise HTTPException(status_code=400, detail=f"target_type must be one of {list(TARGET_TYPES)}")
+    try:
+        document_id = assignment_id(target_type, target_id)
+        result = firebase_service.delete_document(ASSIGNMENT_COLLECTION, document_id)
+        if not result["success"]:
+            raise HTTPException(status_code=400, detail=result.get("error", "Failed to delete geofence assignment"))
+        
+        geofence_assignments.remove(document_id)
+        live_state_cache.invalidate_geofence_results()
+        print(f"🗑️ Geofence assignment for {target_type} {target_id} deleted")
+        return result
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to delete geofence assignment: {str(e)}")
+
+# =====================
+# RETROACTIVE RE-EVALUATION
+# =====================
+
+@router.post("/reevaluations", status_code=202)
+async def start_fence_reevaluation(request: FenceReevaluationCreate):
+    """
+    Re-evaluate stored position history against a new or edited fence in the
+    background (see fence_reevaluation.py). With geofence_id, the fence's
+    current version is the baseline and the result counts reclassified positions.
+    """
+    start = timestamp_order(request.start_time)
+    end = timestamp_order(request.end_time) if request.end_time else time.time()
+    if start is None or end is None:
+        raise HTTPException(status_code=400, detail="start_time and end_time must be ISO timestamps")
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start_time must be before end_time")
+    if request.geofence is None and request.geofence_id is None:
+        raise HTTPException(status_code=400, detail="Either geofence or geofence_id is required")
+    
+    current = None
+    if request.geofence_id is not None:
+        geofence_registry.ensure_fresh()
+        current = geofence_registry.get(request.geofence_id)
+        if current is None:
+            raise HTTPException(status_code=404, detail=f"Geofence {request.geofence_id} not found")
+    
+    if request.geofence is not None:
+        try:
+            data, _ = validate_geofence(request.geofence.model_dump(exclude_none=True))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        geometry_json = json.dumps(data["evaluation_geometry"])
+        zone_type, name = data.get("zone_type", ZONE_INCLUSION), data["name"]
+        baseline_json = shapely.to_geojson(current.polygon) if current is not None else None
+    else:
+        geometry_json, zone_type, name = shapely.to_geojson(current.polygon), current.zone_type, current.name
+        baseline_json = None
+    
+    job = fence_reevaluations.start(geometry_json, zone_type, start, end, cattle_ids=request.cattle_ids,
+                                    fence_id=request.geofence_id, fence_name=name, baseline_json=baseline_json)
+    return {"success": True, "data": job.progress()}
+
+@router.get("/reevaluations", response_class=FastJSONResponse)
+async def get_fence_reevaluations():
+    """Recent re-evaluation jobs and their progress"""
+    return FastJSONResponse({
+        "success": True,
+        "data": [job.progress() for job in fence_reevaluations.jobs()],
+        "stats": fence_reevaluations.stats()
+    })
+
+@router.get("/reevaluations/{job_id}", response_class=FastJSONResponse)
+async def get_fence_reevaluation(job_id: str):
+    """Progress of a re-evaluation job, with its results once completed"""
+    job = fence_reevaluations.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Re-evaluation {job_id} not found")
+    data = job.progress()
+    if job.status in JOB_DONE and not job.error:
+        data["result"] = job.summary()
+    return FastJSONResponse({"success": True, "data": data})
+
+@router.get("/reevaluations/{job_id}/progress")
+async def stream_fence_reevaluation_progress(job_id: str):
+    """Progress of a re-evaluation job as a stream of JSON lines, until it finishes"""
+    job = fence_reevaluations.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Re-evaluation {job_id} not found")
+    
+    async def progress_lines():
+        while True:
+            progress = job.progress()
+            yield dumps(progress) + b"\n"
+            if progress["status"] in JOB_DONE:
+                break
+            await asyncio.sleep(REEVALUATION_PROGRESS_INTERVAL_SECONDS)
+    
+    return StreamingResponse(progress_lines(), media_type="application/x-ndjson")
+
+@router.delete("/reevaluations/{job_id}")
+async def cancel_fence_reevaluation(job_id: str):
+    """Stop a running re-evaluation (animals already evaluated are kept)"""
+    if not fence_reevaluations.cancel(job_id):
+        raise HTTPException(status_code=404, detail=f"Re-evaluation {job_id} not found")
+    return {"success": True, "message": f"Re-evaluation {job_id} cancelled"}
+
 @router.get("/geofences/{geofence_id}")
 async def get_geofence(geofence_id: str):
     """Get a specific geofence by ID"""
@@ -602,6 +1216,7 @@ async def get_geofence(geofence_id: str):
                 raise HTTPException(status_code=404, detail=f"Geofence {geofence_id} not found")
             raise HTTPException(status_code=400, detail=result.get("error", "Failed to get geofence"))
         
+        result.pop("etag", None)
         return result
         
     except HTTPException:
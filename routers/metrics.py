@@ -0,0 +1,40 @@
+from fastapi import APIRouter
+from temp_firebase_service import temp_firebase_service as firebase_service
+from request_coalescing import micro_cache_stats
+from reporting_policy import reporting_policy
+from ingest_dedup import ingest_dedup
+from live_state_cache import live_state_cache
+from position_filter import position_filter
+from geofence_registry import geofence_registry
+from geofence_assignments import geofence_assignments
+from breach_prediction import breach_predictor
+from breach_episodes import breach_episodes
+from position_history import position_history
+from fence_reevaluation import fence_reevaluations
+from fence_occupancy import fence_occupancy
+from herd_state import herd_state
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+@router.get("/storage")
+async def get_storage_metrics():
+    """Read coalescing and micro-cache counters for the storage layer"""
+    return {
+        "success": True,
+        "data": {
+            "single_flight": firebase_service.single_flight.stats(),
+            "revalidation": firebase_service.revalidation_stats,
+            "micro_cache": micro_cache_stats,
+            "ingest": {**reporting_policy.stats(), **ingest_dedup.stats()},
+            "live_state": live_state_cache.stats(),
+            "position_filter": position_filter.stats(),
+            "geofence_registry": geofence_registry.stats(),
+            "geofence_assignments": geofence_assignments.stats(),
+            "breach_prediction": breach_predictor.stats(),
+            "breach_episodes": breach_episodes.stats(),
+            "position_history": position_history.stats(),
+            "fence_reevaluations": fence_reevaluations.stats(),
+            "fence_occupancy": fence_occupancy.stats(),
+            "herd_state": herd_state.stats()
+        }
+    }
@@ -1,32 +1,108 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from temp_firebase_service import temp_firebase_service as firebase_service
 from models import StaffCreate, StaffUpdate, StaffResponse
+from dashboard_summary import dashboard_summary
+from http_cache import etag_matches, not_modified, storage_etag
+from fast_json import FastJSONResponse
 import uuid
 
 router = APIRouter(prefix="/staff", tags=["staff"])
 
+# Lower-cased copies of status/location, indexed in database.rules.json so the
+# case-insensitive filters can run as server-side equalTo queries
+SEARCH_KEY_FIELDS = {"status": "status_key", "location": "location_key"}
+
+# Set once every staff record has its search keys; until then an equalTo query
+# would silently miss the records written before the keys existed
+search_keys_backfilled = False
+
+def with_search_keys(fields: dict) -> dict:
+    """Add the indexed search keys for any status/location present in fields"""
+    keys = {key: str(fields[field]).lower() for field, key in SEARCH_KEY_FIELDS.items() if fields.get(field) is not None}
+    return {**fields, **keys}
+
+def backfill_staff_search_keys():
+    """Add missing search keys to staff records written before they existed"""
+    global search_keys_backfilled
+    result = firebase_service.get_collection("staff")
+    if not result["success"]:
+        print(f"⚠️ Could not backfill staff search keys: {result.get('error')}")
+        return
+    
+    patched = 0
+    failed = 0
+    for staff in result.get("data", []):
+        expected = with_search_keys(staff)
+        missing = {key: expected[key] for key in SEARCH_KEY_FIELDS.values() if key in expected and staff.get(key) != expected[key]}
+        if not missing:
+            continue
+        if firebase_service.update_document("staff", staff["id"], missing)["success"]:
+            patched += 1
+        else:
+            failed += 1
+    if patched:
+        print(f"🔧 Backfilled search keys on {patched} staff records")
+    if failed:
+        print(f"⚠️ Could not backfill search keys on {failed} staff records, filtering staff locally")
+        return
+    search_keys_backfilled = True
+
+def find_staff(field: str, value: str) -> list:
+    """Staff whose field matches value (case-insensitive), from the indexed query once the keys are backfilled"""
+    if not search_keys_backfilled:
+        return filter_staff_locally(field, value)
+    result = firebase_service.query_collection("staff", order_by=SEARCH_KEY_FIELDS[field], equal_to=value.lower())
+    if result["success"]:
+        return result["data"]
+    # Index not deployed yet or query unsupported: fall back to a full scan
+    print(f"⚠️ Staff {field} query failed, scanning collection: {result.get('error')}")
+    return filter_staff_locally(field, value)
+
+def filter_staff_locally(field: str, value: str) -> list:
+    """Full-scan fallback used until the search keys are backfilled, or when the indexed query is unavailable"""
+    result = firebase_service.get_collection("staff")
+    if not result["success"]:
+        raise HTTPException(status_code=400, detail=result.get("error", "Failed to get staff records"))
+    
+    staff_data = result.get("data", [])
+    if isinstance(staff_data, dict):
+        # Convert dict to list and filter
+        filtered_staff = []
+        for staff_id, staff_info in staff_data.items():
+            if isinstance(staff_info, dict) and staff_info.get(field, "").lower() == value.lower():
+                staff_info["id"] = staff_id
+                filtered_staff.append(staff_info)
+    else:
+        # If already a list, filter directly
+        filtered_staff = [staff for staff in staff_data if staff.get(field, "").lower() == value.lower()]
+    return filtered_staff
+
 @router.post("", response_model=StaffResponse)
 async def create_staff(staff_data: StaffCreate):
     """Create a new staff record"""
     staff_id = f"staff_{uuid.uuid4().hex[:8]}"
-    staff_dict = staff_data.model_dump()
+    staff_dict = with_search_keys(staff_data.model_dump())
     staff_dict["id"] = staff_id
     
     result = firebase_service.create_document("staff", staff_id, staff_dict)
     if not result["success"]:
         raise HTTPException(status_code=400, detail=result.get("error", "Failed to create staff record"))
     
+    dashboard_summary.record_staff(staff_id, staff_dict)
     print(f"👤 New staff created: {staff_dict['name']} ({staff_dict['role']})")
     return result
 
-@router.get("", response_model=StaffResponse)
-async def get_all_staff():
+@router.get("", response_model=StaffResponse, response_class=FastJSONResponse)
+async def get_all_staff(request: Request):
     """Get all staff records"""
     try:
         result = firebase_service.get_collection("staff")
         if not result["success"]:
             raise HTTPException(status_code=400, detail=result.get("error", "Failed to get staff records"))
         
+        etag = storage_etag(result)
+        if etag_matches(request, etag):
+            return not_modified(etag)
         # Transform the data to match the expected format
         staff_data = result.get("data", [])
         if isinstance(staff_data, dict):
@@ -39,7 +115,7 @@ async def get_all_staff():
             result["data"] = staff_list
         
         print(f"📋 Retrieved {len(result['data'])} staff records")
-        return result
+        return FastJSONResponse(result, headers={"ETag": etag} if etag else None)
         
     except Exception as e:
         print(f"Error fetching staff: {e}")
@@ -74,11 +150,13 @@ async def update_staff(staff_id: str, staff_data: StaffUpdate):
         update_data = {k: v for k, v in staff_data.model_dump().items() if v is not None}
         if not update_data:
             raise HTTPException(status_code=400, detail="No data provided for update")
+        update_data = with_search_keys(update_data)
         
         result = firebase_service.update_document("staff", staff_id, update_data)
         if not result["success"]:
             raise HTTPException(status_code=400, detail=result.get("error", "Failed to update staff record"))
         
+        dashboard_summary.record_staff(staff_id, update_data)
         print(f"✏️ Staff {staff_id} updated: {update_data}")
         return result
         
@@ -95,6 +173,7 @@ async def delete_staff(staff_id: str):
         if not result["success"]:
             raise HTTPException(status_code=400, detail=result.get("error", "Failed to delete staff record"))
         
+        dashboard_summary.remove_staff(staff_id)
         print(f"🗑️ Staff {staff_id} deleted")
         return result
         
@@ -103,58 +182,28 @@ async def delete_staff(staff_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to delete staff {staff_id}: {str(e)}")
 
-@router.get("/status/{status}", response_model=StaffResponse)
+@router.get("/status/{status}", response_model=StaffResponse, response_class=FastJSONResponse)
 async def get_staff_by_status(status: str):
     """Get staff by status (active, inactive, etc.)"""
     try:
-        result = firebase_service.get_collection("staff")
-        if not result["success"]:
-            raise HTTPException(status_code=400, detail=result.get("error", "Failed to get staff records"))
-        
-        # Transform and filter by status
-        staff_data = result.get("data", [])
-        if isinstance(staff_data, dict):
-            # Convert dict to list and filter
-            filtered_staff = []
-            for staff_id, staff_info in staff_data.items():
-                if isinstance(staff_info, dict) and staff_info.get("status", "").lower() == status.lower():
-                    staff_info["id"] = staff_id
-                    filtered_staff.append(staff_info)
-        else:
-            # If already a list, filter directly
-            filtered_staff = [staff for staff in staff_data if staff.get("status", "").lower() == status.lower()]
+        filtered_staff = find_staff("status", status)
         
         print(f"🔍 Found {len(filtered_staff)} staff with status: {status}")
-        return {"success": True, "data": filtered_staff}
+        return FastJSONResponse({"success": True, "data": filtered_staff})
         
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch staff by status: {str(e)}")
 
-@router.get("/location/{location}", response_model=StaffResponse)
+@router.get("/location/{location}", response_model=StaffResponse, response_class=FastJSONResponse)
 async def get_staff_by_location(location: str):
     """Get staff by location"""
     try:
-        result = firebase_service.get_collection("staff")
-        if not result["success"]:
-            raise HTTPException(status_code=400, detail=result.get("error", "Failed to get staff records"))
-        
-        # Transform and filter by location
-        staff_data = result.get("data", [])
-        if isinstance(staff_data, dict):
-            # Convert dict to list and filter
-            filtered_staff = []
-            for staff_id, staff_info in staff_data.items():
-                if isinstance(staff_info, dict) and staff_info.get("location", "").lower() == location.lower():
-                    staff_info["id"] = staff_id
-                    filtered_staff.append(staff_info)
-        else:
-            # If already a list, filter directly
-            filtered_staff = [staff for staff in staff_data if staff.get("location", "").lower() == location.lower()]
+        filtered_staff = find_staff("location", location)
         
         print(f"📍 Found {len(filtered_staff)} staff at location: {location}")
-        return {"success": True, "data": filtered_staff}
+        return FastJSONResponse({"success": True, "data": filtered_staff})
         
     except HTTPException:
         raise
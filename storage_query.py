@@ -0,0 +1,91 @@
+"""
+Filtered query support shared by the storage services.
+
+Mirrors the Realtime Database query parameters (orderBy, equalTo, startAt,
+endAt, limitToFirst, limitToLast, shallow) so the filtering happens on the
+server and only matching documents are transferred.
+"""
+
+import json
+from typing import Any, Dict, List, Optional
+
+ORDER_BY_KEY = "$key"
+ORDER_BY_VALUE = "$value"
+
+
+def validate_query(order_by: Optional[str] = None, equal_to: Any = None, start_at: Any = None,
+                   end_at: Any = None, limit_to_first: Optional[int] = None,
+                   limit_to_last: Optional[int] = None, shallow: bool = False) -> Optional[str]:
+    """Return an error message if the combination of query options is not supported"""
+    filters = [equal_to, start_at, end_at, limit_to_first, limit_to_last]
+    if shallow and (order_by or any(f is not None for f in filters)):
+        return "shallow cannot be combined with other query parameters"
+    if any(f is not None for f in filters) and not order_by:
+        return "orderBy is required when filtering or limiting a query"
+    if equal_to is not None and (start_at is not None or end_at is not None):
+        return "equalTo cannot be combined with startAt/endAt"
+    if limit_to_first is not None and limit_to_last is not None:
+        return "limitToFirst cannot be combined with limitToLast"
+    return None
+
+
+def to_rest_params(order_by: Optional[str] = None, equal_to: Any = None, start_at: Any = None,
+                   end_at: Any = None, limit_to_first: Optional[int] = None,
+                   limit_to_last: Optional[int] = None, shallow: bool = False) -> Dict[str, str]:
+    """Encode query options as REST query string parameters (values are JSON encoded)"""
+    if shallow:
+        return {"shallow": "true"}
+    params = {}
+    if order_by:
+        params["orderBy"] = json.dumps(order_by)
+    if equal_to is not None:
+        params["equalTo"] = json.dumps(equal_to)
+    if start_at is not None:
+        params["startAt"] = json.dumps(start_at)
+    if end_at is not None:
+        params["endAt"] = json.dumps(end_at)
+    if limit_to_first is not None:
+        params["limitToFirst"] = str(int(limit_to_first))
+    if limit_to_last is not None:
+        params["limitToLast"] = str(int(limit_to_last))
+    return params
+
+
+def cache_key(collection_name: str, params: Dict[str, str]) -> str:
+    """Key used to coalesce identical queries"""
+    return f"query:{collection_name}?" + "&".join(f"{k}={v}" for k, v in sorted(params.items()))
+
+
+def to_documents(data: Any, order_by: Optional[str] = None) -> List[dict]:
+    """
+    Convert a query result into the list-of-documents format used by
+    get_collection. The REST API returns matches as an unordered JSON object,
+    so the documents are sorted by the query's order key.
+    """
+    if not data or not isinstance(data, dict):
+        return []
+
+    documents = []
+    for doc_id, doc_data in data.items():
+        if isinstance(doc_data, dict):
+            documents.append({"id": doc_id, **doc_data})
+        else:
+            documents.append({"id": doc_id, "data": doc_data})
+
+    if order_by:
+        field = {ORDER_BY_KEY: "id", ORDER_BY_VALUE: "data"}.get(order_by, order_by)
+        documents.sort(key=lambda doc: _sort_value(doc.get(field)))
+    return documents
+
+
+def _sort_value(value: Any):
+    # Realtime Database ordering: null < false < true < numbers < strings < objects
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (1, int(value))
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, str):
+        return (3, value)
+    return (4, 0)
@@ -5,47 +5,135 @@ This bypasses authentication issues while maintaining the same interface
 
 import requests
 import json
-from typing import Dict, Any
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+from request_coalescing import SingleFlight
+import storage_query
+
+# Rarely-changing collections kept in a local cache and revalidated with
+# If-None-Match, so an unchanged payload costs a 304 instead of a download.
+# The cache keeps the raw body and every 304 parses a fresh copy, since
+# callers modify the documents they get back.
+REVALIDATED_COLLECTIONS = {"geofences", "staff", "users"}
+REVALIDATION_CACHE_SIZE = 256
+
+class StorageHTTPError(Exception):
+    pass
 
 class TemporaryFirebaseService:
     def __init__(self):
         self.database_url = "https://cattlemonitor-57c45-default-rtdb.firebaseio.com"
+        # Concurrent identical reads share one HTTP request
+        self.single_flight = SingleFlight()
+        self._etag_cache: "OrderedDict[str, Tuple[str, bytes]]" = OrderedDict()  # path -> (etag, body)
+        self._etag_cache_lock = threading.Lock()
+        self.revalidation_stats = {"requests": 0, "not_modified": 0, "bytes_downloaded": 0}
+    
+    def _get_json(self, path: str, params: Optional[Dict[str, str]] = None) -> Tuple[Any, Optional[str]]:
+        """
+        GET a path and return (data, etag). Reads under REVALIDATED_COLLECTIONS
+        send the cached ETag and reuse the cached payload on 304 Not Modified.
+        """
+        url = f"{self.database_url}/{path}.json"
+        if params:
+            # ETags are not supported on queries
+            response = requests.get(url, params=params)
+            if response.status_code != 200:
+                raise StorageHTTPError(f"HTTP {response.status_code}: {response.text}")
+            return response.json(), None
+        
+        headers = {"X-Firebase-ETag": "true"}
+        cacheable = path.split("/", 1)[0] in REVALIDATED_COLLECTIONS
+        cached = None
+        if cacheable:
+            with self._etag_cache_lock:
+                cached = self._etag_cache.get(path)
+            if cached:
+                headers["if-none-match"] = cached[0]
+        
+        response = requests.get(url, headers=headers)
+        if cacheable:
+            self.revalidation_stats["requests"] += 1
+        if response.status_code == 304 and cached:
+            self.revalidation_stats["not_modified"] += 1
+            with self._etag_cache_lock:
+                if path in self._etag_cache:
+                    self._etag_cache.move_to_end(path)
+            return json.loads(cached[1]), cached[0]
+        if response.status_code != 200:
+            raise StorageHTTPError(f"HTTP {response.status_code}: {response.text}")
+        
+        data = response.json()
+        etag = response.headers.get("ETag")
+        if cacheable:
+            self.revalidation_stats["bytes_downloaded"] += len(response.content)
+            if etag:
+                with self._etag_cache_lock:
+                    self._etag_cache[path] = (etag, response.content)
+                    self._etag_cache.move_to_end(path)
+                    while len(self._etag_cache) > REVALIDATION_CACHE_SIZE:
+                        self._etag_cache.popitem(last=False)
+        return data, etag
     
     def get_collection(self, collection_name: str) -> Dict[str, Any]:
         """Get all documents from a collection using HTTP"""
+        return self.single_flight.do(f"collection:{collection_name}", lambda: self._fetch_collection(collection_name))
+    
+    async def aget_collection(self, collection_name: str) -> Dict[str, Any]:
+        """Async variant of get_collection that does not block the event loop"""
+        return await self.single_flight.do_async(f"collection:{collection_name}", lambda: self._fetch_collection(collection_name))
+    
+    def _fetch_collection(self, collection_name: str) -> Dict[str, Any]:
         try:
-            response = requests.get(f"{self.database_url}/{collection_name}.json")
-            if response.status_code == 200:
-                data = response.json()
-                if data:
-                    # Convert to list format similar to the original service
-                    documents = []
-                    for doc_id, doc_data in data.items():
-                        if isinstance(doc_data, dict):
-                            doc_data["id"] = doc_id
-                            documents.append(doc_data)
-                    return {"success": True, "data": documents}
-                else:
-                    return {"success": True, "data": []}
+            data, etag = self._get_json(collection_name)
+            if data:
+                # Convert to list format similar to the original service
+                documents = []
+                for doc_id, doc_data in data.items():
+                    if isinstance(doc_data, dict):
+                        doc_data["id"] = doc_id
+                        documents.append(doc_data)
+                return {"success": True, "data": documents, "etag": etag}
             else:
-                return {"success": False, "error": f"HTTP {response.status_code}: {response.text}"}
+                return {"success": True, "data": [], "etag": etag}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+    
+    def query_collection(self, collection_name: str, order_by: Optional[str] = None, equal_to: Any = None,
+                         start_at: Any = None, end_at: Any = None, limit_to_first: Optional[int] = None,
+                         limit_to_last: Optional[int] = None, shallow: bool = False) -> Dict[str, Any]:
+        """
+        Query a collection with server-side filtering.
+        order_by is a child name, "$key" or "$value". With shallow=True only
+        the document IDs are returned.
+        """
+        error = storage_query.validate_query(order_by, equal_to, start_at, end_at, limit_to_first, limit_to_last, shallow)
+        if error:
+            return {"success": False, "error": error}
+        params = storage_query.to_rest_params(order_by, equal_to, start_at, end_at, limit_to_first, limit_to_last, shallow)
+        key = storage_query.cache_key(collection_name, params)
+        return self.single_flight.do(key, lambda: self._fetch_query(collection_name, params, order_by, shallow))
+    
+    def _fetch_query(self, collection_name: str, params: Dict[str, str], order_by: Optional[str], shallow: bool) -> Dict[str, Any]:
+        try:
+            data, _ = self._get_json(collection_name, params)
+            if shallow:
+                return {"success": True, "data": list(data.keys()) if isinstance(data, dict) else []}
+            return {"success": True, "data": storage_query.to_documents(data, order_by)}
         except Exception as e:
             return {"success": False, "error": str(e)}
     
     def get_document(self, collection_name: str, document_id: str) -> Dict[str, Any]:
         """Get a single document using HTTP"""
         try:
-            response = requests.get(f"{self.database_url}/{collection_name}/{document_id}.json")
-            if response.status_code == 200:
-                data = response.json()
-                if data:
-                    if isinstance(data, dict):
-                        data["id"] = document_id
-                    return {"success": True, "data": data}
-                else:
-                    return {"success": False, "message": "Document not found"}
+            data, etag = self._get_json(f"{collection_name}/{document_id}")
+            if data:
+                if isinstance(data, dict):
+                    data["id"] = document_id
+                return {"success": True, "data": data, "etag": etag}
             else:
-                return {"success": False, "error": f"HTTP {response.status_code}: {response.text}"}
+                return {"success": False, "message": "Document not found"}
         except Exception as e:
             return {"success": False, "error": str(e)}
     
@@ -93,18 +181,32 @@ class TemporaryFirebaseService:
         except Exception as e:
             return {"success": False, "error": str(e)}
     
-    def get_realtime_data(self, path: str) -> Dict[str, Any]:
-        """Get data from Realtime Database using HTTP"""
+    def set_realtime_raw(self, path: str, body: bytes) -> Dict[str, Any]:
+        """Set data from an already JSON-encoded body, without re-encoding it"""
         try:
-            response = requests.get(f"{self.database_url}/{path}.json")
+            response = requests.put(f"{self.database_url}/{path}.json", data=body, headers={"Content-Type": "application/json"})
             if response.status_code == 200:
-                data = response.json()
-                return {"success": True, "data": data}
+                return {"success": True, "message": f"Data set at {path}"}
             else:
                 return {"success": False, "error": f"HTTP {response.status_code}: {response.text}"}
         except Exception as e:
             return {"success": False, "error": str(e)}
     
+    def get_realtime_data(self, path: str) -> Dict[str, Any]:
+        """Get data from Realtime Database using HTTP"""
+        return self.single_flight.do(f"path:{path}", lambda: self._fetch_realtime_data(path))
+    
+    async def aget_realtime_data(self, path: str) -> Dict[str, Any]:
+        """Async variant of get_realtime_data that does not block the event loop"""
+        return await self.single_flight.do_async(f"path:{path}", lambda: self._fetch_realtime_data(path))
+    
+    def _fetch_realtime_data(self, path: str) -> Dict[str, Any]:
+        try:
+            data, etag = self._get_json(path)
+            return {"success": True, "data": data, "etag": etag}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+    
     def update_realtime_data(self, path: str, data: dict) -> Dict[str, Any]:
         """Update data in Realtime Database using HTTP"""
         try:
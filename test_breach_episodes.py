@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Tests for geofence breach episodes and time-outside aggregates (no database needed)
+"""
+
+import sys
+from datetime import datetime, timedelta
+sys.path.append('.')
+
+from fastapi.testclient import TestClient
+
+import breach_episodes
+from breach_episodes import BreachEpisodeTracker, daily_time_outside
+
+
+class FakeFirebase:
+    def __init__(self):
+        self.tree = {}
+        self.reads = []
+
+    def node(self, path):
+        node = self.tree
+        for key in path.split("/"):
+            node = node.get(key, {})
+        return node
+
+    def update_realtime_data(self, path, data):
+        for key, value in data.items():
+            *parents, leaf = f"{path}/{key}".strip("/").split("/")
+            node = self.tree
+            for parent in parents:
+                node = node.setdefault(parent, {})
+            if value is None:
+                node.pop(leaf, None)
+            else:
+                node[leaf] = dict(value)
+        return {"success": True}
+
+    def get_realtime_data(self, path):
+        self.reads.append(path)
+        return {"success": True, "data": self.node(path)}
+
+    def query_collection(self, collection, order_by=None, start_at=None, end_at=None, limit_to_last=None,
+                         shallow=False, **kwargs):
+        self.reads.append(collection)
+        documents = self.node(collection)
+        keys = sorted(key for key in documents
+                      if (start_at is None or key >= start_at) and (end_at is None or key <= end_at))
+        if limit_to_last:
+            keys = keys[-limit_to_last:]
+        if shallow:
+            return {"success": True, "data": keys}
+        return {"success": True, "data": [{"id": key, **documents[key]} for key in keys]}
+
+    @property
+    def data(self):
+        return self.tree.get("geofence_episodes", {})
+
+
+def breach(fence_id, distance_km):
+    return {"id": fence_id, "name": fence_id.title(), "is_inside": False, "distance_to_boundary_km": distance_km}
+
+
+def test_episode_lifecycle(monkeypatch):
+    storage = FakeFirebase()
+    monkeypatch.setattr(breach_episodes, "firebase_service", storage)
+    tracker = BreachEpisodeTracker(flush_seconds=60)
+    start = datetime(2026, 3, 1, 23, 50)
+
+    opened = tracker.observe("c1", -15.5, 28.0, [breach("north", 0.1)], at=start)
+    assert list(opened) == ["north"]
+    # Still outside: no new episode, and no write until the flush interval has passed
+    assert tracker.observe("c1", -15.5, 28.001, [breach("north", 0.3)], at=start + timedelta(seconds=30)) == {}
+    assert tracker.counters["writes"] == 1
+    tracker.observe("c1", -15.5, 28.002, [breach("north", 0.2)], at=start + timedelta(seconds=90))
+    assert tracker.stats()["open"] == 1
+
+    tracker.observe("c1", -15.5, 28.0, [], at=start + timedelta(minutes=20))
+    assert tracker.stats() == {"opened": 1, "closed": 1, "restored": 0, "writes": 3, "write_failures": 0, "open": 0}
+    episode = storage.data["c1"][opened["north"]]
+    assert episode["end"] == (start + timedelta(minutes=20)).isoformat()
+    assert episode["max_distance_km"] == 0.3 and episode["observations"] == 3
+    # Two steps of 0.001 degrees of longitude at -15.5 degrees latitude
+    assert abs(episode["path_length_m"] - 2 * 111.2 * 0.9636) < 1
+
+    # The episode spans midnight: 10 minutes on the first day, 10 on the second
+    days = daily_time_outside([{"id": opened["north"], **episode}], start - timedelta(days=1), start + timedelta(days=1))
+    assert days == {
+        "2026-03-01": {"cattle": {"c1": 600}, "fences": {"north": 600}, "episodes": 1},
+        "2026-03-02": {"cattle": {"c1": 600}, "fences": {"north": 600}, "episodes": 0}
+    }
+
+
+def test_open_episodes_survive_a_restart(monkeypatch):
+    storage = FakeFirebase()
+    monkeypatch.setattr(breach_episodes, "firebase_service", storage)
+    start = datetime(2026, 3, 1, 12, 0)
+    opened = BreachEpisodeTracker(flush_seconds=0).observe("c1", -15.5, 28.0, [breach("north", 0.1)], at=start)
+
+    # A new process picks the open episode up: no second episode or alert for the same breach
+    tracker = BreachEpisodeTracker(flush_seconds=0)
+    assert tracker.observe("c1", -15.5, 28.001, [breach("north", 0.2)], at=start + timedelta(minutes=5)) == {}
+    assert tracker.stats()["restored"] == 1 and tracker.stats()["opened"] == 0
+    tracker.observe("c1", -15.5, 28.0, [], at=start + timedelta(minutes=10))
+
+    assert list(storage.data["c1"]) == [opened["north"]]
+    episode = storage.data["c1"][opened["north"]]
+    assert episode["end"] == (start + timedelta(minutes=10)).isoformat()
+    assert episode["max_distance_km"] == 0.2 and episode["observations"] == 2
+
+
+def test_times_are_utc():
+    assert breach_episodes.parse_time("2026-03-01T12:00:00+02:00") == datetime(2026, 3, 1, 10, 0)
+    assert breach_episodes.parse_time("2026-03-01T12:00:00Z") == datetime(2026, 3, 1, 12, 0)
+    assert breach_episodes.parse_time("2026-03-01T12:00:00") == datetime(2026, 3, 1, 12, 0)
+
+
+def test_herd_wide_queries_read_the_indexes(monkeypatch):
+    storage = FakeFirebase()
+    monkeypatch.setattr(breach_episodes, "firebase_service", storage)
+    tracker = BreachEpisodeTracker(flush_seconds=0)
+    start = datetime(2026, 3, 1, 23, 0)
+    tracker.observe("c1", -15.5, 28.0, [breach("north", 0.1)], at=start)
+    tracker.observe("c1", -15.5, 28.0, [], at=start + timedelta(hours=2))
+    tracker.observe("c2", -15.5, 28.0, [breach("north", 0.1)], at=start + timedelta(hours=1))
+    tracker.observe("c3", -15.5, 28.0, [breach("north", 0.1)], at=start - timedelta(days=40))
+    tracker.observe("c3", -15.5, 28.0, [], at=start - timedelta(days=39))
+
+    # Closed episodes are listed under every day they span; only open ones stay in the open index
+    assert sorted(key[:10] for key in storage.tree["geofence_episodes_daily"]) == [
+        "2026-01-20", "2026-01-21", "2026-03-01", "2026-03-02"]
+    assert [cattle_id for cattle_id, episodes in storage.tree["geofence_episodes_open"].items() if episodes] == ["c2"]
+
+    storage.reads.clear()
+    result = breach_episodes.query_episodes(start - timedelta(days=1), start + timedelta(days=1))
+    assert [(episode["cattle_id"], episode["end"] is None) for episode in result["data"]] == [("c2", True), ("c1", False)]
+    assert result["data"][1]["id"] in storage.data["c1"] and "episode_id" not in result["data"][1]
+    assert "geofence_episodes" not in storage.reads
+
+    assert not breach_episodes.query_episodes(start - timedelta(days=60), start)["success"]
+    assert not breach_episodes.query_episodes(None, start)["success"]
+
+
+def test_one_alert_per_episode_and_endpoints(monkeypatch):
+    import main
+    import routers.geofence as geofence_router
+    from geofence_assignments import GeofenceAssignmentIndex
+    from geofence_registry import GeofenceRegistry
+
+    registry = GeofenceRegistry()
+    registry.sync([{"id": "home", "name": "Home",
+                    "coordinates": [[28.0, -15.5], [28.01, -15.5], [28.01, -15.49], [28.0, -15.49], [28.0, -15.5]]}])
+    assignments = GeofenceAssignmentIndex()
+    assignments.sync([])
+    storage = FakeFirebase()
+    saved = []
+
+    class FakeAlerts:
+        def create_document(self, collection, doc_id, data):
+            saved.append(data)
+            return {"success": True}
+
+    monkeypatch.setattr(geofence_router, "geofence_registry", registry)
+    monkeypatch.setattr(geofence_router, "geofence_assignments", assignments)
+    monkeypatch.setattr(geofence_router, "firebase_service", FakeAlerts())
+    monkeypatch.setattr(breach_episodes, "firebase_service", storage)
+    monkeypatch.setattr(geofence_router, "breach_episodes", BreachEpisodeTracker())
+    monkeypatch.setattr(geofence_router.dashboard_summary, "record_alert", lambda *args: None)
+
+    for longitude in (28.02, 28.021, 28.022):
+        result = geofence_router.check_cattle_geofence_status("c1", -15.495, longitude, record=True)
+        assert result["total_breaches"] == 1
+    assert len(saved) == 1 and saved[0]["episode_id"]
+
+    # Status and what-if checks do not touch the episodes or save alerts
+    result = geofence_router.check_cattle_geofence_status("c1", -15.495, 28.005)
+    assert result["total_breaches"] == 0 and len(saved) == 1
+    assert [episode["fence_id"] for episode in geofence_router.breach_episodes.open_episodes("c1")] == ["home"]
+
+    client = TestClient(main.app)
+    response = client.get("/geofence/alerts/cattle/c1")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["total_alerts"] == 1 and body["alerts"][0]["ongoing"] is True
+    assert body["alerts"][0]["geofence"]["id"] == "home"
+
+    response = client.get("/geofence/episodes", params={"fence_id": "home"})
+    assert response.json()["data"]["count"] == 1 and response.json()["data"]["open"] == 1
+    response = client.get("/geofence/episodes", params={"cattle_id": "c1", "from": "2000-01-01"})
+    assert response.json()["data"]["count"] == 1
+    # Herd-wide windows are bounded
+    assert client.get("/geofence/episodes", params={"from": "2000-01-01"}).status_code == 400
+    assert client.get("/geofence/episodes", params={"fence_id": "other"}).json()["data"]["count"] == 0
+    assert client.get("/geofence/episodes", params={"to": "2000-01-01"}).json()["data"]["count"] == 0
+    assert client.get("/geofence/episodes", params={"from": "yesterday"}).status_code == 400
+
+    daily = client.get("/geofence/episodes/daily", params={"cattle_id": "c1"}).json()["data"]["days"]
+    assert list(daily.values())[-1]["fences"].keys() == {"home"}
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Tests for predictive breach detection (no database needed)
+"""
+
+import math
+import sys
+sys.path.append('.')
+
+from breach_prediction import BreachPredictor, seconds_to_boundary
+from conftest import registry_with, square
+from models import ReportingPolicy
+from reporting_policy import compute_next_interval
+
+
+def test_seconds_to_boundary_is_vectorized_and_metric():
+    registry = registry_with(square("paddock", 28.0, -15.51, 0.02))
+    entry = registry.get("paddock")
+    # Centre of the paddock, heading north, east, south-west and north (slow)
+    seconds, meters = seconds_to_boundary(entry, [28.01] * 4, [-15.5] * 4, [0, 90, 225, 0], [2.0, 2.0, 2.0, 0.5],
+                                          horizon_seconds=1000)
+    half_north = 0.01 * 111320
+    half_east = 0.01 * 111320 * math.cos(math.radians(15.5))
+    assert abs(meters[0] - half_north) < 5 and abs(seconds[0] - half_north / 2) < 3
+    assert abs(meters[1] - half_east) < 5
+    assert abs(meters[2] - half_east * math.sqrt(2)) < 5
+    assert math.isinf(seconds[3])  # 500 m in 1000 s does not reach the boundary
+
+
+def inside(fence_id):
+    return {"success": True, "inside_geofences": [{"id": fence_id}], "outside_geofences": []}
+
+
+def test_predict_herd_and_warnings():
+    registry = registry_with(square("paddock", 28.0, -15.51, 0.02),
+                             square("dam", 28.012, -15.501, 0.002, zone_type="exclusion"))
+    predictor = BreachPredictor(horizon_seconds=300, warning_seconds=120, registry=registry)
+    herd = [
+        # Walking north 80 m from the fence at 1.5 m/s: ~53 s
+        {"cattle_id": "c1", "latitude": -15.49 - 80 / 111320, "longitude": 28.005, "heading": 0, "speed_kmh": 5.4,
+         "geofence_result": inside("paddock")},
+        # Walking east towards the dam, 100 m away at 1 m/s
+        {"cattle_id": "c2", "latitude": -15.5, "longitude": 28.012 - 100 / 107300, "heading": 90, "speed_kmh": 3.6,
+         "geofence_result": inside("paddock")},
+        # Grazing slowly
+        {"cattle_id": "c3", "latitude": -15.5, "longitude": 28.005, "heading": 0, "speed_kmh": 0.2,
+         "geofence_result": inside("paddock")},
+        # Heading west, ~230 s from the boundary: predicted, not yet a warning
+        {"cattle_id": "c4", "latitude": -15.5, "longitude": 28.003, "heading": 270, "speed_kmh": 5.0,
+         "geofence_result": inside("paddock")},
+    ]
+    predictions = predictor.predict(herd)
+    assert predictions["c1"]["geofence_id"] == "paddock" and predictions["c1"]["approaching"]
+    assert abs(predictions["c1"]["seconds_to_boundary"] - 53.3) < 2
+    assert predictions["c2"]["zone_type"] == "exclusion" and predictions["c2"]["approaching"]
+    assert predictions["c3"] is None
+    assert predictions["c4"] is not None and not predictions["c4"]["approaching"]
+    assert predictor.stats()["fence_batches"] == 2  # one vectorized call per fence
+
+    alert = predictor.warning_alert("c1", predictions["c1"], -15.49, 28.005, now=1000)
+    assert alert["type"] == "approaching_boundary" and "leave geofence" in alert["message"]
+    assert predictor.warning_alert("c1", predictions["c1"], -15.49, 28.005, now=1100) is None
+    assert predictor.warning_alert("c1", predictions["c1"], -15.49, 28.005, now=2000) is not None
+    assert "enter exclusion zone" in predictor.warning_alert("c2", predictions["c2"], -15.5, 28.01, now=0)["message"]
+
+
+def test_time_to_boundary_shortens_reporting_interval():
+    policy = ReportingPolicy()
+    interval, reason = compute_next_interval(policy, "walking", True, 3.0, 0.5, False)
+    shorter, shorter_reason = compute_next_interval(policy, "walking", True, 3.0, 0.5, False,
+                                                    load_rps=1000, seconds_to_boundary=20)
+    assert shorter == policy.min_interval_seconds and shorter < interval
+    assert "approaching_boundary" in shorter_reason and "server_load" not in shorter_reason
+    # A distant crossing does not change anything
+    assert compute_next_interval(policy, "walking", True, 3.0, 0.5, False, seconds_to_boundary=600) == (interval, reason)
+
+
+def test_monitor_poll_predicts_without_raising_warnings(check_geofences, monkeypatch):
+    import main
+    import routers.geofence as geofence_router
+    from fastapi.testclient import TestClient
+    from herd_state import HerdState
+
+    # Heading east at 10 km/h, ~60 s from the paddock's east edge
+    state = HerdState()
+    state.update("c1", {"timestamp": "2026-01-01T00:00:00Z", "latitude": -15.5, "longitude": 28.0185,
+                        "heading": 90, "speed_kmh": 10.0})
+    state.ensure_fresh = lambda: True
+    monkeypatch.setattr(geofence_router, "herd_state", state)
+    _, saved = check_geofences([square("paddock", 28.0, -15.51, 0.02)], "c1", -15.5, 28.0185)
+    predictor = BreachPredictor(registry=geofence_router.geofence_registry)
+    monkeypatch.setattr(geofence_router, "breach_predictor", predictor)
+    geofence_router.load_herd_geofence_monitor.cache_clear()
+
+    for _ in range(2):
+        body = TestClient(main.app).get("/geofence/monitor/all").json()
+        geofence_router.load_herd_geofence_monitor.cache_clear()
+        assert body["cattle_approaching_boundary"] == 1
+        assert body["cattle_status"][0]["boundary_prediction"]["geofence_id"] == "paddock"
+        assert body["cattle_status"][0]["alerts"] == []
+    assert saved == [] and predictor.counters["warnings"] == 0
+
+    # The ingest path raises (and saves) the warning
+    animal = {"cattle_id": "c1", "latitude": -15.5, "longitude": 28.0185, "heading": 90.0, "speed_kmh": 10.0,
+              "geofence_result": inside("paddock")}
+    _, warnings = geofence_router.predict_boundary_crossings([animal], record=True)
+    assert warnings["c1"][0]["type"] == "approaching_boundary" and len(saved) == 1
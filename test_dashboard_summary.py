@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Tests for the incrementally maintained dashboard summary (no database needed)
+"""
+
+import sys
+sys.path.append('.')
+
+import dashboard_summary as summary_module
+from dashboard_summary import DashboardSummary
+
+
+class FakeFirebase:
+    def __init__(self, collections):
+        self.collections = collections
+
+    def get_collection(self, name):
+        return {"success": True, "data": [dict(doc) for doc in self.collections.get(name, [])]}
+
+
+def test_incremental_counts():
+    summary = DashboardSummary(recent_limit=2)
+    summary.record_cattle("c1", {"status": "grazing", "location": "A"})
+    summary.record_cattle("c2", {"status": "grazing", "location": "B"})
+    summary.record_cattle("c1", {"status": "resting"})
+    summary.record_staff("s1", {"status": "Online"})
+    summary.record_staff("s2", {"status": "Offline"})
+    summary.record_staff("s2", {"status": "Online"})
+    summary.remove_staff("s1")
+
+    data, _ = summary.snapshot()
+    assert data["cattle"] == {"total": 2, "by_status": {"resting": 1, "grazing": 1}, "by_location": {"A": 1, "B": 1}}
+    assert data["staff"] == {"total": 1, "online": 1, "offline": 0}
+
+
+def test_recent_alerts_heap_and_etag():
+    summary = DashboardSummary(recent_limit=2)
+    for i in range(6):
+        summary.record_alert(f"a{i}", {"type": "x", "timestamp": f"2025-01-0{i + 1}T00:00:00"})
+    data, etag = summary.snapshot()
+    assert data["alerts"]["total"] == 6
+    assert [a["id"] for a in data["alerts"]["recent"]] == ["a5", "a4"]
+
+    summary.remove_alert("a5")
+    data, new_etag = summary.snapshot()
+    assert new_etag != etag
+    assert [a["id"] for a in data["alerts"]["recent"]] == ["a4", "a3"]
+    assert summary.snapshot()[1] == new_etag
+
+
+def test_reconcile_corrects_drift(monkeypatch):
+    fake = FakeFirebase({
+        "cattle": [{"id": "c1", "status": "grazing", "location": "A"}],
+        "staff": [{"id": "s1", "status": "Online"}, {"id": "s2", "status": "Offline"}],
+        "alerts": [{"id": "a1", "type": "x", "timestamp": "2025-01-01T00:00:00"}],
+    })
+    monkeypatch.setattr(summary_module, "firebase_service", fake)
+
+    summary = DashboardSummary()
+    assert summary.ensure_fresh()["success"]
+    summary.record_staff("s3", {"status": "Online"})  # Never reached the database
+
+    result = summary.reconcile()
+    assert result["drift"] == {"staff": -1}
+    data, _ = summary.snapshot()
+    assert data["staff"] == {"total": 2, "online": 1, "offline": 1}
+    assert data["alerts"]["recent"][0]["id"] == "a1"
+
+
+def test_changes_during_reconcile_are_replayed(monkeypatch):
+    summary = DashboardSummary(recent_limit=2)
+    storage = FakeFirebase({"cattle": [{"id": "c1", "status": "grazing", "location": "A"}],
+                            "alerts": [{"id": "a1", "type": "x", "timestamp": "2025-01-01T00:00:00"}]})
+    fetch = storage.get_collection
+
+    def get_collection(name):
+        result = fetch(name)
+        if name == "alerts":
+            # Written after the cattle collection was downloaded
+            summary.record_cattle("c2", {"status": "walking", "location": "B"})
+            summary.record_cattle("c1", {"status": "resting"})
+            summary.record_alert("a2", {"type": "y", "timestamp": "2025-01-02T00:00:00"})
+        return result
+
+    storage.get_collection = get_collection
+    monkeypatch.setattr(summary_module, "firebase_service", storage)
+    assert summary.reconcile()["success"]
+
+    data, _ = summary.snapshot()
+    assert data["cattle"]["by_status"] == {"resting": 1, "walking": 1}
+    assert data["alerts"]["total"] == 2 and data["alerts"]["recent"][0]["id"] == "a2"
+
+    # Outside a reconciliation nothing is journaled
+    summary.record_cattle("c3", {"status": "grazing"})
+    assert summary._journal is None
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Tests for the fast JSON response class
+"""
+
+import sys
+sys.path.append('.')
+
+import json
+
+import numpy as np
+
+import fast_json
+from fast_json import FastJSONResponse
+from models import Position
+
+
+def test_fast_json_matches_stdlib_content():
+    payload = {"success": True, "data": {"cattle1": {"latitude": -15.4, "behavior": {"current": "grazing"}}}}
+    assert json.loads(FastJSONResponse(payload).body) == payload
+
+
+def test_fast_json_handles_models_and_numpy(monkeypatch):
+    payload = {"position": Position(x=1.0, y=2.0), "speeds": np.array([1.5, 2.5]), "count": np.int64(3)}
+    expected = {"position": {"x": 1.0, "y": 2.0}, "speeds": [1.5, 2.5], "count": 3}
+    assert json.loads(fast_json.dumps(payload)) == expected
+
+    # Stdlib fallback when orjson is not installed
+    monkeypatch.setattr(fast_json, "orjson", None)
+    assert json.loads(fast_json.dumps(payload)) == expected
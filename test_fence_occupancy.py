@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Tests for incremental per-fence occupancy counts (no database needed)
+"""
+
+import sys
+sys.path.append('.')
+
+from fastapi.testclient import TestClient
+
+import fence_occupancy
+from conftest import registry_with, square
+from fence_occupancy import FenceOccupancy
+from herd_state import HerdState
+
+
+def test_transitions_density_and_reconciliation(monkeypatch):
+    registry = registry_with(square("farm", 28.0, -15.5, 0.1), square("paddock", 28.0, -15.5, 0.01),
+                             square("dam", 28.05, -15.45, 0.005, zone_type="exclusion"))
+    occupancy = FenceOccupancy(registry)
+
+    assert occupancy.update("c1", -15.495, 28.005) == ({"farm", "paddock"}, set())
+    occupancy.update("c2", -15.495, 28.005)
+    occupancy.update("c3", -15.448, 28.052)
+    assert occupancy.update("c2", -15.48, 28.03) == (set(), {"paddock"})
+    occupancy.update("c3", -15.48, 28.03)  # out of the dam, still on the farm
+
+    fences = {fence["id"]: fence for fence in occupancy.snapshot()}
+    assert {fence_id: fence["head"] for fence_id, fence in fences.items()} == {"farm": 3, "paddock": 1, "dam": 0}
+    # 0.01 x 0.01 degrees at -15.5 degrees latitude is about 119 ha
+    assert abs(fences["paddock"]["area_ha"] - 111320 ** 2 * 0.0001 * 0.9636 / 10000) < 1
+    assert fences["paddock"]["head_per_ha"] == round(1 / fences["paddock"]["area_ha"], 3)
+    assert occupancy.stats()["enters"] == 6 and occupancy.stats()["exits"] == 2
+
+    # A full recount matches the incremental counts, then corrects them after they drift
+    positions = (["c1", "c2", "c3"], [-15.495, -15.48, -15.48], [28.005, 28.03, 28.03])
+    assert occupancy.reconcile(positions)["drift"] == {}
+    occupancy.remove("c1")
+    report = occupancy.reconcile(positions)
+    assert report["drift"] == {"farm": 1, "paddock": 1}
+    assert occupancy.fences_of("c1") == {"farm", "paddock"}
+
+
+def test_occupancy_endpoint_recounts_after_fence_changes(monkeypatch):
+    import main
+    import routers.geofence as geofence_router
+
+    registry = registry_with(square("paddock", 28.0, -15.5, 0.01))
+    registry.ensure_fresh = lambda: True
+    state = HerdState()
+    for index in range(10):
+        state.update(f"c{index}", {"timestamp": "2026-01-01T00:00:00Z", "latitude": -15.495,
+                                   "longitude": 28.005 if index < 4 else 28.05})
+    state.ensure_fresh = lambda: True
+    monkeypatch.setattr(fence_occupancy, "herd_state", state)
+    occupancy = FenceOccupancy(registry)
+    monkeypatch.setattr(geofence_router, "geofence_registry", registry)
+    monkeypatch.setattr(geofence_router, "fence_occupancy", occupancy)
+
+    client = TestClient(main.app)
+    data = client.get("/geofence/occupancy").json()["data"]
+    assert data["fences"][0]["head"] == 4 and data["total_head_in_fences"] == 4
+
+    registry.upsert(square("east", 28.04, -15.5, 0.02))
+    fences = {fence["id"]: fence["head"] for fence in client.get("/geofence/occupancy").json()["data"]["fences"]}
+    assert fences == {"east": 6, "paddock": 4}
+
+    data = client.get("/geofence/occupancy", params={"reconcile": "true"}).json()["data"]
+    assert data["reconciliation"] == {**data["reconciliation"], "animals": 10, "drift": {}}
+
+
+def test_transitions_during_a_recount_are_kept():
+    registry = registry_with(square("paddock", 28.0, -15.5, 0.01))
+    occupancy = FenceOccupancy(registry)
+    recount = occupancy.recount
+
+    def slow_recount(*args):
+        fences = recount(*args)
+        # Readings processed while the recount runs, after its position snapshot
+        occupancy.update("c1", -15.495, 28.05)
+        occupancy.update("c3", -15.495, 28.005)
+        return fences
+
+    occupancy.recount = slow_recount
+    report = occupancy.reconcile((["c1", "c2"], [-15.495, -15.495], [28.005, 28.005]))
+    assert occupancy.snapshot()[0]["head"] == 2
+    assert occupancy.fences_of("c1") == frozenset() and occupancy.fences_of("c3") == {"paddock"}
+    # Only c2, never seen by update(), was missing from the incremental counts
+    assert report["drift"] == {"paddock": 1}
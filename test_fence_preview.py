@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Tests for what-if fence previews against the current herd (no database needed)
+"""
+
+import random
+import sys
+sys.path.append('.')
+
+from fastapi.testclient import TestClient
+from shapely.geometry import box
+
+from fence_preview import preview_fence
+from herd_state import HerdState
+
+
+def test_preview_counts_and_distances():
+    paddock = box(28.0, -15.5, 28.01, -15.49)
+    result = preview_fence(paddock, ["a", "b", "c"], [-15.495, -15.495, -15.48], [28.005, 28.02, 28.005])
+    assert result["counts"] == {"total": 3, "inside": 1, "outside": 2, "in_breach": 2}
+    a, b, c = result["cattle"]
+    assert a["is_inside"] and not a["in_breach"]
+    # 0.005 degrees of longitude from the nearest edge at -15.495 degrees latitude
+    assert abs(a["distance_to_boundary_m"] - 0.005 * 111320 * 0.96365) < 2
+    assert not b["is_inside"] and abs(b["distance_to_boundary_m"] - 0.01 * 111320 * 0.96365) < 2
+    assert abs(c["distance_to_boundary_m"] - 0.01 * 111320) < 2
+
+    exclusion = preview_fence(paddock, ["a", "b"], [-15.495, -15.495], [28.005, 28.02], zone_type="exclusion",
+                              include_cattle=False)
+    assert exclusion["counts"]["in_breach"] == 1 and "cattle" not in exclusion
+
+
+def test_preview_endpoint_uses_herd_state(monkeypatch):
+    import main
+    import routers.geofence as geofence_router
+
+    state = HerdState()
+    rng = random.Random(7)
+    for index in range(5000):
+        state.update(f"c{index}", {"timestamp": "2026-01-01T00:00:00Z", "latitude": rng.uniform(-15.52, -15.48),
+                                   "longitude": rng.uniform(27.98, 28.03)})
+    state.ensure_fresh = lambda: True
+    monkeypatch.setattr(geofence_router, "herd_state", state)
+    cattle_ids, latitudes, longitudes = state.positions()
+    expected = sum(1 for lat, lon in zip(latitudes, longitudes) if 28.0 < lon < 28.01 and -15.5 < lat < -15.49)
+
+    client = TestClient(main.app)
+    response = client.post("/geofence/preview", json={
+        "name": "New paddock", "coordinates": [[28.0, -15.5], [28.01, -15.5], [28.01, -15.49], [28.0, -15.49]]
+    })
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert data["counts"]["total"] == 5000
+    assert data["counts"]["inside"] == expected and len(data["cattle"]) == 5000
+    assert data["elapsed_ms"] < 1000
+
+    assert client.post("/geofence/preview", json={"name": "Line", "coordinates": [[28.0, -15.5], [28.01, -15.5]]}).status_code == 400
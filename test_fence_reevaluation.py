@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Tests for position history and retroactive fence re-evaluation (no database needed)
+"""
+
+import sys
+import time
+sys.path.append('.')
+
+import shapely
+from fastapi.testclient import TestClient
+from shapely.geometry import box
+
+import fence_reevaluation
+import position_history
+from fence_reevaluation import FenceReevaluations, evaluate_track
+from position_history import PositionHistory, load_track
+
+START = 1767225600  # 2026-01-01T00:00:00Z
+
+
+class FakeFirebase:
+    def __init__(self):
+        self.data = {}
+
+    def update_realtime_data(self, path, data):
+        self.data.setdefault(path.split("/")[1], {}).update(data)
+        return {"success": True}
+
+    def query_collection(self, collection, order_by=None, start_at=None, end_at=None, shallow=False, **kwargs):
+        if shallow:
+            return {"success": True, "data": list(self.data)}
+        positions = self.data.get(collection.split("/")[1], {})
+        keys = sorted(key for key in positions if (start_at is None or key >= start_at) and (end_at is None or key <= end_at))
+        return {"success": True, "data": [{"id": key, "data": positions[key]} for key in keys]}
+
+
+def iso(epoch_seconds):
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(epoch_seconds))
+
+
+def test_history_is_thinned_buffered_and_range_queried(monkeypatch):
+    storage = FakeFirebase()
+    monkeypatch.setattr(position_history, "firebase_service", storage)
+    history = PositionHistory(min_interval_seconds=60, flush_seconds=3600)
+
+    for second in range(0, 600, 30):
+        history.record("c1", iso(START + second), -15.5, 28.0 + second / 1e5)
+    assert history.stats()["recorded"] == 10 and history.stats()["thinned"] == 10
+    assert storage.data == {}
+
+    # Unflushed positions are included in the track
+    times, latitudes, longitudes = load_track("c1", START + 120, START + 300, history)
+    assert times == [START + 120, START + 180, START + 240, START + 300]
+    history.flush()
+    assert len(storage.data["c1"]) == 10 and history.stats()["buffered"] == 0
+    assert load_track("c1", START + 120, START + 300)[0] == times
+
+
+def test_evaluate_track_episodes_and_baseline():
+    paddock = shapely.to_geojson(box(28.0, -15.5, 28.01, -15.49))
+    edited = shapely.to_geojson(box(28.0, -15.5, 28.02, -15.49))
+    # Inside, outside for 3 samples, inside, then outside again after a long gap
+    longitudes = [28.005, 28.015, 28.015, 28.03, 28.005, 28.015]
+    times = [0, 60, 120, 180, 240, 10000]
+    result = evaluate_track(paddock, "inclusion", times, [-15.495] * 6, longitudes, baseline_json=edited,
+                            max_gap_seconds=3600)
+    assert result["positions"] == 6 and result["positions_in_breach"] == 4
+    assert [(episode["start"], episode["end"]) for episode in result["episodes"]] == [(60, 240), (10000, 10000)]
+    assert result["seconds_in_breach"] == 180
+    # 0.02 degrees east of the edge at -15.5 degrees latitude
+    assert abs(result["episodes"][0]["max_distance_m"] - 0.02 * 111320 * 0.9636) < 5
+    # The larger edited fence contains three of the positions the current one does not
+    assert result["newly_in_breach"] == 3 and result["no_longer_in_breach"] == 0
+
+    exclusion = evaluate_track(paddock, "exclusion", times, [-15.495] * 6, longitudes)
+    assert exclusion["positions_in_breach"] == 2 and "newly_in_breach" not in exclusion
+
+
+def test_reevaluation_job_endpoints(monkeypatch):
+    import main
+    import routers.geofence as geofence_router
+    from geofence_registry import GeofenceRegistry
+
+    storage = FakeFirebase()
+    for minute in range(60):
+        storage.data.setdefault("c1", {})[f"{START + minute * 60:010d}"] = [-15.495, 28.00525 + minute * 0.0005]
+        storage.data.setdefault("c2", {})[f"{START + minute * 60:010d}"] = [-15.495, 28.005]
+    monkeypatch.setattr(position_history, "firebase_service", storage)
+    monkeypatch.setattr(fence_reevaluation, "position_history", PositionHistory())
+    jobs = FenceReevaluations(workers=2)
+    monkeypatch.setattr(geofence_router, "fence_reevaluations", jobs)
+    registry = GeofenceRegistry()
+    registry.sync([{"id": "paddock", "name": "Paddock",
+                    "coordinates": [[28.0, -15.5], [28.01, -15.5], [28.01, -15.49], [28.0, -15.49], [28.0, -15.5]]}])
+    monkeypatch.setattr(geofence_router, "geofence_registry", registry)
+
+    client = TestClient(main.app)
+    response = client.post("/geofence/reevaluations", json={
+        "start_time": iso(START), "end_time": iso(START + 3600), "geofence_id": "paddock",
+        "geofence": {"name": "Paddock (wider)",
+                     "coordinates": [[28.0, -15.5], [28.02, -15.5], [28.02, -15.49], [28.0, -15.49]]}
+    })
+    assert response.status_code == 202
+    job_id = response.json()["data"]["job_id"]
+
+    lines = client.get(f"/geofence/reevaluations/{job_id}/progress").text.strip().split("\n")
+    assert '"status":"completed"' in lines[-1].replace(" ", "")
+
+    data = client.get(f"/geofence/reevaluations/{job_id}").json()["data"]
+    assert data["animals_done"] == 2 and data["positions"] == 120
+    totals = data["result"]["totals"]
+    # c1 walks east at 0.0005 degrees a minute and leaves the wider fence after 30 minutes
+    assert totals["episodes"] == 1 and totals["positions_in_breach"] == 30
+    # Widening the fence clears the positions between the old and the new eastern edge
+    assert totals["newly_in_breach"] == 0 and totals["no_longer_in_breach"] == 20
+    assert data["result"]["daily"]["2026-01-01"]["cattle"] == {"c1": 29 * 60}
+    assert jobs._pool._mp_context.get_start_method() != "fork"
+    jobs.shutdown()
+    assert jobs._pool is None
+
+    assert client.post("/geofence/reevaluations", json={"start_time": "yesterday", "geofence_id": "paddock"}).status_code == 400
+    assert client.post("/geofence/reevaluations", json={"start_time": iso(START), "geofence_id": "nope"}).status_code == 404
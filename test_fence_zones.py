@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Tests for exclusion zones, holes, multi-part fences and fence hierarchies (no database needed)
+"""
+
+import sys
+sys.path.append('.')
+
+from geofence_bundle import encode_fences
+from geofence_registry import GeofenceRegistry
+
+
+def ring(x, y, size):
+    return [[x, y], [x + size, y], [x + size, y + size], [x, y + size], [x, y]]
+
+
+def fence(fence_id, x, y, size, **extra):
+    return {"id": fence_id, "name": fence_id, "coordinates": ring(x, y, size), **extra}
+
+
+FENCES = [
+    fence("farm", 28.0, -15.5, 0.1),
+    fence("paddock_a", 28.01, -15.49, 0.02, parent_id="farm", holes=[ring(28.015, -15.485, 0.005)]),
+    fence("paddock_b", 28.05, -15.49, 0.02, parent_id="farm",
+          parts=[{"coordinates": ring(28.05, -15.46, 0.01)}]),
+    fence("dam", 28.055, -15.485, 0.005, parent_id="paddock_b", zone_type="exclusion"),
+]
+
+
+def test_holes_and_parts(check_geofences):
+    result, _ = check_geofences(FENCES, "c1", -15.475, 28.025)  # paddock A, not in its hole
+    assert "paddock_a" in [f["id"] for f in result["inside_geofences"]]
+    result, _ = check_geofences(FENCES, "c1", -15.4825, 28.0175)  # inside paddock A's hole
+    assert "paddock_a" in [f["id"] for f in result["outside_geofences"]]
+    result, _ = check_geofences(FENCES, "c1", -15.455, 28.055)  # second part of paddock B
+    assert {"farm", "paddock_b"} <= {f["id"] for f in result["inside_geofences"]}
+
+
+def test_exclusion_zone_breach(check_geofences):
+    result, saved = check_geofences(FENCES, "c1", -15.4825, 28.0575)  # in the dam, inside paddock B
+    breaches = {f["id"]: f for f in result["outside_geofences"]}
+    assert breaches["dam"]["zone_type"] == "exclusion" and breaches["dam"]["is_inside"] is True
+    assert "geofence_exclusion_breach" in [alert["type"] for alert in saved]
+
+    # Assigned to paddock B only: the dam still applies, paddock A is not evaluated
+    documents = [{"id": "cattle_c1", "target_type": "cattle", "target_id": "c1", "geofence_ids": ["paddock_b"]}]
+    result, saved = check_geofences(FENCES, "c1", -15.4825, 28.0575, documents)
+    assert [f["id"] for f in result["outside_geofences"]] == ["dam"]
+    assert [f["id"] for f in result["inside_geofences"]] == ["paddock_b"]
+
+
+def test_children_are_pruned_outside_their_parent(check_geofences):
+    result, _ = check_geofences(FENCES, "c1", -15.3, 28.05, record=False)  # well outside the farm
+    assert [f["id"] for f in result["outside_geofences"]] == ["farm"]
+    assert result["pruned_geofences"] == 3
+
+    # Paddocks assigned without their farm: one breach against the nearest paddock
+    documents = [{"id": "cattle_c1", "target_type": "cattle", "target_id": "c1",
+                  "geofence_ids": ["paddock_a", "paddock_b"]}]
+    result, saved = check_geofences(FENCES, "c1", -15.3, 28.05, documents)
+    assert len(result["outside_geofences"]) == 1
+    assert result["outside_geofences"][0]["distance_approximate"] is True
+
+
+def test_registry_hierarchy_and_bundle():
+    registry = GeofenceRegistry()
+    registry.sync(FENCES + [fence("loop_a", 27.0, -15.0, 0.01, parent_id="loop_b"),
+                            fence("loop_b", 27.0, -15.0, 0.01, parent_id="loop_a")])
+    assert [entry.id for entry in registry.ancestors(registry.get("dam"))] == ["farm", "paddock_b"]
+    assert [entry.id for entry in registry.ancestors(registry.get("loop_a"))] == ["loop_b"]
+    assert registry.exclusion_ids() == {"dam"}
+    assert registry.stats()["child_fences"] == 5
+
+    encoded = encode_fences(FENCES, tolerance_m=0)
+    by_id = {}
+    for item in encoded["fences"]:
+        by_id.setdefault(item["id"], []).append(item)
+    assert len(by_id["paddock_b"]) == 2
+    assert len(by_id["paddock_a"][0]["h"]) == 1
+    assert by_id["dam"][0]["x"] == 1 and "x" not in by_id["farm"][0]
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Tests for cattle -> geofence assignments (no database needed)
+"""
+
+import sys
+sys.path.append('.')
+
+from fastapi.testclient import TestClient
+
+from conftest import square
+from geofence_assignments import GeofenceAssignmentIndex
+from geofence_registry import GeofenceRegistry
+
+
+def assignment(target_type, target_id, geofence_ids, mode="any", cattle_ids=None):
+    document = {"id": f"{target_type}_{target_id}", "target_type": target_type, "target_id": target_id,
+                "geofence_ids": geofence_ids, "mode": mode}
+    if cattle_ids is not None:
+        document["cattle_ids"] = cattle_ids
+    return document
+
+
+def test_resolution_order():
+    index = GeofenceAssignmentIndex(unassigned_mode="all_fences")
+    index.sync([
+        assignment("group", "north_herd", ["a", "b"], cattle_ids=["c1", "c2"]),
+        assignment("cattle", "c2", ["c"], mode="all"),
+        {"id": "broken", "target_type": "group", "target_id": "x", "geofence_ids": []}
+    ])
+    assert index.for_cattle("c1").as_dict() == {"source": "group", "target_id": "north_herd",
+                                                 "mode": "any", "geofence_ids": ["a", "b"]}
+    assert index.for_cattle("c2").source == "cattle"
+    unassigned = index.for_cattle("c3")
+    assert unassigned.geofence_ids is None and unassigned.mode == "all"
+
+    index.remove("cattle_c2")
+    assert index.for_cattle("c2").target_id == "north_herd"
+    assert index.stats()["group_assignments"] == 1
+
+
+PADDOCKS = [square("paddock_a", 28.0, -15.5, 0.01), square("paddock_b", 28.02, -15.5, 0.01),
+            square("farm", 27.99, -15.51, 0.05)]
+
+
+def test_assigned_animal_inside_its_paddock_is_not_breaching(check_geofences):
+    # Unassigned: inside paddock A and the farm, "outside" paddock B
+    result, saved = check_geofences(PADDOCKS, "c1", -15.495, 28.005)
+    assert result["status"] == "partial_breach" and len(saved) == 1
+
+    documents = [assignment("group", "herd", ["paddock_a", "paddock_b"], cattle_ids=["c1"])]
+    result, saved = check_geofences(PADDOCKS, "c1", -15.495, 28.005, documents)
+    assert result["status"] == "all_inside" and result["total_breaches"] == 0 and saved == []
+    assert result["total_geofences"] == 2 and result["assignment"]["source"] == "group"
+
+
+def test_any_mode_reports_one_breach_against_nearest_fence(check_geofences):
+    documents = [assignment("cattle", "c1", ["paddock_a", "paddock_b"])]
+    result, saved = check_geofences(PADDOCKS, "c1", -15.495, 28.015, documents)  # between the paddocks
+    assert result["status"] == "all_outside"
+    assert [fence["id"] for fence in result["outside_geofences"]] == ["paddock_a"]
+    assert len(saved) == 1
+
+    # Same semantics for unassigned animals when configured
+    result, saved = check_geofences(PADDOCKS, "c9", -15.495, 28.005, unassigned_mode="any")
+    assert result["status"] == "all_inside" and saved == []
+
+
+def test_all_mode_requires_every_fence(check_geofences):
+    documents = [assignment("cattle", "c1", ["paddock_a", "farm"], mode="all")]
+    result, _ = check_geofences(PADDOCKS, "c1", -15.495, 28.005, documents)
+    assert result["status"] == "all_inside"
+    result, saved = check_geofences(PADDOCKS, "c1", -15.495, 28.025, documents)
+    assert result["status"] == "partial_breach" and [fence["id"] for fence in result["outside_geofences"]] == ["paddock_a"]
+
+
+def test_assignment_endpoints(monkeypatch):
+    import main
+    import routers.geofence as geofence_router
+
+    stored = {}
+
+    class FakeFirebase:
+        def create_document(self, collection, doc_id, data):
+            stored[doc_id] = data
+            return {"success": True}
+
+        def delete_document(self, collection, doc_id):
+            stored.pop(doc_id, None)
+            return {"success": True}
+
+    registry = GeofenceRegistry()
+    registry.sync([square("paddock_a", 28.0, -15.5, 0.01)])
+    index = GeofenceAssignmentIndex()
+    index.sync([])
+    monkeypatch.setattr(geofence_router, "firebase_service", FakeFirebase())
+    monkeypatch.setattr(geofence_router, "geofence_registry", registry)
+    monkeypatch.setattr(geofence_router, "geofence_assignments", index)
+
+    client = TestClient(main.app)
+    response = client.put("/geofence/assignments/group/herd", json={"geofence_ids": ["paddock_a"], "cattle_ids": ["c1"]})
+    assert response.status_code == 200
+    assert stored["group_herd"]["cattle_ids"] == ["c1"]
+    assert index.for_cattle("c1").target_id == "herd"
+
+    assert client.put("/geofence/assignments/group/herd", json={"geofence_ids": ["nope"]}).status_code == 400
+    assert client.put("/geofence/assignments/cow/c1", json={"geofence_ids": ["paddock_a"]}).status_code == 400
+    assert client.put("/geofence/assignments/cattle/c1", json={"geofence_ids": ["paddock_a"], "mode": "some"}).status_code == 400
+
+    assert [document["id"] for document in client.get("/geofence/assignments").json()["data"]] == ["group_herd"]
+    assert client.delete("/geofence/assignments/group/herd").status_code == 200
+    assert index.for_cattle("c1").source == "unassigned" and stored == {}
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Tests for the compact geofence bundle (no database needed)
+"""
+
+import sys
+sys.path.append('.')
+
+import geofence_bundle as bundle_module
+from geofence_bundle import GeofenceBundle, content_hash, encode_fences
+
+SQUARE = [[28.25, -15.42], [28.26, -15.42], [28.26, -15.41], [28.25, -15.41], [28.25, -15.42]]
+# Same square with a redundant point in the middle of one edge
+SQUARE_WITH_EXTRA_POINT = [[28.25, -15.42], [28.255, -15.42], [28.26, -15.42], [28.26, -15.41],
+                           [28.25, -15.41], [28.25, -15.42]]
+
+
+class FakeFirebase:
+    def __init__(self, geofences):
+        self.geofences = geofences
+        self.realtime = {}
+
+    def get_collection(self, name):
+        return {"success": True, "data": [dict(g) for g in self.geofences]}
+
+    def get_realtime_data(self, path):
+        return {"success": True, "data": self.realtime.get(path)}
+
+    def set_realtime_data(self, path, data):
+        self.realtime[path] = data
+        return {"success": True}
+
+
+def test_encode_quantizes_and_simplifies():
+    encoded = encode_fences([
+        {"id": "b", "name": "B", "coordinates": SQUARE_WITH_EXTRA_POINT},
+        {"id": "a", "name": "A", "coordinates": SQUARE},
+        {"id": "bad", "name": "Too short", "coordinates": [[0, 0], [1, 1]]}
+    ])
+    assert encoded["origin"] == [2825000, -1542000]
+    assert [fence["id"] for fence in encoded["fences"]] == ["a", "b"]
+    for fence in encoded["fences"]:
+        assert fence["b"] == [0, 0, 1000, 1000]
+        assert len(fence["p"]) == 8  # four corners, closing point and collinear point dropped
+        assert all(isinstance(value, int) for value in fence["p"])
+
+
+def test_simplification_tolerance_is_metric_at_any_latitude():
+    # At 60 degrees north a degree of longitude is half as long as a degree of latitude
+    def fence_with_bulge(bulge_m):
+        bulge = bulge_m / (111320 * 0.5)
+        return {"id": "north", "name": "North", "coordinates": [
+            [10.0, 60.0], [10.01, 60.0], [10.01, 60.01], [10.0, 60.01], [10.0 - bulge, 60.005], [10.0, 60.0]]}
+
+    # A 1.5 m bulge on the western edge is within the 2 m tolerance, a 3 m one is not
+    assert len(encode_fences([fence_with_bulge(1.5)], tolerance_m=2)["fences"][0]["p"]) == 8
+    assert len(encode_fences([fence_with_bulge(3.0)], tolerance_m=2)["fences"][0]["p"]) == 10
+
+
+def test_version_only_changes_with_content(monkeypatch):
+    fake = FakeFirebase([{"id": "a", "name": "A", "coordinates": SQUARE}])
+    monkeypatch.setattr(bundle_module, "firebase_service", fake)
+    bundle = GeofenceBundle(refresh_seconds=3600)
+
+    first = bundle.current()
+    assert first["version"] == 1
+    assert first["hash"] == content_hash({"origin": first["origin"], "fences": first["fences"]})
+
+    bundle.invalidate()
+    assert bundle.version() == 1
+
+    fake.geofences.append({"id": "b", "name": "B", "coordinates": SQUARE})
+    assert bundle.version() == 1  # not refreshed yet
+    bundle.invalidate()
+    assert bundle.version() == 2
+    assert fake.realtime[bundle_module.BUNDLE_META_PATH]["version"] == 2
+
+    # A fresh instance picks up the stored version for the same content
+    assert GeofenceBundle().version() == 2
+
+
+def test_bundle_endpoint_and_ingest_signal(monkeypatch):
+    from fastapi.testclient import TestClient
+    import main
+
+    fake = FakeFirebase([{"id": "a", "name": "A", "coordinates": SQUARE}])
+    monkeypatch.setattr(bundle_module, "firebase_service", fake)
+    monkeypatch.setattr(bundle_module.geofence_bundle, "_bundle", None)
+    monkeypatch.setattr(bundle_module.geofence_bundle, "_stale", True)
+    client = TestClient(main.app)
+
+    response = client.get("/geofence/bundle")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["changed"] is True and body["data"]["fences"][0]["id"] == "a"
+    version = body["data"]["version"]
+
+    unchanged = client.get("/geofence/bundle", params={"since_version": version})
+    assert unchanged.json() == {"success": True, "changed": False, "version": version, "hash": body["data"]["hash"]}
+    assert client.get("/geofence/bundle", headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
+
+    from routers import cattle
+    from starlette.requests import Request
+    from fastapi import Response
+
+    request = Request({"type": "http", "headers": [(b"x-geofence-bundle-version", b"0")]})
+    out = Response()
+    assert cattle.geofence_bundle_status(request, out) == {"geofence_bundle_version": version, "geofence_bundle_update": True}
+    assert out.headers["X-Geofence-Bundle-Version"] == str(version)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Tests for geofence validation, repair and GeoJSON/KML import (no database needed)
+"""
+
+import json
+import math
+import sys
+sys.path.append('.')
+
+import pytest
+from fastapi.testclient import TestClient
+from shapely.geometry import Point
+
+from fence_geometry import close_ring, evaluation_geometry, prepare_fence
+from geofence_import import detect_format, parse_geojson, parse_kml
+from geofence_registry import GeofenceRegistry, build_entry
+
+BOWTIE = [[28.0, -15.5], [28.01, -15.49], [28.01, -15.5], [28.0, -15.49]]
+
+
+def traced_circle(vertices=5000, radius=0.01):
+    return [[28.3 + radius * math.cos(2 * math.pi * k / vertices), -15.4 + radius * math.sin(2 * math.pi * k / vertices)]
+            for k in range(vertices)]
+
+
+def test_rings_are_closed_and_checked():
+    assert close_ring([[0, 0], [1, 0], [1, 0], [1, 1]]) == [[0, 0], [1, 0], [1, 1], [0, 0]]
+    with pytest.raises(ValueError):
+        close_ring([[0, 0], [1, 0], [0, 0]])
+    with pytest.raises(ValueError):
+        close_ring([[0, 0], [1, 0], [200, 1]])
+
+
+def test_self_intersecting_fence_is_repaired():
+    data, report = prepare_fence({"name": "bowtie", "coordinates": BOWTIE})
+    assert report["valid"] is False and "invalid_reason" in report
+    assert data["coordinates"][0] == data["coordinates"][-1]  # original kept, closed
+    geometry = evaluation_geometry(data)
+    assert geometry.is_valid and geometry.geom_type == "MultiPolygon"
+    assert geometry.contains(Point(28.002, -15.495))
+
+    # Stored documents from before are repaired when loaded, so checks cannot fail
+    entry = build_entry({"id": "old", "name": "old", "coordinates": BOWTIE})
+    assert entry is not None and entry.polygon.is_valid
+
+
+def test_traced_boundary_is_simplified():
+    data, report = prepare_fence({"name": "traced", "coordinates": traced_circle()}, tolerance_m=1.0)
+    assert report["vertices"] == 5001
+    assert report["evaluation_vertices"] < 500
+    assert len(data["coordinates"]) == 5001
+    original = build_entry({"id": "raw", "name": "raw", "coordinates": traced_circle(),
+                            "evaluation_geometry": None})
+    simplified = evaluation_geometry(data)
+    assert abs(simplified.area - original.polygon.area) / original.polygon.area < 0.001
+    # Exterior rings are counter-clockwise
+    assert simplified.exterior.is_ccw
+
+
+def test_parse_geojson_and_kml():
+    geojson = {"type": "FeatureCollection", "features": [
+        {"type": "Feature", "properties": {"name": "North", "zone_type": "exclusion"},
+         "geometry": {"type": "Polygon", "coordinates": [[[28, -15.5], [28.1, -15.5], [28.1, -15.4], [28, -15.5]]]}},
+        {"type": "Feature", "properties": {"name": "Two parts"},
+         "geometry": {"type": "MultiPolygon", "coordinates": [
+             [[[28, -15], [28.1, -15], [28.1, -14.9]]], [[[29, -15], [29.1, -15], [29.1, -14.9]]]]}},
+        {"type": "Feature", "properties": {"name": "Trough"}, "geometry": {"type": "Point", "coordinates": [28, -15]}}
+    ]}
+    fences, skipped = parse_geojson(json.dumps(geojson).encode())
+    assert [fence["name"] for fence in fences] == ["North", "Two parts"]
+    assert fences[0]["zone_type"] == "exclusion" and len(fences[1]["parts"]) == 1
+    assert skipped[0]["name"] == "Trough"
+
+    kml = b"""<?xml version="1.0" encoding="UTF-8"?>
+    <kml xmlns="http://www.opengis.net/kml/2.2"><Document><Placemark>
+      <name>Dam paddock</name>
+      <ExtendedData><Data name="zone_type"><value>inclusion</value></Data></ExtendedData>
+      <Polygon>
+        <outerBoundaryIs><LinearRing><coordinates>28,-15.5,0 28.1,-15.5,0 28.1,-15.4,0 28,-15.5,0</coordinates></LinearRing></outerBoundaryIs>
+        <innerBoundaryIs><LinearRing><coordinates>28.06,-15.48 28.08,-15.48 28.08,-15.46 28.06,-15.48</coordinates></LinearRing></innerBoundaryIs>
+      </Polygon>
+    </Placemark></Document></kml>"""
+    assert detect_format(None, kml) == "kml" and detect_format("application/geo+json", kml) == "geojson"
+    fences, skipped = parse_kml(kml)
+    assert fences[0]["name"] == "Dam paddock" and len(fences[0]["holes"]) == 1 and skipped == []
+    with pytest.raises(ValueError):
+        parse_kml(b"<kml><Placemark>")
+
+
+def test_import_endpoint(monkeypatch):
+    import main
+    import routers.geofence as geofence_router
+
+    stored = {}
+
+    class FakeFirebase:
+        def create_document(self, collection, doc_id, data):
+            stored[doc_id] = data
+            return {"success": True}
+
+    monkeypatch.setattr(geofence_router, "firebase_service", FakeFirebase())
+    monkeypatch.setattr(geofence_router, "geofence_registry", GeofenceRegistry())
+    monkeypatch.setattr(geofence_router.geofence_bundle, "invalidate", lambda: None)
+
+    geojson = {"type": "FeatureCollection", "features": [
+        {"type": "Feature", "properties": {"name": "Bowtie"}, "geometry": {"type": "Polygon", "coordinates": [BOWTIE]}},
+        {"type": "Feature", "properties": {"name": "Line"},
+         "geometry": {"type": "Polygon", "coordinates": [[[28, -15], [28.1, -15], [28.2, -15]]]}},
+    ]}
+    client = TestClient(main.app)
+    response = client.post("/geofence/import?dry_run=true", content=json.dumps(geojson),
+                           headers={"Content-Type": "application/geo+json"})
+    assert response.json()["data"]["dry_run"] is True and stored == {}
+
+    response = client.post("/geofence/import", content=json.dumps(geojson), headers={"Content-Type": "application/geo+json"})
+    body = response.json()
+    assert body["success"] is False
+    assert [fence["name"] for fence in body["data"]["created"]] == ["Bowtie"]
+    assert body["data"]["failed"][0]["name"] == "Line"
+    assert list(stored.values())[0]["evaluation_geometry"]["type"] == "MultiPolygon"
+
+    response = client.post("/geofence/geofences", json={"name": "bad", "coordinates": [[0, 0], [1, 1]]})
+    assert response.status_code == 400
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Tests for precomputed fence rasters (no database needed)
+"""
+
+import math
+import random
+import sys
+sys.path.append('.')
+
+from shapely.geometry import Point, Polygon
+
+import geofence_raster
+from geofence_raster import BOUNDARY, build_raster, wants_raster
+from geofence_registry import build_entry
+
+
+def circle(cx, cy, radius_deg, vertices=200):
+    return [[cx + radius_deg * math.cos(2 * math.pi * k / vertices),
+             cy + radius_deg * math.sin(2 * math.pi * k / vertices)] for k in range(vertices)]
+
+
+def test_raster_agrees_with_exact_test():
+    random.seed(11)
+    polygon = Polygon(circle(0, 0, 1000))  # local meters
+    raster = build_raster(polygon, cell_m=25)
+    counts = raster.counts()
+    assert counts["boundary"] < counts["inside"]
+
+    half_diagonal = raster.cell * math.sqrt(2) / 2
+    hits = 0
+    for _ in range(2000):
+        x = (random.random() - 0.5) * 2000
+        y = (random.random() - 0.5) * 2000
+        result = raster.lookup(x, y)
+        if result is None:
+            continue
+        hits += 1
+        point = Point(x, y)
+        assert result[0] == polygon.contains(point)
+        assert abs(result[1] - point.distance(polygon.boundary)) <= half_diagonal + 1e-3
+    assert hits > 1600
+
+
+def test_cell_budget_and_eligibility():
+    polygon = Polygon(circle(0, 0, 10000))
+    raster = build_raster(polygon, cell_m=5, max_cells=10000)
+    assert raster.nx * raster.ny <= 10000 * 1.05
+    assert raster.lookup(20000, 0) is None  # outside the grid: exact test
+    assert (raster.states == BOUNDARY).any()
+
+    assert wants_raster(polygon, min_vertices=32)
+    assert not wants_raster(Polygon([[0, 0], [1, 0], [1, 1]]), min_vertices=32)
+    assert not wants_raster(polygon, cell_m=0)
+
+
+def test_registry_entries_get_rasters_and_stats():
+    big = build_entry({"id": "big", "name": "Big", "coordinates": circle(28.3, -15.4, 0.01)})
+    small = build_entry({"id": "small", "name": "Small", "coordinates": [[0, 0], [1, 0], [1, 1]]})
+    assert big.raster is not None and small.raster is None
+
+    before = dict(geofence_raster.raster_stats)
+    big.raster.lookup(*big.projection.to_local(28.3, -15.4))
+    stats = geofence_raster.stats()
+    assert stats["lookups"] == before["lookups"] + 1
+    assert stats["hits"] == before["hits"] + 1
+    assert 0 < stats["hit_ratio"] <= 1
+    assert stats["rasters_built"] >= 1 and stats["build_seconds_total"] > 0
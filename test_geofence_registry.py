@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Tests for the in-memory geofence registry and its grid index (no database needed)
+"""
+
+import math
+import random
+import sys
+sys.path.append('.')
+
+from shapely.geometry import Point
+
+from conftest import square
+from geofence_registry import GeofenceRegistry
+
+
+def test_query_matches_brute_force():
+    random.seed(3)
+    registry = GeofenceRegistry(cell_size_deg=0.01)
+    fences = [square(f"g{i:03d}", 28.0 + random.random() * 0.5, -15.5 + random.random() * 0.5,
+                     0.002 + random.random() * 0.02) for i in range(300)]
+    fences.append(square("huge", 27.0, -16.5, 3.0))
+    registry.max_cells_per_fence = 1000
+    registry.sync(fences)
+    assert registry.stats()["large_fences"] == 1
+
+    radius = 0.02
+    for _ in range(200):
+        x, y = 28.0 + random.random() * 0.5, -15.5 + random.random() * 0.5
+        near, far = registry.query(x, y, radius, include_far=True)
+        assert len(near) + len(far) == len(fences)
+        assert registry.query(x, y, radius) == (near, [])
+        near_ids = {entry.id for entry in near}
+        for entry in registry.entries():
+            if entry.polygon.contains(Point(x, y)):
+                assert entry.id in near_ids
+            assert (entry.bbox_distance(x, y) <= radius) == (entry.id in near_ids)
+        assert [entry.id for entry in near] == sorted(near_ids)
+
+
+def test_incremental_insert_remove_and_sync():
+    registry = GeofenceRegistry(cell_size_deg=0.01)
+    registry.sync([square("a", 28.0, -15.5, 0.005), square("b", 28.1, -15.5, 0.005)])
+    assert len(registry) == 2
+
+    registry.upsert(square("c", 28.0, -15.49, 0.005))
+    assert [entry.id for entry in registry.query(28.002, -15.487, 0.001)[0]] == ["c"]
+
+    # Moving a fence re-indexes it
+    registry.upsert(square("c", 28.3, -15.49, 0.005))
+    assert registry.query(28.002, -15.487, 0.001, include_far=False) == ([], [])
+    assert registry.remove("c") and not registry.remove("c")
+
+    version = registry.version
+    changes = registry.sync([square("a", 28.0, -15.5, 0.005), square("b", 28.2, -15.5, 0.005),
+                             {"id": "bad", "coordinates": [[0, 0]]}])
+    assert changes == {"added": 0, "updated": 1, "removed": 0}
+    assert registry.version == version + 2  # b removed and re-inserted, a untouched
+    assert registry.sync([square("a", 28.0, -15.5, 0.005)]) == {"added": 0, "updated": 0, "removed": 1}
+    assert registry.stats()["grid_cells"] == len(registry.get("a").cells)
+
+
+def test_check_cattle_geofence_status_uses_index(check_geofences):
+    fences = [square("home", 28.0, -15.5, 0.01), square("far_away", 29.0, -15.5, 0.01)]
+    result, _ = check_geofences(fences, "c1", -15.495, 28.005, far_fence_mode="bbox", record=False)
+    assert result["status"] == "partial_breach" and result["total_geofences"] == 2
+    assert [fence["id"] for fence in result["inside_geofences"]] == ["home"]
+    far = result["outside_geofences"][0]
+    assert far["id"] == "far_away" and far["distance_approximate"] is True
+    # 0.995 degrees of longitude at -15.5 degrees latitude, in meters rather than degrees * 111.32
+    assert abs(far["distance_to_boundary_km"] - 0.995 * 111.32 * math.cos(math.radians(15.495))) < 0.05
+
+    # Ingest does not list far fences
+    result, saved = check_geofences(fences, "c1", -15.495, 28.005, far_fence_mode="bbox")
+    assert result["status"] == "all_inside" and saved == []
+
+    result, _ = check_geofences(fences, "c1", -15.495, 28.005, far_fence_mode="skip", record=False)
+    assert result["status"] == "all_inside" and result["outside_geofences"] == []
+
+    result, _ = check_geofences(fences, "c1", -15.495, 28.005, far_fence_mode="exact", record=False)
+    assert "distance_approximate" not in result["outside_geofences"][0]
+
+
+def test_ingest_keeps_far_breaches_in_progress(check_geofences):
+    import routers.geofence as geofence_router
+
+    fences = [square("home", 28.0, -15.5, 0.01), square("far_away", 29.0, -15.5, 0.01)]
+    # Leaving home: near, so it is a breach and starts an episode
+    result, saved = check_geofences(fences, "c1", -15.495, 28.011)
+    assert [fence["id"] for fence in result["outside_geofences"]] == ["home"] and len(saved) == 1
+
+    registry = geofence_router.geofence_registry
+    query = registry.query
+    listed = []
+    registry.query = lambda *args, **kwargs: listed.append(kwargs.get("include_far")) or query(*args, **kwargs)
+    # Walked more than FAR_FENCE_DISTANCE_KM away: home is far now, but its episode goes on
+    result = geofence_router.check_cattle_geofence_status("c1", -15.495, 28.05, record=True)
+    assert [fence["id"] for fence in result["outside_geofences"]] == ["home"]
+    assert result["outside_geofences"][0]["distance_approximate"] is True
+    assert listed == [False] and len(saved) == 1
+    assert [episode["fence_id"] for episode in geofence_router.breach_episodes.open_episodes("c1")] == ["home"]
+
+    # "any" needs the nearest fence when none is near, so the far ones are listed then
+    result, _ = check_geofences(fences, "c2", -15.495, 28.5, unassigned_mode="any")
+    assert [fence["id"] for fence in result["outside_geofences"]] == ["home"]
+
+
+def test_boundary_distances_are_metric():
+    from live_state_cache import distance_m
+    from geofence_registry import build_entry
+
+    entry = build_entry(square("east", 28.0, -15.5, 0.01))
+    # A point 0.01 degrees east of the fence: ~1.07 km at this latitude, not 1.11 km
+    expected = distance_m(-15.495, 28.01, -15.495, 28.02)
+    assert abs(entry.boundary_distance_m(28.02, -15.495) - expected) < expected * 0.002
+    assert abs(entry.bbox_distance_m(28.02, -15.495) - expected) < expected * 0.002
+    # North-south distances are unchanged
+    assert abs(entry.boundary_distance_m(28.005, -15.48) - distance_m(-15.49, 28.005, -15.48, 28.005)) < 3.0
+    assert entry.bbox_distance_m(28.005, -15.495) == 0
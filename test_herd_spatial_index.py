@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Tests for radius and bounding-box queries on the herd state grid (no database needed)
+"""
+
+import sys
+sys.path.append('.')
+
+import random
+
+from fastapi.testclient import TestClient
+
+from herd_state import HerdState
+from live_state_cache import distance_m
+
+
+def reading(latitude, longitude, timestamp="2026-01-01T00:00:00Z"):
+    return {"timestamp": timestamp, "latitude": latitude, "longitude": longitude, "behavior": {"current": "grazing"}}
+
+
+def random_herd(count=500, seed=7):
+    generator = random.Random(seed)
+    state = HerdState(capacity=16)
+    positions = {}
+    for index in range(count):
+        positions[f"c{index:03d}"] = (-15.5 + generator.uniform(-0.02, 0.02), 28.0 + generator.uniform(-0.02, 0.02))
+        state.update(f"c{index:03d}", reading(*positions[f"c{index:03d}"]))
+    return state, positions
+
+
+def test_queries_match_brute_force_after_moves():
+    state, positions = random_herd()
+    generator = random.Random(11)
+    # Move a third of the herd across cells; the index follows the row updates
+    for cattle_id in list(positions)[::3]:
+        positions[cattle_id] = (-15.5 + generator.uniform(-0.02, 0.02), 28.0 + generator.uniform(-0.02, 0.02))
+        state.update(cattle_id, reading(*positions[cattle_id], timestamp="2026-01-01T00:05:00Z"))
+
+    for radius_m in (50, 200, 1500):
+        found = state.nearby(-15.5, 28.0, radius_m)
+        expected = sorted((distance_m(-15.5, 28.0, *position), cattle_id) for cattle_id, position in positions.items()
+                          if distance_m(-15.5, 28.0, *position) <= radius_m)
+        assert [location["cattle_id"] for location in found] == [cattle_id for _, cattle_id in expected]
+        assert all(abs(location["distance_m"] - distance) < 0.1 for location, (distance, _) in zip(found, expected))
+
+    found = state.in_bbox(-15.51, 27.995, -15.495, 28.012)
+    expected = sorted(cattle_id for cattle_id, (latitude, longitude) in positions.items()
+                      if -15.51 <= latitude <= -15.495 and 27.995 <= longitude <= 28.012)
+    assert [location["cattle_id"] for location in found] == expected and expected
+    assert len(state.in_bbox(-15.51, 27.995, -15.495, 28.012, limit=3)) == 3
+    assert state.nearby(-15.5, 28.0, 200, limit=1)[0]["cattle_id"] == state.nearby(-15.5, 28.0, 200)[0]["cattle_id"]
+
+    grid = state.stats()["grid"]
+    assert grid["indexed"] == 500 and grid["cells"] < 100
+
+
+def test_nearby_crosses_the_antimeridian():
+    state = HerdState()
+    state.update("east", reading(-17.0, 179.9995))
+    state.update("west", reading(-17.0, -179.9995))
+    state.update("far", reading(-17.0, -179.99))
+
+    found = state.nearby(-17.0, 179.9995, 200)
+    assert [location["cattle_id"] for location in found] == ["east", "west"]
+    assert abs(found[1]["distance_m"] - distance_m(-17.0, 179.9995, -17.0, -179.9995)) < 0.1
+    # Equally far on either side of the antimeridian
+    assert {location["cattle_id"] for location in state.nearby(-17.0, -180.0, 100)} == {"east", "west"}
+
+
+def test_endpoints_validate_and_answer(monkeypatch):
+    import main
+    import routers.cattle as cattle_router
+
+    state = HerdState()
+    state.update("near", reading(-15.5, 28.001))  # ~107 m east
+    state.update("far", reading(-15.5, 28.01))
+    state.update("unplaced", {"timestamp": "2026-01-01T00:00:00Z"})
+    state.ensure_fresh = lambda: True
+    monkeypatch.setattr(cattle_router, "herd_state", state)
+    client = TestClient(main.app)
+
+    body = client.get("/cattle/nearby", params={"lat": -15.5, "lon": 28.0, "radius_m": 200}).json()
+    assert body["count"] == 1 and body["data"][0]["cattle_id"] == "near"
+    assert 100 < body["data"][0]["distance_m"] < 115
+
+    body = client.get("/cattle/in-bbox", params={"min_lat": -15.6, "min_lon": 27.9, "max_lat": -15.4, "max_lon": 28.1}).json()
+    assert [location["cattle_id"] for location in body["data"]] == ["far", "near"]
+
+    assert client.get("/cattle/nearby", params={"lat": 95, "lon": 28.0}).status_code == 400
+    assert client.get("/cattle/nearby", params={"lat": -15.5, "lon": 28.0, "radius_m": 0}).status_code == 400
+    assert client.get("/cattle/in-bbox", params={"min_lat": -15.4, "min_lon": 27.9,
+                                                 "max_lat": -15.6, "max_lon": 28.1}).status_code == 400
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Tests for the columnar in-memory herd state (no database needed)
+"""
+
+import sys
+sys.path.append('.')
+
+from fastapi.testclient import TestClient
+
+import herd_state
+from herd_state import HerdState
+
+
+def reading(timestamp, latitude, longitude, behavior="grazing", is_moving=False, speed_kmh=0.0):
+    return {"timestamp": timestamp, "latitude": latitude, "longitude": longitude, "speed_kmh": speed_kmh,
+            "heading": 90.0, "is_moving": is_moving, "acceleration": {"x": 0.1, "y": 0.2, "z": 9.8},
+            "behavior": {"current": behavior}}
+
+
+def test_rows_grow_and_update_in_place():
+    state = HerdState(capacity=2)
+    for index in range(5):
+        state.update(f"c{index}", reading("2026-01-01T00:00:00Z", -15.5 + index / 100, 28.0,
+                                          behavior="walking" if index % 2 else "resting", is_moving=bool(index % 2)))
+    state.update("c0", reading("2026-01-01T00:05:00Z", -15.4, 28.1, behavior="walking", is_moving=True, speed_kmh=3.0))
+
+    assert len(state) == 5 and state.stats()["capacity"] == 8
+    assert state.stats()["bytes_per_animal"] < 64
+    view = state.columns("latitude", "speed_kmh", "behavior")
+    assert view["cattle_id"].tolist() == ["c0", "c1", "c2", "c3", "c4"]
+    assert view["latitude"][0] == -15.4 and view["speed_kmh"][0] == 3.0
+
+    locations = state.locations()
+    assert locations[0] == {"cattle_id": "c0", "latitude": -15.4, "longitude": 28.1,
+                            "timestamp": "2026-01-01T00:05:00Z", "behavior": "walking", "is_moving": True}
+    summary = state.summary(now=1767225600 + 600)
+    assert summary == {"tracked": 5, "moving": 3, "active": 5, "by_behavior": {"resting": 2, "walking": 3}}
+
+
+def test_merge_keeps_newer_rows_and_endpoint(monkeypatch):
+    import main
+    import routers.cattle as cattle_router
+
+    class FakeFirebase:
+        def get_realtime_data(self, path):
+            return {"success": True, "data": {
+                "c1": reading("2026-01-01T00:00:00Z", -15.5, 28.0),
+                "c2": reading("2026-01-01T00:00:00Z", -15.6, 28.0),
+                "c3": {"timestamp": "2026-01-01T00:00:00Z"},
+                "broken": "not a reading"
+            }}
+
+    state = HerdState()
+    state.update("c1", reading("2026-01-01T00:10:00Z", -15.45, 28.05, behavior="walking"))
+    monkeypatch.setattr(herd_state, "firebase_service", FakeFirebase())
+    monkeypatch.setattr(cattle_router, "herd_state", state)
+
+    response = TestClient(main.app).get("/cattle/locations")
+    assert response.status_code == 200
+    locations = {location["cattle_id"]: location for location in response.json()["data"]}
+    # The reading ingested here is newer than the stored one; c3 has no position
+    assert set(locations) == {"c1", "c2"}
+    assert locations["c1"]["latitude"] == -15.45 and locations["c1"]["behavior"] == "walking"
+    assert state.stats()["rows_merged"] == 2 and len(state) == 3
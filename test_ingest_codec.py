@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Tests for the fast sensor reading decoder
+"""
+
+import sys
+sys.path.append('.')
+
+import json
+
+import pytest
+from pydantic import ValidationError
+
+from ingest_codec import (
+    decode_sensor_reading, decode_sensor_payload, decode_sensor_batch, inline_json_schema, UnsupportedEncodingError
+)
+from models import CattleSensorData
+
+READING = {
+    "cattle_id": "cattle1",
+    "timestamp": "2025-07-28T12:34:56.000Z",
+    "latitude": -15.3875,
+    "longitude": 28.3228,
+    "gps_fix": True,
+    "speed_kmh": 1.8,
+    "heading": 137.5,
+    "is_moving": True,
+    "acceleration": {"x": 0.12, "y": -0.08, "z": 9.79},
+    "behavior": {"current": "grazing", "previous": "walking", "duration_seconds": 320, "confidence": 0.87},
+    "activity": {"total_active_time_seconds": 14400, "total_rest_time_seconds": 28800,
+                 "daily_steps": 1250, "daily_distance_km": 2.3}
+}
+
+
+def test_decode_matches_model_validation():
+    reading = decode_sensor_reading(json.dumps(READING).encode())
+    assert reading.model == CattleSensorData.model_validate(READING)
+    assert reading.as_dict() == READING
+    assert json.loads(reading.as_json()) == READING
+    # Encodings are built once and shared
+    assert reading.as_json() is reading.as_json()
+    assert reading.as_dict() is reading.as_dict()
+
+
+def test_replace_rebuilds_encodings():
+    reading = decode_sensor_reading(json.dumps(READING).encode())
+    moved = reading.replace(latitude=-15.0)
+    assert json.loads(moved.as_json())["latitude"] == -15.0
+    assert reading.as_dict()["latitude"] == READING["latitude"]
+
+
+def test_invalid_payload_raises_validation_error():
+    with pytest.raises(ValidationError):
+        decode_sensor_reading(json.dumps({**READING, "latitude": "north"}).encode())
+    with pytest.raises(ValidationError):
+        decode_sensor_reading(b"{not json")
+
+
+def test_inline_schema_has_no_local_refs():
+    schema = inline_json_schema(CattleSensorData)
+    assert "$defs" not in schema and "$ref" not in json.dumps(schema)
+    assert schema["properties"]["behavior"]["properties"]["current"]["type"] == "string"
+
+
+SHORT_READING = {
+    "i": "cattle1", "t": "2025-07-28T12:34:56.000Z", "la": -15.3875, "lo": 28.3228, "f": True,
+    "s": 1.8, "h": 137.5, "m": True, "a": [0.12, -0.08, 9.79],
+    "b": {"c": "grazing", "p": "walking", "d": 320, "k": 0.87},
+    "ac": {"at": 14400, "rt": 28800, "st": 1250, "dk": 2.3}
+}
+
+
+def test_short_key_json_decodes_to_same_reading():
+    reading = decode_sensor_payload(json.dumps(SHORT_READING).encode(), "application/vnd.liwena.sensor+json; v=1")
+    assert reading.as_dict() == READING
+
+
+def test_binary_encodings_decode_to_same_reading():
+    msgpack = pytest.importorskip("msgpack")
+    cbor2 = pytest.importorskip("cbor2")
+    assert decode_sensor_payload(msgpack.packb(SHORT_READING), "application/msgpack").as_dict() == READING
+    assert decode_sensor_payload(cbor2.dumps(READING), "application/cbor").as_dict() == READING
+    assert len(msgpack.packb(SHORT_READING)) < len(json.dumps(READING)) / 2
+
+
+def test_epoch_timestamp_and_unsupported_formats():
+    reading = decode_sensor_payload(json.dumps({**SHORT_READING, "t": 0}).encode(), "application/vnd.liwena.sensor+json")
+    assert reading.model.timestamp == "1970-01-01T00:00:00Z"
+    with pytest.raises(UnsupportedEncodingError):
+        decode_sensor_payload(b"", "application/xml")
+    with pytest.raises(UnsupportedEncodingError):
+        decode_sensor_payload(json.dumps(READING).encode(), "application/json", schema_version="2")
+
+
+def test_batch_reports_invalid_items_individually():
+    body = json.dumps({"readings": [SHORT_READING, {"i": "cattle2"}]}).encode()
+    decoded = decode_sensor_batch(body, "application/vnd.liwena.sensor+json")
+    assert decoded[0].as_dict() == READING
+    assert isinstance(decoded[1], ValidationError)
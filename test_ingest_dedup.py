@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Tests for duplicate, replay and out-of-order suppression on ingest (no database needed)
+"""
+
+import sys
+sys.path.append('.')
+
+from ingest_dedup import IngestDeduplicator, timestamp_order
+
+
+def test_window_returns_original_result_and_is_bounded():
+    dedup = IngestDeduplicator(window_size=2)
+    for second in range(3):
+        dedup.remember("c1", f"2025-07-28T12:00:0{second}Z", {"n": second})
+
+    assert dedup.lookup("c1", "2025-07-28T12:00:02Z") == {"n": 2}
+    assert dedup.lookup("c1", "2025-07-28T12:00:00Z") is None  # fell out of the window
+    assert dedup.lookup("c2", "2025-07-28T12:00:02Z") is None
+    assert dedup.stats()["duplicates"] == 1
+
+    # The same instant spelled differently is the same reading
+    assert dedup.lookup("c1", "2025-07-28T12:00:02+00:00") == {"n": 2}
+    assert dedup.lookup("c1", "2025-07-28T12:00:02.000Z") == {"n": 2}
+    assert dedup.lookup("c1", "2025-07-28T14:00:02.000000+02:00") == {"n": 2}
+    dedup.remember("c1", "not a timestamp", {"n": "raw"})
+    assert dedup.lookup("c1", "not a timestamp") == {"n": "raw"}
+
+
+def test_out_of_order_detection():
+    dedup = IngestDeduplicator()
+    assert dedup.latest_timestamp("c1", "2025-07-28T12:00:00Z") is None
+    dedup.remember("c1", "2025-07-28T12:00:10.000Z", {})
+
+    assert dedup.latest_timestamp("c1", "2025-07-28T12:00:05Z") == "2025-07-28T12:00:10.000Z"
+    # Same instant in another offset is not older
+    assert dedup.latest_timestamp("c1", "2025-07-28T15:00:10+03:00") is None
+    assert dedup.latest_timestamp("c1", "not a timestamp") is None
+    # An older reading does not move the latest timestamp back
+    dedup.remember("c1", "2025-07-28T12:00:05Z", {})
+    assert dedup.latest_timestamp("c1", "2025-07-28T12:00:07Z") == "2025-07-28T12:00:10.000Z"
+    assert timestamp_order("2025-07-28T12:00:00") == timestamp_order("2025-07-28T12:00:00Z")
+
+
+def test_idempotency_keys_expire_and_are_bounded():
+    dedup = IngestDeduplicator(idempotency_capacity=2, idempotency_ttl=60)
+    dedup.remember_key("a", {"ok": 1})
+    dedup.remember_key("b", {"ok": 2})
+    dedup.remember_key("c", {"ok": 3})
+    assert dedup.replay("a") is None
+    assert dedup.replay("c") == {"ok": 3}
+
+    expired = IngestDeduplicator(idempotency_ttl=0)
+    expired.remember_key("a", {"ok": 1})
+    assert expired.replay("a") is None
+
+
+def test_process_sensor_reading_short_circuits(monkeypatch):
+    from routers import cattle
+    from ingest_codec import decode_sensor_payload
+
+    monkeypatch.setattr(cattle, "ingest_dedup", IngestDeduplicator())
+    processed = []
+
+    def fake_store(reading):
+        processed.append(reading.model.timestamp)
+        return {"success": True, "cattle_id": reading.cattle_id}
+
+    monkeypatch.setattr(cattle, "store_and_evaluate_reading", fake_store)
+
+    def reading(timestamp):
+        return decode_sensor_payload(
+            b'{"i": "c1", "t": "%s", "la": -15.4, "lo": 28.3, "f": true, "s": 0, "h": 0, "m": false,'
+            b' "a": [0, 0, 9.8], "b": {"c": "resting", "p": "resting", "d": 1, "k": 0.9},'
+            b' "ac": {"at": 0, "rt": 0, "st": 0, "dk": 0}}' % timestamp.encode(),
+            "application/vnd.liwena.sensor+json"
+        )
+
+    assert cattle.process_sensor_reading(reading("2025-07-28T12:00:10Z")) == {"success": True, "cattle_id": "c1"}
+    assert cattle.process_sensor_reading(reading("2025-07-28T12:00:10Z"))["duplicate"] is True
+    late = cattle.process_sensor_reading(reading("2025-07-28T12:00:00Z"))
+    assert late["out_of_order"] is True and late["latest_timestamp"] == "2025-07-28T12:00:10Z"
+    assert processed == ["2025-07-28T12:00:10Z"]
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Tests for change detection on ingest (no database needed)
+"""
+
+import sys
+from datetime import datetime
+sys.path.append('.')
+
+from live_state_cache import LiveStateCache, WRITE_FULL, WRITE_PATCH, WRITE_SKIP, distance_m
+from position_filter import PositionFilter
+
+
+def reading(timestamp, latitude=-15.4, longitude=28.3, moving=False, behavior="resting", speed=0.0):
+    return {
+        "cattle_id": "c1", "timestamp": timestamp, "latitude": latitude, "longitude": longitude,
+        "gps_fix": True, "speed_kmh": speed, "heading": 0.0, "is_moving": moving,
+        "acceleration": {"x": 0.0, "y": 0.0, "z": 9.8},
+        "behavior": {"current": behavior, "previous": "resting", "duration_seconds": 10, "confidence": 0.9},
+        "activity": {"total_active_time_seconds": 0, "total_rest_time_seconds": 0, "daily_steps": 0, "daily_distance_km": 0.0}
+    }
+
+
+def test_distance_m():
+    assert distance_m(-15.4, 28.3, -15.4, 28.3) == 0
+    # One thousandth of a degree of latitude is about 111 m
+    assert 110 < distance_m(-15.4, 28.3, -15.401, 28.3) < 112
+
+
+def test_plan_write_throttles_heartbeats():
+    cache = LiveStateCache(heartbeat_interval=60)
+    previous = {"a": 1, "t": "x"}
+    assert cache.plan_write(None, 0, {"a": 1}, significant=False) == (WRITE_FULL, {"a": 1})
+    assert cache.plan_write(previous, 100, dict(previous), significant=True, now=101) == (WRITE_SKIP, {})
+    assert cache.plan_write(previous, 100, {"a": 1, "t": "y"}, significant=False, now=120) == (WRITE_SKIP, {})
+    assert cache.plan_write(previous, 100, {"a": 1, "t": "y"}, significant=False, now=161) == (WRITE_PATCH, {"t": "y"})
+    assert cache.plan_write(previous, 100, {"a": 2, "t": "x"}, significant=True, now=101) == (WRITE_PATCH, {"a": 2})
+
+
+def test_resting_animal_live_writes():
+    cache = LiveStateCache(stationary_threshold_m=5, heartbeat_interval=300)
+    first = reading("t1")
+    assert not cache.is_stationary("c1", -15.4, 28.3, False)
+    assert cache.plan_live_write("c1", first, False)[0] == WRITE_FULL
+    cache.record_live_write("c1", first)
+    cache.record_reading("c1", first)
+
+    # GPS noise of ~1 m while resting: heartbeat only
+    noisy = reading("t2", latitude=-15.40001)
+    assert cache.is_stationary("c1", noisy["latitude"], noisy["longitude"], False)
+    assert cache.plan_live_write("c1", noisy, True) == (WRITE_SKIP, {})
+
+    # Behavior change is written straight away, as a patch of the changed fields
+    standing = reading("t3", latitude=-15.40001, behavior="grazing")
+    mode, fields = cache.plan_live_write("c1", standing, True)
+    assert mode == WRITE_PATCH
+    assert set(fields) == {"timestamp", "latitude", "behavior"}
+
+    # Moving away is never stationary
+    assert not cache.is_stationary("c1", -15.401, 28.3, False)
+    assert not cache.is_stationary("c1", -15.4, 28.3, True)
+
+
+def test_geofence_result_reuse():
+    cache = LiveStateCache(stationary_threshold_m=5)
+    inside = {"success": True, "total_breaches": 0, "alerts": [], "inside_geofences": [{"id": "g"}]}
+    cache.record_geofence_result("c1", -15.4, 28.3, inside)
+
+    cached = cache.cached_geofence_result("c1", -15.40001, 28.3, False)
+    assert cached["cached"] is True and cached["inside_geofences"] == [{"id": "g"}]
+    assert cache.cached_geofence_result("c1", -15.40001, 28.3, True) is None
+    assert cache.cached_geofence_result("c1", -15.401, 28.3, False) is None
+
+    cache.invalidate_geofence_results()
+    assert cache.cached_geofence_result("c1", -15.4, 28.3, False) is None
+
+    # Breached animals are always re-evaluated
+    cache.record_geofence_result("c1", -15.4, 28.3, {"success": True, "total_breaches": 1, "alerts": []})
+    assert cache.cached_geofence_result("c1", -15.4, 28.3, False) is None
+
+
+class FakeFirebase:
+    def __init__(self):
+        self.writes = []
+
+    def set_realtime_raw(self, path, body):
+        self.writes.append(("set", path))
+        return {"success": True}
+
+    def update_realtime_data(self, path, data):
+        self.writes.append(("patch", path, sorted(data)))
+        return {"success": True}
+
+    def update_document(self, collection, doc_id, data):
+        self.writes.append(("update", collection, sorted(data)))
+        return {"success": True}
+
+
+def test_resting_herd_write_volume(monkeypatch):
+    from routers import cattle
+    import routers.geofence as geofence_router
+    from ingest_codec import DecodedReading
+    from models import CattleSensorData
+
+    fake = FakeFirebase()
+    evaluations = []
+    monkeypatch.setattr(cattle, "firebase_service", fake)
+    monkeypatch.setattr(cattle, "live_state_cache", LiveStateCache(heartbeat_interval=300))
+    monkeypatch.setattr(cattle, "position_filter", PositionFilter())
+    monkeypatch.setattr(cattle, "analyze_behavior_and_generate_alerts", lambda *args: [])
+    monkeypatch.setattr(cattle.dashboard_summary, "record_cattle", lambda *args: None)
+    monkeypatch.setattr(cattle.reporting_policy, "get_policy", lambda: cattle.reporting_policy._policy)
+
+    def fake_check(cattle_id, latitude, longitude, record=False, at=None):
+        evaluations.append((latitude, longitude, record, at))
+        return {"success": True, "total_breaches": 0, "alerts": [], "inside_geofences": [], "outside_geofences": []}
+
+    monkeypatch.setattr(geofence_router, "check_cattle_geofence_status", fake_check)
+
+    for second in range(10):
+        noisy = reading(f"2025-07-28T12:00:{second:02d}Z", latitude=-15.4 + (second % 2) * 1e-5)
+        result = cattle.store_and_evaluate_reading(DecodedReading(CattleSensorData(**noisy)))
+
+    assert result["writes"] == {"live_data": "skip", "cattle": "skip", "geofence": "cached"}
+    assert fake.writes == [
+        ("set", "cattle_live_data/c1"),
+        ("update", "cattle", ["lastMovement", "last_seen", "location", "position", "status"])
+    ]
+    assert len(evaluations) == 1
+    # Ingest folds the evaluation into breach episodes at the reading's time
+    assert evaluations[0][2:] == (True, datetime(2025, 7, 28, 12, 0, 0))
+
+
+def test_herd_state_keeps_the_filtered_position(monkeypatch):
+    from routers import cattle
+    import routers.geofence as geofence_router
+    from herd_state import HerdState
+    from ingest_codec import DecodedReading
+    from models import CattleSensorData
+
+    state = HerdState()
+    monkeypatch.setattr(cattle, "firebase_service", FakeFirebase())
+    monkeypatch.setattr(cattle, "live_state_cache", LiveStateCache())
+    monkeypatch.setattr(cattle, "position_filter", PositionFilter())
+    monkeypatch.setattr(cattle, "herd_state", state)
+    monkeypatch.setattr(cattle, "analyze_behavior_and_generate_alerts", lambda *args: [])
+    monkeypatch.setattr(cattle.dashboard_summary, "record_cattle", lambda *args: None)
+    monkeypatch.setattr(cattle.reporting_policy, "get_policy", lambda: cattle.reporting_policy._policy)
+    monkeypatch.setattr(geofence_router, "check_cattle_geofence_status",
+                        lambda *args, **kwargs: {"success": True, "total_breaches": 0, "alerts": []})
+
+    cattle.store_and_evaluate_reading(DecodedReading(CattleSensorData(**reading("2025-07-28T12:00:00Z"))))
+    no_fix = {**reading("2025-07-28T12:01:00Z", latitude=0.0, longitude=0.0), "gps_fix": False}
+    cattle.store_and_evaluate_reading(DecodedReading(CattleSensorData(**no_fix)))
+
+    # The no-fix reading updates the row, but not to 0,0
+    location = state.locations()[0]
+    assert (location["latitude"], location["longitude"]) == (-15.4, 28.3)
+    assert location["timestamp"] == "2025-07-28T12:01:00Z"
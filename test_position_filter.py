@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Tests for GPS quality gating and the per-animal position filter (no database needed)
+"""
+
+import random
+import sys
+sys.path.append('.')
+
+from live_state_cache import distance_m
+from position_filter import (
+    PositionFilter, QUALITY_FILTERED, QUALITY_INITIAL, QUALITY_NO_FIX, QUALITY_REJECTED, QUALITY_RESET
+)
+
+LAT, LON = -15.4, 28.3
+METERS_PER_DEGREE = 111320.0
+
+
+def ts(second):
+    return f"2025-07-28T12:{second // 60:02d}:{second % 60:02d}Z"
+
+
+def test_no_fix_before_and_after_first_position():
+    gps = PositionFilter()
+    first = gps.update("c1", 0.0, 0.0, True, ts(0))
+    assert first.quality == QUALITY_NO_FIX and not first.available
+
+    assert gps.update("c1", LAT, LON, True, ts(15)).quality == QUALITY_INITIAL
+    held = gps.update("c1", 0.0, 0.0, False, ts(30))
+    assert held.quality == QUALITY_NO_FIX and not held.measured
+    assert (held.latitude, held.longitude) == (LAT, LON)
+
+
+def test_smooths_jitter_of_a_resting_animal():
+    random.seed(7)
+    gps = PositionFilter(noise_m=5)
+    raw_errors, filtered_errors = [], []
+    for step in range(40):
+        lat = LAT + random.gauss(0, 5) / METERS_PER_DEGREE
+        lon = LON + random.gauss(0, 5) / METERS_PER_DEGREE
+        position = gps.update("c1", lat, lon, True, ts(step * 15), is_moving=False)
+        if step >= 10:
+            raw_errors.append(distance_m(LAT, LON, lat, lon))
+            filtered_errors.append(distance_m(LAT, LON, position.latitude, position.longitude))
+    assert sum(filtered_errors) < 0.5 * sum(raw_errors)
+
+
+def test_tracks_a_walking_animal():
+    gps = PositionFilter()
+    speed_ms = 1.2  # walking north
+    for step in range(30):
+        position = gps.update("c1", LAT + speed_ms * step * 15 / METERS_PER_DEGREE, LON, True, ts(step * 15))
+    assert position.quality == QUALITY_FILTERED
+    assert abs(position.speed_kmh - speed_ms * 3.6) < 0.5
+    assert distance_m(position.latitude, position.longitude, LAT + speed_ms * 29 * 15 / METERS_PER_DEGREE, LON) < 5
+
+
+def test_rejects_impossible_jumps_then_resets():
+    gps = PositionFilter(reset_after_rejects=3)
+    gps.update("c1", LAT, LON, True, ts(0))
+    far = LAT + 0.05  # ~5.5 km in 15 s
+    first = gps.update("c1", far, LON, True, ts(15))
+    assert first.quality == QUALITY_REJECTED and first.latitude == LAT
+    assert gps.update("c1", far, LON, True, ts(30)).quality == QUALITY_REJECTED
+    reset = gps.update("c1", far, LON, True, ts(45))
+    assert reset.quality == QUALITY_RESET and reset.latitude == far
+    assert gps.stats()[QUALITY_REJECTED] == 2
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Tests for the adaptive reporting interval policy (no database needed)
+"""
+
+import sys
+sys.path.append('.')
+
+import reporting_policy as policy_module
+from models import ReportingPolicy, ReportingPolicyUpdate
+from reporting_policy import (
+    IngestRateMeter, ReportingPolicyManager, compute_next_interval, nearest_fence
+)
+
+
+class FakeFirebase:
+    def __init__(self, stored=None):
+        self.stored = stored
+        self.writes = []
+
+    def get_realtime_data(self, path):
+        return {"success": True, "data": self.stored}
+
+    def set_realtime_data(self, path, data):
+        self.writes.append((path, data))
+        self.stored = data
+        return {"success": True}
+
+
+def test_resting_far_from_fences_backs_off():
+    policy = ReportingPolicy()
+    seconds, reason = compute_next_interval(policy, "Resting", False, 0.0, 5.0, False)
+    assert seconds == 300
+    assert reason == "behavior:resting"
+
+
+def test_safety_cases_use_minimum_interval():
+    policy = ReportingPolicy()
+    assert compute_next_interval(policy, "resting", False, 0.0, 5.0, True) == (15, "outside_geofence")
+    assert compute_next_interval(policy, "resting", True, 9.0, 5.0, False) == (15, "fast_movement")
+    assert compute_next_interval(policy, "resting", False, 0.0, 0.05, False) == (15, "near_fence_boundary")
+    # Heavy load never stretches the safety cases
+    assert compute_next_interval(policy, "resting", False, 0.0, 5.0, True, load_rps=1e6)[0] == 15
+
+
+def test_moving_proximity_and_load():
+    policy = ReportingPolicy()
+    assert compute_next_interval(policy, "resting", True, 2.0, None, False) == (30, "behavior:resting,moving")
+
+    # Halfway between fence_near_km and fence_far_km
+    seconds, reason = compute_next_interval(policy, "resting", False, 0.0, 0.55, False)
+    assert seconds == round(15 + (300 - 15) * 0.5)
+    assert "fence_proximity" in reason
+
+    seconds, reason = compute_next_interval(policy, "grazing", False, 0.0, None, False, load_rps=100)
+    assert seconds == 180 and reason.endswith("server_load")
+    # Never above the maximum
+    assert compute_next_interval(policy, "resting", False, 0.0, None, False, load_rps=100)[0] == 300
+
+
+def test_nearest_fence_from_geofence_result():
+    result = {
+        "success": True,
+        "inside_geofences": [{"id": "a", "distance_to_boundary_km": 0.4}],
+        "outside_geofences": [{"id": "b", "distance_to_boundary_km": 0.2}]
+    }
+    assert nearest_fence(result) == (0.2, True)
+    assert nearest_fence({"success": True, "inside_geofences": [], "outside_geofences": []}) == (None, False)
+    assert nearest_fence(None) == (None, False)
+
+
+def test_rate_meter_window():
+    meter = IngestRateMeter(window_seconds=10)
+    for second in range(100, 110):
+        meter.record(5, now=second)
+    assert meter.rate(now=109) == 5.0
+    assert meter.rate(now=115) == 2.0
+    assert meter.rate(now=200) == 0.0
+
+
+def test_manager_loads_and_persists_policy(monkeypatch):
+    fake = FakeFirebase(stored={**ReportingPolicy().model_dump(), "max_interval_seconds": 120})
+    monkeypatch.setattr(policy_module, "firebase_service", fake)
+    manager = ReportingPolicyManager()
+
+    assert manager.get_policy().max_interval_seconds == 120
+    seconds, _ = manager.next_interval("resting", False, 0.0, {"success": True, "inside_geofences": [], "outside_geofences": []})
+    assert seconds == 120
+
+    result = manager.update_policy(ReportingPolicyUpdate(max_interval_seconds=10))
+    assert not result["success"]
+
+    result = manager.update_policy(ReportingPolicyUpdate(behavior_intervals={"resting": 90}))
+    assert result["success"]
+    assert fake.writes[-1][1]["behavior_intervals"] == {"resting": 90}
+    assert fake.writes[-1][1]["max_interval_seconds"] == 120
+    assert manager.next_interval("resting", False, 0.0)[0] == 90
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Tests for single-flight read coalescing and the micro-TTL response cache
+"""
+
+import sys
+sys.path.append('.')
+
+import asyncio
+import threading
+import time
+
+from request_coalescing import SingleFlight, micro_cache, micro_cache_stats
+
+
+def test_single_flight_shares_one_execution():
+    flight = SingleFlight()
+    executions = []
+    release = threading.Event()
+
+    def slow_fetch():
+        executions.append(1)
+        release.wait(1)
+        return {"success": True, "data": [1, 2, 3]}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("path:cattle_live_data", slow_fetch))) for _ in range(10)]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert len(executions) == 1
+    assert len(results) == 10
+    assert flight.stats()["coalesced"] == 9
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_single_flight_callers_get_their_own_documents():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def slow_fetch():
+        release.wait(1)
+        return {"success": True, "data": [{"id": "s1", "status": "active"}]}
+
+    results = []
+
+    def read_and_modify():
+        result = flight.do("collection:staff", slow_fetch)
+        results.append([dict(document) for document in result["data"]])
+        # Callers decorate the documents they get back
+        result["data"][0]["status"] = "changed"
+        result["data"].append({"id": "extra"})
+
+    threads = [threading.Thread(target=read_and_modify) for _ in range(5)]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert flight.stats()["coalesced"] == 4
+    assert results == [[{"id": "s1", "status": "active"}]] * 5
+
+
+def test_single_flight_propagates_errors():
+    flight = SingleFlight()
+
+    def failing():
+        raise RuntimeError("boom")
+
+    try:
+        flight.do("k", failing)
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("expected RuntimeError")
+    assert flight.do("k", lambda: 42) == 42
+
+
+def test_micro_cache_coalesces_and_expires():
+    calls = []
+
+    @micro_cache(0.2)
+    async def endpoint_for_test(limit: int = 5):
+        calls.append(limit)
+        await asyncio.sleep(0.05)
+        return {"limit": limit}
+
+    async def run():
+        first = await asyncio.gather(*[endpoint_for_test(limit=5) for _ in range(5)])
+        cached = await endpoint_for_test(limit=5)
+        other = await endpoint_for_test(limit=6)
+        await asyncio.sleep(0.25)
+        expired = await endpoint_for_test(limit=5)
+        return first, cached, other, expired
+
+    first, cached, other, expired = asyncio.run(run())
+    assert all(r == {"limit": 5} for r in first)
+    assert cached == {"limit": 5} and other == {"limit": 6} and expired == {"limit": 5}
+    assert calls == [5, 6, 5]
+    stats = micro_cache_stats["endpoint_for_test"]
+    assert stats["coalesced"] == 4 and stats["hits"] == 1
+
+
+def test_cached_endpoint_responses_survive_compression(monkeypatch):
+    import main
+    import routers.cattle as cattle_router
+    from fastapi.testclient import TestClient
+    from herd_state import HerdState
+
+    state = HerdState()
+    for index in range(50):
+        state.update(f"cattle_{index:03d}", {"timestamp": "2026-01-01T00:00:00Z", "latitude": -15.5 + index / 1000,
+                                             "longitude": 28.0, "behavior": {"current": "grazing"}})
+    state.ensure_fresh = lambda: True
+    monkeypatch.setattr(cattle_router, "herd_state", state)
+    cattle_router.load_all_cattle_locations.cache_clear()
+    client = TestClient(main.app)
+
+    # Several requests inside the TTL, compressed and not, each get an intact response
+    responses = [client.get("/cattle/locations", headers={"Accept-Encoding": encoding})
+                 for encoding in ("gzip", "gzip", "identity", "gzip")]
+    assert [response.status_code for response in responses] == [200] * 4
+    assert [response.headers.get("content-encoding") for response in responses] == ["gzip", "gzip", None, "gzip"]
+    assert all(response.json() == responses[0].json() for response in responses)
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Tests for the indexed staff filters and their search-key backfill (no database needed)
+"""
+
+import sys
+sys.path.append('.')
+
+from fastapi.testclient import TestClient
+
+
+class FakeStaffStorage:
+    def __init__(self, staff):
+        self.staff = staff
+        self.queries = []
+
+    def get_collection(self, collection):
+        return {"success": True, "data": [{"id": staff_id, **record} for staff_id, record in self.staff.items()]}
+
+    def update_document(self, collection, document_id, data):
+        self.staff[document_id].update(data)
+        return {"success": True}
+
+    def query_collection(self, collection, order_by=None, equal_to=None, **kwargs):
+        self.queries.append(order_by)
+        return {"success": True, "data": [{"id": staff_id, **record} for staff_id, record in self.staff.items()
+                                          if record.get(order_by) == equal_to]}
+
+
+def test_filters_scan_until_the_backfill_has_finished(monkeypatch):
+    import main
+    import routers.staff as staff_router
+
+    storage = FakeStaffStorage({
+        "s1": {"name": "Old", "status": "Active", "location": "North"},
+        "s2": {"name": "New", "status": "active", "location": "south", "status_key": "active", "location_key": "south"}
+    })
+    monkeypatch.setattr(staff_router, "firebase_service", storage)
+    monkeypatch.setattr(staff_router, "search_keys_backfilled", False)
+    client = TestClient(main.app)
+
+    # s1 has no search keys yet: the indexed query would miss it
+    body = client.get("/staff/status/ACTIVE").json()
+    assert sorted(record["id"] for record in body["data"]) == ["s1", "s2"] and storage.queries == []
+
+    staff_router.backfill_staff_search_keys()
+    assert staff_router.search_keys_backfilled and storage.staff["s1"]["location_key"] == "north"
+    body = client.get("/staff/location/North").json()
+    assert [record["id"] for record in body["data"]] == ["s1"] and storage.queries == ["location_key"]
+
+
+def test_failed_backfill_keeps_scanning(monkeypatch):
+    import routers.staff as staff_router
+
+    storage = FakeStaffStorage({"s1": {"name": "Old", "status": "Active"}})
+    storage.update_document = lambda *args: {"success": False, "error": "denied"}
+    monkeypatch.setattr(staff_router, "firebase_service", storage)
+    monkeypatch.setattr(staff_router, "search_keys_backfilled", False)
+
+    staff_router.backfill_staff_search_keys()
+    assert not staff_router.search_keys_backfilled
+    assert [record["id"] for record in staff_router.find_staff("status", "active")] == ["s1"]
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Tests for the server-side query helpers used by the storage services
+"""
+
+import sys
+sys.path.append('.')
+
+import storage_query
+
+
+def test_validate_query_rejects_unsupported_combinations():
+    assert storage_query.validate_query(equal_to="Online") is not None
+    assert storage_query.validate_query(order_by="status", shallow=True) is not None
+    assert storage_query.validate_query(order_by="ts", equal_to=1, start_at=0) is not None
+    assert storage_query.validate_query(order_by="ts", limit_to_first=1, limit_to_last=1) is not None
+    assert storage_query.validate_query(order_by="status_key", equal_to="online") is None
+    assert storage_query.validate_query(shallow=True) is None
+
+
+def test_rest_params_are_json_encoded():
+    params = storage_query.to_rest_params(order_by="cattleId", equal_to="cattle1", limit_to_last=10)
+    assert params == {"orderBy": '"cattleId"', "equalTo": '"cattle1"', "limitToLast": "10"}
+    assert storage_query.to_rest_params(shallow=True) == {"shallow": "true"}
+    assert storage_query.to_rest_params(order_by="$key", start_at="b") == {"orderBy": '"$key"', "startAt": '"b"'}
+
+
+def test_documents_are_ordered_by_query_key():
+    data = {
+        "a2": {"timestamp": "2025-01-02", "type": "x"},
+        "a1": {"timestamp": "2025-01-03", "type": "x"},
+        "a3": {"type": "x"},
+    }
+    docs = storage_query.to_documents(data, order_by="timestamp")
+    assert [d["id"] for d in docs] == ["a3", "a2", "a1"]
+    assert [d["id"] for d in storage_query.to_documents(data, order_by="$key")] == ["a1", "a2", "a3"]
+    assert storage_query.to_documents(None) == []
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Tests for ETag revalidation in the HTTP storage service and 304 handling
+"""
+
+import sys
+sys.path.append('.')
+
+import json
+
+import temp_firebase_service as storage_module
+from temp_firebase_service import TemporaryFirebaseService
+from http_cache import etag_matches, storage_etag
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None, etag=None):
+        self.status_code = status_code
+        self.content = json.dumps(payload).encode() if payload is not None else b""
+        self.text = self.content.decode()
+        self.headers = {"ETag": etag} if etag else {}
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+
+class FakeRequest:
+    def __init__(self, headers):
+        self.headers = headers
+
+
+def test_unchanged_collection_is_served_from_cache(monkeypatch):
+    calls = []
+    geofences = {"g1": {"name": "Paddock", "coordinates": [[0, 0], [1, 0], [1, 1]]}}
+
+    def fake_get(url, headers=None, params=None):
+        calls.append(dict(headers or {}))
+        if headers and headers.get("if-none-match") == "etag-1":
+            return FakeResponse(304)
+        return FakeResponse(200, geofences, etag="etag-1")
+
+    monkeypatch.setattr(storage_module.requests, "get", fake_get)
+    service = TemporaryFirebaseService()
+
+    first = service.get_collection("geofences")
+    second = service.get_collection("geofences")
+
+    assert first["data"] == second["data"] and second["data"][0]["id"] == "g1"
+    assert second["etag"] == "etag-1"
+    assert calls[1]["if-none-match"] == "etag-1"
+    assert service.revalidation_stats["not_modified"] == 1
+
+    # Changes a caller makes to its documents do not leak into later 304s
+    second["data"][0]["name"] = "Changed"
+    second["data"][0].pop("coordinates")
+    third = service.get_collection("geofences")
+    assert third["data"][0]["name"] == "Paddock" and "coordinates" in third["data"][0]
+
+
+def test_hot_paths_are_not_cached(monkeypatch):
+    calls = []
+
+    def fake_get(url, headers=None, params=None):
+        calls.append(dict(headers or {}))
+        return FakeResponse(200, {"cattle1": {"latitude": 1}}, etag="live-1")
+
+    monkeypatch.setattr(storage_module.requests, "get", fake_get)
+    service = TemporaryFirebaseService()
+    service.get_realtime_data("cattle_live_data")
+    result = service.get_realtime_data("cattle_live_data")
+
+    assert "if-none-match" not in calls[1]
+    assert result["etag"] == "live-1"
+
+
+def test_http_etag_matching():
+    result = {"success": True, "data": [], "etag": "abc"}
+    etag = storage_etag(result)
+    assert "etag" not in result
+    assert etag_matches(FakeRequest({"if-none-match": etag}), etag)
+    assert etag_matches(FakeRequest({"if-none-match": f'"other", W/{etag}'}), etag)
+    assert not etag_matches(FakeRequest({}), etag)
+    assert storage_etag({"success": True}) is None
+
+
+def test_admin_service_serves_a_fresh_copy_on_every_unchanged_read(monkeypatch):
+    import firebase_admin
+    from firebase_admin import db
+
+    geofences = {"g1": {"name": "Paddock", "coordinates": [[0, 0], [1, 0], [1, 1]]}}
+
+    class FakeRef:
+        def child(self, path):
+            return self
+
+        def get(self, etag=False):
+            return json.loads(json.dumps(geofences)), "etag-1"
+
+        def get_if_changed(self, etag):
+            return False, None, etag
+
+    # Skip credential setup; the service only needs a database reference
+    monkeypatch.setattr(firebase_admin, "_apps", {"[DEFAULT]": object()})
+    monkeypatch.setattr(db, "reference", lambda: FakeRef())
+    from firebase_service import FirebaseService
+    service = FirebaseService()
+
+    first = service.get_collection("geofences")
+    first["data"][0]["name"] = "Changed"
+    first["data"][0]["coordinates"].append([0, 0])
+    second = service.get_collection("geofences")
+    second["data"][0].pop("coordinates")
+    third = service.get_realtime_data("geofences/g1")
+    third["data"]["name"] = "Changed"
+    fourth = service.get_collection("geofences")
+
+    assert service.revalidation_stats["not_modified"] == 2
+    assert fourth["data"] == [{"id": "g1", **geofences["g1"]}]